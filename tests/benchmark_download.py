@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+"""
+<Program Name>
+  benchmark_download.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Measure the throughput (MB/s) of 'tuf.download.safe_download()' against the
+  local 'simple_server.py'.  This is not a unit test and is not run by
+  'aggregate_tests.py'.  Run it from the 'tuf/tests/' directory:
+
+  $ python benchmark_download.py [size_in_megabytes] [number_of_rounds]
+"""
+
+# Help with Python 3 compatibility, where the print statement is a function, an
+# implicit relative import is invalid, and the '/' operator performs true
+# division.  Example:  print 'hello world' raises a 'SyntaxError' exception.
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import sys
+import random
+import subprocess
+import tempfile
+import time
+import timeit
+
+import tuf
+import tuf.download
+import tuf.settings
+
+
+def run(size_in_megabytes, number_of_rounds):
+  # Create a target file in the current directory, so that it is served by
+  # 'simple_server.py'.
+  data_length = int(size_in_megabytes * 1024 * 1024)
+  file_descriptor, target_filepath = \
+    tempfile.mkstemp(prefix='benchmark_', dir=os.getcwd())
+
+  with os.fdopen(file_descriptor, 'wb') as file_object:
+    file_object.write(os.urandom(data_length))
+
+  port = random.randint(30000, 45000)
+  command = ['python', 'simple_server.py', str(port)]
+  server_process = subprocess.Popen(command, stderr=subprocess.PIPE)
+  url = 'http://localhost:' + str(port) + '/' + \
+    os.path.basename(target_filepath)
+
+  # NOTE: Following error is raised if a delay is not applied:
+  # <urlopen error [Errno 111] Connection refused>
+  time.sleep(1)
+
+  try:
+    results = []
+    for round_number in range(number_of_rounds):
+      start_time = timeit.default_timer()
+      temp_file = tuf.download.safe_download(url, data_length)
+      seconds = timeit.default_timer() - start_time
+      temp_file.close_temp_file()
+
+      megabytes_per_second = size_in_megabytes / seconds
+      results.append(megabytes_per_second)
+      print('Round ' + str(round_number + 1) + ': ' +
+        '%.2f' % megabytes_per_second + ' MB/s')
+
+    print('Best of ' + str(number_of_rounds) + ': ' +
+      '%.2f' % max(results) + ' MB/s (' + str(size_in_megabytes) + ' MB, ' +
+      'CHUNK_SIZE=' + str(tuf.settings.CHUNK_SIZE) + ')')
+
+  finally:
+    if server_process.returncode is None:
+      server_process.kill()
+    os.remove(target_filepath)
+
+
+
+if __name__ == '__main__':
+  size_in_megabytes = 16
+  number_of_rounds = 3
+
+  if len(sys.argv) > 1:
+    size_in_megabytes = float(sys.argv[1])
+
+  if len(sys.argv) > 2:
+    number_of_rounds = int(sys.argv[2])
+
+  run(size_in_megabytes, number_of_rounds)
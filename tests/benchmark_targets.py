@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+"""
+<Program Name>
+  benchmark_targets.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Measure the latency of 'tuf.client.updater.Updater.get_one_valid_targetinfo()'
+  as the number of targets listed by the 'targets' role grows.  The client
+  metadata of 'repository_data/client/test_repository' is copied to a
+  temporary directory, and its 'targets.json' is padded with generated
+  targets.  The first lookup, which loads the metadata of the role, is
+  measured apart from the following ones.  No mirror is contacted.  This is
+  not a unit test and is not run by 'aggregate_tests.py'.  Run it from the
+  'tuf/tests/' directory:
+
+  $ python benchmark_targets.py [number_of_lookups] [number_of_targets ...]
+"""
+
+# Help with Python 3 compatibility, where the print statement is a function, an
+# implicit relative import is invalid, and the '/' operator performs true
+# division.  Example:  print 'hello world' raises a 'SyntaxError' exception.
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+import tuf
+import tuf.client.updater
+import tuf.settings
+
+
+def run(number_of_lookups, numbers_of_targets):
+  temporary_directory = tempfile.mkdtemp(dir=os.getcwd())
+  original_repositories_directory = tuf.settings.repositories_directory
+  tuf.settings.repositories_directory = temporary_directory
+
+  repository_mirrors = {'mirror': {
+      'url_prefix': 'http://localhost:0/repository',
+      'metadata_path': 'metadata', 'targets_path': 'targets',
+      'confined_target_dirs': ['']}}
+
+  try:
+    for number_of_targets in numbers_of_targets:
+      client_directory = os.path.join(temporary_directory, 'repository')
+      shutil.rmtree(client_directory, ignore_errors=True)
+      shutil.copytree(os.path.join('repository_data', 'client',
+          'test_repository'), client_directory)
+
+      # Pad the trusted 'targets.json' of the client.  The signatures are not
+      # checked when metadata is loaded from disk.
+      targets_filepath = os.path.join(client_directory, 'metadata', 'current',
+          'targets.json')
+
+      with open(targets_filepath) as file_object:
+        targets_signable = json.load(file_object)
+
+      targets = targets_signable['signed']['targets']
+      fileinfo = targets['/file1.txt']
+
+      # The last target added is the one looked up.
+      target_filepath = '/file1.txt'
+
+      for index in range(number_of_targets - len(targets)):
+        target_filepath = '/generated/file' + str(index) + '.txt'
+        targets[target_filepath] = fileinfo
+
+      with open(targets_filepath, 'w') as file_object:
+        json.dump(targets_signable, file_object)
+
+      updater = tuf.client.updater.Updater('repository', repository_mirrors)
+
+      # The first lookup loads the metadata of the role from disk.
+      start_time = timeit.default_timer()
+      updater.get_one_valid_targetinfo(target_filepath)
+      first_seconds = timeit.default_timer() - start_time
+
+      start_time = timeit.default_timer()
+      for lookup in range(number_of_lookups):
+        updater.get_one_valid_targetinfo(target_filepath)
+      seconds = timeit.default_timer() - start_time
+
+      print(str(len(targets)) + ' targets: ' +
+        '%.3f' % (first_seconds * 1000) + ' ms for the first lookup, ' +
+        '%.3f' % (seconds / number_of_lookups * 1000) + ' ms per lookup')
+
+  finally:
+    tuf.settings.repositories_directory = original_repositories_directory
+    shutil.rmtree(temporary_directory)
+
+
+
+if __name__ == '__main__':
+  number_of_lookups = 20
+  numbers_of_targets = [10, 1000, 10000, 100000]
+
+  if len(sys.argv) > 1:
+    number_of_lookups = int(sys.argv[1])
+
+  if len(sys.argv) > 2:
+    numbers_of_targets = [int(argument) for argument in sys.argv[2:]]
+
+  run(number_of_lookups, numbers_of_targets)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+<Program Name>
+  range_server.py
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  The server of 'simple_server.py', with a request handler that also supports
+  HTTP range requests of the form 'Range: bytes=first-' and
+  'Range: bytes=first-last', and gzip compressed responses.  It is used to
+  test resumable, segmented, conditional and compressed downloads in
+  'test_download.py'.
+"""
+
+# Help with Python 3 compatibility, where the print statement is a function, an
+# implicit relative import is invalid, and the '/' operator performs true
+# division.  Example:  print 'hello world' raises a 'SyntaxError' exception.
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import zlib
+
+import simple_server
+
+
+class Handler(simple_server.Handler):
+
+  def do_GET(self):
+    byte_range = self.headers.get('Range')
+    compress = byte_range is None and \
+        'gzip' in self.headers.get('Accept-Encoding', '')
+
+    if byte_range is None and not compress:
+      return simple_server.Handler.do_GET(self)
+
+    if self.send_not_modified():
+      return
+
+    filepath = self.translate_path(self.path)
+
+    if compress and self.etag is not None:
+      with open(filepath, 'rb') as fileobj:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        data = compressor.compress(fileobj.read()) + compressor.flush()
+
+      self.send_response(200)
+      self.send_header('Content-Encoding', 'gzip')
+      self.send_header('Content-Length', str(len(data)))
+      self.end_headers()
+      self.wfile.write(data)
+      return
+
+    if byte_range is None:
+      return simple_server.Handler.do_GET(self)
+
+    try:
+      with open(filepath, 'rb') as fileobj:
+        data = fileobj.read()
+
+    except IOError:
+      self.send_error(404, 'File not found')
+      return
+
+    first, last = byte_range.split('=', 1)[1].split('-', 1)
+    first = int(first)
+    last = int(last) if last else len(data) - 1
+
+    if first >= len(data):
+      self.send_error(416, 'Requested range not satisfiable')
+      return
+
+    last = min(last, len(data) - 1)
+    self.send_response(206)
+    self.send_header('Content-Length', str(last - first + 1))
+    self.send_header('Content-Range',
+        'bytes ' + str(first) + '-' + str(last) + '/' + str(len(data)))
+    self.end_headers()
+    self.wfile.write(data[first:last + 1])
+
+
+
+if __name__ == '__main__':
+  simple_server.run(Handler)
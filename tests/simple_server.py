@@ -15,7 +15,8 @@
 
 <Purpose>
   This is a basic server that was designed to be used in conjunction with 
-  test_download.py to test download.py module. 
+  test_download.py to test download.py module.  It also answers conditional
+  requests (with an 'If-None-Match' header).
 
 <Reference>
   SimpleHTTPServer:
@@ -30,29 +31,85 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import os
 import sys
 import random
+import hashlib
 
 import six
 
-PORT = 0
+
+class Handler(six.moves.SimpleHTTPServer.SimpleHTTPRequestHandler):
+  """
+  The handler of requests, which 'range_server.py' extends.  Files are sent
+  with an 'ETag' header, the hash of their contents, and a request with a
+  matching 'If-None-Match' header is answered with '304 Not Modified'.
+  """
+
+  def do_GET(self):
+    if self.send_not_modified():
+      return
+
+    six.moves.SimpleHTTPServer.SimpleHTTPRequestHandler.do_GET(self)
+
+
+  def send_not_modified(self):
+    """
+    Set the ETag of the requested file, and send a '304 Not Modified'
+    response if the request has a matching 'If-None-Match' header.  Return
+    True if the response was sent.
+    """
+
+    filepath = self.translate_path(self.path)
+    self.etag = None
+
+    if os.path.isfile(filepath):
+      with open(filepath, 'rb') as fileobj:
+        self.etag = '"' + hashlib.sha256(fileobj.read()).hexdigest() + '"'
+
+    if self.etag is not None and self.headers.get('If-None-Match') == self.etag:
+      self.send_response(304)
+      self.end_headers()
+      return True
+
+    return False
+
+
+  def end_headers(self):
+    if getattr(self, 'etag', None) is not None:
+      self.send_header('ETag', self.etag)
+
+    six.moves.SimpleHTTPServer.SimpleHTTPRequestHandler.end_headers(self)
+
+
 
 def _port_gen():
   return random.randint(30000, 45000)
 
-if len(sys.argv) > 1:
-  try:
-    PORT = int(sys.argv[1])
-    if PORT < 30000 or PORT > 45000:
-      raise ValueError
-  
-  except ValueError:
-    PORT = _port_gen()
 
-else:
-  PORT = _port_gen()
+def run(handler):
+  """
+  Serve the files of the current directory with 'handler', on the port given
+  as the first command-line argument (a random port between 30000 and 45000
+  if there is none, or if it is out of that range).
+  """
+
+  if len(sys.argv) > 1:
+    try:
+      port = int(sys.argv[1])
+      if port < 30000 or port > 45000:
+        raise ValueError
+
+    except ValueError:
+      port = _port_gen()
+
+  else:
+    port = _port_gen()
+
+  httpd = six.moves.socketserver.TCPServer(('', port), handler)
+  httpd.serve_forever()
+
 
-Handler = six.moves.SimpleHTTPServer.SimpleHTTPRequestHandler
-httpd = six.moves.socketserver.TCPServer(('', PORT), Handler)
 
-httpd.serve_forever()
+if __name__ == '__main__':
+  run(Handler)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+"""
+<Program Name>
+  test_async_updater.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  'test_async_updater.py' provides a collection of methods that test the
+  public and non-public methods of 'tuf.client.async_updater.py'.  The
+  'AsyncUpdater' class requires Python 3.5 or later, so the test cases are
+  skipped on earlier versions.
+"""
+
+# Help with Python 3 compatibility, where the print statement is a function, an
+# implicit relative import is invalid, and the '/' operator performs true
+# division.  Example:  print 'hello world' raises a 'SyntaxError' exception.
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import time
+import shutil
+import tempfile
+import logging
+import random
+import subprocess
+import sys
+import unittest
+
+import tuf
+import tuf.exceptions
+import tuf.log
+import tuf.formats
+import tuf.keydb
+import tuf.roledb
+import tuf.settings
+import tuf.unittest_toolbox as unittest_toolbox
+import tuf.client.updater as updater
+
+import securesystemslib
+
+if sys.version_info >= (3, 5):
+  import asyncio
+  import tuf.client.async_updater as async_updater
+
+logger = logging.getLogger('tuf.test_async_updater')
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'AsyncUpdater requires Python 3.5+')
+class TestAsyncUpdater(unittest_toolbox.Modified_TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    # Create a temporary directory to store the repository, metadata, and target
+    # files.  'temporary_directory' must be deleted in TearDownClass() so that
+    # temporary files are always removed, even when exceptions occur.
+    cls.temporary_directory = tempfile.mkdtemp(dir=os.getcwd())
+
+    # Launch a SimpleHTTPServer (serves files in the current directory).
+    cls.SERVER_PORT = random.randint(30000, 45000)
+    command = ['python', 'simple_server.py', str(cls.SERVER_PORT)]
+    cls.server_process = subprocess.Popen(command, stderr=subprocess.PIPE)
+    logger.info('\n\tServer process started.')
+    logger.info('\tServer process id: '+str(cls.server_process.pid))
+    logger.info('\tServing on port: '+str(cls.SERVER_PORT))
+
+    # NOTE: Following error is raised if a delay is not applied:
+    # <urlopen error [Errno 111] Connection refused>
+    time.sleep(1)
+
+
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls.temporary_directory)
+
+    # Kill the SimpleHTTPServer process.
+    if cls.server_process.returncode is None:
+      logger.info('\tServer process ' + str(cls.server_process.pid) + ' terminated.')
+      cls.server_process.kill()
+
+
+
+  def setUp(self):
+    # We are inheriting from custom class.
+    unittest_toolbox.Modified_TestCase.setUp(self)
+    tuf.roledb.clear_roledb(clear_all=True)
+    tuf.keydb.clear_keydb(clear_all=True)
+
+    self.repository_name = 'test_repository'
+
+    # Copy the original repository files provided in the test folder so that
+    # any modifications made to repository files are restricted to the copies.
+    original_repository_files = os.path.join(os.getcwd(), 'repository_data')
+    temporary_repository_root = \
+      self.make_temp_directory(directory=self.temporary_directory)
+
+    original_repository = os.path.join(original_repository_files, 'repository')
+    original_client = os.path.join(original_repository_files, 'client')
+
+    self.repository_directory = \
+      os.path.join(temporary_repository_root, 'repository')
+    self.client_directory = os.path.join(temporary_repository_root, 'client')
+
+    shutil.copytree(original_repository, self.repository_directory)
+    shutil.copytree(original_client, self.client_directory)
+
+    # 'path/to/tmp/repository' -> 'localhost:8001/tmp/repository'.
+    repository_basepath = self.repository_directory[len(os.getcwd()):]
+    url_prefix = \
+      'http://localhost:' + str(self.SERVER_PORT) + repository_basepath
+
+    tuf.settings.repositories_directory = self.client_directory
+
+    self.repository_mirrors = {'mirror1': {'url_prefix': url_prefix,
+                                           'metadata_path': 'metadata',
+                                           'targets_path': 'targets',
+                                           'confined_target_dirs': ['']}}
+
+    self.repository_updater = async_updater.AsyncUpdater(self.repository_name,
+        self.repository_mirrors, max_concurrent_downloads=2)
+
+    self.loop = asyncio.new_event_loop()
+
+
+
+  def tearDown(self):
+    # We are inheriting from custom class.
+    unittest_toolbox.Modified_TestCase.tearDown(self)
+    self.repository_updater.close()
+    self.loop.close()
+    tuf.roledb.clear_roledb(clear_all=True)
+    tuf.keydb.clear_keydb(clear_all=True)
+
+
+
+  def run_coroutine(self, coroutine):
+    return self.loop.run_until_complete(coroutine)
+
+
+
+  def test_1__init__(self):
+    self.assertEqual(2, self.repository_updater.max_concurrent_downloads)
+
+    # Test: Invalid 'max_concurrent_downloads' argument.
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        async_updater.AsyncUpdater, self.repository_name,
+        self.repository_mirrors, max_concurrent_downloads=0)
+
+    # Test: Invalid 'repository_name' argument, checked by the Updater object.
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        async_updater.AsyncUpdater, 8, self.repository_mirrors)
+
+
+
+  def test_2_all_targets(self):
+    self.run_coroutine(self.repository_updater.refresh())
+    all_targets = self.run_coroutine(self.repository_updater.all_targets())
+
+    self.assertTrue(tuf.formats.TARGETINFOS_SCHEMA.matches(all_targets))
+
+    # The delegated role 'role1' (and 'role2', which it delegates to) must
+    # have been updated and verified.
+    metadata = self.repository_updater._updater.metadata['current']
+    self.assertTrue('role1' in metadata)
+    self.assertTrue('role2' in metadata)
+
+    # The targets must be the same as those returned by the sync updater.
+    repository_updater = updater.Updater(self.repository_name,
+        self.repository_mirrors)
+    repository_updater.refresh()
+    self.assertEqual(repository_updater.all_targets(), all_targets)
+
+    targets = self.run_coroutine(self.repository_updater.targets_of_role('role1'))
+    self.assertEqual(repository_updater.targets_of_role('role1'), targets)
+
+
+
+  def test_3_get_one_valid_targetinfo(self):
+    self.run_coroutine(self.repository_updater.refresh())
+
+    targetinfo = self.run_coroutine(
+        self.repository_updater.get_one_valid_targetinfo('file3.txt'))
+    self.assertEqual('/file3.txt', targetinfo['filepath'])
+
+    # The exceptions of the sync updater are raised.
+    self.assertRaises(tuf.exceptions.UnknownTargetError, self.run_coroutine,
+        self.repository_updater.get_one_valid_targetinfo('missing.txt'))
+
+    targetinfos = self.run_coroutine(
+        self.repository_updater.get_valid_targetinfos(['file3.txt',
+        'missing.txt']))
+    self.assertEqual(targetinfo, targetinfos['file3.txt'])
+    self.assertTrue(isinstance(targetinfos['missing.txt'],
+        tuf.exceptions.UnknownTargetError))
+
+
+
+  def test_4_download_targets(self):
+    self.run_coroutine(self.repository_updater.refresh())
+    all_targets = self.run_coroutine(self.repository_updater.all_targets())
+    destination_directory = self.make_temp_directory()
+
+    updated_targets = self.run_coroutine(
+        self.repository_updater.updated_targets(all_targets,
+        destination_directory))
+    self.assertEqual(3, len(updated_targets))
+
+    self.run_coroutine(self.repository_updater.download_targets(
+        updated_targets, destination_directory))
+
+    for target in all_targets:
+      target_filepath = os.path.join(destination_directory,
+          target['filepath'].lstrip('/'))
+      self.assertEqual(target['fileinfo']['length'],
+          os.path.getsize(target_filepath))
+
+    self.assertEqual([], self.run_coroutine(
+        self.repository_updater.updated_targets(all_targets,
+        destination_directory)))
+
+    # Test: A target whose trusted hashes do not match is rejected, but the
+    # other targets are still downloaded.
+    shutil.rmtree(destination_directory)
+    os.mkdir(destination_directory)
+    bad_target = {'filepath': all_targets[0]['filepath'],
+        'fileinfo': {'length': all_targets[0]['fileinfo']['length'],
+        'hashes': {'sha256': '0' * 64}}}
+
+    self.assertRaises(tuf.exceptions.NoWorkingMirrorError, self.run_coroutine,
+        self.repository_updater.download_targets([bad_target] + all_targets[1:],
+        destination_directory))
+
+    self.assertEqual([all_targets[0]], self.run_coroutine(
+        self.repository_updater.updated_targets(all_targets,
+        destination_directory)))
+
+
+
+  def test_5_delegated_roles_in_memory(self):
+    original_max_delegated_roles = tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY
+    tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY = 1
+
+    try:
+      self.run_coroutine(self.repository_updater.refresh())
+      repository_updater = self.repository_updater._updater
+      current_metadata = repository_updater.metadata['current']
+      previous_metadata = repository_updater.metadata['previous']
+
+      # The metadata of the least recently used delegated role is evicted
+      # after all the targets are listed, and the previous metadata of
+      # delegated roles is not kept in memory.
+      all_targets = self.run_coroutine(self.repository_updater.all_targets())
+      self.assertEqual(3, len(all_targets))
+      self.assertEqual(['role2'],
+          list(repository_updater.delegated_roles_in_memory))
+      self.assertTrue('role2' in current_metadata)
+      self.assertFalse('role1' in current_metadata)
+      self.assertFalse('role1' in previous_metadata)
+      self.assertFalse('role2' in previous_metadata)
+      self.assertEqual({'targets': 1, 'role2': 1},
+          repository_updater.fresh_roles)
+
+      # The evicted role is loaded again from disk, but the fresh roles are
+      # not.
+      loaded_roles = []
+      load_metadata_from_file = repository_updater._load_metadata_from_file
+
+      def spy(metadata_set, metadata_role):
+        loaded_roles.append(metadata_role)
+        load_metadata_from_file(metadata_set, metadata_role)
+
+      repository_updater._load_metadata_from_file = spy
+
+      self.assertEqual(all_targets,
+          self.run_coroutine(self.repository_updater.all_targets()))
+      self.assertEqual(['role1', 'role1'], loaded_roles)
+      self.assertEqual(['role2'],
+          list(repository_updater.delegated_roles_in_memory))
+
+    finally:
+      tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY = original_max_delegated_roles
+
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -33,6 +33,7 @@ import logging
 import os
 import random
 import subprocess
+import threading
 import time
 import unittest
 
@@ -43,6 +44,7 @@ import tuf.unittest_toolbox as unittest_toolbox
 import tuf.exceptions
 
 import securesystemslib
+import securesystemslib.hash
 import six
 
 logger = logging.getLogger('tuf.test_download')
@@ -106,6 +108,246 @@ class TestDownload(unittest_toolbox.Modified_TestCase):
 
 
 
+  # Test: Hashes computed while downloading.
+  def test_download_url_to_tempfileobj_and_digest_objects(self):
+    digest_objects = {'md5': securesystemslib.hash.digest('md5'),
+                      'sha256': securesystemslib.hash.digest('sha256')}
+
+    temp_fileobj = download.safe_download(self.url, self.target_data_length,
+        digest_objects=digest_objects)
+
+    self.assertEqual(self.target_hash['md5'], digest_objects['md5'].hexdigest())
+    self.assertEqual(hashlib.sha256(temp_fileobj.read()).hexdigest(),
+        digest_objects['sha256'].hexdigest())
+    temp_fileobj.close_temp_file()
+
+
+
+  # Test: Resumable download to a spool file.
+  def test_resumable_download(self):
+    target_data = self.target_data.encode('utf-8')
+    spool_filepath = os.path.join(self.make_temp_directory(), 'target.partial')
+
+    length = download.resumable_download(self.url, self.target_data_length,
+        spool_filepath)
+    self.assertEqual(self.target_data_length, length)
+    with open(spool_filepath, 'rb') as spool_file:
+      self.assertEqual(target_data, spool_file.read())
+
+    # A complete spool file is not downloaded again.
+    self.server_proc.kill()
+    self.server_proc.wait()
+    length = download.resumable_download(self.url, self.target_data_length,
+        spool_filepath)
+    self.assertEqual(self.target_data_length, length)
+
+
+
+  # Test: Resuming from a server that ignores the 'Range' header.
+  def test_resumable_download_restarts(self):
+    target_data = self.target_data.encode('utf-8')
+    spool_filepath = os.path.join(self.make_temp_directory(), 'target.partial')
+
+    # simple_server.py does not support range requests, so the download starts
+    # over, and the digest objects are replaced.
+    digest_objects = {'md5': securesystemslib.hash.digest('md5')}
+    with open(spool_filepath, 'wb') as spool_file:
+      spool_file.write(b'x' * 4)
+    digest_objects['md5'].update(b'x' * 4)
+
+    download.resumable_download(self.url, self.target_data_length,
+        spool_filepath, digest_objects=digest_objects)
+
+    self.assertEqual(self.target_hash['md5'], digest_objects['md5'].hexdigest())
+    with open(spool_filepath, 'rb') as spool_file:
+      self.assertEqual(target_data, spool_file.read())
+
+    # A spool file longer than the required length is discarded.
+    with open(spool_filepath, 'ab') as spool_file:
+      spool_file.write(b'x' * 4)
+
+    download.resumable_download(self.url, self.target_data_length,
+        spool_filepath)
+    with open(spool_filepath, 'rb') as spool_file:
+      self.assertEqual(target_data, spool_file.read())
+
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        download.resumable_download, self.url, self.target_data_length, 8)
+
+
+
+  # Test: Temporary file next to the destination.
+  def test_download_url_to_tempfileobj_and_temp_directory(self):
+    temp_directory = self.make_temp_directory()
+    destination = os.path.join(temp_directory, 'target')
+
+    temp_fileobj = download.safe_download(self.url, self.target_data_length,
+        temp_directory=temp_directory)
+    self.assertTrue(isinstance(temp_fileobj, download.DestinationTempFile))
+    self.assertEqual(self.target_data_length,
+        temp_fileobj.get_compressed_length())
+    self.assertEqual(self.target_data, temp_fileobj.read().decode('utf-8'))
+
+    # The file is renamed into place.
+    temp_fileobj.move(destination)
+    self.assertEqual(['target'], os.listdir(temp_directory))
+    with open(destination, 'rb') as fileobj:
+      self.assertEqual(self.target_data, fileobj.read().decode('utf-8'))
+
+    # An existing destination is replaced, and a closed file is removed.  The
+    # file may be flushed to disk first.
+    tuf.settings.FSYNC_DOWNLOADED_TARGETS = True
+
+    try:
+      temp_fileobj = download.unsafe_download(self.url,
+          self.target_data_length, temp_directory=temp_directory)
+      temp_fileobj.move(destination)
+
+    finally:
+      tuf.settings.FSYNC_DOWNLOADED_TARGETS = False
+
+    temp_fileobj = download.safe_download(self.url, self.target_data_length,
+        temp_directory=temp_directory)
+    temp_fileobj.close_temp_file()
+    self.assertEqual(['target'], os.listdir(temp_directory))
+
+
+
+  # Test: Cancelled download.
+  def test_download_url_to_tempfileobj_and_cancel_event(self):
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    self.assertRaises(tuf.exceptions.DownloadError, download.safe_download,
+        self.url, self.target_data_length, cancel_event=cancel_event)
+    self.assertRaises(tuf.exceptions.DownloadError, download.unsafe_download,
+        self.url, self.target_data_length, cancel_event=cancel_event)
+
+
+
+  # Test: Conditional requests with the validators of a downloaded file.
+  def test_download_url_to_tempfileobj_and_validators(self):
+    port = random.randint(30000, 45000)
+    command = ['python', 'range_server.py', str(port)]
+    range_server_proc = subprocess.Popen(command, stderr=subprocess.PIPE)
+    time.sleep(1)
+
+    try:
+      url = self.url.replace(str(self.PORT), str(port))
+
+      # A file is downloaded unconditionally if no validators are known.
+      validators = {}
+      temp_fileobj = download.unsafe_download(url, self.target_data_length,
+          validators=validators)
+      self.assertEqual(self.target_data, temp_fileobj.read().decode('utf-8'))
+      temp_fileobj.close_temp_file()
+      self.assertTrue('ETag' in validators)
+      etag = validators['ETag']
+
+      # An unchanged file is not downloaded again.
+      self.assertRaises(tuf.exceptions.NotModifiedError,
+          download.unsafe_download, url, self.target_data_length,
+          validators=validators)
+      self.assertEqual(etag, validators['ETag'])
+
+      # A changed file is downloaded, and its validators are saved.
+      with open(self.target_fileobj.name, 'ab') as target_fileobj:
+        target_fileobj.write(b'!')
+
+      temp_fileobj = download.unsafe_download(url,
+          self.target_data_length + 1, validators=validators)
+      self.assertEqual(self.target_data + '!',
+          temp_fileobj.read().decode('utf-8'))
+      temp_fileobj.close_temp_file()
+      self.assertNotEqual(etag, validators['ETag'])
+
+    finally:
+      if range_server_proc.returncode is None:
+        range_server_proc.kill()
+
+
+
+  # Test: Compressed transfer, bounded by the required length.
+  def test_download_url_to_tempfileobj_and_accept_compression(self):
+    port = random.randint(30000, 45000)
+    command = ['python', 'range_server.py', str(port)]
+    range_server_proc = subprocess.Popen(command, stderr=subprocess.PIPE)
+    time.sleep(1)
+
+    # A large file that compresses very well.
+    current_dir = os.getcwd()
+    zeros_filepath = self.make_temp_file(directory=current_dir)
+    with open(zeros_filepath, 'wb') as zeros_fileobj:
+      zeros_fileobj.write(b'\0' * 1000000)
+
+    try:
+      url = self.url.replace(str(self.PORT), str(port))
+      temp_fileobj = download.safe_download(url, self.target_data_length,
+          accept_compression=True)
+      self.assertEqual(self.target_data, temp_fileobj.read().decode('utf-8'))
+      temp_fileobj.close_temp_file()
+
+      # The decompressed file is no longer than the required length.
+      zeros_url = url.replace(os.path.basename(self.target_fileobj.name),
+          os.path.basename(zeros_filepath))
+      temp_fileobj = download.unsafe_download(zeros_url, 1000,
+          accept_compression=True)
+      self.assertEqual(b'\0' * 1000, temp_fileobj.read())
+      temp_fileobj.close_temp_file()
+
+      temp_fileobj = download.unsafe_download(zeros_url, 2000000,
+          accept_compression=True)
+      self.assertEqual(1000000, len(temp_fileobj.read()))
+      temp_fileobj.close_temp_file()
+
+    finally:
+      if range_server_proc.returncode is None:
+        range_server_proc.kill()
+
+
+
+  # Test: Segments downloaded with range requests.
+  def test_download_segment(self):
+    target_data = self.target_data.encode('utf-8')
+
+    # simple_server.py does not support range requests.
+    temp_fileobj = securesystemslib.util.TempFile()
+    file_lock = threading.Lock()
+    self.assertRaises(tuf.exceptions.DownloadError, download.download_segment,
+        self.url, 0, 4, temp_fileobj, file_lock)
+
+    port = random.randint(30000, 45000)
+    command = ['python', 'range_server.py', str(port)]
+    range_server_proc = subprocess.Popen(command, stderr=subprocess.PIPE)
+    time.sleep(1)
+
+    try:
+      url = self.url.replace(str(self.PORT), str(port))
+
+      # Download the second half of the file, and then the first.
+      half = self.target_data_length // 2
+      download.download_segment(url, half, self.target_data_length - half,
+          temp_fileobj, file_lock)
+      download.download_segment(url, 0, half, temp_fileobj, file_lock)
+      self.assertEqual(target_data, temp_fileobj.read())
+
+      # A resumable download continues from the data in the spool file.
+      spool_filepath = os.path.join(self.make_temp_directory(), 'partial')
+      with open(spool_filepath, 'wb') as spool_file:
+        spool_file.write(target_data[:half])
+
+      download.resumable_download(url, self.target_data_length,
+          spool_filepath)
+      with open(spool_filepath, 'rb') as spool_file:
+        self.assertEqual(target_data, spool_file.read())
+
+    finally:
+      temp_fileobj.close_temp_file()
+      range_server_proc.kill()
+      range_server_proc.wait()
+
+
+
   # Test: Incorrect lengths.
   def test_download_url_to_tempfileobj_and_lengths(self):
     # We do *not* catch 'securesystemslib.exceptions.DownloadLengthMismatchError' in the following two
@@ -243,6 +485,74 @@ class TestDownload(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_connection_pool(self):
+    # 'simple_server.py' speaks HTTP/1.0 and closes every connection, so
+    # launch a server that keeps HTTP/1.1 connections alive.
+    class KeepAliveHandler(six.moves.SimpleHTTPServer.SimpleHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+
+      def log_message(self, format, *args):
+        pass
+
+    server = six.moves.socketserver.ThreadingTCPServer(('localhost', 0),
+        KeepAliveHandler)
+    server.daemon_threads = True
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    port = server.server_address[1]
+    url = 'http://localhost:' + str(port) + '/' + self.url.split('/')[-1]
+    key = ('http', 'localhost', port)
+    original_pool_size = tuf.settings.CONNECTION_POOL_SIZE
+    original_idle_timeout = tuf.settings.CONNECTION_IDLE_TIMEOUT
+
+    try:
+      # Test: the connection is returned to the pool after the download.
+      temp_fileobj = download.safe_download(url, self.target_data_length)
+      temp_fileobj.close_temp_file()
+      idle_connections = download._connection_pool._idle_connections[key]
+      self.assertEqual(len(idle_connections), 1)
+      connection = idle_connections[0][0]
+
+      # Test: the idle connection is reused by the next download.
+      temp_fileobj = download.unsafe_download(url, self.target_data_length)
+      self.assertEqual(self.target_data, temp_fileobj.read().decode('utf-8'))
+      temp_fileobj.close_temp_file()
+      self.assertEqual([connection],
+          [idle_connection for idle_connection, released in idle_connections])
+
+      # Test: a connection that was closed by the server is replaced.
+      connection.sock.close()
+      temp_fileobj = download.safe_download(url, self.target_data_length)
+      self.assertEqual(self.target_data, temp_fileobj.read().decode('utf-8'))
+      temp_fileobj.close_temp_file()
+      self.assertEqual(len(idle_connections), 1)
+      self.assertNotEqual(connection, idle_connections[0][0])
+
+      # Test: expired idle connections are not reused.
+      tuf.settings.CONNECTION_IDLE_TIMEOUT = 0
+      connection = idle_connections[0][0]
+      temp_fileobj = download.safe_download(url, self.target_data_length)
+      temp_fileobj.close_temp_file()
+      self.assertNotEqual(connection, idle_connections[0][0])
+
+      # Test: a pool size of zero disables persistent connections.
+      tuf.settings.CONNECTION_POOL_SIZE = 0
+      download._connection_pool.clear()
+      temp_fileobj = download.safe_download(url, self.target_data_length)
+      temp_fileobj.close_temp_file()
+      self.assertEqual(download._connection_pool._idle_connections[key], [])
+
+    finally:
+      tuf.settings.CONNECTION_POOL_SIZE = original_pool_size
+      tuf.settings.CONNECTION_IDLE_TIMEOUT = original_idle_timeout
+      download._connection_pool.clear()
+      server.shutdown()
+      server.server_close()
+
+
+
   def test__get_content_length(self):
     content_length = \
       tuf.download._get_content_length({'bad_connection_object': 8})
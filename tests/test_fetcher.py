@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""
+<Program>
+  test_fetcher.py
+
+<Started>
+  October 16, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Unit test for 'fetcher.py'.
+"""
+
+# Help with Python 3 compatibility, where the print statement is a function, an
+# implicit relative import is invalid, and the '/' operator performs true
+# division.  Example:  print 'hello world' raises a 'SyntaxError' exception.
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import threading
+import unittest
+
+import tuf
+import tuf.download as download
+import tuf.exceptions
+import tuf.fetcher as fetcher
+import tuf.unittest_toolbox as unittest_toolbox
+
+import securesystemslib
+import securesystemslib.hash
+import securesystemslib.util
+import six
+
+
+class TestFetcher(unittest_toolbox.Modified_TestCase):
+
+  def setUp(self):
+    unittest_toolbox.Modified_TestCase.setUp(self)
+
+    self.data = b'0123456789' * 1000
+    self.filepath = self.make_temp_file()
+
+    with open(self.filepath, 'wb') as file_object:
+      file_object.write(self.data)
+
+    self.file_url = 'file://' + \
+      six.moves.urllib.request.pathname2url(os.path.abspath(self.filepath))
+    self.memory_url = 'memory://mirror/file.txt'
+
+
+
+  def test_file_fetcher(self):
+    file_fetcher = fetcher.FileFetcher()
+
+    # A file that need not be hashed is copied by the kernel, if possible.
+    temp_fileobj = download.unsafe_download(self.file_url, len(self.data) * 2,
+        fetcher=file_fetcher)
+    self.assertEqual(self.data, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    # A file that is hashed is read.
+    digest_objects = {'sha256': securesystemslib.hash.digest('sha256')}
+    temp_fileobj = download.safe_download(self.file_url, len(self.data),
+        digest_objects=digest_objects, fetcher=file_fetcher)
+    self.assertEqual(self.data, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    digest_object = securesystemslib.hash.digest('sha256')
+    digest_object.update(self.data)
+    self.assertEqual(digest_object.hexdigest(),
+        digest_objects['sha256'].hexdigest())
+
+    # No more than the required length is copied.
+    temp_fileobj = download.unsafe_download(self.file_url, 10,
+        fetcher=file_fetcher)
+    self.assertEqual(self.data[:10], temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    self.assertRaises(six.moves.urllib.error.HTTPError,
+        download.safe_download, self.file_url + '.missing', len(self.data),
+        fetcher=file_fetcher)
+    self.assertRaises(six.moves.urllib.error.URLError,
+        download.safe_download, 'http://localhost/file.txt', len(self.data),
+        fetcher=file_fetcher)
+
+
+
+  def test_memory_fetcher(self):
+    memory_fetcher = fetcher.MemoryFetcher({self.memory_url: self.data})
+
+    temp_fileobj = download.safe_download(self.memory_url, len(self.data),
+        fetcher=memory_fetcher)
+    self.assertEqual(self.data, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    # Files may be added at any time.
+    memory_fetcher.files[self.memory_url + '.new'] = b'new' * 1000
+    temp_fileobj = download.unsafe_download(self.memory_url + '.new', 5000,
+        fetcher=memory_fetcher)
+    self.assertEqual(b'new' * 1000, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    self.assertRaises(six.moves.urllib.error.HTTPError,
+        download.safe_download, self.memory_url + '.missing', len(self.data),
+        fetcher=memory_fetcher)
+
+
+
+  def test_fetcher_interface(self):
+    # A fetcher must implement fetch().
+    self.assertRaises(TypeError, fetcher.FetcherInterface)
+
+    class IncompleteFetcher(fetcher.FetcherInterface):
+      pass
+
+    self.assertRaises(TypeError, IncompleteFetcher)
+    self.assertTrue(isinstance(fetcher.HTTPFetcher(), fetcher.FetcherInterface))
+
+
+
+  def test_range_requests(self):
+    memory_fetcher = fetcher.MemoryFetcher({self.memory_url: self.data})
+
+    response = memory_fetcher.fetch(self.memory_url, {'Range': 'bytes=10-19'})
+    self.assertEqual(206, response.getcode())
+    self.assertEqual('bytes 10-19/10000', response.info().get('content-range'))
+    self.assertEqual(self.data[10:20], response.read())
+    self.assertEqual(b'', response.read())
+    response.close()
+
+    self.assertRaises(six.moves.urllib.error.HTTPError, memory_fetcher.fetch,
+        self.memory_url, {'Range': 'bytes=10000-'})
+
+    # Segments of a local file.
+    temp_fileobj = securesystemslib.util.TempFile()
+    file_lock = threading.Lock()
+
+    for offset in range(0, len(self.data), 3000):
+      length = min(3000, len(self.data) - offset)
+      download.download_segment(self.file_url, offset, length, temp_fileobj,
+          file_lock, fetcher=fetcher.FileFetcher())
+
+    self.assertEqual(self.data, temp_fileobj.read())
+    temp_fileobj.close_temp_file()
+
+    # A resumed download.
+    spool_filepath = self.make_temp_file()
+
+    with open(spool_filepath, 'wb') as spool_file:
+      spool_file.write(self.data[:1234])
+
+    length = download.resumable_download(self.memory_url, len(self.data),
+        spool_filepath, fetcher=memory_fetcher)
+    self.assertEqual(len(self.data), length)
+
+    with open(spool_filepath, 'rb') as spool_file:
+      self.assertEqual(self.data, spool_file.read())
+
+
+
+  def test__copy_file_range(self):
+    destination_filepath = self.make_temp_file()
+
+    with open(self.filepath, 'rb') as source:
+      with open(destination_filepath, 'wb') as destination:
+        source.seek(10)
+        copied = fetcher._copy_file_range(source.fileno(),
+            destination.fileno(), 100)
+
+    with open(destination_filepath, 'rb') as destination:
+      data = destination.read()
+
+    # Zero bytes are copied on platforms that cannot copy between files.
+    self.assertEqual(self.data[10:10 + copied], data)
+
+
+
+# Run the unittests
+if __name__ == '__main__':
+  unittest.main()
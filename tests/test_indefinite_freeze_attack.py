@@ -309,8 +309,10 @@ class TestIndefiniteFreezeAttack(unittest_toolbox.Modified_TestCase):
     logger.info('Test: Refreshed #1 - Initial metadata refresh completed '
                 'successfully. Now sleeping until snapshot metadata expires.')
 
-    # Sleep until expiry_time ('repository.snapshot.expiration')
-    time.sleep(max(0, expiry_time - time.time()))
+    # Sleep until expiry_time ('repository.snapshot.expiration').  The
+    # expiration is stored with a resolution of one second, so sleep past that
+    # second as well.
+    time.sleep(max(0, expiry_time - time.time() + 1))
 
     logger.info('Test: Refreshing #2 - Now trying to refresh again after local'
       ' snapshot expiry.')
@@ -374,7 +376,7 @@ class TestIndefiniteFreezeAttack(unittest_toolbox.Modified_TestCase):
 
     # Wait just long enough for the timestamp metadata (which is now both on
     # the repository and on the client) to expire.
-    time.sleep(max(0, expiry_time - time.time()))
+    time.sleep(max(0, expiry_time - time.time() + 1))
 
     # Try to refresh top-level metadata on the client. Since we're already past
     # 'repository.timestamp.expiration', the TUF client is expected to detect
@@ -100,6 +100,41 @@ class TestKeydb(unittest.TestCase):
 
 
 
+  def test_replace_keydb(self):
+    rsakey = KEYS[0]
+    keyid = KEYS[0]['keyid']
+    repository_name = 'example_repository'
+    staged_repository_name = 'example_repository (staged)'
+
+    tuf.keydb.create_keydb(repository_name)
+    tuf.keydb.create_keydb(staged_repository_name)
+    tuf.keydb.add_key(rsakey, repository_name=staged_repository_name)
+    repository_keydb = tuf.keydb._keydb_dict[repository_name]
+
+    # The staged key database replaces that of the repository, and is removed.
+    tuf.keydb.replace_keydb(repository_name, staged_repository_name)
+    self.assertEqual(rsakey, tuf.keydb.get_key(keyid, repository_name))
+    self.assertFalse(staged_repository_name in tuf.keydb._keydb_dict)
+    self.assertEqual({}, repository_keydb)
+
+    # Test conditions for non-existent and 'default' repository names.
+    self.assertRaises(securesystemslib.exceptions.InvalidNameError,
+        tuf.keydb.replace_keydb, repository_name, staged_repository_name)
+    self.assertRaises(securesystemslib.exceptions.InvalidNameError,
+        tuf.keydb.replace_keydb, 'non-existent', repository_name)
+    self.assertRaises(securesystemslib.exceptions.InvalidNameError,
+        tuf.keydb.replace_keydb, repository_name, 'default')
+
+    # Test condition for improperly formatted arguments.
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        tuf.keydb.replace_keydb, 123, repository_name)
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        tuf.keydb.replace_keydb, repository_name, 123)
+
+    tuf.keydb.remove_keydb(repository_name)
+
+
+
   def test_clear_keydb(self):
     # Test condition ensuring 'clear_keydb()' clears the keydb database.
     # Test the length of the keydb before and after adding a key.
@@ -29,6 +29,7 @@ import unittest
 
 import tuf
 import tuf.mirrors as mirrors
+import tuf.settings
 import tuf.unittest_toolbox as unittest_toolbox
 
 import securesystemslib
@@ -58,6 +59,14 @@ class TestMirrors(unittest_toolbox.Modified_TestCase):
                  'confined_target_dirs' : ['targets/release/',
                                             'targets/release/']}}
 
+    mirrors.clear_mirror_stats()
+
+
+
+  def tearDown(self):
+    unittest_toolbox.Modified_TestCase.tearDown(self)
+    mirrors.clear_mirror_stats()
+
 
 
   def test_get_list_of_mirrors(self):
@@ -107,6 +116,109 @@ class TestMirrors(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_get_list_of_mirrors_quoting(self):
+    # Every mirror url has the file path quoted exactly once.
+    mirror_list = mirrors.get_list_of_mirrors('meta', 'a b.txt', self.mirrors)
+    self.assertEqual(len(mirror_list), 3)
+    for url in mirror_list:
+      self.assertTrue(url.endswith('/metadata/a%20b.txt'))
+
+
+
+  def test_mirror_ranking(self):
+    mirror1_url = 'http://mirror1.com/metadata/release.txt'
+    mirror2_url = 'http://mirror2.com/metadata/release.txt'
+    mirror3_url = 'http://mirror3.com/metadata/release.txt'
+
+    # The mirror with the highest throughput comes first, and a mirror with
+    # errors comes after a slightly slower one without.
+    mirrors.record_success(mirror1_url, 2, 1000)
+    mirrors.record_success(mirror2_url, 1, 1000)
+    mirrors.record_success(mirror3_url, 0.9, 1000)
+    mirrors.record_failure(mirror3_url)
+
+    mirror_list = mirrors.get_list_of_mirrors('meta', 'release.txt', self.mirrors)
+    self.assertEqual([mirror2_url, mirror3_url, mirror1_url], mirror_list)
+
+    stats = mirrors.get_mirror_stats()
+    self.assertEqual(1000, stats['http://mirror2.com']['throughput'])
+    self.assertEqual(1, stats['http://mirror3.com']['failures'])
+    self.assertEqual('closed', stats['http://mirror3.com']['state'])
+    self.assertTrue(stats['http://mirror3.com']['score'] >
+        stats['http://mirror2.com']['score'])
+
+    # A mirror that has only failed comes after all of them.
+    mirrors.clear_mirror_stats()
+    mirrors.record_failure(mirror1_url)
+    mirrors.record_success(mirror2_url, 1, 1000)
+    mirrors.record_success(mirror3_url, 2, 1000)
+    mirror_list = mirrors.get_list_of_mirrors('meta', 'release.txt', self.mirrors)
+    self.assertEqual(mirror1_url, mirror_list[-1])
+
+    # Mirrors are ranked by throughput, whatever the size of the files they
+    # served.  A mirror that served a small file quickly comes after one that
+    # served a large file at a higher throughput.
+    mirrors.clear_mirror_stats()
+    mirrors.record_success(mirror1_url, 0.1, 1000)
+    mirrors.record_success(mirror2_url, 2, 10000000)
+    mirrors.record_success(mirror3_url, 1, 1000000)
+    mirror_list = mirrors.get_list_of_mirrors('meta', 'release.txt', self.mirrors)
+    self.assertEqual([mirror2_url, mirror3_url, mirror1_url], mirror_list)
+
+    # A mirror that has never been downloaded from is ranked with the median
+    # score of the others: after the fastest, but before the slowest.
+    mirrors.clear_mirror_stats()
+    mirrors.record_success(mirror1_url, 1, 100000)
+    mirrors.record_success(mirror3_url, 1, 1000)
+    mirror_list = mirrors.get_list_of_mirrors('meta', 'release.txt', self.mirrors)
+    self.assertEqual([mirror1_url, mirror2_url, mirror3_url], mirror_list)
+    self.assertEqual(None, mirrors.get_mirror_stats().get(
+        'http://mirror2.com'))
+
+
+
+  def test_mirror_circuit_breaker(self):
+    mirror1_url = 'http://mirror1.com/metadata/release.txt'
+
+    for attempt in range(tuf.settings.MIRROR_FAILURE_THRESHOLD):
+      mirrors.record_failure(mirror1_url)
+
+    stats = mirrors.get_mirror_stats()
+    self.assertEqual('open', stats['http://mirror1.com']['state'])
+    self.assertTrue(stats['http://mirror1.com']['retry_in'] > 0)
+
+    mirror_list = mirrors.get_list_of_mirrors('meta', 'release.txt', self.mirrors)
+    self.assertEqual(2, len(mirror_list))
+    self.assertFalse(mirror1_url in mirror_list)
+
+    # The mirror is still returned if no other mirror may serve the file.
+    mirror_list = mirrors.get_list_of_mirrors('target', 'a.txt', self.mirrors)
+    self.assertEqual(['http://mirror1.com/targets/a.txt'], mirror_list)
+
+    # Once the timeout has passed, the mirror is tried again, last.
+    timeout = tuf.settings.MIRROR_CIRCUIT_BREAKER_TIMEOUT
+    tuf.settings.MIRROR_CIRCUIT_BREAKER_TIMEOUT = 0
+
+    try:
+      mirrors.record_failure(mirror1_url)
+      stats = mirrors.get_mirror_stats()
+      self.assertEqual('half-open', stats['http://mirror1.com']['state'])
+
+      mirror_list = \
+        mirrors.get_list_of_mirrors('meta', 'release.txt', self.mirrors)
+      self.assertEqual(mirror1_url, mirror_list[-1])
+
+    finally:
+      tuf.settings.MIRROR_CIRCUIT_BREAKER_TIMEOUT = timeout
+
+    # A successful download closes the circuit breaker.
+    mirrors.record_success(mirror1_url, 1, 1000)
+    stats = mirrors.get_mirror_stats()
+    self.assertEqual('closed', stats['http://mirror1.com']['state'])
+    self.assertEqual(0, stats['http://mirror1.com']['consecutive_failures'])
+
+
+
 # Run the unittests
 if __name__ == '__main__':
   unittest.main()
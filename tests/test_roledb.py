@@ -100,6 +100,43 @@ class TestRoledb(unittest.TestCase):
 
 
 
+  def test_replace_roledb(self):
+    repository_name = 'example_repository'
+    staged_repository_name = 'example_repository (staged)'
+    rolename = 'targets'
+    roleinfo = {'keyids': ['123'], 'threshold': 1}
+
+    tuf.roledb.create_roledb(repository_name)
+    tuf.roledb.create_roledb(staged_repository_name)
+    tuf.roledb.add_role(rolename, roleinfo, staged_repository_name)
+    repository_roledb = tuf.roledb._roledb_dict[repository_name]
+
+    # The staged roledb replaces that of the repository, and is removed.
+    tuf.roledb.replace_roledb(repository_name, staged_repository_name)
+    self.assertEqual(roleinfo, tuf.roledb.get_roleinfo(rolename,
+        repository_name))
+    self.assertFalse(staged_repository_name in tuf.roledb._roledb_dict)
+    self.assertFalse(staged_repository_name in tuf.roledb._dirty_roles)
+    self.assertEqual({}, repository_roledb)
+
+    # Test conditions for non-existent and 'default' repository names.
+    self.assertRaises(securesystemslib.exceptions.InvalidNameError,
+        tuf.roledb.replace_roledb, repository_name, staged_repository_name)
+    self.assertRaises(securesystemslib.exceptions.InvalidNameError,
+        tuf.roledb.replace_roledb, 'non-existent', repository_name)
+    self.assertRaises(securesystemslib.exceptions.InvalidNameError,
+        tuf.roledb.replace_roledb, repository_name, 'default')
+
+    # Test condition for improperly formatted arguments.
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        tuf.roledb.replace_roledb, 123, repository_name)
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        tuf.roledb.replace_roledb, repository_name, 123)
+
+    tuf.roledb.remove_roledb(repository_name)
+
+
+
   def test_clear_roledb(self):
     # Test for an empty roledb, a length of 1 after adding a key, and finally
     # an empty roledb after calling 'clear_roledb()'.
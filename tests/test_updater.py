@@ -52,6 +52,7 @@ import shutil
 import copy
 import tempfile
 import logging
+import marshal
 import random
 import subprocess
 import sys
@@ -70,6 +71,7 @@ import tuf.unittest_toolbox as unittest_toolbox
 import tuf.client.updater as updater
 
 import securesystemslib
+import securesystemslib.hash
 import six
 
 logger = logging.getLogger('tuf.test_updater')
@@ -329,6 +331,101 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_1__cached_metadata(self):
+    # The cache is enabled by default.
+    self.assertTrue(tuf.settings.CACHE_VERIFIED_METADATA)
+
+    try:
+      # The metadata loaded and checked is cached.
+      self.repository_updater._load_metadata_from_file('current', 'targets')
+      targets_filepath = \
+        os.path.join(self.client_metadata_current, 'targets.json')
+      targets_signable = securesystemslib.util.load_json_file(targets_filepath)
+      targets_digest = securesystemslib.hash.digest_filename(targets_filepath,
+          'sha256').hexdigest()
+
+      self.assertEqual(targets_signable,
+          self.repository_updater._load_cached_metadata('current', 'targets',
+          targets_digest))
+      self.assertEqual(None, self.repository_updater._load_cached_metadata(
+          'current', 'targets', '0' * 64))
+
+      # The cached copy of an unchanged file is loaded instead of the file.
+      targets_signable['signed']['version'] = 999
+      self.repository_updater._save_cached_metadata('current', 'targets',
+          targets_digest, targets_signable)
+      self.repository_updater._load_metadata_from_file('current', 'targets')
+      self.assertEqual(999,
+          self.repository_updater.metadata['current']['targets']['version'])
+
+      # A file that has changed is loaded, and cached again.
+      with open(targets_filepath, 'ab') as file_object:
+        file_object.write(b' ')
+
+      self.repository_updater._load_metadata_from_file('current', 'targets')
+      self.assertNotEqual(999,
+          self.repository_updater.metadata['current']['targets']['version'])
+
+      targets_digest = securesystemslib.hash.digest_filename(targets_filepath,
+          'sha256').hexdigest()
+      self.assertEqual(self.repository_updater.metadata['current']['targets'],
+          self.repository_updater._load_cached_metadata('current', 'targets',
+          targets_digest)['signed'])
+
+      # An unreadable copy is ignored.
+      cached_filepath = self.repository_updater._get_cached_metadata_filepath(
+          'current', 'targets')
+      with open(cached_filepath, 'wb') as file_object:
+        file_object.write(b'bad data')
+
+      self.assertEqual(None, self.repository_updater._load_cached_metadata(
+          'current', 'targets', targets_digest))
+
+      # A copy that is not a signable object is ignored.
+      with open(cached_filepath, 'wb') as file_object:
+        file_object.write(marshal.dumps({'python': list(sys.version_info[:2]),
+            'sha256': targets_digest, 'signable': []}))
+
+      self.assertEqual(None, self.repository_updater._load_cached_metadata(
+          'current', 'targets', targets_digest))
+
+      # The keys of the delegated roles are cached, and are not formatted
+      # again when the delegations are imported on a warm start.
+      self.repository_updater._load_metadata_from_file('current', 'targets')
+      repository_name = self.repository_updater.repository_name
+      delegated_keyids = list(self.repository_updater.metadata['current']\
+        ['targets']['delegations']['keys'])
+      tuf.keydb.clear_keydb(repository_name)
+      format_delegated_keys = updater._format_delegated_keys
+
+      def _format_delegated_keys(keys_info):
+        raise AssertionError('The delegated keys are formatted again.')
+
+      updater._format_delegated_keys = _format_delegated_keys
+
+      try:
+        self.repository_updater._load_metadata_from_file('current', 'targets')
+
+      finally:
+        updater._format_delegated_keys = format_delegated_keys
+
+      self.assertEqual({}, self.repository_updater.delegated_keys)
+      for keyid in delegated_keyids:
+        self.assertTrue(tuf.keydb.get_key(keyid, repository_name))
+
+      # The cache can be disabled.
+      tuf.settings.CACHE_VERIFIED_METADATA = False
+      os.remove(cached_filepath)
+      self.repository_updater._load_metadata_from_file('current', 'targets')
+      self.assertFalse(os.path.exists(cached_filepath))
+
+    finally:
+      tuf.settings.CACHE_VERIFIED_METADATA = True
+
+
+
+
+
   def test_1__rebuild_key_and_role_db(self):
     # Setup
     root_roleinfo = tuf.roledb.get_roleinfo('root', self.repository_name)
@@ -930,6 +1027,221 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
     self.assertEqual(self.repository_updater.metadata['current']['timestamp']\
                                                     ['version'], 2)
 
+    # Test: unchanged metadata.  The validators of the root and timestamp
+    # metadata are saved, so that they are requested conditionally, and the
+    # server's '304 Not Modified' responses leave the trusted metadata as is.
+    self.assertTrue(os.path.exists(self.repository_updater.validators_filepath))
+    self.assertEqual(2, len(self.repository_updater.validators))
+
+    self.repository_updater.refresh()
+    self.assertEqual(self.repository_updater.metadata['current']\
+                                              ['timestamp']['version'], 2)
+    self.assertEqual(self.repository_updater.metadata['previous']\
+                                              ['timestamp']['version'], 1)
+
+    # Expired metadata is not requested conditionally, but downloaded in
+    # full, so that it is replaced.
+    expired_date = '1960-01-01T12:00:00Z'
+    self.repository_updater.metadata['current']['timestamp']['expires'] = \
+      expired_date
+    self.repository_updater.metadata['current']['root']['expires'] = \
+      expired_date
+    self.repository_updater.refresh()
+    self.assertNotEqual(expired_date,
+      self.repository_updater.metadata['current']['timestamp']['expires'])
+    self.assertEqual(2, len(self.repository_updater.validators))
+
+
+
+
+
+  def test_4_auto_refresh_root_rotation(self):
+    self.repository_updater.refresh()
+    targetinfo = self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    repository_name = self.repository_updater.repository_name
+
+    repository = repo_tool.load_repository(self.repository_directory)
+    repository.mark_dirty(['root'])
+    repository.root.load_signing_key(self.role_keys['root']['private'])
+    repository.snapshot.load_signing_key(self.role_keys['snapshot']['private'])
+    repository.timestamp.load_signing_key(self.role_keys['timestamp']['private'])
+    repository.writeall()
+
+    # Move the staged metadata to the "live" metadata.
+    shutil.rmtree(os.path.join(self.repository_directory, 'metadata'))
+    shutil.copytree(os.path.join(self.repository_directory, 'metadata.staged'),
+                    os.path.join(self.repository_directory, 'metadata'))
+
+    # A delegated target is looked up while the new root is being installed
+    # by a background refresh.  The key and role databases it uses are not
+    # rebuilt until they are published with the new metadata.
+    role1_targets = self.repository_updater.targets_of_role('role1')
+    targetinfos = []
+    rebuild_key_and_role_db = updater.Updater._rebuild_key_and_role_db
+
+    def spy(repository_updater):
+      rebuild_key_and_role_db(repository_updater)
+
+      if repository_updater is not self.repository_updater:
+        self.repository_updater.target_cache.clear()
+        targetinfos.append(
+            self.repository_updater.get_one_valid_targetinfo('file3.txt'))
+        self.assertEqual(role1_targets,
+            self.repository_updater.targets_of_role('role1'))
+
+    updater.Updater._rebuild_key_and_role_db = spy
+
+    try:
+      self.repository_updater._refresh_and_publish()
+
+    finally:
+      updater.Updater._rebuild_key_and_role_db = rebuild_key_and_role_db
+
+    self.assertEqual([targetinfo], targetinfos)
+    self.assertEqual(2,
+        self.repository_updater.metadata['current']['root']['version'])
+    self.assertEqual(repository_name, self.repository_updater.repository_name)
+
+    # The staged databases, with the delegations of the trusted targets
+    # metadata, replace those of the updater.
+    self.assertFalse(repository_name + ' (staged)' in tuf.roledb._roledb_dict)
+    self.assertFalse(repository_name + ' (staged)' in tuf.keydb._keydb_dict)
+    self.assertEqual(2, tuf.roledb.get_roleinfo('root',
+        repository_name)['version'])
+    self.assertTrue(tuf.roledb.role_exists('role1', repository_name))
+
+    self.repository_updater.target_cache.clear()
+    self.assertEqual(targetinfo,
+        self.repository_updater.get_one_valid_targetinfo('file3.txt'))
+
+    # The staged databases are removed if the refresh fails.
+    repository.mark_dirty(['root'])
+    repository.root.load_signing_key(self.role_keys['root']['private'])
+    repository.snapshot.load_signing_key(self.role_keys['snapshot']['private'])
+    repository.timestamp.load_signing_key(self.role_keys['timestamp']['private'])
+    repository.writeall()
+    shutil.rmtree(os.path.join(self.repository_directory, 'metadata'))
+    shutil.copytree(os.path.join(self.repository_directory, 'metadata.staged'),
+                    os.path.join(self.repository_directory, 'metadata'))
+
+    refresh_top_level_metadata = updater.Updater._refresh_top_level_metadata
+
+    def failing_refresh(repository_updater, *args):
+      refresh_top_level_metadata(repository_updater, *args)
+      raise tuf.exceptions.RepositoryError('Refresh failed.')
+
+    updater.Updater._refresh_top_level_metadata = failing_refresh
+
+    try:
+      self.assertRaises(tuf.exceptions.RepositoryError,
+          self.repository_updater._refresh_and_publish)
+
+    finally:
+      updater.Updater._refresh_top_level_metadata = refresh_top_level_metadata
+
+    self.assertFalse(repository_name + ' (staged)' in tuf.roledb._roledb_dict)
+    self.assertFalse(repository_name + ' (staged)' in tuf.keydb._keydb_dict)
+    self.assertEqual(2, tuf.roledb.get_roleinfo('root',
+        repository_name)['version'])
+    self.assertTrue(tuf.roledb.role_exists('role1', repository_name))
+
+
+
+
+
+  def test_4_auto_refresh(self):
+    repository = repo_tool.load_repository(self.repository_directory)
+    target3 = os.path.join(self.repository_directory, 'targets', 'file3.txt')
+
+    repository.targets.add_target(target3)
+    repository.targets.load_signing_key(self.role_keys['targets']['private'])
+    repository.snapshot.load_signing_key(self.role_keys['snapshot']['private'])
+    repository.timestamp.load_signing_key(self.role_keys['timestamp']['private'])
+    repository.writeall()
+
+    # Move the staged metadata to the "live" metadata.
+    shutil.rmtree(os.path.join(self.repository_directory, 'metadata'))
+    shutil.copytree(os.path.join(self.repository_directory, 'metadata.staged'),
+                    os.path.join(self.repository_directory, 'metadata'))
+
+    # The new metadata is refreshed in copies of the metadata stores, which
+    # are then published at once.  The stores used by lookups made before
+    # then are left as they were.
+    metadata = self.repository_updater.metadata
+    current_metadata = metadata['current']
+    target_cache = self.repository_updater.target_cache
+    delegation_matchers = self.repository_updater.delegation_matchers
+    self.repository_updater._refresh_and_publish()
+
+    self.assertFalse(metadata is self.repository_updater.metadata)
+    self.assertFalse(target_cache is self.repository_updater.target_cache)
+    self.assertFalse(
+        delegation_matchers is self.repository_updater.delegation_matchers)
+    self.assertEqual(1, current_metadata['timestamp']['version'])
+    self.assertEqual(1, current_metadata['snapshot']['version'])
+    self.assertEqual(1, current_metadata['targets']['version'])
+    self.assertFalse('/file3.txt' in current_metadata['targets']['targets'])
+
+    current_metadata = self.repository_updater.metadata['current']
+    self.assertEqual(2, current_metadata['timestamp']['version'])
+    self.assertEqual(2, current_metadata['snapshot']['version'])
+    self.assertEqual(2, current_metadata['targets']['version'])
+    self.assertTrue('/file3.txt' in current_metadata['targets']['targets'])
+    self.assertEqual({'version': 2},
+        self.repository_updater.versioninfo['targets.json'])
+
+    # The new metadata is not downloaded again by lookups.
+    updated_roles = []
+    update_metadata = self.repository_updater._update_metadata
+
+    def spy(metadata_role, *args, **kwargs):
+      updated_roles.append(metadata_role)
+      update_metadata(metadata_role, *args, **kwargs)
+
+    self.repository_updater._update_metadata = spy
+    self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    self.assertEqual([], updated_roles)
+
+    # Lookups do not wait for a refresh in progress if the targets metadata
+    # is unchanged.
+    with self.repository_updater.refresh_lock:
+      self.repository_updater.get_one_valid_targetinfo('file1.txt')
+
+    # The schedule of the background thread.
+    self.assertEqual(tuf.settings.MAX_AUTO_REFRESH_INTERVAL,
+        self.repository_updater._get_auto_refresh_delay())
+
+    current_metadata['timestamp']['expires'] = '1960-01-01T12:00:00Z'
+    self.assertEqual(tuf.settings.MIN_AUTO_REFRESH_INTERVAL,
+        self.repository_updater._get_auto_refresh_delay())
+
+    self.repository_updater.auto_refresh_interval = 5
+    self.assertEqual(5, self.repository_updater._get_auto_refresh_delay())
+
+    self.repository_updater.auto_refresh_error = \
+      tuf.exceptions.NoWorkingMirrorError({})
+    self.assertEqual(tuf.settings.MIN_AUTO_REFRESH_INTERVAL,
+        self.repository_updater._get_auto_refresh_delay())
+    self.repository_updater.auto_refresh_error = None
+
+    # The background thread is started once, and stopped.
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        self.repository_updater.start_auto_refresh, 0)
+
+    self.repository_updater.start_auto_refresh(60)
+    auto_refresh_thread = self.repository_updater.auto_refresh_thread
+    self.assertTrue(auto_refresh_thread.is_alive())
+
+    self.repository_updater.start_auto_refresh()
+    self.assertTrue(auto_refresh_thread is
+        self.repository_updater.auto_refresh_thread)
+    self.assertEqual(None, self.repository_updater.auto_refresh_interval)
+
+    self.repository_updater.stop_auto_refresh()
+    self.assertFalse(auto_refresh_thread.is_alive())
+    self.assertEqual(None, self.repository_updater.auto_refresh_thread)
+    self.repository_updater.stop_auto_refresh()
+
 
 
 
@@ -947,6 +1259,23 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
     # Verify that client's metadata files were refreshed successfully.
     self.assertEqual(len(self.repository_updater.metadata['current']), 6)
 
+    # The metadata of several roles may be downloaded concurrently.  A role
+    # that cannot be downloaded is returned with its exception.
+    snapshot_meta = self.repository_updater.metadata['current']['snapshot']['meta']
+    snapshot_meta['missing_role.json'] = {'version': 1}
+    downloaded_metadata = self.repository_updater._download_metadata_files(
+        ['role1', 'role2', 'missing_role'])
+
+    for role in ['role1', 'role2']:
+      file_object, metadata_signable = downloaded_metadata[role]
+      self.assertEqual(self.repository_updater.metadata['current'][role],
+          metadata_signable['signed'])
+      file_object.close_temp_file()
+
+    self.assertTrue(isinstance(downloaded_metadata['missing_role'],
+        tuf.exceptions.NoWorkingMirrorError))
+    del snapshot_meta['missing_role.json']
+
     # Test for non-existing rolename.
     self.repository_updater._refresh_targets_metadata('bad_rolename',
         refresh_all_delegated_roles=False)
@@ -955,6 +1284,17 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
     self.repository_updater.metadata['current']['snapshot']['meta']['bad_role.xml'] = {}
     self.repository_updater._refresh_targets_metadata(refresh_all_delegated_roles=True)
 
+    # The changed roles of a level are downloaded concurrently, and installed
+    # in order.  A role whose metadata could not be downloaded (snapshot lists
+    # a version that the mirror does not have) is not trusted anymore.
+    self.repository_updater.versioninfo['role1.json'] = {'version': 0}
+    snapshot_meta['role2.json'] = {'version': 2}
+    self.assertRaises(tuf.exceptions.NoWorkingMirrorError,
+        self.repository_updater._refresh_delegated_roles, ['role1', 'role2'])
+    self.assertEqual({'version': 1},
+        self.repository_updater.versioninfo['role1.json'])
+    self.assertFalse('role2' in self.repository_updater.metadata['current'])
+
 
 
   def test_5_all_targets(self):
@@ -1137,6 +1477,189 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_6_get_valid_targetinfos(self):
+    self.repository_updater.refresh()
+
+    # The metadata of each role is updated at most once for the batch.
+    refreshed_roles = []
+    refresh_targets_metadata = self.repository_updater._refresh_targets_metadata
+
+    def spy(rolename, refresh_all_delegated_roles=False):
+      refreshed_roles.append(rolename)
+      refresh_targets_metadata(rolename, refresh_all_delegated_roles)
+
+    self.repository_updater._refresh_targets_metadata = spy
+
+    target_filepaths = ['file1.txt', '/file2.txt', 'file3.txt', '/file3.txt',
+        'missing.txt']
+    targetinfos = self.repository_updater.get_valid_targetinfos(
+        target_filepaths)
+
+    self.assertEqual(['targets', 'role1'], refreshed_roles)
+    self.assertEqual(sorted(target_filepaths), sorted(targetinfos))
+
+    for target_filepath in target_filepaths[:-1]:
+      self.assertEqual(
+          self.repository_updater.get_one_valid_targetinfo(target_filepath),
+          targetinfos[target_filepath])
+
+    self.assertTrue(isinstance(targetinfos['missing.txt'],
+        tuf.exceptions.UnknownTargetError))
+
+    self.assertEqual({}, self.repository_updater.get_valid_targetinfos([]))
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        self.repository_updater.get_valid_targetinfos, 'file1.txt')
+
+
+
+
+  def test_6_fresh_roles(self):
+    self.repository_updater.refresh()
+    self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    self.assertEqual({'targets': 1, 'role1': 1},
+        self.repository_updater.fresh_roles)
+
+    # The metadata of the roles is not loaded from disk again by later
+    # lookups.
+    loaded_roles = []
+    load_metadata_from_file = self.repository_updater._load_metadata_from_file
+
+    def spy(metadata_set, metadata_role):
+      loaded_roles.append(metadata_role)
+      load_metadata_from_file(metadata_set, metadata_role)
+
+    self.repository_updater._load_metadata_from_file = spy
+
+    self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    self.repository_updater.get_valid_targetinfos(['file1.txt', 'file3.txt'])
+    self.repository_updater.all_targets()
+    self.assertEqual(['role2', 'role2'], loaded_roles)
+
+    # Expired metadata is still rejected.
+    role1 = self.repository_updater.metadata['current']['role1']
+    expires = role1['expires']
+    role1['expires'] = '1970-01-01T00:00:00Z'
+    self.assertRaises(tuf.exceptions.ExpiredMetadataError,
+        self.repository_updater.get_one_valid_targetinfo, 'file3.txt')
+    role1['expires'] = expires
+
+    # A role is loaded again if snapshot lists another version of it, or if
+    # the role database is rebuilt.
+    del loaded_roles[:]
+    self.repository_updater.fresh_roles['role1'] = 0
+    self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    self.assertEqual(['role1', 'role1'], loaded_roles)
+
+    del loaded_roles[:]
+    self.repository_updater._rebuild_key_and_role_db()
+    self.assertEqual({}, self.repository_updater.fresh_roles)
+    self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    self.assertEqual(['targets', 'targets', 'role1', 'role1'], loaded_roles)
+
+
+
+
+  def test_6_target_cache(self):
+    self.repository_updater.refresh()
+
+    targetinfo = self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    self.assertEqual({'hits': 0, 'misses': 1, 'maxsize':
+        tuf.settings.TARGET_CACHE_SIZE, 'currsize': 1},
+        self.repository_updater.target_cache_info())
+
+    # The delegations are not walked again for a cached target.
+    walked_roles = []
+    get_target_from_targets_role = \
+      self.repository_updater._get_target_from_targets_role
+
+    def spy(role_name, targets, target_filepath):
+      walked_roles.append(role_name)
+      return get_target_from_targets_role(role_name, targets, target_filepath)
+
+    self.repository_updater._get_target_from_targets_role = spy
+
+    self.assertEqual(targetinfo,
+        self.repository_updater.get_one_valid_targetinfo('/file3.txt'))
+    self.assertEqual(targetinfo, self.repository_updater.get_valid_targetinfos(
+        ['file3.txt'])['file3.txt'])
+    self.assertEqual([], walked_roles)
+    self.assertEqual(2, self.repository_updater.target_cache_info()['hits'])
+
+    # A new version of snapshot empties the cache.
+    self.repository_updater.metadata['current']['snapshot']['version'] += 1
+    self.repository_updater.get_one_valid_targetinfo('file3.txt')
+    self.assertEqual(['targets', 'role1'], walked_roles)
+    self.assertEqual(2, self.repository_updater.target_cache_info()['misses'])
+
+    # The least recently used targets are evicted.
+    self.repository_updater.target_cache.maxsize = 2
+    self.repository_updater.get_valid_targetinfos(['file1.txt', 'file2.txt'])
+    self.assertEqual(['/file1.txt', '/file2.txt'],
+        list(self.repository_updater.target_cache.entries))
+
+    # A target is not served from the cache once the metadata of a role that
+    # was visited to find it has expired.
+    del walked_roles[:]
+    self.repository_updater.target_cache.entries['/file2.txt'] = \
+      self.repository_updater.target_cache.entries['/file2.txt'][:2] + (0,)
+    self.repository_updater.get_one_valid_targetinfo('file2.txt')
+    self.assertEqual(['targets'], walked_roles)
+
+
+
+
+
+  def test_6_delegated_roles_in_memory(self):
+    original_max_delegated_roles = tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY
+    tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY = 1
+
+    try:
+      self.repository_updater.refresh()
+      current_metadata = self.repository_updater.metadata['current']
+      previous_metadata = self.repository_updater.metadata['previous']
+
+      # The metadata of the least recently used delegated role is evicted
+      # after a lookup, and the previous metadata of delegated roles is not
+      # kept in memory.
+      self.assertEqual(3, len(self.repository_updater.all_targets()))
+      self.assertEqual(['role2'],
+          list(self.repository_updater.delegated_roles_in_memory))
+      self.assertTrue('role2' in current_metadata)
+      self.assertFalse('role1' in current_metadata)
+      self.assertFalse('role1' in previous_metadata)
+      self.assertFalse('role2' in previous_metadata)
+
+      # An evicted role is loaded again from disk, not downloaded.
+      updated_roles = []
+      update_metadata = self.repository_updater._update_metadata
+
+      def spy(metadata_role, *args, **kwargs):
+        updated_roles.append(metadata_role)
+        update_metadata(metadata_role, *args, **kwargs)
+
+      self.repository_updater._update_metadata = spy
+
+      targetinfo = self.repository_updater.get_one_valid_targetinfo('file3.txt')
+      self.assertEqual('/file3.txt', targetinfo['filepath'])
+      self.assertEqual([], updated_roles)
+
+      self.assertTrue('role1' in current_metadata)
+      self.assertFalse('role2' in current_metadata)
+      self.assertEqual({'targets': 1, 'role1': 1},
+          self.repository_updater.fresh_roles)
+
+      # The metadata of a role evicted from memory is read from disk.
+      role2 = self.repository_updater._get_metadata_of_role('current', 'role2')
+      self.assertEqual('targets', role2['_type'])
+      self.assertFalse('role2' in current_metadata)
+      self.assertEqual(None,
+          self.repository_updater._get_metadata_of_role('previous', 'role3'))
+
+    finally:
+      tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY = original_max_delegated_roles
+
+
+
   def test_6_download_target(self):
     # Create temporary directory (destination directory of downloaded targets)
     # that will be passed as an argument to 'download_target()'.
@@ -1171,6 +1694,37 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
     self.assertEqual(targetinfo['fileinfo'], download_targetfileinfo)
 
+    # Test: resume a download from the data left in the spool file.
+    with open(download_filepath, 'rb') as file_object:
+      target_data = file_object.read()
+    os.remove(download_filepath)
+
+    spool_filepath = download_filepath + tuf.settings.PARTIAL_DOWNLOAD_SUFFIX
+    with open(spool_filepath, 'wb') as file_object:
+      file_object.write(target_data[:len(target_data) // 2])
+
+    self.repository_updater.download_target(targetinfo,
+        destination_directory, resumable=True)
+
+    self.assertFalse(os.path.exists(spool_filepath))
+    with open(download_filepath, 'rb') as file_object:
+      self.assertEqual(target_data, file_object.read())
+
+    # A complete spool file with bad data is discarded.
+    os.remove(download_filepath)
+    with open(spool_filepath, 'wb') as file_object:
+      file_object.write(b'x' * len(target_data))
+
+    self.assertRaises(tuf.exceptions.NoWorkingMirrorError,
+        self.repository_updater.download_target, targetinfo,
+        destination_directory, resumable=True)
+    self.assertFalse(os.path.exists(spool_filepath))
+    self.assertFalse(os.path.exists(download_filepath))
+
+    self.repository_updater.download_target(targetinfo,
+        destination_directory, resumable=True)
+    self.assertTrue(os.path.exists(download_filepath))
+
     # Test when consistent snapshots is set.  First, create a valid
     # repository with consistent snapshots set (root.json contains a
     # "consistent_snapshot" entry that the updater uses to correctly fetch
@@ -1247,6 +1801,63 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_6_download_targets(self):
+    destination_directory = self.make_temp_directory()
+    all_targets = self.repository_updater.all_targets()
+
+    # A target with the content of another one is copied rather than
+    # downloaded, so it need not be on the mirrors.
+    copied_target = copy.deepcopy(all_targets[0])
+    copied_target['filepath'] = '/copies/' + \
+      all_targets[0]['filepath'].lstrip('/')
+
+    missing_target = copy.deepcopy(all_targets[0])
+    missing_target['filepath'] = '/missing.txt'
+    missing_target['fileinfo']['length'] = 3
+
+    targets = all_targets + [copied_target, missing_target, all_targets[0]]
+    results = self.repository_updater.download_targets(targets,
+        destination_directory, max_workers=2)
+
+    self.assertEqual(sorted(target['filepath'] for target in targets[:-1]),
+        sorted(results))
+
+    for target in all_targets + [copied_target]:
+      self.assertEqual(None, results[target['filepath']])
+      download_filepath = os.path.join(destination_directory,
+          target['filepath'].lstrip('/'))
+      self.assertEqual(target['fileinfo']['length'],
+          os.path.getsize(download_filepath))
+
+    self.assertTrue(isinstance(results['/missing.txt'],
+        tuf.exceptions.NoWorkingMirrorError))
+    self.assertFalse(os.path.exists(os.path.join(destination_directory,
+        'missing.txt')))
+
+    # A copy is verified like a download.
+    source = os.path.join(destination_directory, 'source.txt')
+    with open(source, 'wb') as file_object:
+      file_object.write(b'x' * copied_target['fileinfo']['length'])
+
+    copied_target['filepath'] = '/copies/bad.txt'
+    self.assertRaises(securesystemslib.exceptions.BadHashError,
+        self.repository_updater._copy_target_file, source, copied_target,
+        destination_directory)
+    self.assertEqual([all_targets[0]['filepath'].lstrip('/')],
+        os.listdir(os.path.join(destination_directory, 'copies')))
+
+    # Test: Invalid arguments.
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        self.repository_updater.download_targets, all_targets,
+        destination_directory, max_workers=0)
+
+    self.assertRaises(securesystemslib.exceptions.FormatError,
+        self.repository_updater.download_targets, 8, destination_directory)
+
+
+
+
+
   def test_7_updated_targets(self):
     # Verify that the list of targets returned by updated_targets() contains
     # all the files that need to be updated, these files include modified and
@@ -1348,6 +1959,126 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_7_updated_targets_local_hashes(self):
+    # The cache is disabled by default.
+    self.assertFalse(tuf.settings.CACHE_LOCAL_TARGET_HASHES)
+    tuf.settings.CACHE_LOCAL_TARGET_HASHES = True
+
+    try:
+      destination_directory = self.make_temp_directory()
+      all_targets = self.repository_updater.all_targets()
+
+      for target in all_targets:
+        self.repository_updater.download_target(target, destination_directory)
+
+      # Files modified in the last seconds are not cached, so date them back.
+      target_filepaths = []
+      for target in all_targets:
+        target_filepath = os.path.join(destination_directory,
+            target['filepath'].lstrip('/'))
+        os.utime(target_filepath, (time.time() - 60, time.time() - 60))
+        target_filepaths.append(os.path.abspath(target_filepath))
+
+      updated_targets = self.repository_updater.updated_targets(
+          all_targets + all_targets, destination_directory)
+      self.assertEqual([], updated_targets)
+      self.assertEqual(sorted(target_filepaths),
+          sorted(self.repository_updater.local_hashes))
+
+      # The hashes are saved, and loaded by a new updater.
+      self.assertTrue(os.path.exists(
+          self.repository_updater.local_hashes_filepath))
+      repository_updater = updater.Updater(self.repository_name,
+          self.repository_mirrors)
+      self.assertEqual(self.repository_updater.local_hashes,
+          repository_updater._load_local_hashes())
+
+      # A file whose length, modification time and inode are unchanged is not
+      # hashed again, so a wrong cached hash is not detected.
+      local_hashes = self.repository_updater.local_hashes[target_filepaths[0]]
+      right_hashes = local_hashes['hashes']
+      local_hashes['hashes'] = dict((algorithm, '0' * len(digest))
+          for algorithm, digest in six.iteritems(right_hashes))
+
+      updated_targets = self.repository_updater.updated_targets(
+          all_targets, destination_directory)
+      self.assertEqual([all_targets[0]], updated_targets)
+
+      # A file that is modified is hashed again.
+      os.utime(target_filepaths[0], (time.time() - 30, time.time() - 30))
+      updated_targets = self.repository_updater.updated_targets(
+          all_targets, destination_directory)
+      self.assertEqual([], updated_targets)
+      self.assertEqual(right_hashes,
+          self.repository_updater.local_hashes[target_filepaths[0]]['hashes'])
+
+      # A file that is removed is updated.
+      os.remove(target_filepaths[0])
+      updated_targets = self.repository_updater.updated_targets(
+          all_targets, destination_directory)
+      self.assertEqual([all_targets[0]], updated_targets)
+
+      # The hashes of a file that no longer exists are dropped.
+      self.assertEqual(sorted(target_filepaths[1:]),
+          sorted(self.repository_updater.local_hashes))
+
+      # Targets checked in batches keep the hashes of the other batches.
+      self.repository_updater.download_target(all_targets[0],
+          destination_directory)
+      os.utime(target_filepaths[0], (time.time() - 60, time.time() - 60))
+      hashed_filepaths = []
+      hash_file = updater._hash_file
+
+      def _hash_file(filepath, algorithms):
+        hashed_filepaths.append(os.path.abspath(filepath))
+        return hash_file(filepath, algorithms)
+
+      updater._hash_file = _hash_file
+
+      try:
+        updated_targets = self.repository_updater.updated_targets(
+            all_targets[:1], destination_directory)
+        self.assertEqual([], updated_targets)
+        updated_targets = self.repository_updater.updated_targets(
+            all_targets[1:], destination_directory)
+        self.assertEqual([], updated_targets)
+        updated_targets = self.repository_updater.updated_targets(
+            all_targets[:1], destination_directory)
+        self.assertEqual([], updated_targets)
+
+      finally:
+        updater._hash_file = hash_file
+
+      self.assertEqual([target_filepaths[0]], hashed_filepaths)
+      self.assertEqual(sorted(target_filepaths),
+          sorted(self.repository_updater.local_hashes))
+
+      # The hashes of the obsolete targets removed from the destination
+      # directory are dropped.
+      self.repository_updater.local_hashes['/nonexistent'] = \
+        self.repository_updater.local_hashes[target_filepaths[0]]
+      self.repository_updater._forget_local_hashes(['/nonexistent'])
+      self.assertEqual(sorted(target_filepaths),
+          sorted(self.repository_updater.local_hashes))
+      self.assertEqual(self.repository_updater.local_hashes,
+          self.repository_updater._load_local_hashes())
+
+      # The cache can be disabled.
+      tuf.settings.CACHE_LOCAL_TARGET_HASHES = False
+      self.repository_updater.local_hashes = {}
+      os.remove(target_filepaths[0])
+      updated_targets = self.repository_updater.updated_targets(
+          all_targets, destination_directory)
+      self.assertEqual([all_targets[0]], updated_targets)
+      self.assertEqual({}, self.repository_updater.local_hashes)
+
+    finally:
+      tuf.settings.CACHE_LOCAL_TARGET_HASHES = False
+
+
+
+
+
   def test_8_remove_obsolete_targets(self):
     # Setup.
     # Create temporary directory that will hold the client's target files.
@@ -1487,6 +2218,19 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_10__get_target_from_targets_role(self):
+    targets = self.repository_updater.metadata['current']['targets']['targets']
+
+    target = self.repository_updater._get_target_from_targets_role('targets',
+        targets, '/file1.txt')
+    self.assertEqual({'filepath': '/file1.txt',
+        'fileinfo': targets['/file1.txt']}, target)
+
+    self.assertEqual(None, self.repository_updater._get_target_from_targets_role(
+        'targets', targets, '/non-existent.txt'))
+
+
+
   def test_10__preorder_depth_first_walk(self):
 
     # Test that infinit loop is prevented if the target file is not found and
@@ -1574,6 +2318,126 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
 
 
 
+  def test_10__get_delegation_matcher(self):
+    child_roles = [
+        {'name': 'exe', 'paths': ['/*.exe'], 'terminating': False},
+        {'name': 'bin', 'paths': ['/bin/*', '/target.exe'],
+            'terminating': False},
+        {'name': 'bins', 'path_hash_prefixes': ['8baf', '0'],
+            'terminating': False},
+        {'name': 'file', 'paths': ['/file3.txt'], 'terminating': False}]
+
+    matcher = self.repository_updater._get_delegation_matcher('targets',
+        child_roles)
+    self.assertTrue(matcher.uses_path_hash_prefixes)
+
+    # The delegations are compiled once for the trusted metadata of a role.
+    self.assertTrue(matcher is self.repository_updater._get_delegation_matcher(
+        'targets', child_roles))
+    self.assertFalse(matcher is self.repository_updater._get_delegation_matcher(
+        'targets', list(child_roles)))
+
+    def match(target_filepath):
+      target_filepath_hash = \
+        self.repository_updater._get_target_hash(target_filepath)
+      return [child_role['name'] for child_role in
+          matcher.match(target_filepath, target_filepath_hash)]
+
+    # The child roles that match are returned in order of priority.
+    self.assertEqual(['exe', 'bin'], match('/target.exe'))
+    self.assertEqual(['bin'], match('/bin/ls'))
+    self.assertEqual(['bins', 'file'], match('/file3.txt'))
+    self.assertEqual([], match('/unknown.txt'))
+
+    # The matcher agrees with _visit_child_role().
+    for target_filepath in ['/target.exe', '/bin/ls', '/file3.txt', '/x']:
+      self.assertEqual(match(target_filepath), [child_role['name']
+          for child_role in child_roles if self.repository_updater.\
+          _visit_child_role(child_role, target_filepath)])
+
+
+
+  def test_10__compact_targets(self):
+    targets_filepath = \
+      os.path.join(self.client_metadata_current, 'targets.json')
+    targets = securesystemslib.util.load_json_file(targets_filepath) \
+      ['signed']['targets']
+
+    # The targets of the trusted metadata are held as a dict by default.
+    self.assertFalse(tuf.settings.COMPACT_TARGETS_METADATA)
+    self.assertTrue(isinstance(
+        self.repository_updater.metadata['current']['targets']['targets'],
+        dict))
+
+    tuf.settings.COMPACT_TARGETS_METADATA = True
+
+    try:
+      # If enabled, the targets of the trusted metadata are held compactly.
+      self.repository_updater._load_metadata_from_file('current', 'targets')
+      compact_targets = \
+        self.repository_updater.metadata['current']['targets']['targets']
+      self.assertTrue(isinstance(compact_targets, updater._CompactTargets))
+
+      # The fileinfo of the targets, and the order of the targets, are those of
+      # the metadata.
+      self.assertEqual(targets, compact_targets)
+      self.assertEqual(list(targets), list(compact_targets))
+      self.assertEqual(list(six.iteritems(targets)),
+          list(six.iteritems(compact_targets)))
+
+      for target_filepath, fileinfo in six.iteritems(targets):
+        self.assertTrue(target_filepath in compact_targets)
+        self.assertEqual(fileinfo, compact_targets[target_filepath])
+
+      for target_filepath in ['/non-existent.txt', '', '/', None]:
+        self.assertFalse(target_filepath in compact_targets)
+        self.assertEqual(None, compact_targets.get(target_filepath))
+
+      self.assertRaises(KeyError, compact_targets.__getitem__, '/file0.txt')
+      self.assertEqual(0, len(updater._CompactTargets({})))
+
+      # The compact targets are cached as a tuple, from which they are rebuilt.
+      rebuilt_targets = \
+        updater._CompactTargets.from_tuple(compact_targets.to_tuple())
+      self.assertEqual(list(six.iteritems(targets)),
+          list(six.iteritems(rebuilt_targets)))
+
+      # A tuple that is not consistent is rejected.
+      content = compact_targets.to_tuple()
+      self.assertRaises(ValueError, updater._CompactTargets.from_tuple,
+          (tuple(reversed(content[0])),) + content[1:])
+      self.assertRaises(ValueError, updater._CompactTargets.from_tuple,
+          content[:5] + ((content[5][0][1:],) + content[5][1:],) + content[6:])
+      self.assertRaises(ValueError, updater._CompactTargets.from_tuple,
+          content[:6] + ({len(targets): {}},))
+
+      # Targets that cannot be held compactly are kept as they are.
+      fileinfo = {'length': 1, 'hashes': {'sha256': 'AB'}}
+      metadata_object = {'_type': 'targets', 'targets': {'/file.txt': fileinfo}}
+      self.assertTrue(metadata_object is updater._compact_metadata(
+          metadata_object))
+
+      for fileinfo in [{'length': 1, 'hashes': {'sha256': 'abc'}},
+          {'length': 1, 'hashes': {'sha256': 'xy'}},
+          {'length': 1, 'hashes': {'sha256': 'ab'}, 'unknown': None}]:
+        self.assertRaises(ValueError, updater._CompactTargets,
+            {'/file.txt': fileinfo})
+
+      self.assertRaises(ValueError, updater._CompactTargets,
+          {'/file1.txt': {'length': 1, 'hashes': {'sha256': 'ab'}},
+          '/file2.txt': {'length': 1, 'hashes': {'sha512': 'ab'}}})
+
+      # The metadata of other roles is kept as it is.
+      snapshot = self.repository_updater.metadata['current']['snapshot']
+      self.assertTrue(snapshot is updater._compact_metadata(snapshot))
+
+    finally:
+      tuf.settings.COMPACT_TARGETS_METADATA = False
+
+
+
+
+
   def test_11__verify_uncompressed_metadata_file(self):
     # Test for invalid metadata content.
     metadata_file_object = securesystemslib.util.TempFile()
@@ -1584,6 +2448,26 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
         self.repository_updater._verify_uncompressed_metadata_file,
         metadata_file_object, 'root')
 
+    # Metadata is parsed from bytes, once, and the result can be verified
+    # without reading the file again.
+    self.assertRaises(tuf.exceptions.InvalidMetadataJSONError,
+        self.repository_updater._load_metadata_signable, metadata_file_object)
+
+    root_filepath = os.path.join(self.client_metadata_current, 'root.json')
+    metadata_file_object = securesystemslib.util.TempFile()
+
+    with open(root_filepath, 'rb') as file_object:
+      metadata_file_object.write(file_object.read())
+
+    metadata_signable = \
+      self.repository_updater._load_metadata_signable(metadata_file_object)
+    self.assertEqual(securesystemslib.util.load_json_file(root_filepath),
+        metadata_signable)
+
+    metadata_file_object.close_temp_file()
+    self.repository_updater._verify_uncompressed_metadata_file(
+        metadata_file_object, 'root', metadata_signable)
+
 
 
   def test_12__verify_root_chain_link(self):
@@ -1625,6 +2509,46 @@ class TestUpdater(unittest_toolbox.Modified_TestCase):
     self.repository_updater._get_file('targets.json', verify_target_file,
         file_type, file_size, download_safely=False)
 
+    # Test for hashes that are computed while the file is downloaded.
+    def verify_target_length(targets_path):
+      self.repository_updater._hard_check_file_length(targets_path, file_size)
+
+    self.repository_updater._get_file('targets.json', verify_target_length,
+        file_type, file_size, download_safely=True, trusted_hashes=file_hashes)
+
+    bad_hashes = {'sha256': '0' * 64}
+    self.assertRaises(tuf.exceptions.NoWorkingMirrorError,
+        self.repository_updater._get_file, 'targets.json',
+        verify_target_length, file_type, file_size, download_safely=True,
+        trusted_hashes=bad_hashes)
+
+    # Test for hedged requests.  The first mirror cannot be reached, so the
+    # file is requested from the second one as well.
+    mirrors = self.repository_updater.mirrors
+    original_mirror = mirrors['mirror1']
+    mirrors['mirror2'] = original_mirror
+    mirrors['mirror1'] = copy.deepcopy(original_mirror)
+    mirrors['mirror1']['url_prefix'] = 'http://localhost:1'
+
+    tuf.settings.HEDGED_REQUEST_DELAY = 0.1
+    tuf.mirrors.clear_mirror_stats()
+
+    try:
+      file_object = self.repository_updater._get_file('targets.json',
+          verify_target_length, file_type, file_size, download_safely=True,
+          trusted_hashes=file_hashes)
+      self.assertEqual(file_size, len(file_object.read()))
+
+      self.assertRaises(tuf.exceptions.NoWorkingMirrorError,
+          self.repository_updater._get_file, 'targets.json',
+          verify_target_length, file_type, file_size, download_safely=True,
+          trusted_hashes=bad_hashes)
+
+    finally:
+      tuf.settings.HEDGED_REQUEST_DELAY = None
+      mirrors['mirror1'] = original_mirror
+      del mirrors['mirror2']
+
 
 
   def test_14__targets_of_role(self):
@@ -0,0 +1,750 @@
+"""
+<Program Name>
+  async_updater.py
+
+<Started>
+  October 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Provide an 'asyncio' interface to the TUF client, for software update systems
+  that run inside an event loop.  'AsyncUpdater' performs the same update
+  workflow as 'tuf.client.updater.Updater' (timestamp -> snapshot -> root (if
+  necessary) -> targets), and uses an 'Updater' object to download, verify, and
+  store every metadata and target file.  The verification of files, and the
+  exceptions raised when it fails, are therefore identical.
+
+  The blocking network and file system operations of the 'Updater' object run
+  in a pool of worker threads, so that the event loop is never blocked.
+  Delegated roles at the same depth of the delegation tree, and independent
+  target files, are downloaded concurrently.  The number of concurrent
+  downloads is limited by a semaphore, which is set to
+  'tuf.settings.MAX_CONCURRENT_DOWNLOADS' by default.
+
+  This module requires Python 3.5 or later.
+
+<Example Client>
+
+  import asyncio
+  import tuf.client.async_updater
+
+  tuf.settings.repositories_directory = 'local-repository'
+
+  repository_mirrors = {'mirror1': {'url_prefix': 'http://localhost:8001',
+                                    'metadata_path': 'metadata',
+                                    'targets_path': 'targets',
+                                    'confined_target_dirs': ['']}}
+
+  async def update(destination_directory):
+    updater = tuf.client.async_updater.AsyncUpdater('updater',
+        repository_mirrors, max_concurrent_downloads=8)
+
+    try:
+      await updater.refresh()
+      targets = await updater.all_targets()
+      updated_targets = await updater.updated_targets(targets,
+          destination_directory)
+      await updater.download_targets(updated_targets, destination_directory)
+
+    finally:
+      updater.close()
+
+  asyncio.get_event_loop().run_until_complete(update('.'))
+"""
+
+# Help with Python 3 compatibility, where the print statement is a function, an
+# implicit relative import is invalid, and the '/' operator performs true
+# division.  Example:  print 'hello world' raises a 'SyntaxError' exception.
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+
+import tuf
+import tuf.client.updater
+import tuf.formats
+import tuf.roledb
+import tuf.settings
+
+import securesystemslib.formats
+
+# See 'log.py' to learn how logging is handled in TUF.
+logger = logging.getLogger('tuf.client.async_updater')
+
+
+class AsyncUpdater(object):
+  """
+  <Purpose>
+    Provide a class that can download target files securely, without blocking
+    the 'asyncio' event loop.  The public methods of 'AsyncUpdater' are
+    coroutines that mirror the methods of 'tuf.client.updater.Updater'.
+
+  <Updater Methods>
+    refresh():
+      Update the metadata of the top-level roles, in the order required by the
+      TUF specification.
+
+    all_targets():
+      Refresh the metadata of all the delegated roles, concurrently for roles
+      at the same depth of the delegation tree, and return the target
+      information of all the trusted targets on the repository.
+
+    targets_of_role(rolename):
+      Return the target information of the targets listed by 'rolename'.
+
+    get_one_valid_targetinfo(target_filepath):
+      Return the target information of 'target_filepath'.  The delegation
+      tree is walked in order of priority, so delegated roles are downloaded
+      one at a time.
+
+    get_valid_targetinfos(target_filepaths):
+      Return the target information of each of 'target_filepaths'.  The
+      delegation tree is walked once for all of them.
+
+    updated_targets(targets, destination_directory):
+      Return the targets of 'targets' that must be downloaded.
+
+    remove_obsolete_targets(destination_directory):
+      Remove the files in 'destination_directory' that are no longer trusted.
+
+    download_target(target, destination_directory):
+      Download and verify 'target'.
+
+    download_targets(targets, destination_directory):
+      Download and verify the targets of 'targets' concurrently.
+
+    close():
+      Shut down the worker threads.
+
+  <Arguments>
+    repository_name:
+      The name of the repository.
+
+    repository_mirrors:
+      A dictionary of repository mirrors, conformant to
+      'tuf.formats.MIRRORDICT_SCHEMA'.
+
+    max_concurrent_downloads:
+      The maximum number of metadata and target files that are downloaded
+      at the same time.  'tuf.settings.MAX_CONCURRENT_DOWNLOADS' is used if
+      None.
+
+    fetcher:
+      An optional 'tuf.fetcher.FetcherInterface' that files are downloaded
+      with.  See tuf.client.updater.Updater().
+
+  <Exceptions>
+    securesystemslib.exceptions.FormatError:
+      If the arguments are improperly formatted.
+
+    Any of the exceptions raised by tuf.client.updater.Updater().
+
+  <Side Effects>
+    The metadata files of the repository are loaded from disk.  A pool of
+    worker threads is created on first use.
+
+  <Returns>
+    None.
+  """
+
+  def __init__(self, repository_name, repository_mirrors,
+      max_concurrent_downloads=None, fetcher=None):
+
+    if max_concurrent_downloads is None:
+      max_concurrent_downloads = tuf.settings.MAX_CONCURRENT_DOWNLOADS
+
+    # Is 'max_concurrent_downloads' properly formatted?  'repository_name' and
+    # 'repository_mirrors' are checked by the Updater object.
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    tuf.formats.MAX_WORKERS_SCHEMA.check_match(max_concurrent_downloads)
+
+    # The Updater object verifies, stores, and keeps track of all the metadata
+    # and target files.  Its methods are only called from worker threads.
+    self._updater = tuf.client.updater.Updater(repository_name,
+        repository_mirrors, fetcher=fetcher)
+
+    self.repository_name = repository_name
+    self.max_concurrent_downloads = max_concurrent_downloads
+
+    self._executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_concurrent_downloads)
+
+    # The asyncio primitives are bound to the event loop that is running when
+    # they are first used, so they are created lazily.  The semaphore limits
+    # the number of concurrent downloads.  The lock ensures that the metadata
+    # store is updated by one workflow at a time (e.g., refresh() is not run
+    # while all_targets() updates delegated roles).
+    self._semaphore = None
+    self._metadata_lock = None
+
+    # The worker threads download and verify the metadata of several roles at
+    # once, but install it (into the metadata store of the Updater object and
+    # the role and key databases) one role at a time.
+    self._install_lock = threading.Lock()
+
+
+
+  def __str__(self):
+    return str(self._updater)
+
+
+
+  def close(self):
+    """
+    <Purpose>
+      Wait for any pending operations to finish, and shut down the worker
+      threads.  The AsyncUpdater object cannot be used afterwards.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The worker threads are stopped.
+
+    <Returns>
+      None.
+    """
+
+    self._executor.shutdown(wait=True)
+
+
+
+  async def refresh(self, unsafely_update_root_if_necessary=True):
+    """
+    <Purpose>
+      Update the latest copies of the metadata for the top-level roles.  Each
+      role is updated in turn, in the same order as
+      tuf.client.updater.Updater.refresh():
+      timestamp -> snapshot -> root (if necessary) -> targets.
+
+    <Arguments>
+      unsafely_update_root_if_necessary:
+        Boolean that indicates whether to unsafely update the Root metadata if
+        any of the top-level metadata cannot be downloaded successfully.
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        If the metadata for any of the top-level roles cannot be updated.
+
+      tuf.exceptions.ExpiredMetadataError:
+        If any of the top-level metadata is expired.
+
+    <Side Effects>
+      Updates the metadata files of the top-level roles with the latest
+      information.
+
+    <Returns>
+      None.
+    """
+
+    async with self._get_metadata_lock():
+      await self._download(self._updater.refresh,
+          unsafely_update_root_if_necessary)
+
+
+
+  async def all_targets(self):
+    """
+    <Purpose>
+      Get a list of the target information for all the trusted targets on the
+      repository, in the same order as tuf.client.updater.Updater.all_targets().
+      The metadata of a delegated role is updated only after the metadata of
+      the role that delegates to it, and roles delegated by the same role are
+      updated concurrently.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      tuf.exceptions.UnknownRoleError:
+        If one of the roles could not be found in the role database.
+
+      tuf.exceptions.NoWorkingMirrorError:
+        If the metadata of a delegated role cannot be updated.
+
+    <Side Effects>
+      The metadata for target roles is updated and stored.
+
+    <Returns>
+     A list of targets, conformant to 'tuf.formats.TARGETINFOS_SCHEMA'.
+    """
+
+    async with self._get_metadata_lock():
+      await self._refresh_delegated_roles('targets')
+
+      # Fetch the targets for the 'targets' role, and then the targets of the
+      # delegated roles.  The metadata is already loaded, so the event loop is
+      # not blocked.
+      all_targets = self._updater._targets_of_role('targets', skip_refresh=True)
+
+      for role in tuf.roledb.get_rolenames(self.repository_name):
+        if role in ['root', 'snapshot', 'targets', 'timestamp']:
+          continue
+
+        all_targets.extend(self._updater._targets_of_role(role,
+            skip_refresh=True))
+
+      self._updater._evict_delegated_roles()
+
+      return all_targets
+
+
+
+  async def targets_of_role(self, rolename='targets'):
+    """
+    <Purpose>
+      Return a list of trusted targets directly specified by 'rolename'.  See
+      tuf.client.updater.Updater.targets_of_role().
+
+    <Arguments>
+      rolename:
+        The name of the role whose list of targets are wanted.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'rolename' is improperly formatted.
+
+      tuf.exceptions.UnknownRoleError:
+        If 'rolename' is not found in the role database.
+
+    <Side Effects>
+      The metadata of updated delegated roles are downloaded and stored.
+
+    <Returns>
+      A list of targets, conformant to 'tuf.formats.TARGETINFOS_SCHEMA'.
+    """
+
+    async with self._get_metadata_lock():
+      return await self._download(self._updater.targets_of_role, rolename)
+
+
+
+  async def get_one_valid_targetinfo(self, target_filepath):
+    """
+    <Purpose>
+      Return the target information of 'target_filepath', and update its
+      corresponding metadata, if necessary.  The delegated roles are visited
+      in order of priority, as in
+      tuf.client.updater.Updater.get_one_valid_targetinfo(), so they are
+      downloaded one at a time.
+
+    <Arguments>
+      target_filepath:
+        The path to the target file on the repository.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'target_filepath' is improperly formatted.
+
+      tuf.exceptions.UnknownTargetError:
+        If 'target_filepath' was not found.
+
+    <Side Effects>
+      The metadata for updated delegated roles are downloaded and stored.
+
+    <Returns>
+      The target information for 'target_filepath', conformant to
+      'tuf.formats.TARGETINFO_SCHEMA'.
+    """
+
+    async with self._get_metadata_lock():
+      return await self._download(self._updater.get_one_valid_targetinfo,
+          target_filepath)
+
+
+
+  async def get_valid_targetinfos(self, target_filepaths):
+    """
+    <Purpose>
+      Return the target information of each of 'target_filepaths', and update
+      the corresponding metadata, if necessary.  The delegated roles are
+      visited as in tuf.client.updater.Updater.get_valid_targetinfos(), so the
+      metadata of each role is downloaded at most once.
+
+    <Arguments>
+      target_filepaths:
+        A list of paths to target files on the repository.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'target_filepaths' is improperly formatted.
+
+    <Side Effects>
+      The metadata for updated delegated roles are downloaded and stored.
+
+    <Returns>
+      A dictionary of the paths of 'target_filepaths' to their target
+      information, conformant to 'tuf.formats.TARGETINFO_SCHEMA', or to the
+      exception raised for the path (e.g., 'tuf.exceptions.UnknownTargetError').
+    """
+
+    async with self._get_metadata_lock():
+      return await self._download(self._updater.get_valid_targetinfos,
+          target_filepaths)
+
+
+
+  async def updated_targets(self, targets, destination_directory):
+    """
+    <Purpose>
+      Return the targets of 'targets' that are missing from, or have changed
+      in, 'destination_directory'.  See
+      tuf.client.updater.Updater.updated_targets().
+
+    <Arguments>
+      targets:
+        A list of target information, conformant to
+        'tuf.formats.TARGETINFOS_SCHEMA'.
+
+      destination_directory:
+        The directory containing the target files.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If the arguments are improperly formatted.
+
+    <Side Effects>
+      The files in 'targets' are read and their hashes computed.
+
+    <Returns>
+      A list of target information, conformant to
+      'tuf.formats.TARGETINFOS_SCHEMA'.
+    """
+
+    return await self._run(self._updater.updated_targets, targets,
+        destination_directory)
+
+
+
+  async def remove_obsolete_targets(self, destination_directory):
+    """
+    <Purpose>
+      Remove any files that are in 'previous' but not 'current' metadata.  See
+      tuf.client.updater.Updater.remove_obsolete_targets().
+
+    <Arguments>
+      destination_directory:
+        The directory containing the target files.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'destination_directory' is improperly formatted.
+
+    <Side Effects>
+      Target files are removed from disk.
+
+    <Returns>
+      None.
+    """
+
+    async with self._get_metadata_lock():
+      await self._run(self._updater.remove_obsolete_targets,
+          destination_directory)
+
+
+
+  async def download_target(self, target, destination_directory,
+      resumable=False):
+    """
+    <Purpose>
+      Download 'target' and verify it is trusted.  See
+      tuf.client.updater.Updater.download_target().
+
+    <Arguments>
+      target:
+        The target to be downloaded.  Conformant to
+        'tuf.formats.TARGETINFO_SCHEMA'.
+
+      destination_directory:
+        The directory to save the downloaded target file.
+
+      resumable:
+        A boolean indicating whether an interrupted download should be
+        resumed, rather than started over.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'target' is not properly formatted.
+
+      tuf.exceptions.NoWorkingMirrorError:
+        If a target could not be downloaded from any of the mirrors.
+
+    <Side Effects>
+      A target file is saved to the local system.
+
+    <Returns>
+      None.
+    """
+
+    await self._download(self._updater.download_target, target,
+        destination_directory, resumable)
+
+
+
+  async def download_targets(self, targets, destination_directory,
+      resumable=False):
+    """
+    <Purpose>
+      Download the targets of 'targets' concurrently, and verify they are
+      trusted.  At most 'max_concurrent_downloads' targets are downloaded at
+      the same time.  Every target is attempted, even if another one fails.
+
+    <Arguments>
+      targets:
+        A list of targets to be downloaded.  Conformant to
+        'tuf.formats.TARGETINFOS_SCHEMA'.
+
+      destination_directory:
+        The directory to save the downloaded target files.
+
+      resumable:
+        A boolean indicating whether interrupted downloads should be resumed,
+        rather than started over.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If the arguments are improperly formatted.
+
+      tuf.exceptions.NoWorkingMirrorError:
+        If a target could not be downloaded from any of the mirrors.  The
+        exception of the first target in 'targets' that failed is raised.
+
+    <Side Effects>
+      Target files are saved to the local system.
+
+    <Returns>
+      None.
+    """
+
+    # Do the arguments have the correct format?
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    tuf.formats.TARGETINFOS_SCHEMA.check_match(targets)
+    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
+
+    results = await asyncio.gather(*[self.download_target(target,
+        destination_directory, resumable) for target in targets],
+        return_exceptions=True)
+
+    # Every download has finished (no worker thread is still writing to
+    # 'destination_directory'), so the first error can now be raised.
+    _raise_first_exception(results)
+
+
+
+  async def _refresh_delegated_roles(self, rolename, visited_roles=None):
+    """
+    <Purpose>
+      Non-public coroutine that updates the metadata of 'rolename', if it is
+      listed in the 'snapshot' metadata, and then the metadata of the roles it
+      delegates to, recursively.  The delegated roles of 'rolename' are updated
+      concurrently, once the delegations of 'rolename' are trusted.
+
+    <Arguments>
+      rolename:
+        The name of the targets role to update.  Example: 'targets'.
+
+      visited_roles:
+        The set of role names that have already been scheduled for update.
+
+    <Exceptions>
+      Any of the exceptions raised by
+      tuf.client.updater.Updater._update_metadata_if_changed().
+
+    <Side Effects>
+      The metadata of the roles are loaded from disk, and updated if they have
+      changed.
+
+    <Returns>
+      None.
+    """
+
+    if visited_roles is None:
+      visited_roles = set([rolename])
+
+    snapshot_meta = self._updater.metadata['current']['snapshot']['meta']
+
+    if rolename + '.json' not in snapshot_meta:
+      return
+
+    await self._download(self._refresh_role, rolename)
+
+    # The delegations of 'rolename' may only be trusted now that its metadata
+    # has been updated.
+    delegated_roles = []
+    role_metadata = self._updater.metadata['current'].get(rolename, {})
+
+    for roleinfo in role_metadata.get('delegations', {}).get('roles', []):
+      delegated_role = roleinfo['name']
+
+      if delegated_role not in visited_roles:
+        visited_roles.add(delegated_role)
+        delegated_roles.append(delegated_role)
+
+    if not delegated_roles:
+      return
+
+    logger.debug('Roles to update: ' + repr(delegated_roles) + '.')
+
+    results = await asyncio.gather(*[self._refresh_delegated_roles(role,
+        visited_roles) for role in delegated_roles], return_exceptions=True)
+
+    _raise_first_exception(results)
+
+
+
+  def _refresh_role(self, rolename):
+    """
+    <Purpose>
+      Non-public method, called in a worker thread, that loads the metadata of
+      'rolename' from disk and updates it if it has changed, as done by
+      tuf.client.updater.Updater._refresh_delegated_roles().  The metadata of
+      a fresh role is only checked for expiration.  The changed metadata is
+      downloaded and verified concurrently with that of other roles, but
+      loaded and installed under 'self._install_lock'.
+
+    <Arguments>
+      rolename:
+        The name of the targets role to update.
+
+    <Exceptions>
+      Any of the exceptions raised by
+      tuf.client.updater.Updater._update_metadata_if_changed().
+
+    <Side Effects>
+      The metadata of 'rolename' is loaded and updated, and 'rolename' becomes
+      the most recently used delegated role.
+
+    <Returns>
+      None.
+    """
+
+    metadata_filename = rolename + '.json'
+
+    with self._install_lock:
+      self._updater._use_delegated_role(rolename)
+
+      if self._updater._is_fresh_role(rolename):
+        self._updater._ensure_not_expired(
+            self._updater.metadata['current'][rolename], rolename)
+        return
+
+      self._updater._load_metadata_from_file('previous', rolename)
+      self._updater._load_metadata_from_file('current', rolename)
+
+      versioninfo = self._updater.metadata['current']['snapshot']['meta'] \
+                                          [metadata_filename]
+      changed = self._updater._versioninfo_has_been_updated(metadata_filename,
+          versioninfo)
+
+    # (file_object, metadata_signable) or exception
+    downloaded_metadata = None
+
+    # The top-level targets metadata is downloaded while holding the refresh
+    # lock of the updater (see Updater._update_targets_metadata()).
+    if changed and rolename != 'targets':
+      downloaded_metadata = \
+        self._updater._download_metadata_files([rolename])[rolename]
+
+    with self._install_lock:
+      if rolename == 'targets':
+        self._updater._update_targets_metadata()
+
+      else:
+        self._updater._update_metadata_if_changed(rolename,
+            downloaded_metadata=downloaded_metadata)
+
+      self._updater.fresh_roles[rolename] = \
+        self._updater.metadata['current']['snapshot']['meta'] \
+                              [metadata_filename]['version']
+
+
+
+  async def _download(self, function, *args):
+    """
+    <Purpose>
+      Non-public coroutine that calls 'function' in a worker thread, once one
+      of the 'max_concurrent_downloads' download slots is free.
+
+    <Arguments>
+      function:
+        The blocking callable to call.
+
+      args:
+        The arguments passed to 'function'.
+
+    <Exceptions>
+      Any exception raised by 'function'.
+
+    <Side Effects>
+      'function' is called.
+
+    <Returns>
+      The return value of 'function'.
+    """
+
+    if self._semaphore is None:
+      self._semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
+
+    async with self._semaphore:
+      return await self._run(function, *args)
+
+
+
+  async def _run(self, function, *args):
+    """
+    <Purpose>
+      Non-public coroutine that calls 'function' in a worker thread, so that
+      the event loop is not blocked.
+
+    <Arguments>
+      function:
+        The blocking callable to call.
+
+      args:
+        The arguments passed to 'function'.
+
+    <Exceptions>
+      Any exception raised by 'function'.
+
+    <Side Effects>
+      'function' is called.
+
+    <Returns>
+      The return value of 'function'.
+    """
+
+    loop = asyncio.get_event_loop()
+
+    return await loop.run_in_executor(self._executor, function, *args)
+
+
+
+  def _get_metadata_lock(self):
+    if self._metadata_lock is None:
+      self._metadata_lock = asyncio.Lock()
+
+    return self._metadata_lock
+
+
+
+
+
+def _raise_first_exception(results):
+  """
+  Raise the first exception of 'results', a list returned by
+  asyncio.gather(..., return_exceptions=True), if any.
+  """
+
+  for result in results:
+    if isinstance(result, BaseException):
+      raise result
@@ -93,10 +93,11 @@
   destination_directory = '.'
   updated_targets = updater.updated_targets(targets, destination_directory)
 
-  # Lastly, attempt to download each target among those that have changed.
-  # The updated target files are saved locally to 'destination_directory'.
-  for target in updated_targets:
-    updater.download_target(target, destination_directory)
+  # Lastly, attempt to download each target among those that have changed,
+  # several at a time.  The updated target files are saved locally to
+  # 'destination_directory'.  The result of each download is None, or the
+  # exception raised if the target could not be downloaded.
+  results = updater.download_targets(updated_targets, destination_directory)
 """
 
 # Help with Python 3 compatibility, where the print statement is a function, an
@@ -107,13 +108,25 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import unicode_literals
 
+import array
+import binascii
+import bisect
+import collections
+import copy
 import errno
+import json
 import logging
+import marshal
 import os
 import shutil
+import stat
+import sys
 import time
+import timeit
 import random
 import fnmatch
+import re
+import threading
 
 import tuf
 import tuf.download
@@ -132,9 +145,19 @@ import securesystemslib.util
 import six
 import iso8601
 
+try:
+  from collections.abc import Mapping as _Mapping
+
+# Python 2.
+except ImportError: # pragma: no cover
+  from collections import Mapping as _Mapping
+
 # See 'log.py' to learn how logging is handled in TUF.
 logger = logging.getLogger('tuf.client.updater')
 
+# The roles whose metadata is always kept in memory.
+_TOP_LEVEL_ROLE_NAMES = ['root', 'targets', 'snapshot', 'timestamp']
+
 # Disable 'iso8601' logger messages to prevent 'iso8601' from clogging the
 # log file.
 iso8601_logger = logging.getLogger('iso8601')
@@ -178,6 +201,10 @@ class Updater(object):
     self.repository_name:
       The name of the updater instance.
 
+    self.target_cache:
+      The most recently resolved targets, by target path (see
+      'tuf.settings.TARGET_CACHE_SIZE' and target_cache_info()).
+
   <Updater Methods>
     refresh():
       This method downloads, verifies, and loads metadata for the top-level
@@ -202,6 +229,11 @@ class Updater(object):
       Returns the target information for a specific file identified by its file
       path.  This target method also downloads the metadata of updated targets.
 
+    get_valid_targetinfos(file_paths):
+      Returns the target information for each of a list of file paths, like
+      get_one_valid_targetinfo(), but walks the delegation graph once for all
+      of them.
+
     updated_targets(targets, destination_directory):
       After the client has retrieved the target information for those targets
       they are interested in updating, they would call this method to determine
@@ -213,11 +245,28 @@ class Updater(object):
       This method performs the actual download of the specified target.  The
       file is saved to the 'destination_directory' argument.
 
+    download_targets(targets, destination_directory):
+      Downloads each of a list of targets, like download_target(), with a pool
+      of worker threads, and returns the result of each download.
+
     remove_obsolete_targets(destination_directory):
       Any files located in 'destination_directory' that were previously
       served by the repository but have since been removed, can be deleted
       from disk by the client by calling this method.
 
+    target_cache_info():
+      Returns the hit and miss counters of the cache of resolved targets, and
+      its current and maximum sizes.
+
+    start_auto_refresh(interval=None):
+      Starts a background thread that refreshes the metadata of the top-level
+      roles on a schedule, like refresh(), and publishes the newly trusted
+      metadata at once, so that the target methods called in the meantime are
+      neither blocked nor see partly updated metadata.
+
+    stop_auto_refresh():
+      Stops the background thread started by start_auto_refresh().
+
     Note: The methods listed above are public and intended for the software
     updater integrating TUF with this module.  All other methods that may begin
     with a single leading underscore are non-public and only used internally.
@@ -226,7 +275,7 @@ class Updater(object):
     http://www.python.org/dev/peps/pep-0008/#method-names-and-instance-variables
   """
 
-  def __init__(self, repository_name, repository_mirrors):
+  def __init__(self, repository_name, repository_mirrors, fetcher=None):
     """
     <Purpose>
       Constructor.  Instantiating an updater object causes all the metadata
@@ -266,6 +315,12 @@ class Updater(object):
                                           'targets_path': 'targets',
                                           'confined_target_dirs': ['']}}
 
+      fetcher:
+        An optional 'tuf.fetcher.FetcherInterface' that metadata and target
+        files are downloaded with, such as 'tuf.fetcher.FileFetcher' for
+        mirrors on the local file system.  By default, they are downloaded
+        over HTTP(S).
+
     <Exceptions>
       securesystemslib.exceptions.FormatError:
         If the arguments are improperly formatted.
@@ -294,6 +349,7 @@ class Updater(object):
     # Save the validated arguments.
     self.repository_name = repository_name
     self.mirrors = repository_mirrors
+    self.fetcher = fetcher
 
     # Store the trusted metadata read from disk.
     self.metadata = {}
@@ -353,6 +409,81 @@ class Updater(object):
 
     self.metadata_directory['previous'] = previous_path
 
+    # Store the HTTP cache validators ('ETag') of the root and timestamp
+    # metadata last downloaded from each mirror, which are sent in
+    # conditional requests.  The dict keys are mirror URLs, and the dict
+    # values the validators and the version number of the metadata they are
+    # for.  They are saved next to the 'current' metadata directory.
+    self.validators_filepath = \
+      os.path.join(repository_directory, 'metadata', 'validators.json')
+    self.validators = self._load_validators()
+
+    # Store the hashes of the local copies of targets checked by
+    # updated_targets(), with the length, modification time and inode of each
+    # file when it was hashed.  The dict keys are absolute file paths.  They
+    # are loaded from the file the first time they are needed.
+    self.local_hashes_filepath = \
+      os.path.join(repository_directory, 'metadata', 'local_hashes.json')
+    self.local_hashes = None
+
+    # Store a copy of each metadata file loaded and checked, in a binary form
+    # that is loaded faster, with the hash of the file it was parsed from.
+    # The cache mirrors the 'current' and 'previous' metadata directories.
+    self.metadata_cache_directory = \
+      os.path.join(repository_directory, 'metadata', 'cache')
+
+    # Store the keys of the roles delegated by a targets role, in the form
+    # they are added to the key database, when its metadata is loaded from or
+    # saved to the cache, until _import_delegations() imports them.  The dict
+    # keys are role names, and the dict values the 'keys' object of the
+    # delegations the keys were formatted from, and the list of keys.
+    self.delegated_keys = {}
+
+    # Store the names of the delegated roles whose metadata is in memory, from
+    # the least to the most recently used, if their number is bounded (see
+    # 'tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY').  The dict values are
+    # unused.
+    self.delegated_roles_in_memory = collections.OrderedDict()
+
+    # Store the Unix timestamps of the expiration dates of metadata, by date,
+    # so that each date is parsed once.
+    # Example: {'2030-01-01T00:00:00Z': 1893456000}
+    self.expiration_timestamps = {}
+
+    # Store the compiled delegations of each targets role, which the
+    # delegation walk of get_one_valid_targetinfo() matches target paths
+    # against.  The dict keys are role names, and the dict values the
+    # '_DelegationMatcher' of the trusted delegations of the role.
+    self.delegation_matchers = {}
+
+    # Store the version of each targets role, as listed by snapshot, when its
+    # metadata was last loaded and checked.  A role whose listed version is
+    # unchanged is not loaded from disk again for every target lookup.
+    # Example: {'targets': 3, 'role1': 1}
+    self.fresh_roles = {}
+
+    # Store the target information, and the role that provides it, of the
+    # target paths most recently resolved by the target methods.
+    self.target_cache = _TargetCache(tuf.settings.TARGET_CACHE_SIZE)
+
+    # The lock that keeps the top-level metadata from being refreshed by
+    # refresh() and the background thread of start_auto_refresh() at the same
+    # time, the background thread, its interval and the event that stops it,
+    # if started, and the exception raised by its last refresh (None if it
+    # succeeded).
+    self.refresh_lock = threading.Lock()
+    self.auto_refresh_thread = None
+    self.auto_refresh_interval = None
+    self.auto_refresh_stop_event = None
+    self.auto_refresh_error = None
+
+    # The repository name under which the key and role databases are rebuilt
+    # when a new root is installed, or None if they are rebuilt in place.  It
+    # is only set on the copy of the updater that refreshes the metadata in
+    # the background (see _refresh_and_publish()), so that the databases used
+    # by the target methods are replaced at once, with the metadata.
+    self.staged_repository_name = None
+
     # Load current and previous metadata.
     for metadata_set in ['current', 'previous']:
       for metadata_role in ['root', 'targets', 'snapshot', 'timestamp']:
@@ -409,7 +540,9 @@ class Updater(object):
       If the metadata is loaded successfully, it is saved to the metadata
       store.  If 'metadata_role' is 'root', the role and key databases
       are reloaded.  If 'metadata_role' is a target metadata, all its
-      delegated roles are refreshed.
+      delegated roles are refreshed.  The previous metadata of a delegated
+      role is not loaded if 'tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY' is
+      set.
 
     <Returns>
       None.
@@ -419,2327 +552,5656 @@ class Updater(object):
     if metadata_set not in ['current', 'previous']:
       raise securesystemslib.exceptions.Error('Invalid metadata set: ' + repr(metadata_set))
 
+    # The previous metadata of delegated roles is only kept on disk if the
+    # memory held by delegated metadata is bounded.
+    if metadata_set == 'previous' and \
+        tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY is not None and \
+        metadata_role not in _TOP_LEVEL_ROLE_NAMES:
+      return
+
+    metadata_object = self._read_metadata_file(metadata_set, metadata_role)
+
+    if metadata_object is None:
+      return
+
+    # Save the metadata object to the metadata store.
+    self.metadata[metadata_set][metadata_role] = metadata_object
+
+    # If 'metadata_role' is 'root' or targets metadata, the key and role
+    # databases must be rebuilt.  If 'root', ensure self.consistent_snaptshots
+    # is updated.
+    if metadata_set == 'current':
+      if metadata_role == 'root':
+        self._rebuild_key_and_role_db()
+        self.consistent_snapshot = metadata_object['consistent_snapshot']
+
+      elif metadata_object['_type'] == 'targets':
+        # TODO: Should we also remove the keys of the delegated roles?
+        self._import_delegations(metadata_role)
+
+
+
+
+
+  def _read_metadata_file(self, metadata_set, metadata_role):
+    """
+    <Purpose>
+      Non-public method that reads the current or previous metadata of
+      'metadata_role' from its local file, or from the cached copy of the
+      file, without saving it to the metadata store.
+
+    <Arguments>
+      metadata_set:
+        The string 'current' or 'previous'.
+
+      metadata_role:
+        The name of the metadata. This is a role name and should
+        not end in '.json'.  Examples: 'root', 'targets', 'unclaimed'.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If the role object loaded for 'metadata_role' is improperly formatted.
+
+    <Side Effects>
+      The metadata file is read, and cached if it has not been.
+
+    <Returns>
+      The metadata object (the 'signed' object of the metadata file), or None
+      if there is no valid metadata file.
+    """
+
     # Save and construct the full metadata path.
     metadata_directory = self.metadata_directory[metadata_set]
     metadata_filename = metadata_role + '.json'
     metadata_filepath = os.path.join(metadata_directory, metadata_filename)
 
     # Ensure the metadata path is valid/exists, else ignore the call.
-    if os.path.exists(metadata_filepath):
+    if not os.path.exists(metadata_filepath):
+      return None
+
+    with open(metadata_filepath, 'rb') as file_object:
+      metadata_data = file_object.read()
+
+    digest_object = securesystemslib.hash.digest('sha256')
+    digest_object.update(metadata_data)
+    metadata_digest = digest_object.hexdigest()
+
+    # A file with the hash of the cached copy has already been parsed and
+    # checked.
+    metadata_signable = self._load_cached_metadata(metadata_set,
+        metadata_role, metadata_digest)
+
+    if metadata_signable is None:
       # Load the file.  The loaded object should conform to
       # 'tuf.formats.SIGNABLE_SCHEMA'.
       try:
-        metadata_signable = securesystemslib.util.load_json_file(metadata_filepath)
+        metadata_signable = securesystemslib.util.load_json_string(
+            metadata_data.decode('utf-8'))
 
       # Although the metadata file may exist locally, it may not
       # be a valid json file.  On the next refresh cycle, it will be
       # updated as required.  If Root if cannot be loaded from disk
       # successfully, an exception should be raised by the caller.
-      except securesystemslib.exceptions.Error:
-        return
+      except (securesystemslib.exceptions.Error, UnicodeDecodeError):
+        return None
 
       tuf.formats.check_signable_object_format(metadata_signable)
 
-      # Extract the 'signed' role object from 'metadata_signable'.
-      metadata_object = metadata_signable['signed']
+      # The cached copy of the metadata of a targets role holds its compact
+      # targets, which are loaded much faster than a dictionary per target.
+      metadata_signable['signed'] = \
+        _compact_metadata(metadata_signable['signed'])
+      self._save_cached_metadata(metadata_set, metadata_role,
+          metadata_digest, metadata_signable)
 
-      # Save the metadata object to the metadata store.
-      self.metadata[metadata_set][metadata_role] = metadata_object
+    # Extract the 'signed' role object from 'metadata_signable'.
+    return _compact_metadata(metadata_signable['signed'])
 
-      # If 'metadata_role' is 'root' or targets metadata, the key and role
-      # databases must be rebuilt.  If 'root', ensure self.consistent_snaptshots
-      # is updated.
-      if metadata_set == 'current':
-        if metadata_role == 'root':
-          self._rebuild_key_and_role_db()
-          self.consistent_snapshot = metadata_object['consistent_snapshot']
 
-        elif metadata_object['_type'] == 'targets':
-          # TODO: Should we also remove the keys of the delegated roles?
-          self._import_delegations(metadata_role)
 
 
 
-
-
-  def _rebuild_key_and_role_db(self):
+  def _get_cached_metadata_filepath(self, metadata_set, metadata_role):
     """
     <Purpose>
-      Non-public method that rebuilds the key and role databases from the
-      currently trusted 'root' metadata object extracted from 'root.json'.
-      This private method is called when a new/updated 'root' metadata file is
-      loaded.  This method will only store the role information of the
-      top-level roles (i.e., 'root', 'targets', 'snapshot', 'timestamp').
+      Non-public method that returns the path of the cached copy of the
+      'metadata_set' metadata of 'metadata_role'.
 
     <Arguments>
-      None.
+      metadata_set:
+        The string 'current' or 'previous'.
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If the 'root' metadata is improperly formatted.
+      metadata_role:
+        The name of the role.
 
-      securesystemslib.exceptions.Error:
-        If there is an error loading a role contained in the 'root'
-        metadata.
+    <Exceptions>
+      None.
 
     <Side Effects>
-      The key and role databases are reloaded for the top-level roles.
+      None.
 
     <Returns>
-      None.
+      The path of the cached copy.
     """
 
-    # Clobbering this means all delegated metadata files are rendered outdated
-    # and will need to be reloaded.  However, reloading the delegated metadata
-    # files is avoided here because fetching target information with methods
-    # like all_targets() and get_one_valid_targetinfo() always cause a refresh
-    # of these files.  The metadata files for delegated roles are also not
-    # loaded when the repository is first instantiated.  Due to this setup,
-    # reloading delegated roles is not required here.
-    tuf.keydb.create_keydb_from_root_metadata(self.metadata['current']['root'],
-        self.repository_name)
-    tuf.roledb.create_roledb_from_root_metadata(self.metadata['current']['root'],
-        self.repository_name)
+    return os.path.join(self.metadata_cache_directory, metadata_set,
+        metadata_role + '.json.marshal')
 
 
 
 
 
-  def _import_delegations(self, parent_role):
+  def _load_cached_metadata(self, metadata_set, metadata_role,
+      metadata_digest):
     """
     <Purpose>
-      Non-public method that imports all the roles delegated by 'parent_role'.
+      Non-public method that loads the cached copy of the 'metadata_set'
+      metadata of 'metadata_role', saved by _save_cached_metadata().  The copy
+      is only an optimization, so a missing, unreadable or stale copy is
+      ignored.
 
     <Arguments>
-      parent_role:
-        The role whose delegations will be imported.
+      metadata_set:
+        The string 'current' or 'previous'.
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If a key attribute of a delegated role's signing key is
-        improperly formatted.
+      metadata_role:
+        The name of the role.
 
-      securesystemslib.exceptions.Error:
-        If the signing key of a delegated role cannot not be loaded.
+      metadata_digest:
+        The SHA-256 hex digest of the metadata file.  A copy of a file with
+        another hash is stale.
+
+    <Exceptions>
+      None.
 
     <Side Effects>
-      The key and role databases are modified to include the newly loaded roles
-      delegated by 'parent_role'.
+      The cached copy is read, if it exists.
 
     <Returns>
-      None.
+      The signable object of the metadata, or None if there is no usable copy.
+      The keys of the roles delegated by the 'current' metadata of a targets
+      role are saved for _import_delegations().
     """
 
-    current_parent_metadata = self.metadata['current'][parent_role]
+    if not tuf.settings.CACHE_VERIFIED_METADATA:
+      return None
 
-    if 'delegations' not in current_parent_metadata:
-      return
+    cached_filepath = \
+      self._get_cached_metadata_filepath(metadata_set, metadata_role)
 
-    # This could be quite slow with a large number of delegations.
-    keys_info = current_parent_metadata['delegations'].get('keys', {})
-    roles_info = current_parent_metadata['delegations'].get('roles', [])
+    try:
+      with open(cached_filepath, 'rb') as file_object:
+        cached_metadata = marshal.loads(file_object.read())
 
-    logger.debug('Adding roles delegated from ' + repr(parent_role) + '.')
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+      return None
 
-    # Iterate the keys of the delegated roles of 'parent_role' and load them.
-    for keyid, keyinfo in six.iteritems(keys_info):
-      if keyinfo['keytype'] in ['rsa', 'ed25519']:
+    # The marshal format may change between versions of Python.
+    if not isinstance(cached_metadata, dict) or \
+        cached_metadata.get('python') != list(sys.version_info[:2]) or \
+        cached_metadata.get('sha256') != metadata_digest:
+      return None
 
-        # We specify the keyid to ensure that it's the correct keyid
-        # for the key.
-        try:
-          key, keyids = securesystemslib.keys.format_metadata_to_key(keyinfo)
-          for keyid in keyids:
-            key['keyid'] = keyid
-            tuf.keydb.add_key(key, keyid=None, repository_name=self.repository_name)
+    metadata_signable = cached_metadata.get('signable')
 
-        except securesystemslib.exceptions.KeyAlreadyExistsError:
-          pass
+    # The cached copy is trusted like the metadata files next to it, which are
+    # not verified again when they are loaded either, so it is not checked
+    # against the metadata schemas.
+    if not isinstance(metadata_signable, dict) or \
+        not isinstance(metadata_signable.get('signed'), dict):
+      logger.warning('Ignoring the invalid cached copy of ' +
+          repr(metadata_role) + '.')
+      return None
 
-        except (securesystemslib.exceptions.FormatError, securesystemslib.exceptions.Error):
-          logger.exception('Invalid key for keyid: ' + repr(keyid) + '.')
-          logger.error('Aborting role delegation for parent role ' + parent_role + '.')
-          raise
+    try:
+      if cached_metadata.get('compact_targets') is not None:
+        targets = _CompactTargets.from_tuple(cached_metadata['compact_targets'])
 
-      else:
-        logger.warning('Invalid key type for ' + repr(keyid) + '.')
-        continue
+        if not tuf.settings.COMPACT_TARGETS_METADATA:
+          targets = dict(six.iteritems(targets))
 
-    # Add the roles to the role database.
-    for roleinfo in roles_info:
-      try:
-        # NOTE: tuf.roledb.add_role will take care of the case where rolename
-        # is None.
-        rolename = roleinfo.get('name')
-        logger.debug('Adding delegated role: ' + str(rolename) + '.')
-        tuf.roledb.add_role(rolename, roleinfo, self.repository_name)
+        metadata_signable['signed']['targets'] = targets
 
-      except tuf.exceptions.RoleAlreadyExistsError:
-        logger.warning('Role already exists: ' + rolename)
+    except (TypeError, ValueError, KeyError):
+      logger.warning('Ignoring the invalid cached copy of ' +
+          repr(metadata_role) + '.')
+      return None
 
-      except:
-        logger.exception('Failed to add delegated role: ' + repr(rolename) + '.')
-        raise
+    delegations = metadata_signable['signed'].get('delegations')
 
+    if metadata_set == 'current' and isinstance(delegations, dict) and \
+        isinstance(cached_metadata.get('delegated_keys'), list):
+      self.delegated_keys[metadata_role] = \
+        (delegations.get('keys'), cached_metadata['delegated_keys'])
 
+    logger.debug('Loaded the cached copy of ' + repr(metadata_role) + '.')
 
+    return metadata_signable
 
 
-  def refresh(self, unsafely_update_root_if_necessary=True):
+
+
+
+  def _save_cached_metadata(self, metadata_set, metadata_role,
+      metadata_digest, metadata_signable):
     """
     <Purpose>
-      Update the latest copies of the metadata for the top-level roles. The
-      update request process follows a specific order to ensure the metadata
-      files are securely updated:
-      timestamp -> snapshot -> root (if necessary) -> targets.
+      Non-public method that caches the 'metadata_set' metadata of
+      'metadata_role', which has been parsed and checked, so that
+      _load_metadata_from_file() does not parse and check it again.
 
-      Delegated metadata is not refreshed by this method. After this method is
-      called, the use of target methods (e.g., all_targets(),
-      targets_of_role(), or get_one_valid_targetinfo()) will update delegated
-      metadata, when required.  Calling refresh() ensures that top-level
-      metadata is up-to-date, so that the target methods can refer to the
-      latest available content. Thus, refresh() should always be called by the
-      client before any requests of target file information.
+    <Arguments>
+      metadata_set:
+        The string 'current' or 'previous'.
 
-      The expiration time for downloaded metadata is also verified, including
-      local metadata that the repository claims is up to date.
+      metadata_role:
+        The name of the role.
 
-      If the refresh fails for any reason, then unless
-      'unsafely_update_root_if_necessary' is set, refresh will be retried once
-      after first attempting to update the root metadata file. Only after this
-      check will the exceptions listed here potentially be raised.
+      metadata_digest:
+        The SHA-256 hex digest of the metadata file.
 
-    <Arguments>
-      unsafely_update_root_if_necessary:
-        Boolean that indicates whether to unsafely update the Root metadata if
-        any of the top-level metadata cannot be downloaded successfully.  The
-        Root role is unsafely updated if its current version number is unknown.
+      metadata_signable:
+        The signable object parsed from the file.
 
     <Exceptions>
-      tuf.exceptions.NoWorkingMirrorError:
-        If the metadata for any of the top-level roles cannot be updated.
-
-      tuf.exceptions.ExpiredMetadataError:
-         If any of the top-level metadata is expired (whether a new version was
-         downloaded expired or no new version was found and the existing
-         version is now expired).
+      None.
 
     <Side Effects>
-      Updates the metadata files of the top-level roles with the latest
-      information.
+      The cached copy is written.  The keys of the roles delegated by the
+      'current' metadata of a targets role are saved for
+      _import_delegations().
 
     <Returns>
       None.
     """
 
-    # Do the arguments have the correct format?
-    # This check ensures the arguments have the appropriate
-    # number of objects and object types, and that all dict
-    # keys are properly named.
-    # Raise 'securesystemslib.exceptions.FormatError' if the check fail.
-    securesystemslib.formats.BOOLEAN_SCHEMA.check_match(unsafely_update_root_if_necessary)
+    if not tuf.settings.CACHE_VERIFIED_METADATA:
+      return
 
-    # The Timestamp role does not have signed metadata about it; otherwise we
-    # would need an infinite regress of metadata. Therefore, we use some
-    # default, but sane, upper file length for its metadata.
-    DEFAULT_TIMESTAMP_UPPERLENGTH = tuf.settings.DEFAULT_TIMESTAMP_REQUIRED_LENGTH
+    cached_filepath = \
+      self._get_cached_metadata_filepath(metadata_set, metadata_role)
 
-    # The Root role may be updated without knowing its version number if
-    # top-level metadata cannot be safely downloaded (e.g., keys may have been
-    # revoked, thus requiring a new Root file that includes the updated keys)
-    # and 'unsafely_update_root_if_necessary' is True.
-    # We use some default, but sane, upper file length for its metadata.
-    DEFAULT_ROOT_UPPERLENGTH = tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH
+    # Compact targets (see '_CompactTargets') are saved as the tuple they are
+    # rebuilt from.
+    compact_targets = None
 
-    # Update the top-level metadata.  The _update_metadata_if_changed() and
-    # _update_metadata() calls below do NOT perform an update if there
-    # is insufficient trusted signatures for the specified metadata.
-    # Raise 'tuf.exceptions.NoWorkingMirrorError' if an update fails.
-    root_metadata = self.metadata['current']['root']
+    # The keys of the delegated roles are saved in the form they are added to
+    # the key database, so that they are not formatted again on a warm start.
+    # Invalid keys are left for _import_delegations() to report.
+    delegated_keys = None
+    delegations = metadata_signable['signed'].get('delegations')
 
-    try:
-      self._ensure_not_expired(root_metadata, 'root')
+    if delegations is not None:
+      try:
+        delegated_keys = _format_delegated_keys(delegations.get('keys', {}))
 
-    except tuf.exceptions.ExpiredMetadataError:
-      # Raise 'tuf.exceptions.NoWorkingMirrorError' if a valid (not
-      # expired, properly signed, and valid metadata) 'root.json' cannot be
-      # installed.
-      if unsafely_update_root_if_necessary:
-        logger.info('Expired Root metadata was loaded from disk.'
-          '  Try to update it now.' )
+      except securesystemslib.exceptions.Error:
+        pass
 
-      # The caller explicitly requested not to unsafely fetch an expired Root.
       else:
-        logger.info('An expired Root metadata was loaded and must be updated.')
-        raise
+        if metadata_set == 'current':
+          self.delegated_keys[metadata_role] = \
+            (delegations.get('keys'), delegated_keys)
 
-    # TODO: How should the latest root metadata be verified?  According to the
-    # currently trusted root keys?  What if all of the currently trusted
-    # root keys have since been revoked by the latest metadata?  Alternatively,
-    # do we blindly trust the downloaded root metadata here?
-    self._update_root_metadata(root_metadata)
+    if isinstance(metadata_signable['signed'].get('targets'), _CompactTargets):
+      compact_targets = metadata_signable['signed']['targets'].to_tuple()
+      metadata_signable = dict(metadata_signable,
+          signed=dict(metadata_signable['signed'], targets=None))
 
-    # Use default but sane information for timestamp metadata, and do not
-    # require strict checks on its required length.
-    self._update_metadata('timestamp', DEFAULT_TIMESTAMP_UPPERLENGTH)
-    # TODO: After fetching snapshot.json, we should either verify the root
-    # fileinfo referenced there matches what was fetched earlier in
-    # _update_root_metadata() or make another attempt to download root.json.
-    self._update_metadata_if_changed('snapshot',
-                                     referenced_metadata='timestamp')
-    self._update_metadata_if_changed('targets')
+    try:
+      securesystemslib.util.ensure_parent_dir(cached_filepath)
+      file_object = securesystemslib.util.TempFile()
+      file_object.write(marshal.dumps({'python': list(sys.version_info[:2]),
+          'sha256': metadata_digest, 'signable': metadata_signable,
+          'compact_targets': compact_targets,
+          'delegated_keys': delegated_keys}))
+      file_object.move(cached_filepath)
 
+    except Exception:
+      logger.exception('Could not save ' + repr(cached_filepath) + '.')
 
 
-  def _update_root_metadata(self, current_root_metadata):
-    """
-    <Purpose>
-      The root file must be signed by the current root threshold and keys as
-      well as the previous root threshold and keys. The update process for root
-      files means that each intermediate root file must be downloaded, to build
-      a chain of trusted root keys from keys already trusted by the client:
 
-        1.root -> 2.root -> 3.root
 
-      3.root must be signed by the threshold and keys of 2.root, and 2.root
-      must be signed by the threshold and keys of 1.root.
+
+  def _load_validators(self):
+    """
+    <Purpose>
+      Non-public method that loads the HTTP cache validators saved by
+      _save_validators().  Validators are only an optimization, so a missing
+      or unreadable validators file is ignored.
 
     <Arguments>
-      current_root_metadata:
-        The currently held version of root.
+      None.
+
+    <Exceptions>
+      None.
 
     <Side Effects>
-      Updates the root metadata files with the latest information.
+      The validators file is read, if it exists.
 
     <Returns>
-      None.
+      A dictionary of mirror URLs to validators.
     """
 
-    # Retrieve the latest, remote root.json.
-    latest_root_metadata_file = \
-      self._get_metadata_file('root', 'root.json',
-        tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH, None)
-    latest_root_metadata = \
-      securesystemslib.util.load_json_string(latest_root_metadata_file.read().decode('utf-8'))
+    if not os.path.exists(self.validators_filepath):
+      return {}
 
+    try:
+      validators = securesystemslib.util.load_json_file(self.validators_filepath)
 
-    next_version = current_root_metadata['version'] + 1
-    latest_version = latest_root_metadata['signed']['version']
+    except Exception:
+      logger.warning('Could not load ' + repr(self.validators_filepath) + '.')
+      return {}
 
-    # update from the next version of root up to (and including) the latest
-    # version.  For example:
-    # current = version 1
-    # latest = version 3
-    # update from 1.root.json to 3.root.json.
-    for version in range(next_version, latest_version + 1):
-      # Temporarily set consistent snapshot. Will be updated to whatever is set
-      # in the latest root.json after running through the intermediates with
-      # _update_metadata().
-      self.consistent_snapshot = True
-      self._update_metadata('root', tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH,
-          version=version)
+    if not isinstance(validators, dict):
+      return {}
+
+    return validators
 
 
 
-  def _check_hashes(self, file_object, trusted_hashes):
+
+
+  def _save_validators(self):
     """
     <Purpose>
-      Non-public method that verifies multiple secure hashes of the downloaded
-      file 'file_object'.  If any of these fail it raises an exception.  This is
-      to conform with the TUF spec, which support clients with different hashing
-      algorithms. The 'hash.py' module is used to compute the hashes of
-      'file_object'.
+      Non-public method that saves the HTTP cache validators of the root and
+      timestamp metadata, so that they are requested conditionally after the
+      updater is restarted.
 
     <Arguments>
-      file_object:
-        A 'securesystemslib.util.TempFile' file-like object.  'file_object' ensures that a
-        read() without a size argument properly reads the entire file.
-
-      trusted_hashes:
-        A dictionary with hash-algorithm names as keys and hashes as dict values.
-        The hashes should be in the hexdigest format.  Should be Conformant to
-        'securesystemslib.formats.HASHDICT_SCHEMA'.
+      None.
 
     <Exceptions>
-      securesystemslib.exceptions.BadHashError, if the hashes don't match.
+      None.
 
     <Side Effects>
-      Hash digest object is created using the 'securesystemslib.hash' module.
+      The validators file is written.
 
     <Returns>
       None.
     """
 
-    # Verify each trusted hash of 'trusted_hashes'.  If all are valid, simply
-    # return.
-    for algorithm, trusted_hash in six.iteritems(trusted_hashes):
-      digest_object = securesystemslib.hash.digest(algorithm)
-      digest_object.update(file_object.read())
-      computed_hash = digest_object.hexdigest()
+    try:
+      file_object = securesystemslib.util.TempFile()
+      file_object.write(json.dumps(self.validators, indent=1,
+          sort_keys=True).encode('utf-8'))
+      file_object.move(self.validators_filepath)
 
-      # Raise an exception if any of the hashes are incorrect.
-      if trusted_hash != computed_hash:
-        raise securesystemslib.exceptions.BadHashError(trusted_hash, computed_hash)
-      else:
-        logger.info('The file\'s ' + algorithm + ' hash is correct: ' + trusted_hash)
+    except Exception:
+      logger.exception('Could not save ' + repr(self.validators_filepath) + '.')
 
 
 
 
 
-  def _hard_check_file_length(self, file_object, trusted_file_length):
+  def _load_local_hashes(self):
     """
     <Purpose>
-      Non-public method that ensures the length of 'file_object' is strictly
-      equal to 'trusted_file_length'.  This is a deliberately redundant
-      implementation designed to complement
-      tuf.download._check_downloaded_length().
+      Non-public method that loads the hashes of local files saved by
+      _save_local_hashes().  The hashes are only an optimization, so a missing
+      or unreadable file is ignored.
 
     <Arguments>
-      file_object:
-        A 'securesystemslib.util.TempFile' file-like object.  'file_object'
-        ensures that a read() without a size argument properly reads the entire
-        file.
-
-      trusted_file_length:
-        A non-negative integer that is the trusted length of the file.
+      None.
 
     <Exceptions>
-      tuf.exceptions.DownloadLengthMismatchError, if the lengths do not match.
+      None.
 
     <Side Effects>
-      Reads the contents of 'file_object' and logs a message if 'file_object'
-      matches the trusted length.
+      The local hashes file is read, if it exists.
 
     <Returns>
-      None.
+      A dictionary of absolute file paths to their hashes and file status.
     """
 
-    # Read the entire contents of 'file_object', a 'securesystemslib.util.TempFile' file-like
-    # object that ensures the entire file is read.
-    observed_length = len(file_object.read())
+    if not os.path.exists(self.local_hashes_filepath):
+      return {}
 
-    # Return and log a message if the length 'file_object' is equal to
-    # 'trusted_file_length', otherwise raise an exception.  A hard check
-    # ensures that a downloaded file strictly matches a known, or trusted,
-    # file length.
-    if observed_length != trusted_file_length:
-      raise tuf.exceptions.DownloadLengthMismatchError(trusted_file_length,
-                                            observed_length)
-    else:
-      logger.debug('Observed length ('+str(observed_length)+\
-                   ') == trusted length ('+str(trusted_file_length)+')')
+    try:
+      local_hashes = \
+        securesystemslib.util.load_json_file(self.local_hashes_filepath)
 
+    except Exception:
+      logger.warning('Could not load ' + repr(self.local_hashes_filepath) + '.')
+      return {}
 
+    if not isinstance(local_hashes, dict):
+      return {}
 
+    return local_hashes
 
 
-  def _soft_check_file_length(self, file_object, trusted_file_length):
+
+
+
+  def _save_local_hashes(self):
     """
     <Purpose>
-      Non-public method that checks the trusted file length of a
-      'securesystemslib.util.TempFile' file-like object. The length of the file
-      must be less than or equal to the expected length. This is a deliberately
-      redundant implementation designed to complement
-      tuf.download._check_downloaded_length().
+      Non-public method that saves the hashes of local files, so that the
+      files are not hashed again by updated_targets() after the updater is
+      restarted.
 
     <Arguments>
-      file_object:
-        A 'securesystemslib.util.TempFile' file-like object.  'file_object'
-        ensures that a read() without a size argument properly reads the entire
-        file.
-
-      trusted_file_length:
-        A non-negative integer that is the trusted length of the file.
+      None.
 
     <Exceptions>
-      tuf.exceptions.DownloadLengthMismatchError, if the lengths do
-      not match.
+      None.
 
     <Side Effects>
-      Reads the contents of 'file_object' and logs a message if 'file_object'
-      is less than or equal to the trusted length.
+      The local hashes file is written.
 
     <Returns>
       None.
     """
 
-    # Read the entire contents of 'file_object', a
-    # 'securesystemslib.util.TempFile' file-like object that ensures the entire
-    # file is read.
-    observed_length = len(file_object.read())
+    try:
+      file_object = securesystemslib.util.TempFile()
+      file_object.write(json.dumps(self.local_hashes,
+          sort_keys=True).encode('utf-8'))
+      file_object.move(self.local_hashes_filepath)
 
-    # Return and log a message if 'file_object' is less than or equal to
-    # 'trusted_file_length', otherwise raise an exception.  A soft check
-    # ensures that an upper bound restricts how large a file is downloaded.
-    if observed_length > trusted_file_length:
-      raise tuf.exceptions.DownloadLengthMismatchError(trusted_file_length,
-                                            observed_length)
-    else:
-      logger.debug('Observed length ('+str(observed_length)+\
-                   ') <= trusted length ('+str(trusted_file_length)+')')
+    except Exception:
+      logger.exception('Could not save ' + repr(self.local_hashes_filepath) +
+          '.')
 
 
 
 
 
-  def _get_target_file(self, target_filepath, file_length, file_hashes):
+  def _forget_local_hashes(self, filepaths):
     """
     <Purpose>
-      Non-public method that safely (i.e., the file length and hash are strictly
-      equal to the trusted) downloads a target file up to a certain length, and
-      checks its hashes thereafter.
+      Non-public method that drops the cached hashes of local files that have
+      been removed (e.g., by remove_obsolete_targets()), and saves the cached
+      hashes if any were dropped.
 
     <Arguments>
-      target_filepath:
-        The target filepath (relative to the repository targets directory)
-        obtained from TUF targets metadata.
-
-      file_length:
-        The expected compressed length of the target file. If the file is not
-        compressed, then it will simply be its uncompressed length.
-
-      file_hashes:
-        The expected hashes of the target file.
+      filepaths:
+        A list of the paths of the removed files.
 
     <Exceptions>
-      tuf.exceptions.NoWorkingMirrorError:
-        The target could not be fetched. This is raised only when all known
-        mirrors failed to provide a valid copy of the desired target file.
+      None.
 
     <Side Effects>
-      The target file is downloaded from all known repository mirrors in the
-      worst case. If a valid copy of the target file is found, it is stored in
-      a temporary file and returned.
+      The local hashes file is written if cached hashes are dropped.
 
     <Returns>
-      A 'securesystemslib.util.TempFile' file-like object containing the target.
+      None.
     """
 
-    # Define a callable function that is passed as an argument to _get_file()
-    # and called.  The 'verify_target_file' function ensures the file length
-    # and hashes of 'target_filepath' are strictly equal to the trusted values.
-    def verify_target_file(target_file_object):
+    if not tuf.settings.CACHE_LOCAL_TARGET_HASHES:
+      return
 
-      # Every target file must have its length and hashes inspected.
-      self._hard_check_file_length(target_file_object, file_length)
-      self._check_hashes(target_file_object, file_hashes)
+    if self.local_hashes is None:
+      self.local_hashes = self._load_local_hashes()
 
-    if self.consistent_snapshot:
-      target_digest = random.choice(list(file_hashes.values()))
-      dirname, basename = os.path.split(target_filepath)
-      target_filepath = os.path.join(dirname, target_digest + '.' + basename)
+    cache_changed = False
 
-    return self._get_file(target_filepath, verify_target_file,
-        'target', file_length, download_safely=True)
+    for filepath in filepaths:
+      if self.local_hashes.pop(os.path.abspath(filepath), None) is not None:
+        cache_changed = True
 
+    if cache_changed:
+      self._save_local_hashes()
 
 
 
 
-  def _verify_uncompressed_metadata_file(self, metadata_file_object,
-                                         metadata_role):
+
+  def _rebuild_key_and_role_db(self):
     """
     <Purpose>
-      Non-public method that verifies an uncompressed metadata file.  An
-      exception is raised if 'metadata_file_object is invalid.  There is no
-      return value.
+      Non-public method that rebuilds the key and role databases from the
+      currently trusted 'root' metadata object extracted from 'root.json'.
+      This private method is called when a new/updated 'root' metadata file is
+      loaded.  This method will only store the role information of the
+      top-level roles (i.e., 'root', 'targets', 'snapshot', 'timestamp').
 
     <Arguments>
-      metadata_file_object:
-        A 'securesystemslib.util.TempFile' instance containing the metadata file.
-        'metadata_file_object' ensures the entire file is returned with read().
-
-      metadata_role:
-        The role name of the metadata (e.g., 'root', 'targets',
-        'unclaimed').
+      None.
 
     <Exceptions>
       securesystemslib.exceptions.FormatError:
-        In case the metadata file is valid JSON, but not valid TUF metadata.
-
-      tuf.exceptions.InvalidMetadataJSONError:
-        In case the metadata file is not valid JSON.
-
-      tuf.exceptions.ReplayedMetadataError:
-        In case the downloaded metadata file is older than the current one.
-
-      tuf.exceptions.RepositoryError:
-        In case the repository is somehow inconsistent; e.g. a parent has not
-        delegated to a child (contrary to expectations).
+        If the 'root' metadata is improperly formatted.
 
-      tuf.SignatureError:
-        In case the metadata file does not have a valid signature.
+      securesystemslib.exceptions.Error:
+        If there is an error loading a role contained in the 'root'
+        metadata.
 
     <Side Effects>
-      The content of 'metadata_file_object' is read and loaded.
+      The key and role databases are reloaded for the top-level roles, under
+      'self.staged_repository_name' if it is set.
 
     <Returns>
       None.
     """
 
-    metadata = metadata_file_object.read().decode('utf-8')
-
-    try:
-      metadata_signable = securesystemslib.util.load_json_string(metadata)
-
-    except Exception as exception:
-      raise tuf.exceptions.InvalidMetadataJSONError(exception)
+    # Clobbering this means all delegated metadata files are rendered outdated
+    # and will need to be reloaded.  However, reloading the delegated metadata
+    # files is avoided here because fetching target information with methods
+    # like all_targets() and get_one_valid_targetinfo() always cause a refresh
+    # of these files, once they are no longer considered fresh.  The metadata
+    # files for delegated roles are also not loaded when the repository is
+    # first instantiated.  Due to this setup, reloading delegated roles is not
+    # required here.
+    self.fresh_roles.clear()
+    self.target_cache.clear()
+
+    # The databases of a background refresh are staged, and its later
+    # verifications use them.
+    if self.staged_repository_name is not None:
+      self.repository_name = self.staged_repository_name
 
-    else:
-      # Ensure the loaded 'metadata_signable' is properly formatted.  Raise
-      # 'securesystemslib.exceptions.FormatError' if not.
-      tuf.formats.check_signable_object_format(metadata_signable)
+    tuf.keydb.create_keydb_from_root_metadata(self.metadata['current']['root'],
+        self.repository_name)
+    tuf.roledb.create_roledb_from_root_metadata(self.metadata['current']['root'],
+        self.repository_name)
 
-    # Is 'metadata_signable' expired?
-    self._ensure_not_expired(metadata_signable['signed'], metadata_role)
 
-    # We previously verified version numbers in this function, but have since
-    # moved version number verification to the functions that retrieve
-    # metadata.
 
-    # Verify the signature on the downloaded metadata object.
 
-    valid = tuf.sig.verify(metadata_signable, metadata_role, self.repository_name)
 
-    if not valid:
-      raise securesystemslib.exceptions.BadSignatureError(metadata_role)
+  def _import_delegations(self, parent_role):
+    """
+    <Purpose>
+      Non-public method that imports all the roles delegated by 'parent_role'.
 
+    <Arguments>
+      parent_role:
+        The role whose delegations will be imported.
 
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If a key attribute of a delegated role's signing key is
+        improperly formatted.
 
+      securesystemslib.exceptions.Error:
+        If the signing key of a delegated role cannot not be loaded.
 
+    <Side Effects>
+      The key and role databases are modified to include the newly loaded roles
+      delegated by 'parent_role'.
 
-  def _get_metadata_file(self, metadata_role, remote_filename,
-    upperbound_filelength, expected_version):
+    <Returns>
+      None.
     """
-    <Purpose>
-      Non-public method that tries downloading, up to a certain length, a
-      metadata file from a list of known mirrors. As soon as the first valid
-      copy of the file is found, the downloaded file is returned and the
-      remaining mirrors are skipped.
 
-    <Arguments>
-      metadata_role:
-        The role name of the metadata (e.g., 'root', 'targets', 'unclaimed').
+    current_parent_metadata = self.metadata['current'][parent_role]
 
-      remote_filename:
-        The relative file path (on the remove repository) of 'metadata_role'.
+    if 'delegations' not in current_parent_metadata:
+      return
 
-      upperbound_filelength:
-        The expected length, or upper bound, of the metadata file to be
-        downloaded.
+    # This could be quite slow with a large number of delegations.
+    keys_info = current_parent_metadata['delegations'].get('keys', {})
+    roles_info = current_parent_metadata['delegations'].get('roles', [])
 
-      expected_version:
-        The expected and required version number of the 'metadata_role' file
-        downloaded.  'expected_version' is an integer.
+    logger.debug('Adding roles delegated from ' + repr(parent_role) + '.')
 
-    <Exceptions>
-      tuf.exceptions.NoWorkingMirrorError:
-        The metadata could not be fetched. This is raised only when all known
-        mirrors failed to provide a valid copy of the desired metadata file.
+    # The keys are only formatted if they were not saved when the metadata was
+    # loaded from or saved to the cache (see _load_cached_metadata()).
+    cached_keys_info, delegated_keys = \
+      self.delegated_keys.pop(parent_role, (None, None))
 
-    <Side Effects>
-      The file is downloaded from all known repository mirrors in the worst
-      case. If a valid copy of the file is found, it is stored in a temporary
-      file and returned.
+    if cached_keys_info is not keys_info:
+      try:
+        delegated_keys = _format_delegated_keys(keys_info)
 
-    <Returns>
-      A 'securesystemslib.util.TempFile' file-like object containing the metadata.
-    """
+      except securesystemslib.exceptions.Error:
+        logger.error('Aborting role delegation for parent role ' + parent_role + '.')
+        raise
 
-    file_mirrors = tuf.mirrors.get_list_of_mirrors('meta', remote_filename,
-                                                   self.mirrors)
-    # file_mirror (URL): error (Exception)
-    file_mirror_errors = {}
-    file_object = None
+    # Load the keys of the delegated roles of 'parent_role'.
+    for key in delegated_keys:
+      try:
+        tuf.keydb.add_key(key, keyid=None, repository_name=self.repository_name)
 
-    for file_mirror in file_mirrors:
+      except securesystemslib.exceptions.KeyAlreadyExistsError:
+        pass
+
+    # Add the roles to the role database.
+    for roleinfo in roles_info:
       try:
-        file_object = tuf.download.unsafe_download(file_mirror,
-                                                   upperbound_filelength)
+        # NOTE: tuf.roledb.add_role will take care of the case where rolename
+        # is None.
+        rolename = roleinfo.get('name')
+        logger.debug('Adding delegated role: ' + str(rolename) + '.')
+        tuf.roledb.add_role(rolename, roleinfo, self.repository_name)
 
-        # Verify 'file_object' according to the callable function.
-        # 'file_object' is also verified if decompressed above (i.e., the
-        # uncompressed version).
-        metadata_signable = \
-          securesystemslib.util.load_json_string(file_object.read().decode('utf-8'))
-
-        # Determine if the specification version number is supported.  It is
-        # assumed that "spec_version" is in (major.minor.fix) format, (for
-        # example: "1.4.3") and that releases with the same major version
-        # number maintain backwards compatibility.  Consequently, if the major
-        # version number of new metadata equals our expected major version
-        # number, the new metadata is safe to parse.
-        try:
-          spec_version_parsed = metadata_signable['signed']['spec_version'].split('.')
-          if int(spec_version_parsed[0]) != SUPPORTED_MAJOR_VERSION:
-            raise securesystemslib.exceptions.BadVersionNumberError('Downloaded'
-              ' metadata that specifies an unsupported spec_version.  Supported'
-              ' major version number: ' + repr(SUPPORTED_MAJOR_VERSION))
-
-        except (ValueError, TypeError):
-          raise securesystemslib.exceptions.FormatError('Improperly'
-            ' formatted spec_version, which must be in major.minor.fix format')
-
-        # If the version number is unspecified, ensure that the version number
-        # downloaded is greater than the currently trusted version number for
-        # 'metadata_role'.
-        version_downloaded = metadata_signable['signed']['version']
-
-        if expected_version is not None:
-          # Verify that the downloaded version matches the version expected by
-          # the caller.
-          if version_downloaded != expected_version:
-            raise securesystemslib.exceptions.BadVersionNumberError('Downloaded'
-              ' version number: ' + repr(version_downloaded) + '.  Version'
-              ' number MUST be: ' + repr(expected_version))
-
-        # The caller does not know which version to download.  Verify that the
-        # downloaded version is at least greater than the one locally available.
-        else:
-          # Verify that the version number of the locally stored
-          # 'timestamp.json', if available, is less than what was downloaded.
-          # Otherwise, accept the new timestamp with version number
-          # 'version_downloaded'.
+      except tuf.exceptions.RoleAlreadyExistsError:
+        logger.warning('Role already exists: ' + rolename)
 
-          try:
-            current_version = \
-              self.metadata['current'][metadata_role]['version']
+      except:
+        logger.exception('Failed to add delegated role: ' + repr(rolename) + '.')
+        raise
 
-            if version_downloaded < current_version:
-              raise tuf.exceptions.ReplayedMetadataError(metadata_role, version_downloaded,
-                                              current_version)
 
-          except KeyError:
-            logger.info(metadata_role + ' not available locally.')
 
-        self._verify_uncompressed_metadata_file(file_object, metadata_role)
 
-      except Exception as exception:
-        # Remember the error from this mirror, and "reset" the target file.
-        logger.exception('Update failed from ' + file_mirror + '.')
-        file_mirror_errors[file_mirror] = exception
-        file_object = None
 
-      else:
-        break
+  def refresh(self, unsafely_update_root_if_necessary=True):
+    """
+    <Purpose>
+      Update the latest copies of the metadata for the top-level roles. The
+      update request process follows a specific order to ensure the metadata
+      files are securely updated:
+      timestamp -> snapshot -> root (if necessary) -> targets.
 
-    if file_object:
-      return file_object
+      Delegated metadata is not refreshed by this method. After this method is
+      called, the use of target methods (e.g., all_targets(),
+      targets_of_role(), or get_one_valid_targetinfo()) will update delegated
+      metadata, when required.  Calling refresh() ensures that top-level
+      metadata is up-to-date, so that the target methods can refer to the
+      latest available content. Thus, refresh() should always be called by the
+      client before any requests of target file information.
 
-    else:
-      logger.error('Failed to update ' + repr(remote_filename) + ' from all'
-        ' mirrors: ' + repr(file_mirror_errors))
-      raise tuf.exceptions.NoWorkingMirrorError(file_mirror_errors)
+      The expiration time for downloaded metadata is also verified, including
+      local metadata that the repository claims is up to date.
+
+      If the refresh fails for any reason, then unless
+      'unsafely_update_root_if_necessary' is set, refresh will be retried once
+      after first attempting to update the root metadata file. Only after this
+      check will the exceptions listed here potentially be raised.
+
+    <Arguments>
+      unsafely_update_root_if_necessary:
+        Boolean that indicates whether to unsafely update the Root metadata if
+        any of the top-level metadata cannot be downloaded successfully.  The
+        Root role is unsafely updated if its current version number is unknown.
 
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        If the metadata for any of the top-level roles cannot be updated.
 
+      tuf.exceptions.ExpiredMetadataError:
+         If any of the top-level metadata is expired (whether a new version was
+         downloaded expired or no new version was found and the existing
+         version is now expired).
 
-  def _verify_root_chain_link(self, role, current, next):
-    if role != 'root':
-      return True
+    <Side Effects>
+      Updates the metadata files of the top-level roles with the latest
+      information.
 
-    current_role = current['roles'][role]
+    <Returns>
+      None.
+    """
 
-    # Verify next metadata with current keys/threshold
-    valid = tuf.sig.verify(next, role, self.repository_name,
-                           current_role['threshold'], current_role['keyids'])
+    # Do the arguments have the correct format?
+    # This check ensures the arguments have the appropriate
+    # number of objects and object types, and that all dict
+    # keys are properly named.
+    # Raise 'securesystemslib.exceptions.FormatError' if the check fail.
+    securesystemslib.formats.BOOLEAN_SCHEMA.check_match(unsafely_update_root_if_necessary)
 
-    if not valid:
-      raise securesystemslib.exceptions.BadSignatureError('Root is not signed'
-          ' by previous threshold of keys.')
+    # The metadata is not refreshed by the background thread of
+    # start_auto_refresh() at the same time.
+    with self.refresh_lock:
+      self._refresh_top_level_metadata(unsafely_update_root_if_necessary)
 
 
 
 
 
-  def _get_file(self, filepath, verify_file_function, file_type,
-    file_length, download_safely=True):
+  def _refresh_top_level_metadata(self, unsafely_update_root_if_necessary):
     """
     <Purpose>
-      Non-public method that tries downloading, up to a certain length, a
-      metadata or target file from a list of known mirrors. As soon as the first
-      valid copy of the file is found, the rest of the mirrors will be skipped.
+      Non-public method that updates the metadata of the top-level roles, as
+      described in refresh(), without taking 'self.refresh_lock'.
 
     <Arguments>
-      filepath:
-        The relative metadata or target filepath.
-
-      verify_file_function:
-        A callable function that expects a 'securesystemslib.util.TempFile'
-        file-like object and raises an exception if the file is invalid.
-        Target files and uncompressed versions of metadata may be verified with
-        'verify_file_function'.
-
-      file_type:
-        Type of data needed for download, must correspond to one of the strings
-        in the list ['meta', 'target'].  'meta' for metadata file type or
-        'target' for target file type.  It should correspond to the
-        'securesystemslib.formats.NAME_SCHEMA' format.
-
-      file_length:
-        The expected length, or upper bound, of the target or metadata file to
-        be downloaded.
-
-      download_safely:
-        A boolean switch to toggle safe or unsafe download of the file.
+      unsafely_update_root_if_necessary:
+        Boolean that indicates whether to unsafely update the Root metadata if
+        any of the top-level metadata cannot be downloaded successfully.
 
     <Exceptions>
-      tuf.exceptions.NoWorkingMirrorError:
-        The metadata could not be fetched. This is raised only when all known
-        mirrors failed to provide a valid copy of the desired metadata file.
+      See refresh().
 
     <Side Effects>
-      The file is downloaded from all known repository mirrors in the worst
-      case. If a valid copy of the file is found, it is stored in a temporary
-      file and returned.
+      Updates the metadata files of the top-level roles with the latest
+      information.
 
     <Returns>
-      A 'securesystemslib.util.TempFile' file-like object containing the metadata
-      or target.
+      None.
     """
 
-    file_mirrors = tuf.mirrors.get_list_of_mirrors(file_type, filepath,
-                                                   self.mirrors)
-    # file_mirror (URL): error (Exception)
-    file_mirror_errors = {}
-    file_object = None
-
-    for file_mirror in file_mirrors:
-      try:
-        # TODO: Instead of the more fragile 'download_safely' switch, unroll
-        # the function into two separate ones: one for "safe" download, and the
-        # other one for "unsafe" download? This should induce safer and more
-        # readable code.
-        if download_safely:
-          file_object = tuf.download.safe_download(file_mirror,
-                                                   file_length)
-        else:
-          file_object = tuf.download.unsafe_download(file_mirror,
-                                                     file_length)
+    # The Timestamp role does not have signed metadata about it; otherwise we
+    # would need an infinite regress of metadata. Therefore, we use some
+    # default, but sane, upper file length for its metadata.
+    DEFAULT_TIMESTAMP_UPPERLENGTH = tuf.settings.DEFAULT_TIMESTAMP_REQUIRED_LENGTH
 
-        # Verify 'file_object' according to the callable function.
-        # 'file_object' is also verified if decompressed above (i.e., the
-        # uncompressed version).
-        verify_file_function(file_object)
+    # The Root role may be updated without knowing its version number if
+    # top-level metadata cannot be safely downloaded (e.g., keys may have been
+    # revoked, thus requiring a new Root file that includes the updated keys)
+    # and 'unsafely_update_root_if_necessary' is True.
+    # We use some default, but sane, upper file length for its metadata.
+    DEFAULT_ROOT_UPPERLENGTH = tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH
 
-      except Exception as exception:
-        # Remember the error from this mirror, and "reset" the target file.
-        logger.exception('Update failed from ' + file_mirror + '.')
-        file_mirror_errors[file_mirror] = exception
-        file_object = None
+    # Update the top-level metadata.  The _update_metadata_if_changed() and
+    # _update_metadata() calls below do NOT perform an update if there
+    # is insufficient trusted signatures for the specified metadata.
+    # Raise 'tuf.exceptions.NoWorkingMirrorError' if an update fails.
+    root_metadata = self.metadata['current']['root']
 
-      else:
-        break
+    try:
+      self._ensure_not_expired(root_metadata, 'root')
 
-    if file_object:
-      return file_object
+    except tuf.exceptions.ExpiredMetadataError:
+      # Raise 'tuf.exceptions.NoWorkingMirrorError' if a valid (not
+      # expired, properly signed, and valid metadata) 'root.json' cannot be
+      # installed.
+      if unsafely_update_root_if_necessary:
+        logger.info('Expired Root metadata was loaded from disk.'
+          '  Try to update it now.' )
 
-    else:
-      logger.error('Failed to update {0} from all mirrors: {1}'.format(
-                   filepath, file_mirror_errors))
-      raise tuf.exceptions.NoWorkingMirrorError(file_mirror_errors)
+      # The caller explicitly requested not to unsafely fetch an expired Root.
+      else:
+        logger.info('An expired Root metadata was loaded and must be updated.')
+        raise
 
+    # TODO: How should the latest root metadata be verified?  According to the
+    # currently trusted root keys?  What if all of the currently trusted
+    # root keys have since been revoked by the latest metadata?  Alternatively,
+    # do we blindly trust the downloaded root metadata here?
+    self._update_root_metadata(root_metadata)
 
+    # Use default but sane information for timestamp metadata, and do not
+    # require strict checks on its required length.
+    self._update_metadata('timestamp', DEFAULT_TIMESTAMP_UPPERLENGTH,
+        conditional=True)
+    # TODO: After fetching snapshot.json, we should either verify the root
+    # fileinfo referenced there matches what was fetched earlier in
+    # _update_root_metadata() or make another attempt to download root.json.
+    self._update_metadata_if_changed('snapshot',
+                                     referenced_metadata='timestamp')
+    self._update_metadata_if_changed('targets')
 
 
 
-  def _update_metadata(self, metadata_role, upperbound_filelength, version=None):
+  def start_auto_refresh(self, interval=None):
     """
     <Purpose>
-      Non-public method that downloads, verifies, and 'installs' the metadata
-      belonging to 'metadata_role'.  Calling this method implies the metadata
-      has been updated by the repository and thus needs to be re-downloaded.
-      The current and previous metadata stores are updated if the newly
-      downloaded metadata is successfully downloaded and verified.
+      Start a background thread that refreshes the metadata of the top-level
+      roles, like refresh(), for long-running clients that would rather not
+      wait for refresh() while they look up targets.  The metadata is
+      refreshed every 'interval' seconds or, by default, once half of the time
+      left before the trusted timestamp metadata expires has passed (within
+      'tuf.settings.MIN_AUTO_REFRESH_INTERVAL' and
+      'tuf.settings.MAX_AUTO_REFRESH_INTERVAL').  A refresh that fails is
+      retried after 'tuf.settings.MIN_AUTO_REFRESH_INTERVAL' seconds, and its
+      exception is saved to 'self.auto_refresh_error'.
+
+      The background thread refreshes copies of the metadata stores of the
+      updater, and then replaces the stores with the copies at once.  The
+      target methods called in the meantime (e.g.,
+      get_one_valid_targetinfo()) do not wait for the refresh, and use the
+      metadata that was trusted before it until the new metadata is published.
 
     <Arguments>
-      metadata_role:
-        The name of the metadata. This is a role name and should not end
-        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
-
-      upperbound_filelength:
-        The expected length, or upper bound, of the metadata file to be
-        downloaded.
-
-      version:
-        The expected and required version number of the 'metadata_role' file
-        downloaded.  'expected_version' is an integer.
+      interval:
+        The number of seconds between two refreshes, or None to derive it from
+        the expiration of the timestamp metadata.
 
     <Exceptions>
-      tuf.exceptions.NoWorkingMirrorError:
-        The metadata cannot be updated. This is not specific to a single
-        failure but rather indicates that all possible ways to update the
-        metadata have been tried and failed.
+      securesystemslib.exceptions.FormatError:
+        If 'interval' is improperly formatted.
 
     <Side Effects>
-      The metadata file belonging to 'metadata_role' is downloaded from a
-      repository mirror.  If the metadata is valid, it is stored in the
-      metadata store.
+      A daemon thread is started, unless it is already running, in which case
+      only its interval is changed.
 
     <Returns>
       None.
     """
 
-    # Construct the metadata filename as expected by the download/mirror modules.
-    metadata_filename = metadata_role + '.json'
-    metadata_filename = metadata_filename
+    if interval is not None:
+      tuf.formats.REFRESH_INTERVAL_SCHEMA.check_match(interval)
 
-    # Attempt a file download from each mirror until the file is downloaded and
-    # verified.  If the signature of the downloaded file is valid, proceed,
-    # otherwise log a warning and try the next mirror.  'metadata_file_object'
-    # is the file-like object returned by 'download.py'.  'metadata_signable'
-    # is the object extracted from 'metadata_file_object'.  Metadata saved to
-    # files are regarded as 'signable' objects, conformant to
-    # 'tuf.formats.SIGNABLE_SCHEMA'.
-    #
-    # Some metadata (presently timestamp) will be downloaded "unsafely", in the
-    # sense that we can only estimate its true length and know nothing about
-    # its version.  This is because not all metadata will have other metadata
-    # for it; otherwise we will have an infinite regress of metadata signing
-    # for each other. In this case, we will download the metadata up to the
-    # best length we can get for it, not request a specific version, but
-    # perform the rest of the checks (e.g., signature verification).
+    self.auto_refresh_interval = interval
 
-    remote_filename = metadata_filename
-    filename_version = ''
+    if self.auto_refresh_thread is not None:
+      return
 
-    if self.consistent_snapshot and version:
-      filename_version = version
-      dirname, basename = os.path.split(remote_filename)
-      remote_filename = os.path.join(dirname, str(filename_version) + '.' + basename)
+    self.auto_refresh_stop_event = threading.Event()
+    self.auto_refresh_thread = threading.Thread(target=self._auto_refresh,
+        args=(self.auto_refresh_stop_event,),
+        name='tuf-auto-refresh-' + self.repository_name)
+    self.auto_refresh_thread.daemon = True
+    self.auto_refresh_thread.start()
 
-    metadata_file_object = \
-      self._get_metadata_file(metadata_role, remote_filename,
-        upperbound_filelength, version)
 
-    # The metadata has been verified. Move the metadata file into place.
-    # First, move the 'current' metadata file to the 'previous' directory
-    # if it exists.
-    current_filepath = os.path.join(self.metadata_directory['current'],
-                                    metadata_filename)
-    current_filepath = os.path.abspath(current_filepath)
-    securesystemslib.util.ensure_parent_dir(current_filepath)
 
-    previous_filepath = os.path.join(self.metadata_directory['previous'],
-                                     metadata_filename)
-    previous_filepath = os.path.abspath(previous_filepath)
 
-    if os.path.exists(current_filepath):
-      # Previous metadata might not exist, say when delegations are added.
-      securesystemslib.util.ensure_parent_dir(previous_filepath)
-      shutil.move(current_filepath, previous_filepath)
 
-    # Next, move the verified updated metadata file to the 'current' directory.
-    # Note that the 'move' method comes from securesystemslib.util's TempFile class.
-    # 'metadata_file_object' is an instance of securesystemslib.util.TempFile.
-    metadata_signable = \
-      securesystemslib.util.load_json_string(metadata_file_object.read().decode('utf-8'))
+  def stop_auto_refresh(self):
+    """
+    <Purpose>
+      Stop the background thread started by start_auto_refresh(), once the
+      refresh that it may be doing is finished.
 
-    metadata_file_object.move(current_filepath)
+    <Arguments>
+      None.
 
-    # Extract the metadata object so we can store it to the metadata store.
-    # 'current_metadata_object' set to 'None' if there is not an object
-    # stored for 'metadata_role'.
-    updated_metadata_object = metadata_signable['signed']
-    current_metadata_object = self.metadata['current'].get(metadata_role)
+    <Exceptions>
+      None.
 
-    self._verify_root_chain_link(metadata_role, current_metadata_object,
-                                      metadata_signable)
+    <Side Effects>
+      The background thread is stopped.
 
-    # Finally, update the metadata and fileinfo stores, and rebuild the
-    # key and role info for the top-level roles if 'metadata_role' is root.
-    # Rebuilding the the key and role info is required if the newly-installed
-    # root metadata has revoked keys or updated any top-level role information.
-    logger.debug('Updated ' + repr(current_filepath) + '.')
-    self.metadata['previous'][metadata_role] = current_metadata_object
-    self.metadata['current'][metadata_role] = updated_metadata_object
-    self._update_versioninfo(metadata_filename)
+    <Returns>
+      None.
+    """
 
-    # Ensure the role and key information of the top-level roles is also updated
-    # according to the newly-installed Root metadata.
-    if metadata_role == 'root':
-      self._rebuild_key_and_role_db()
-      self.consistent_snapshot = updated_metadata_object['consistent_snapshot']
+    if self.auto_refresh_thread is None:
+      return
+
+    self.auto_refresh_stop_event.set()
+    self.auto_refresh_thread.join()
+    self.auto_refresh_thread = None
+    self.auto_refresh_stop_event = None
+
+
+
+
+
+  def _auto_refresh(self, stop_event):
+    """
+    <Purpose>
+      Non-public method, run by the background thread of
+      start_auto_refresh(), that refreshes the metadata of the top-level
+      roles on schedule until 'stop_event' is set.
+
+    <Arguments>
+      stop_event:
+        The 'threading.Event' that stops the thread.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The metadata of the top-level roles is refreshed and published.
+
+    <Returns>
+      None.
+    """
+
+    while not stop_event.wait(self._get_auto_refresh_delay()):
+      try:
+        self._refresh_and_publish()
+
+      except Exception as e:
+        logger.warning('Could not refresh the metadata of ' +
+            repr(self.repository_name) + ' in the background: ' + repr(e))
+        self.auto_refresh_error = e
+
+      else:
+        self.auto_refresh_error = None
+
+
+
+
+
+  def _get_auto_refresh_delay(self):
+    """
+    <Purpose>
+      Non-public method that returns the number of seconds until the next
+      refresh of the background thread of start_auto_refresh().
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The number of seconds.
+    """
+
+    if self.auto_refresh_error is not None:
+      return tuf.settings.MIN_AUTO_REFRESH_INTERVAL
+
+    if self.auto_refresh_interval is not None:
+      return self.auto_refresh_interval
+
+    timestamp = self.metadata['current'].get('timestamp')
+
+    if timestamp is None:
+      return tuf.settings.MIN_AUTO_REFRESH_INTERVAL
+
+    remaining_seconds = \
+      self._get_expiration_timestamp(timestamp['expires']) - time.time()
+
+    return min(max(remaining_seconds / 2,
+        tuf.settings.MIN_AUTO_REFRESH_INTERVAL),
+        tuf.settings.MAX_AUTO_REFRESH_INTERVAL)
+
+
+
+
+
+  def _refresh_and_publish(self):
+    """
+    <Purpose>
+      Non-public method that refreshes the metadata of the top-level roles in
+      copies of the metadata stores of the updater, and then publishes the
+      copies, so that the metadata trusted by the target methods changes at
+      once rather than role by role.
+
+      The stores are replaced in an order that keeps the target methods
+      called meanwhile from downloading metadata again: the version numbers
+      of the newly trusted metadata are published before the metadata that
+      lists them.  The copies have their own target cache and compiled
+      delegations, which are published with them.  The delegated metadata
+      loaded by the target methods during the refresh is loaded again from
+      disk when it is next used.  The target methods do not install the
+      targets metadata during the refresh (see _update_targets_metadata()).
+      If a new root is installed, the key and role databases are rebuilt
+      under a staged repository name, with the delegations of the targets
+      metadata in memory, and replace those of the updater when the metadata
+      is published.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      Any of the exceptions raised by refresh().
+
+    <Side Effects>
+      The metadata of the top-level roles is refreshed, and the metadata
+      stores of the updater are replaced.
+
+    <Returns>
+      None.
+    """
+
+    with self.refresh_lock:
+      staged_updater = copy.copy(self)
+      staged_updater.metadata = {'current': dict(self.metadata['current']),
+          'previous': dict(self.metadata['previous'])}
+      staged_updater.versioninfo = dict(self.versioninfo)
+      staged_updater.fileinfo = dict(self.fileinfo)
+      staged_updater.validators = dict(self.validators)
+      staged_updater.fresh_roles = dict(self.fresh_roles)
+      staged_updater.delegated_roles_in_memory = \
+        collections.OrderedDict(self.delegated_roles_in_memory)
+      staged_updater.delegation_matchers = dict(self.delegation_matchers)
+      staged_updater.target_cache = _TargetCache(self.target_cache.maxsize)
+      staged_updater.mirrors = dict(self.mirrors)
+      staged_updater.staged_repository_name = \
+        self.repository_name + ' (staged)'
+
+      try:
+        staged_updater._refresh_top_level_metadata(True)
+
+        # The staged databases, rebuilt from a new root, hold the delegations
+        # of the targets metadata updated during the refresh.  Those of the
+        # other targets metadata in memory are imported before they are
+        # published, so that the delegated roles stay known.
+        if staged_updater.repository_name != self.repository_name:
+          for rolename, metadata_object in \
+              six.iteritems(staged_updater.metadata['current']):
+            if metadata_object['_type'] == 'targets' and \
+                metadata_object is self.metadata['current'].get(rolename):
+              staged_updater._import_delegations(rolename)
+
+      except Exception:
+        if staged_updater.repository_name != self.repository_name:
+          tuf.keydb.remove_keydb(staged_updater.repository_name)
+          tuf.roledb.remove_roledb(staged_updater.repository_name)
+
+        raise
+
+      self.versioninfo = staged_updater.versioninfo
+      self.fileinfo = staged_updater.fileinfo
+      self.validators = staged_updater.validators
+      self.fresh_roles = staged_updater.fresh_roles
+      self.delegated_roles_in_memory = staged_updater.delegated_roles_in_memory
+      self.delegation_matchers = staged_updater.delegation_matchers
+      self.consistent_snapshot = staged_updater.consistent_snapshot
+
+      # The hits and misses of the target cache are carried over.
+      staged_updater.target_cache.hits = self.target_cache.hits
+      staged_updater.target_cache.misses = self.target_cache.misses
+      self.target_cache = staged_updater.target_cache
+
+      if staged_updater.repository_name != self.repository_name:
+        tuf.keydb.replace_keydb(self.repository_name,
+            staged_updater.repository_name)
+        tuf.roledb.replace_roledb(self.repository_name,
+            staged_updater.repository_name)
+
+      # The target methods see the new metadata from here.
+      self.metadata = staged_updater.metadata
+
+
+
+
+
+  def _update_root_metadata(self, current_root_metadata):
+    """
+    <Purpose>
+      The root file must be signed by the current root threshold and keys as
+      well as the previous root threshold and keys. The update process for root
+      files means that each intermediate root file must be downloaded, to build
+      a chain of trusted root keys from keys already trusted by the client:
+
+        1.root -> 2.root -> 3.root
+
+      3.root must be signed by the threshold and keys of 2.root, and 2.root
+      must be signed by the threshold and keys of 1.root.
+
+    <Arguments>
+      current_root_metadata:
+        The currently held version of root.
+
+    <Side Effects>
+      Updates the root metadata files with the latest information.
+
+    <Returns>
+      None.
+    """
+
+    # Retrieve the latest, remote root.json, unless it is known to be the
+    # currently held version.
+    if tuf.settings.CONDITIONAL_METADATA_REQUESTS:
+      validators = self.validators
+
+    else:
+      validators = None
+
+    try:
+      latest_root_metadata_file, latest_root_metadata = \
+        self._get_metadata_file('root', 'root.json',
+          tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH, None, validators)
+
+    except tuf.exceptions.NotModifiedError:
+      logger.info('root.json has not changed.')
+      return
+
+    # Only the version number of the latest root is needed.
+    latest_root_metadata_file.close_temp_file()
+
+    if validators is not None:
+      self._save_validators()
+
+
+    next_version = current_root_metadata['version'] + 1
+    latest_version = latest_root_metadata['signed']['version']
+
+    # update from the next version of root up to (and including) the latest
+    # version.  For example:
+    # current = version 1
+    # latest = version 3
+    # update from 1.root.json to 3.root.json.
+    for version in range(next_version, latest_version + 1):
+      # Temporarily set consistent snapshot. Will be updated to whatever is set
+      # in the latest root.json after running through the intermediates with
+      # _update_metadata().
+      self.consistent_snapshot = True
+      self._update_metadata('root', tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH,
+          version=version)
+
+
+
+  def _check_hashes(self, file_object, trusted_hashes, digest_objects=None):
+    """
+    <Purpose>
+      Non-public method that verifies multiple secure hashes of the downloaded
+      file 'file_object'.  If any of these fail it raises an exception.  This is
+      to conform with the TUF spec, which support clients with different hashing
+      algorithms. The 'hash.py' module is used to compute the hashes of
+      'file_object'.
+
+    <Arguments>
+      file_object:
+        A 'securesystemslib.util.TempFile' file-like object.  'file_object' ensures that a
+        read() without a size argument properly reads the entire file.
+
+      trusted_hashes:
+        A dictionary with hash-algorithm names as keys and hashes as dict values.
+        The hashes should be in the hexdigest format.  Should be Conformant to
+        'securesystemslib.formats.HASHDICT_SCHEMA'.
+
+      digest_objects:
+        An optional dictionary of hash algorithms to digest objects that were
+        updated with the contents of 'file_object' while it was downloaded
+        (see tuf.download.safe_download()).  If given, 'file_object' is not
+        read again.
+
+    <Exceptions>
+      securesystemslib.exceptions.BadHashError, if the hashes don't match.
+
+    <Side Effects>
+      Hash digest object is created using the 'securesystemslib.hash' module.
+
+    <Returns>
+      None.
+    """
+
+    # Hash 'file_object' in a single pass, a chunk at a time, if its hashes
+    # were not already computed while it was downloaded.
+    if digest_objects is None:
+      digest_objects = self._new_digest_objects(trusted_hashes)
+      file_object.seek(0)
+
+      while True:
+        data = file_object.read(tuf.settings.CHUNK_SIZE)
+
+        if not data:
+          break
+
+        for digest_object in six.itervalues(digest_objects):
+          digest_object.update(data)
+
+      file_object.seek(0)
+
+    # Verify each trusted hash of 'trusted_hashes'.  If all are valid, simply
+    # return.
+    for algorithm, trusted_hash in six.iteritems(trusted_hashes):
+      computed_hash = digest_objects[algorithm].hexdigest()
+
+      # Raise an exception if any of the hashes are incorrect.
+      if trusted_hash != computed_hash:
+        raise securesystemslib.exceptions.BadHashError(trusted_hash, computed_hash)
+      else:
+        logger.info('The file\'s ' + algorithm + ' hash is correct: ' + trusted_hash)
+
+
+
+
+
+  def _new_digest_objects(self, trusted_hashes):
+    """
+    <Purpose>
+      Non-public method that returns a dictionary of new digest objects, one
+      for each of the hash algorithms listed in 'trusted_hashes'.
+
+    <Arguments>
+      trusted_hashes:
+        A dictionary with hash-algorithm names as keys and hashes as dict
+        values.  Should be Conformant to
+        'securesystemslib.formats.HASHDICT_SCHEMA'.
+
+    <Exceptions>
+      securesystemslib.exceptions.UnsupportedAlgorithmError, if a hash
+      algorithm is not supported.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A dictionary with hash-algorithm names as keys and digest objects as
+      values.
+    """
+
+    digest_objects = {}
+
+    for algorithm in trusted_hashes:
+      digest_objects[algorithm] = securesystemslib.hash.digest(algorithm)
+
+    return digest_objects
+
+
+
+
+
+  def _get_file_length(self, file_object):
+    """
+    <Purpose>
+      Non-public method that returns the length of 'file_object' as stored on
+      disk, so that its contents need not be read into memory.
+
+    <Arguments>
+      file_object:
+        A 'securesystemslib.util.TempFile' file-like object.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      Any buffered writes to 'file_object' are flushed.
+
+    <Returns>
+      The length of 'file_object', in bytes.
+    """
+
+    file_object.flush()
+
+    return file_object.get_compressed_length()
+
+
+
+
+
+  def _hard_check_file_length(self, file_object, trusted_file_length):
+    """
+    <Purpose>
+      Non-public method that ensures the length of 'file_object' is strictly
+      equal to 'trusted_file_length'.  This is a deliberately redundant
+      implementation designed to complement
+      tuf.download._check_downloaded_length().
+
+    <Arguments>
+      file_object:
+        A 'securesystemslib.util.TempFile' file-like object.  'file_object'
+        ensures that a read() without a size argument properly reads the entire
+        file.
+
+      trusted_file_length:
+        A non-negative integer that is the trusted length of the file.
+
+    <Exceptions>
+      tuf.exceptions.DownloadLengthMismatchError, if the lengths do not match.
+
+    <Side Effects>
+      Flushes 'file_object' and logs a message if 'file_object' matches the
+      trusted length.
+
+    <Returns>
+      None.
+    """
+
+    # Determine the length of 'file_object' from the file system, rather than
+    # reading its entire contents into memory.
+    observed_length = self._get_file_length(file_object)
+
+    # Return and log a message if the length 'file_object' is equal to
+    # 'trusted_file_length', otherwise raise an exception.  A hard check
+    # ensures that a downloaded file strictly matches a known, or trusted,
+    # file length.
+    if observed_length != trusted_file_length:
+      raise tuf.exceptions.DownloadLengthMismatchError(trusted_file_length,
+                                            observed_length)
+    else:
+      logger.debug('Observed length ('+str(observed_length)+\
+                   ') == trusted length ('+str(trusted_file_length)+')')
+
+
+
+
+
+  def _soft_check_file_length(self, file_object, trusted_file_length):
+    """
+    <Purpose>
+      Non-public method that checks the trusted file length of a
+      'securesystemslib.util.TempFile' file-like object. The length of the file
+      must be less than or equal to the expected length. This is a deliberately
+      redundant implementation designed to complement
+      tuf.download._check_downloaded_length().
+
+    <Arguments>
+      file_object:
+        A 'securesystemslib.util.TempFile' file-like object.  'file_object'
+        ensures that a read() without a size argument properly reads the entire
+        file.
+
+      trusted_file_length:
+        A non-negative integer that is the trusted length of the file.
+
+    <Exceptions>
+      tuf.exceptions.DownloadLengthMismatchError, if the lengths do
+      not match.
+
+    <Side Effects>
+      Flushes 'file_object' and logs a message if 'file_object' is less than
+      or equal to the trusted length.
+
+    <Returns>
+      None.
+    """
+
+    # Determine the length of 'file_object' from the file system, rather than
+    # reading its entire contents into memory.
+    observed_length = self._get_file_length(file_object)
+
+    # Return and log a message if 'file_object' is less than or equal to
+    # 'trusted_file_length', otherwise raise an exception.  A soft check
+    # ensures that an upper bound restricts how large a file is downloaded.
+    if observed_length > trusted_file_length:
+      raise tuf.exceptions.DownloadLengthMismatchError(trusted_file_length,
+                                            observed_length)
+    else:
+      logger.debug('Observed length ('+str(observed_length)+\
+                   ') <= trusted length ('+str(trusted_file_length)+')')
+
+
+
+
+
+  def _get_target_file(self, target_filepath, file_length, file_hashes,
+      temp_directory=None):
+    """
+    <Purpose>
+      Non-public method that safely (i.e., the file length and hash are strictly
+      equal to the trusted) downloads a target file up to a certain length, and
+      checks its hashes thereafter.
+
+    <Arguments>
+      target_filepath:
+        The target filepath (relative to the repository targets directory)
+        obtained from TUF targets metadata.
+
+      file_length:
+        The expected compressed length of the target file. If the file is not
+        compressed, then it will simply be its uncompressed length.
+
+      file_hashes:
+        The expected hashes of the target file.
+
+      temp_directory:
+        The directory in which the target is downloaded, or None for the
+        default temporary directory.  See tuf.download.safe_download().
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        The target could not be fetched. This is raised only when all known
+        mirrors failed to provide a valid copy of the desired target file.
+
+    <Side Effects>
+      The target file is downloaded from all known repository mirrors in the
+      worst case. If a valid copy of the target file is found, it is stored in
+      a temporary file and returned.  A target of at least
+      'tuf.settings.SEGMENTED_DOWNLOAD_MIN_LENGTH' bytes is first downloaded
+      in segments, one from each mirror, concurrently.
+
+    <Returns>
+      A 'securesystemslib.util.TempFile' file-like object containing the target.
+    """
+
+    # Define a callable function that is passed as an argument to _get_file()
+    # and called.  The 'verify_target_file' function ensures the file length
+    # of 'target_filepath' is strictly equal to the trusted value.  Its hashes
+    # are computed while it is downloaded, and checked by _get_file().
+    def verify_target_file(target_file_object):
+
+      # Every target file must have its length inspected.
+      self._hard_check_file_length(target_file_object, file_length)
+
+    if self.consistent_snapshot:
+      target_digest = random.choice(list(file_hashes.values()))
+      dirname, basename = os.path.split(target_filepath)
+      target_filepath = os.path.join(dirname, target_digest + '.' + basename)
+
+    # A large target is downloaded in segments from several mirrors at once,
+    # if there is more than one.  If that fails (e.g., because the mirrors do
+    # not support range requests), the whole file is downloaded from one
+    # mirror at a time instead.
+    if tuf.settings.SEGMENTED_DOWNLOAD_MIN_LENGTH is not None and \
+        file_length >= tuf.settings.SEGMENTED_DOWNLOAD_MIN_LENGTH:
+      file_mirrors = tuf.mirrors.get_list_of_mirrors('target',
+          target_filepath, self.mirrors)
+
+      if len(file_mirrors) > 1 and file_length > 0:
+        try:
+          return self._get_target_file_segmented(target_filepath, file_length,
+              file_hashes, file_mirrors, temp_directory)
+
+        except tuf.exceptions.NoWorkingMirrorError:
+          logger.warning('Could not download ' + repr(target_filepath) +
+            ' in segments.  Downloading it from one mirror at a time.')
+
+    return self._get_file(target_filepath, verify_target_file,
+        'target', file_length, download_safely=True,
+        trusted_hashes=file_hashes, temp_directory=temp_directory)
+
+
+
+
+
+  def _get_target_file_segmented(self, target_filepath, file_length,
+      file_hashes, file_mirrors, temp_directory=None):
+    """
+    <Purpose>
+      Non-public method that downloads a target file in segments, one from
+      each of 'file_mirrors', concurrently.  The segments are written into a
+      single file that is preallocated to the trusted length.  A segment that
+      fails is downloaded again from the next mirror.  The assembled file must
+      match the trusted length and hashes.
+
+    <Arguments>
+      target_filepath:
+        The target filepath, as it is found on the mirrors.
+
+      file_length:
+        The expected length of the target file.
+
+      file_hashes:
+        The expected hashes of the target file.
+
+      file_mirrors:
+        The mirror URLs of the target file, in order of preference.
+
+      temp_directory:
+        The directory in which the target is downloaded, or None for the
+        default temporary directory.  See tuf.download.safe_download().
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        A segment could not be downloaded from any of the mirrors, or the
+        assembled file is invalid.
+
+    <Side Effects>
+      Worker threads download the segments of the target file.
+
+    <Returns>
+      A 'securesystemslib.util.TempFile' file-like object containing the target.
+    """
+
+    number_of_segments = min(len(file_mirrors), file_length)
+    segment_length = -(-file_length // number_of_segments)
+    segments = [(offset, min(segment_length, file_length - offset))
+                for offset in range(0, file_length, segment_length)]
+
+    if temp_directory is None:
+      temp_file = securesystemslib.util.TempFile()
+
+    else:
+      temp_file = tuf.download.DestinationTempFile(temp_directory)
+
+    temp_file.seek(file_length - 1)
+    temp_file.write(b'\0')
+
+    file_lock = threading.Lock()
+    cancel_event = threading.Event()
+
+    # file_mirror (URL): error (Exception)
+    file_mirror_errors = {}
+    failed_segments = []
+
+    def download_segment(segment_index):
+      offset, length = segments[segment_index]
+
+      # Segment i starts with the i-th mirror, so that every mirror serves a
+      # different segment, and moves on to the next mirror if it fails.
+      for attempt in range(len(file_mirrors)):
+        file_mirror = \
+          file_mirrors[(segment_index + attempt) % len(file_mirrors)]
+        start_time = timeit.default_timer()
+
+        try:
+          tuf.download.download_segment(file_mirror, offset, length,
+              temp_file, file_lock, cancel_event=cancel_event,
+              fetcher=self.fetcher)
+
+        except Exception as exception:
+          if cancel_event.is_set():
+            return
+
+          logger.exception('Segment update failed from ' + file_mirror + '.')
+          with file_lock:
+            file_mirror_errors[file_mirror] = exception
+          tuf.mirrors.record_failure(file_mirror)
+
+        else:
+          tuf.mirrors.record_success(file_mirror,
+              timeit.default_timer() - start_time, length)
+          return
+
+      # No mirror could serve this segment, so the download has failed.
+      with file_lock:
+        failed_segments.append(segment_index)
+      cancel_event.set()
+
+    threads = []
+    for segment_index in range(len(segments)):
+      thread = threading.Thread(target=download_segment, args=(segment_index,))
+      thread.daemon = True
+      thread.start()
+      threads.append(thread)
+
+    for thread in threads:
+      thread.join()
+
+    if not failed_segments:
+      try:
+        self._hard_check_file_length(temp_file, file_length)
+        self._check_hashes(temp_file, file_hashes)
+
+      except Exception as exception:
+        # There is no way to tell which of the mirrors served the bad data.
+        logger.exception('Segmented update of ' + repr(target_filepath) +
+          ' failed.')
+        for file_mirror in file_mirrors:
+          file_mirror_errors[file_mirror] = exception
+
+      else:
+        return temp_file
+
+    temp_file.close_temp_file()
+    logger.error('Failed to update {0} in segments: {1}'.format(
+                 target_filepath, file_mirror_errors))
+    raise tuf.exceptions.NoWorkingMirrorError(file_mirror_errors)
+
+
+
+
+
+  def _get_target_file_resumably(self, target_filepath, file_length,
+      file_hashes, spool_filepath):
+    """
+    <Purpose>
+      Non-public method that downloads a target file to 'spool_filepath', like
+      _get_target_file(), but resumes the download with the data that is
+      already in 'spool_filepath' instead of starting over from byte zero.
+      The data received from a mirror is kept if the download fails, and the
+      next mirror continues from where it stopped.
+
+    <Arguments>
+      target_filepath:
+        The target filepath (relative to the repository targets directory)
+        obtained from TUF targets metadata.
+
+      file_length:
+        The expected length of the target file.
+
+      file_hashes:
+        The expected hashes of the target file.
+
+      spool_filepath:
+        The path of the file that holds the partially downloaded target.
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        The target could not be fetched. This is raised only when all known
+        mirrors failed to provide a valid copy of the desired target file.
+        The data received so far is left in 'spool_filepath'.
+
+    <Side Effects>
+      The target file is downloaded to 'spool_filepath'.  A complete spool file
+      whose length or hashes do not match the trusted ones is discarded.
+
+    <Returns>
+      None.
+    """
+
+    if self.consistent_snapshot:
+      target_digest = random.choice(list(file_hashes.values()))
+      dirname, basename = os.path.split(target_filepath)
+      target_filepath = os.path.join(dirname, target_digest + '.' + basename)
+
+    file_mirrors = tuf.mirrors.get_list_of_mirrors('target', target_filepath,
+                                                   self.mirrors)
+
+    # Hash the data that a previous download left in the spool file, so that
+    # the digest objects can be updated with the rest of the file as it is
+    # downloaded.
+    digest_objects = self._new_digest_objects(file_hashes)
+
+    if os.path.exists(spool_filepath) and \
+        os.path.getsize(spool_filepath) <= file_length:
+      with open(spool_filepath, 'rb') as spool_file:
+        while True:
+          data = spool_file.read(tuf.settings.CHUNK_SIZE)
+
+          if not data:
+            break
+
+          for digest_object in six.itervalues(digest_objects):
+            digest_object.update(data)
+
+    # file_mirror (URL): error (Exception)
+    file_mirror_errors = {}
+
+    for file_mirror in file_mirrors:
+      start_time = timeit.default_timer()
+
+      resumed_length = 0
+      if os.path.exists(spool_filepath):
+        resumed_length = min(os.path.getsize(spool_filepath), file_length)
+
+      try:
+        tuf.download.resumable_download(file_mirror, file_length,
+            spool_filepath, digest_objects=digest_objects,
+            fetcher=self.fetcher)
+
+      except Exception as exception:
+        # Keep the data received so far for the next mirror.
+        logger.exception('Update failed from ' + file_mirror + '.')
+        file_mirror_errors[file_mirror] = exception
+        tuf.mirrors.record_failure(file_mirror)
+        continue
+
+      try:
+        # The spool file is complete.  Its length and hashes must match the
+        # trusted ones before it is moved into place.
+        observed_length = os.path.getsize(spool_filepath)
+        if observed_length != file_length:
+          raise tuf.exceptions.DownloadLengthMismatchError(file_length,
+                                                          observed_length)
+
+        with open(spool_filepath, 'rb') as spool_file:
+          self._check_hashes(spool_file, file_hashes, digest_objects)
+
+      except Exception as exception:
+        # Some of the data in the spool file is bad, and we cannot tell which
+        # part.  Start over with the next mirror.
+        logger.exception('Update failed from ' + file_mirror + '.')
+        file_mirror_errors[file_mirror] = exception
+        os.remove(spool_filepath)
+        digest_objects = self._new_digest_objects(file_hashes)
+        tuf.mirrors.record_failure(file_mirror)
+
+      else:
+        tuf.mirrors.record_success(file_mirror,
+            timeit.default_timer() - start_time, file_length - resumed_length)
+        return
+
+    logger.error('Failed to update {0} from all mirrors: {1}'.format(
+                 target_filepath, file_mirror_errors))
+    raise tuf.exceptions.NoWorkingMirrorError(file_mirror_errors)
+
+
+
+
+
+  def _verify_uncompressed_metadata_file(self, metadata_file_object,
+                                         metadata_role, metadata_signable=None):
+    """
+    <Purpose>
+      Non-public method that verifies an uncompressed metadata file.  An
+      exception is raised if 'metadata_file_object is invalid.  There is no
+      return value.
+
+    <Arguments>
+      metadata_file_object:
+        A 'securesystemslib.util.TempFile' instance containing the metadata file.
+        'metadata_file_object' ensures the entire file is returned with read().
+
+      metadata_role:
+        The role name of the metadata (e.g., 'root', 'targets',
+        'unclaimed').
+
+      metadata_signable:
+        The metadata already loaded from 'metadata_file_object' with
+        _load_metadata_signable(), if any, so that it is not parsed again.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        In case the metadata file is valid JSON, but not valid TUF metadata.
+
+      tuf.exceptions.InvalidMetadataJSONError:
+        In case the metadata file is not valid JSON.
+
+      tuf.exceptions.ReplayedMetadataError:
+        In case the downloaded metadata file is older than the current one.
+
+      tuf.exceptions.RepositoryError:
+        In case the repository is somehow inconsistent; e.g. a parent has not
+        delegated to a child (contrary to expectations).
+
+      tuf.SignatureError:
+        In case the metadata file does not have a valid signature.
+
+    <Side Effects>
+      The content of 'metadata_file_object' is read and loaded.
+
+    <Returns>
+      None.
+    """
+
+    if metadata_signable is None:
+      metadata_signable = self._load_metadata_signable(metadata_file_object)
+
+    # Ensure the loaded 'metadata_signable' is properly formatted.  Raise
+    # 'securesystemslib.exceptions.FormatError' if not.
+    tuf.formats.check_signable_object_format(metadata_signable)
+
+    # Is 'metadata_signable' expired?
+    self._ensure_not_expired(metadata_signable['signed'], metadata_role)
+
+    # We previously verified version numbers in this function, but have since
+    # moved version number verification to the functions that retrieve
+    # metadata.
+
+    # Verify the signature on the downloaded metadata object.
+
+    valid = tuf.sig.verify(metadata_signable, metadata_role, self.repository_name)
+
+    if not valid:
+      raise securesystemslib.exceptions.BadSignatureError(metadata_role)
+
+
+
+
+
+  def _load_metadata_signable(self, metadata_file_object):
+    """
+    <Purpose>
+      Non-public method that parses the JSON metadata in
+      'metadata_file_object'.  The bytes of the file are parsed directly,
+      without first decoding them into a string, which would be a second copy
+      of a possibly large file.
+
+    <Arguments>
+      metadata_file_object:
+        A 'securesystemslib.util.TempFile' instance containing the metadata file.
+
+    <Exceptions>
+      tuf.exceptions.InvalidMetadataJSONError:
+        In case the metadata file is not valid JSON.
+
+    <Side Effects>
+      The content of 'metadata_file_object' is read.
+
+    <Returns>
+      The metadata, which should be conformant to 'tuf.formats.SIGNABLE_SCHEMA'.
+    """
+
+    metadata = metadata_file_object.read()
+
+    # json.loads() parses bytes, in UTF-8 (or UTF-16/32), in Python 2.7 and
+    # Python 3.6+ only.
+    if six.PY3 and sys.version_info < (3, 6): # pragma: no cover
+      metadata = metadata.decode('utf-8')
+
+    try:
+      return json.loads(metadata)
+
+    except Exception as exception:
+      raise tuf.exceptions.InvalidMetadataJSONError(exception)
+
+
+
+
+
+  def _get_metadata_file(self, metadata_role, remote_filename,
+    upperbound_filelength, expected_version, validators=None):
+    """
+    <Purpose>
+      Non-public method that tries downloading, up to a certain length, a
+      metadata file from a list of known mirrors. As soon as the first valid
+      copy of the file is found, the downloaded file is returned and the
+      remaining mirrors are skipped.
+
+    <Arguments>
+      metadata_role:
+        The role name of the metadata (e.g., 'root', 'targets', 'unclaimed').
+
+      remote_filename:
+        The relative file path (on the remove repository) of 'metadata_role'.
+
+      upperbound_filelength:
+        The expected length, or upper bound, of the metadata file to be
+        downloaded.
+
+      expected_version:
+        The expected and required version number of the 'metadata_role' file
+        downloaded.  'expected_version' is an integer.
+
+      validators:
+        An optional dictionary of mirror URLs to the HTTP cache validators of
+        the file last downloaded from each mirror, and its version number.  A
+        mirror whose validators are for the currently trusted version is sent
+        a conditional request.  The dictionary is updated with the validators
+        of the downloaded file.
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        The metadata could not be fetched. This is raised only when all known
+        mirrors failed to provide a valid copy of the desired metadata file.
+
+      tuf.exceptions.NotModifiedError:
+        A mirror reported that the currently trusted version of the file is
+        unchanged, and it has not expired.
+
+    <Side Effects>
+      The file is downloaded from all known repository mirrors in the worst
+      case. If a valid copy of the file is found, it is stored in a temporary
+      file and returned.
+
+    <Returns>
+      A (file_object, metadata_signable) tuple, where 'file_object' is a
+      'securesystemslib.util.TempFile' file-like object containing the
+      metadata, and 'metadata_signable' the verified metadata loaded from it.
+    """
+
+    file_mirrors = tuf.mirrors.get_list_of_mirrors('meta', remote_filename,
+                                                   self.mirrors)
+
+    # The metadata loaded from each downloaded file, so that the file that is
+    # returned is parsed only once.
+    metadata_signables = {}
+
+    # Define a callable function that is passed as an argument to
+    # _download_from_mirrors() and called for each mirror.  It returns the
+    # downloaded file once it is verified.
+    def download_metadata_file(file_mirror, cancel_event):
+      current_metadata = self.metadata['current'].get(metadata_role)
+      request_validators = None
+
+      # The validators of the mirror are only sent if they are for the
+      # currently trusted version, which the mirror may then report unchanged.
+      # Expired metadata is always downloaded in full, since it could not be
+      # kept if the mirror reported it unchanged (e.g., an expired root must
+      # be replaced by the latest root to be trusted again).
+      if validators is not None:
+        request_validators = {}
+        mirror_validators = validators.get(file_mirror, {})
+
+        if current_metadata is not None and 'ETag' in mirror_validators and \
+            mirror_validators.get('version') == current_metadata['version']:
+          try:
+            self._ensure_not_expired(current_metadata, metadata_role)
+
+          except tuf.exceptions.ExpiredMetadataError:
+            logger.info('The trusted ' + repr(metadata_role) + ' metadata'
+                ' has expired.  It is not requested conditionally.')
+
+          else:
+            request_validators['ETag'] = mirror_validators['ETag']
+
+      try:
+        file_object = tuf.download.unsafe_download(file_mirror,
+            upperbound_filelength, cancel_event=cancel_event,
+            validators=request_validators,
+            accept_compression=tuf.settings.COMPRESSED_METADATA_TRANSFER,
+            fetcher=self.fetcher)
+
+      except tuf.exceptions.NotModifiedError:
+        # The trusted metadata is still the latest, so only its expiration
+        # must be checked again.  Expired metadata is treated as it would be if
+        # it were downloaded again.
+        self._ensure_not_expired(current_metadata, metadata_role)
+        raise
+
+      # Verify 'file_object' according to the callable function.
+      # 'file_object' is also verified if decompressed above (i.e., the
+      # uncompressed version).  A mirror that sent invalid JSON is reported
+      # with 'securesystemslib.exceptions.Error', as
+      # securesystemslib.util.load_json_string() would.
+      try:
+        metadata_signable = self._load_metadata_signable(file_object)
+
+      except tuf.exceptions.InvalidMetadataJSONError as exception:
+        raise securesystemslib.exceptions.Error('Cannot deserialize to a'
+            ' Python object: ' + str(exception))
+
+      # Determine if the specification version number is supported.  It is
+      # assumed that "spec_version" is in (major.minor.fix) format, (for
+      # example: "1.4.3") and that releases with the same major version
+      # number maintain backwards compatibility.  Consequently, if the major
+      # version number of new metadata equals our expected major version
+      # number, the new metadata is safe to parse.
+      try:
+        spec_version_parsed = metadata_signable['signed']['spec_version'].split('.')
+        if int(spec_version_parsed[0]) != SUPPORTED_MAJOR_VERSION:
+          raise securesystemslib.exceptions.BadVersionNumberError('Downloaded'
+            ' metadata that specifies an unsupported spec_version.  Supported'
+            ' major version number: ' + repr(SUPPORTED_MAJOR_VERSION))
+
+      except (ValueError, TypeError):
+        raise securesystemslib.exceptions.FormatError('Improperly'
+          ' formatted spec_version, which must be in major.minor.fix format')
+
+      # If the version number is unspecified, ensure that the version number
+      # downloaded is greater than the currently trusted version number for
+      # 'metadata_role'.
+      version_downloaded = metadata_signable['signed']['version']
+
+      if expected_version is not None:
+        # Verify that the downloaded version matches the version expected by
+        # the caller.
+        if version_downloaded != expected_version:
+          raise securesystemslib.exceptions.BadVersionNumberError('Downloaded'
+            ' version number: ' + repr(version_downloaded) + '.  Version'
+            ' number MUST be: ' + repr(expected_version))
+
+      # The caller does not know which version to download.  Verify that the
+      # downloaded version is at least greater than the one locally available.
+      else:
+        # Verify that the version number of the locally stored
+        # 'timestamp.json', if available, is less than what was downloaded.
+        # Otherwise, accept the new timestamp with version number
+        # 'version_downloaded'.
+
+        try:
+          current_version = \
+            self.metadata['current'][metadata_role]['version']
+
+          if version_downloaded < current_version:
+            raise tuf.exceptions.ReplayedMetadataError(metadata_role, version_downloaded,
+                                            current_version)
+
+        except KeyError:
+          logger.info(metadata_role + ' not available locally.')
+
+      self._verify_uncompressed_metadata_file(file_object, metadata_role,
+          metadata_signable)
+
+      if validators is not None:
+        request_validators['version'] = version_downloaded
+        validators[file_mirror] = request_validators
+
+      metadata_signables[file_object] = metadata_signable
+
+      return file_object
+
+    file_object = self._download_from_mirrors(remote_filename, file_mirrors,
+        download_metadata_file,
+        hedged=tuf.settings.HEDGED_REQUEST_DELAY is not None)
+
+    return file_object, metadata_signables[file_object]
+
+
+
+
+
+  def _verify_root_chain_link(self, role, current, next):
+    if role != 'root':
+      return True
+
+    current_role = current['roles'][role]
+
+    # Verify next metadata with current keys/threshold
+    valid = tuf.sig.verify(next, role, self.repository_name,
+                           current_role['threshold'], current_role['keyids'])
+
+    if not valid:
+      raise securesystemslib.exceptions.BadSignatureError('Root is not signed'
+          ' by previous threshold of keys.')
+
+
+
+
+
+  def _get_file(self, filepath, verify_file_function, file_type,
+    file_length, download_safely=True, trusted_hashes=None,
+    temp_directory=None):
+    """
+    <Purpose>
+      Non-public method that tries downloading, up to a certain length, a
+      metadata or target file from a list of known mirrors. As soon as the first
+      valid copy of the file is found, the rest of the mirrors will be skipped.
+
+    <Arguments>
+      filepath:
+        The relative metadata or target filepath.
+
+      verify_file_function:
+        A callable function that expects a 'securesystemslib.util.TempFile'
+        file-like object and raises an exception if the file is invalid.
+        Target files and uncompressed versions of metadata may be verified with
+        'verify_file_function'.
+
+      file_type:
+        Type of data needed for download, must correspond to one of the strings
+        in the list ['meta', 'target'].  'meta' for metadata file type or
+        'target' for target file type.  It should correspond to the
+        'securesystemslib.formats.NAME_SCHEMA' format.
+
+      file_length:
+        The expected length, or upper bound, of the target or metadata file to
+        be downloaded.
+
+      download_safely:
+        A boolean switch to toggle safe or unsafe download of the file.
+
+      trusted_hashes:
+        An optional dictionary with hash-algorithm names as keys and hashes as
+        dict values.  If given, the hashes of the file are computed while it is
+        downloaded, and must match 'trusted_hashes'.
+
+      temp_directory:
+        The directory in which the file is downloaded, or None for the
+        default temporary directory.  See tuf.download.safe_download().
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        The metadata could not be fetched. This is raised only when all known
+        mirrors failed to provide a valid copy of the desired metadata file.
+
+    <Side Effects>
+      The file is downloaded from all known repository mirrors in the worst
+      case. If a valid copy of the file is found, it is stored in a temporary
+      file and returned.
+
+    <Returns>
+      A 'securesystemslib.util.TempFile' file-like object containing the metadata
+      or target.
+    """
+
+    file_mirrors = tuf.mirrors.get_list_of_mirrors(file_type, filepath,
+                                                   self.mirrors)
+
+    # Define a callable function that is passed as an argument to
+    # _download_from_mirrors() and called for each mirror.  It returns the
+    # downloaded file once it is verified.
+    def download_file(file_mirror, cancel_event):
+      # The hashes of the file are computed, a chunk at a time, while it is
+      # downloaded.  Every mirror is hashed with new digest objects.
+      digest_objects = None
+      if trusted_hashes is not None:
+        digest_objects = self._new_digest_objects(trusted_hashes)
+
+      # TODO: Instead of the more fragile 'download_safely' switch, unroll
+      # the function into two separate ones: one for "safe" download, and the
+      # other one for "unsafe" download? This should induce safer and more
+      # readable code.
+      if download_safely:
+        file_object = tuf.download.safe_download(file_mirror,
+            file_length, digest_objects=digest_objects,
+            cancel_event=cancel_event, temp_directory=temp_directory,
+            fetcher=self.fetcher)
+      else:
+        file_object = tuf.download.unsafe_download(file_mirror,
+            file_length, digest_objects=digest_objects,
+            cancel_event=cancel_event, temp_directory=temp_directory,
+            fetcher=self.fetcher)
+
+      try:
+        # Verify 'file_object' according to the callable function.
+        # 'file_object' is also verified if decompressed above (i.e., the
+        # uncompressed version).
+        verify_file_function(file_object)
+
+        if trusted_hashes is not None:
+          self._check_hashes(file_object, trusted_hashes, digest_objects)
+
+      except:
+        # Remove the invalid file now, rather than leave it for the garbage
+        # collector; it may be next to the destination of the target.
+        file_object.close_temp_file()
+        raise
+
+      return file_object
+
+    # Hedging is limited to metadata.  A target usually takes longer to
+    # download than any sensible delay, so it would always be downloaded
+    # more than once.
+    hedged = file_type == 'meta' and \
+      tuf.settings.HEDGED_REQUEST_DELAY is not None
+
+    return self._download_from_mirrors(filepath, file_mirrors, download_file,
+        hedged=hedged)
+
+
+
+
+
+  def _download_from_mirrors(self, filepath, file_mirrors, download_function,
+      hedged=False):
+    """
+    <Purpose>
+      Non-public method that calls 'download_function' for each of
+      'file_mirrors' until one of them returns a valid copy of 'filepath'.
+
+      Mirrors are normally tried one after another.  In hedged mode, if a
+      mirror has not returned a valid file within
+      'tuf.settings.HEDGED_REQUEST_DELAY' seconds, or has failed, the file is
+      also requested from the next mirror, without waiting for the first one.
+      The first valid copy is returned, and the downloads that are still in
+      progress are cancelled.
+
+    <Arguments>
+      filepath:
+        The relative metadata or target filepath, used in log messages.
+
+      file_mirrors:
+        The list of mirror URLs of the file, in order of preference.
+
+      download_function:
+        A callable that expects a mirror URL and a 'threading.Event' (or None),
+        downloads and verifies the file, and returns it as a
+        'securesystemslib.util.TempFile' file-like object.  The download must
+        be abandoned if the event is set.  It raises an exception if the file
+        is invalid.
+
+      hedged:
+        A boolean switch to toggle hedged requests.
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        The file could not be fetched. This is raised only when all known
+        mirrors failed to provide a valid copy of the file.
+
+      tuf.exceptions.NotModifiedError:
+        'download_function' raised it, because the copy of the file that is
+        already held is unchanged.  The remaining mirrors are skipped.
+
+    <Side Effects>
+      In hedged mode, the file is downloaded by worker threads, more than one
+      of which may be running at the same time.
+
+    <Returns>
+      A 'securesystemslib.util.TempFile' file-like object containing the
+      metadata or target.
+    """
+
+    # file_mirror (URL): error (Exception)
+    file_mirror_errors = {}
+
+    if hedged:
+      file_object = self._download_from_mirrors_hedged(file_mirrors,
+          download_function, file_mirror_errors)
+
+    else:
+      file_object = None
+
+      for file_mirror in file_mirrors:
+        start_time = timeit.default_timer()
+
+        try:
+          file_object = download_function(file_mirror, None)
+
+        except tuf.exceptions.NotModifiedError:
+          tuf.mirrors.record_success(file_mirror,
+              timeit.default_timer() - start_time, 0)
+          raise
+
+        except Exception as exception:
+          # Remember the error from this mirror, and "reset" the file.
+          logger.exception('Update failed from ' + file_mirror + '.')
+          file_mirror_errors[file_mirror] = exception
+          file_object = None
+          tuf.mirrors.record_failure(file_mirror)
+
+        else:
+          tuf.mirrors.record_success(file_mirror,
+              timeit.default_timer() - start_time,
+              self._get_file_length(file_object))
+          break
+
+    if file_object:
+      return file_object
+
+    else:
+      logger.error('Failed to update ' + repr(filepath) + ' from all'
+        ' mirrors: ' + repr(file_mirror_errors))
+      raise tuf.exceptions.NoWorkingMirrorError(file_mirror_errors)
+
+
+
+
+
+  def _download_from_mirrors_hedged(self, file_mirrors, download_function,
+      file_mirror_errors):
+    """
+    <Purpose>
+      Non-public method that implements the hedged mode of
+      _download_from_mirrors().  The error of every mirror that failed is
+      added to 'file_mirror_errors'.
+
+    <Arguments>
+      file_mirrors:
+        The list of mirror URLs of the file, in order of preference.
+
+      download_function:
+        See _download_from_mirrors().
+
+      file_mirror_errors:
+        A dictionary of mirror URLs to the exceptions they raised.
+
+    <Exceptions>
+      tuf.exceptions.NotModifiedError, if raised by 'download_function'.
+
+    <Side Effects>
+      Starts a worker thread for each mirror that is tried.
+
+    <Returns>
+      The first valid 'securesystemslib.util.TempFile' file-like object, or
+      None if every mirror failed.
+    """
+
+    # (file_mirror, file_object, exception) tuples of finished downloads.
+    results = six.moves.queue.Queue()
+    cancel_event = threading.Event()
+
+    # Once 'cancel_event' is set under 'lock', no more results are added to
+    # 'results', and the file of any download that completes is discarded.
+    lock = threading.Lock()
+
+    def download(file_mirror):
+      start_time = timeit.default_timer()
+
+      try:
+        file_object = download_function(file_mirror, cancel_event)
+
+      except Exception as exception:
+        file_object = None
+        result = (file_mirror, None, exception)
+
+      else:
+        result = (file_mirror, file_object, None)
+
+      with lock:
+        if not cancel_event.is_set():
+          results.put(result)
+
+          # A download that is cancelled says nothing about the mirror.
+          if file_object is not None:
+            tuf.mirrors.record_success(file_mirror,
+                timeit.default_timer() - start_time,
+                self._get_file_length(file_object))
+
+          elif isinstance(result[2], tuf.exceptions.NotModifiedError):
+            tuf.mirrors.record_success(file_mirror,
+                timeit.default_timer() - start_time, 0)
+
+          else:
+            tuf.mirrors.record_failure(file_mirror)
+
+          return
+
+      if file_object is not None:
+        file_object.close_temp_file()
+
+    file_mirrors = list(file_mirrors)
+    file_object = None
+    not_modified_error = None
+    running = 0
+
+    while file_mirrors or running:
+      if file_mirrors and not running:
+        # Nothing is in progress (e.g., every started mirror failed), so the
+        # next mirror is tried at once.
+        timeout = 0
+
+      elif file_mirrors:
+        timeout = tuf.settings.HEDGED_REQUEST_DELAY
+
+      else:
+        timeout = None
+
+      try:
+        file_mirror, file_object, exception = results.get(timeout=timeout)
+
+      except six.moves.queue.Empty:
+        file_mirror = file_mirrors.pop(0)
+
+        if running:
+          logger.info('No response within ' +
+            repr(tuf.settings.HEDGED_REQUEST_DELAY) + ' seconds.  Also'
+            ' requesting ' + repr(file_mirror) + '.')
+
+        thread = threading.Thread(target=download, args=(file_mirror,))
+        thread.daemon = True
+        thread.start()
+        running = running + 1
+        continue
+
+      running = running - 1
+
+      if exception is None:
+        break
+
+      if isinstance(exception, tuf.exceptions.NotModifiedError):
+        not_modified_error = exception
+        break
+
+      # Remember the error from this mirror.
+      logger.error('Update failed from ' + file_mirror + ': ' +
+        repr(exception))
+      file_mirror_errors[file_mirror] = exception
+
+    # Cancel the downloads that are still in progress, and discard the files
+    # of any that completed in the meantime.
+    with lock:
+      cancel_event.set()
+
+    while not results.empty():
+      unused_file_object = results.get()[1]
+
+      if unused_file_object is not None:
+        unused_file_object.close_temp_file()
+
+    if not_modified_error is not None:
+      raise not_modified_error
+
+    return file_object
+
+
+
+
+
+  def _get_remote_metadata_filename(self, metadata_role, version=None):
+    """
+    <Purpose>
+      Non-public method that returns the path, relative to the metadata
+      directory of a mirror, of the 'metadata_role' file.  If the repository
+      uses consistent snapshots and 'version' is known, the filename is
+      prefixed with the version number (e.g., '3.targets.json').
+
+    <Arguments>
+      metadata_role:
+        The name of the metadata (e.g., 'targets', 'unclaimed').
+
+      version:
+        The expected version number of the metadata, or None if unknown.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The remote filename of the metadata.
+    """
+
+    remote_filename = metadata_role + '.json'
+
+    if self.consistent_snapshot and version:
+      dirname, basename = os.path.split(remote_filename)
+      remote_filename = os.path.join(dirname, str(version) + '.' + basename)
+
+    return remote_filename
+
+
+
+
+
+  def _update_metadata(self, metadata_role, upperbound_filelength, version=None,
+      conditional=False, downloaded_metadata=None):
+    """
+    <Purpose>
+      Non-public method that downloads, verifies, and 'installs' the metadata
+      belonging to 'metadata_role'.  Calling this method implies the metadata
+      has been updated by the repository and thus needs to be re-downloaded.
+      The current and previous metadata stores are updated if the newly
+      downloaded metadata is successfully downloaded and verified.
+
+    <Arguments>
+      metadata_role:
+        The name of the metadata. This is a role name and should not end
+        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+
+      upperbound_filelength:
+        The expected length, or upper bound, of the metadata file to be
+        downloaded.
+
+      version:
+        The expected and required version number of the 'metadata_role' file
+        downloaded.  'expected_version' is an integer.
+
+      conditional:
+        A boolean switch to request the metadata conditionally (see
+        'tuf.settings.CONDITIONAL_METADATA_REQUESTS').  If a mirror reports
+        that the currently trusted metadata is unchanged, and it has not
+        expired, nothing is updated.
+
+      downloaded_metadata:
+        The result of _get_metadata_file() for 'metadata_role', if the
+        metadata has already been downloaded and verified (e.g., concurrently
+        with that of other roles), or the exception that it raised.  None if
+        the metadata must be downloaded.
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        The metadata cannot be updated. This is not specific to a single
+        failure but rather indicates that all possible ways to update the
+        metadata have been tried and failed.
+
+    <Side Effects>
+      The metadata file belonging to 'metadata_role' is downloaded from a
+      repository mirror.  If the metadata is valid, it is stored in the
+      metadata store.
+
+    <Returns>
+      None.
+    """
+
+    # Construct the metadata filename as expected by the download/mirror modules.
+    metadata_filename = metadata_role + '.json'
+    metadata_filename = metadata_filename
+
+    # Attempt a file download from each mirror until the file is downloaded and
+    # verified.  If the signature of the downloaded file is valid, proceed,
+    # otherwise log a warning and try the next mirror.  'metadata_file_object'
+    # is the file-like object returned by 'download.py'.  'metadata_signable'
+    # is the object extracted from 'metadata_file_object'.  Metadata saved to
+    # files are regarded as 'signable' objects, conformant to
+    # 'tuf.formats.SIGNABLE_SCHEMA'.
+    #
+    # Some metadata (presently timestamp) will be downloaded "unsafely", in the
+    # sense that we can only estimate its true length and know nothing about
+    # its version.  This is because not all metadata will have other metadata
+    # for it; otherwise we will have an infinite regress of metadata signing
+    # for each other. In this case, we will download the metadata up to the
+    # best length we can get for it, not request a specific version, but
+    # perform the rest of the checks (e.g., signature verification).
+
+    remote_filename = self._get_remote_metadata_filename(metadata_role,
+        version)
+
+    if conditional and tuf.settings.CONDITIONAL_METADATA_REQUESTS:
+      validators = self.validators
+
+    else:
+      validators = None
+
+    try:
+      if isinstance(downloaded_metadata, Exception):
+        raise downloaded_metadata
+
+      elif downloaded_metadata is not None:
+        metadata_file_object, metadata_signable = downloaded_metadata
+
+      else:
+        metadata_file_object, metadata_signable = \
+          self._get_metadata_file(metadata_role, remote_filename,
+            upperbound_filelength, version, validators)
+
+    except tuf.exceptions.NotModifiedError:
+      logger.info(repr(metadata_filename) + ' has not changed.')
+      return
+
+    if validators is not None:
+      self._save_validators()
+
+    # The metadata has been verified. Move the metadata file into place.
+    # First, move the 'current' metadata file to the 'previous' directory
+    # if it exists.
+    current_filepath = os.path.join(self.metadata_directory['current'],
+                                    metadata_filename)
+    current_filepath = os.path.abspath(current_filepath)
+    securesystemslib.util.ensure_parent_dir(current_filepath)
+
+    previous_filepath = os.path.join(self.metadata_directory['previous'],
+                                     metadata_filename)
+    previous_filepath = os.path.abspath(previous_filepath)
+
+    if os.path.exists(current_filepath):
+      # Previous metadata might not exist, say when delegations are added.
+      securesystemslib.util.ensure_parent_dir(previous_filepath)
+      shutil.move(current_filepath, previous_filepath)
+
+      # The cached copy of the file follows it.
+      cached_filepath = \
+        self._get_cached_metadata_filepath('current', metadata_role)
+
+      if os.path.exists(cached_filepath):
+        previous_cached_filepath = \
+          self._get_cached_metadata_filepath('previous', metadata_role)
+        securesystemslib.util.ensure_parent_dir(previous_cached_filepath)
+        shutil.move(cached_filepath, previous_cached_filepath)
+
+    # Next, move the verified updated metadata file to the 'current' directory.
+    # Note that the 'move' method comes from securesystemslib.util's TempFile class.
+    # 'metadata_file_object' is an instance of securesystemslib.util.TempFile.
+    # 'metadata_signable' was parsed from it when it was downloaded.
+    metadata_file_object.move(current_filepath)
+
+    # Extract the metadata object so we can store it to the metadata store.
+    # 'current_metadata_object' set to 'None' if there is not an object
+    # stored for 'metadata_role'.
+    updated_metadata_object = _compact_metadata(metadata_signable['signed'])
+    current_metadata_object = self.metadata['current'].get(metadata_role)
+
+    if tuf.settings.CACHE_VERIFIED_METADATA:
+      self._save_cached_metadata('current', metadata_role,
+          securesystemslib.hash.digest_filename(current_filepath,
+          'sha256').hexdigest(),
+          dict(metadata_signable, signed=updated_metadata_object))
+
+    self._verify_root_chain_link(metadata_role, current_metadata_object,
+                                      metadata_signable)
+
+    # Finally, update the metadata and fileinfo stores, and rebuild the
+    # key and role info for the top-level roles if 'metadata_role' is root.
+    # Rebuilding the the key and role info is required if the newly-installed
+    # root metadata has revoked keys or updated any top-level role information.
+    logger.debug('Updated ' + repr(current_filepath) + '.')
+    if tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY is not None and \
+        metadata_role not in _TOP_LEVEL_ROLE_NAMES:
+      self.metadata['previous'].pop(metadata_role, None)
+
+    else:
+      self.metadata['previous'][metadata_role] = current_metadata_object
+
+    self.metadata['current'][metadata_role] = updated_metadata_object
+    self._update_versioninfo(metadata_filename)
+
+    # Ensure the role and key information of the top-level roles is also updated
+    # according to the newly-installed Root metadata.
+    if metadata_role == 'root':
+      self._rebuild_key_and_role_db()
+      self.consistent_snapshot = updated_metadata_object['consistent_snapshot']
+
+
+
+
+
+  def _update_metadata_if_changed(self, metadata_role,
+    referenced_metadata='snapshot', downloaded_metadata=None):
+    """
+    <Purpose>
+      Non-public method that updates the metadata for 'metadata_role' if it has
+      changed.  With the exception of the 'timestamp' role, all the top-level
+      roles are updated by this method.  The 'timestamp' role is always
+      downloaded from a mirror without first checking if it has been updated; it
+      is updated in refresh() by calling _update_metadata('timestamp').  This
+      method is also called for delegated role metadata, which are referenced by
+      'snapshot'.
+
+      If the metadata needs to be updated but an update cannot be obtained,
+      this method will delete the file (with the exception of the root
+      metadata, which never gets removed without a replacement).
+
+      Due to the way in which metadata files are updated, it is expected that
+      'referenced_metadata' is not out of date and trusted.  The refresh()
+      method updates the top-level roles in 'timestamp -> snapshot ->
+      root -> targets' order.  For delegated metadata, the parent role is
+      updated before the delegated role.  Taking into account that
+      'referenced_metadata' is updated and verified before 'metadata_role',
+      this method determines if 'metadata_role' has changed by checking
+      the 'meta' field of the newly updated 'referenced_metadata'.
+
+    <Arguments>
+      metadata_role:
+        The name of the metadata. This is a role name and should not end
+        in '.json'.  Examples: 'root', 'targets', 'unclaimed'.
+
+      referenced_metadata:
+        This is the metadata that provides the role information for
+        'metadata_role'.  For the top-level roles, the 'snapshot' role
+        is the referenced metadata for the 'root', and 'targets' roles.
+        The 'timestamp' metadata is always downloaded regardless.  In
+        other words, it is updated by calling _update_metadata('timestamp')
+        and not by this method.  The referenced metadata for 'snapshot'
+        is 'timestamp'.  See refresh().
+
+      downloaded_metadata:
+        The already downloaded metadata of 'metadata_role', if it has changed,
+        or None.  See _update_metadata().
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        If 'metadata_role' could not be downloaded after determining that it had
+        changed.
+
+      tuf.exceptions.RepositoryError:
+        If the referenced metadata is missing.
+
+    <Side Effects>
+      If it is determined that 'metadata_role' has been updated, the metadata
+      store (i.e., self.metadata) is updated with the new metadata and the
+      affected stores modified (i.e., the previous metadata store is updated).
+      If the metadata is 'targets' or a delegated targets role, the role
+      database is updated with the new information, including its delegated
+      roles.
+
+    <Returns>
+      None.
+    """
+
+    metadata_filename = metadata_role + '.json'
+    expected_versioninfo = None
+    expected_fileinfo = None
+
+    # Ensure the referenced metadata has been loaded.  The 'root' role may be
+    # updated without having 'snapshot' available.
+    if referenced_metadata not in self.metadata['current']:
+      raise tuf.exceptions.RepositoryError('Cannot update'
+        ' ' + repr(metadata_role) + ' because ' + referenced_metadata + ' is'
+        ' missing.')
+
+    # The referenced metadata has been loaded.  Extract the new versioninfo for
+    # 'metadata_role' from it.
+    else:
+      logger.debug(repr(metadata_role) + ' referenced in ' +
+        repr(referenced_metadata)+ '.  ' + repr(metadata_role) +
+        ' may be updated.')
+
+    # Simply return if the metadata for 'metadata_role' has not been updated,
+    # according to the uncompressed metadata provided by the referenced
+    # metadata.  The metadata is considered updated if its version number is
+    # strictly greater than its currently trusted version number.
+    expected_versioninfo = self.metadata['current'][referenced_metadata] \
+                                        ['meta'] \
+                                        [metadata_filename]
+
+    if not self._versioninfo_has_been_updated(metadata_filename,
+                                              expected_versioninfo):
+      logger.info(repr(metadata_filename) + ' up-to-date.')
+
+      # Since we have not downloaded a new version of this metadata, we should
+      # check to see if our local version is stale and notify the user if so.
+      # This raises tuf.exceptions.ExpiredMetadataError if the metadata we have
+      # is expired. Resolves issue #322.
+      self._ensure_not_expired(self.metadata['current'][metadata_role],
+                               metadata_role)
+
+      # TODO: If 'metadata_role' is root or snapshot, we should verify that
+      # root's hash matches what's in snapshot, and that snapshot hash matches
+      # what's listed in timestamp.json.
+
+      return
+
+    logger.debug('Metadata ' + repr(metadata_filename) + ' has changed.')
+
+    # The file lengths of metadata are unknown, only their version numbers are
+    # known.  Set an upper limit for the length of the downloaded file for each
+    # expected role.  Note: The Timestamp role is not updated via this
+    # function.
+    if metadata_role == 'snapshot':
+      upperbound_filelength = tuf.settings.DEFAULT_SNAPSHOT_REQUIRED_LENGTH
+
+    elif metadata_role == 'root':
+      upperbound_filelength = tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH
+
+    # The metadata is considered Targets (or delegated Targets metadata).
+    else:
+      upperbound_filelength = tuf.settings.DEFAULT_TARGETS_REQUIRED_LENGTH
+
+    try:
+      self._update_metadata(metadata_role, upperbound_filelength,
+          expected_versioninfo['version'],
+          downloaded_metadata=downloaded_metadata)
+
+    except:
+      # The current metadata we have is not current but we couldn't get new
+      # metadata. We shouldn't use the old metadata anymore.  This will get rid
+      # of in-memory knowledge of the role and delegated roles, but will leave
+      # delegated metadata files as current files on disk.
+      #
+      # TODO: Should we get rid of the delegated metadata files?  We shouldn't
+      # need to, but we need to check the trust implications of the current
+      # implementation.
+      self._delete_metadata(metadata_role)
+      logger.error('Metadata for ' + repr(metadata_role) + ' cannot be updated.')
+      raise
+
+    else:
+      # We need to import the delegated roles of 'metadata_role', since its
+      # list of delegations might have changed from what was previously
+      # loaded..
+      # TODO: Should we remove the keys of the delegated roles?
+      self._import_delegations(metadata_role)
+
+
+
+
+
+  def _versioninfo_has_been_updated(self, metadata_filename, new_versioninfo):
+    """
+    <Purpose>
+      Non-public method that determines whether the current versioninfo of
+      'metadata_filename' is less than 'new_versioninfo' (i.e., the version
+      number has been incremented).  The 'new_versioninfo' argument should be
+      extracted from the latest copy of the metadata that references
+      'metadata_filename'.  Example: 'root.json' would be referenced by
+      'snapshot.json'.
+
+      'new_versioninfo' should only be 'None' if this is for updating
+      'root.json' without having 'snapshot.json' available.
+
+    <Arguments>
+      metadadata_filename:
+        The metadata filename for the role.  For the 'root' role,
+        'metadata_filename' would be 'root.json'.
+
+      new_versioninfo:
+        A dict object representing the new file information for
+        'metadata_filename'.  'new_versioninfo' may be 'None' when
+        updating 'root' without having 'snapshot' available.  This
+        dict conforms to 'securesystemslib.formats.VERSIONINFO_SCHEMA' and has
+        the form:
+
+        {'version': 288}
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      If there is no versioninfo currently loaded for 'metadata_filename', try
+      to load it.
+
+    <Returns>
+      Boolean.  True if the versioninfo has changed, False otherwise.
+    """
+
+    # If there is no versioninfo currently stored for 'metadata_filename',
+    # try to load the file, calculate the versioninfo, and store it.
+    if metadata_filename not in self.versioninfo:
+      self._update_versioninfo(metadata_filename)
+
+    # Return true if there is no versioninfo for 'metadata_filename'.
+    # 'metadata_filename' is not in the 'self.versioninfo' store
+    # and it doesn't exist in the 'current' metadata location.
+    if self.versioninfo[metadata_filename] is None:
+      return True
+
+    current_versioninfo = self.versioninfo[metadata_filename]
+
+    if new_versioninfo['version'] > current_versioninfo['version']:
+      return True
+
+    else:
+      return False
+
+
+
+
+
+  def _update_versioninfo(self, metadata_filename):
+    """
+    <Purpose>
+      Non-public method that updates the 'self.versioninfo' entry for the
+      metadata belonging to 'metadata_filename'.  If the current metadata for
+      'metadata_filename' cannot be loaded, set its 'versioninfo' to 'None' to
+      signal that it is not in 'self.versioninfo' AND it also doesn't exist
+      locally.
+
+    <Arguments>
+      metadata_filename:
+        The metadata filename for the role.  For the 'root' role,
+        'metadata_filename' would be 'root.json'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The version number of 'metadata_filename' is calculated and stored in its
+      corresponding entry in 'self.versioninfo'.
+
+    <Returns>
+      None.
+    """
+
+    # In case we delayed loading the metadata and didn't do it in
+    # __init__ (such as with delegated metadata), then get the version
+    # info now.
+
+    # Save the path to the current metadata file for 'metadata_filename'.
+    current_filepath = os.path.join(self.metadata_directory['current'],
+                                    metadata_filename)
+    # If the path is invalid, simply return and leave versioninfo unset.
+    if not os.path.exists(current_filepath):
+      self.versioninfo[metadata_filename] = None
+      return
+
+    # Extract the version information from the trusted snapshot role and save
+    # it to the 'self.versioninfo' store.
+    if metadata_filename == 'timestamp.json':
+      trusted_versioninfo = \
+        self.metadata['current']['timestamp']['version']
+
+    # When updating snapshot.json, the client either (1) has a copy of
+    # snapshot.json, or (2) is in the process of obtaining it by first
+    # downloading timestamp.json.  Note: Clients are allowed to have only
+    # root.json initially, and perform a refresh of top-level metadata to
+    # obtain the remaining roles.
+    elif metadata_filename == 'snapshot.json':
+
+      # Verify the version number of the currently trusted snapshot.json in
+      # snapshot.json itself.  Checking the version number specified in
+      # timestamp.json may be greater than the version specified in the
+      # client's copy of snapshot.json.
+      try:
+        timestamp_version_number = self.metadata['current']['snapshot']['version']
+        trusted_versioninfo = tuf.formats.make_versioninfo(timestamp_version_number)
+
+      except KeyError:
+        trusted_versioninfo = \
+          self.metadata['current']['timestamp']['meta']['snapshot.json']
+
+    else:
+
+      try:
+        # The metadata file names in 'self.metadata' exclude the role
+        # extension.  Strip the '.json' extension when checking if
+        # 'metadata_filename' currently exists.
+        targets_version_number = \
+          self.metadata['current'][metadata_filename[:-len('.json')]]['version']
+        trusted_versioninfo = \
+          tuf.formats.make_versioninfo(targets_version_number)
+
+      except KeyError:
+        trusted_versioninfo = \
+          self.metadata['current']['snapshot']['meta'][metadata_filename]
+
+    self.versioninfo[metadata_filename] = trusted_versioninfo
+
+
+
+
+
+  def _fileinfo_has_changed(self, metadata_filename, new_fileinfo):
+    """
+    <Purpose>
+      Non-public method that determines whether the current fileinfo of
+      'metadata_filename' differs from 'new_fileinfo'.  The 'new_fileinfo'
+      argument should be extracted from the latest copy of the metadata that
+      references 'metadata_filename'.  Example: 'root.json' would be referenced
+      by 'snapshot.json'.
+
+      'new_fileinfo' should only be 'None' if this is for updating 'root.json'
+      without having 'snapshot.json' available.
+
+    <Arguments>
+      metadadata_filename:
+        The metadata filename for the role.  For the 'root' role,
+        'metadata_filename' would be 'root.json'.
+
+      new_fileinfo:
+        A dict object representing the new file information for
+        'metadata_filename'.  'new_fileinfo' may be 'None' when
+        updating 'root' without having 'snapshot' available.  This
+        dict conforms to 'tuf.formats.FILEINFO_SCHEMA' and has
+        the form:
+
+        {'length': 23423
+         'hashes': {'sha256': adfbc32343..}}
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      If there is no fileinfo currently loaded for 'metada_filename',
+      try to load it.
+
+    <Returns>
+      Boolean.  True if the fileinfo has changed, false otherwise.
+    """
+
+    # If there is no fileinfo currently stored for 'metadata_filename',
+    # try to load the file, calculate the fileinfo, and store it.
+    if metadata_filename not in self.fileinfo:
+      self._update_fileinfo(metadata_filename)
+
+    # Return true if there is no fileinfo for 'metadata_filename'.
+    # 'metadata_filename' is not in the 'self.fileinfo' store
+    # and it doesn't exist in the 'current' metadata location.
+    if self.fileinfo[metadata_filename] is None:
+      return True
+
+    current_fileinfo = self.fileinfo[metadata_filename]
+
+    if current_fileinfo['length'] != new_fileinfo['length']:
+      return True
+
+    # Now compare hashes. Note that the reason we can't just do a simple
+    # equality check on the fileinfo dicts is that we want to support the
+    # case where the hash algorithms listed in the metadata have changed
+    # without having that result in considering all files as needing to be
+    # updated, or not all hash algorithms listed can be calculated on the
+    # specific client.
+    for algorithm, hash_value in six.iteritems(new_fileinfo['hashes']):
+      # We're only looking for a single match. This isn't a security
+      # check, we just want to prevent unnecessary downloads.
+      if algorithm in current_fileinfo['hashes']:
+        if hash_value == current_fileinfo['hashes'][algorithm]:
+          return False
+
+    return True
+
+
+
+
+
+  def _update_fileinfo(self, metadata_filename):
+    """
+    <Purpose>
+      Non-public method that updates the 'self.fileinfo' entry for the metadata
+      belonging to 'metadata_filename'.  If the 'current' metadata for
+      'metadata_filename' cannot be loaded, set its fileinfo' to 'None' to
+      signal that it is not in the 'self.fileinfo' AND it also doesn't exist
+      locally.
+
+    <Arguments>
+      metadata_filename:
+        The metadata filename for the role.  For the 'root' role,
+        'metadata_filename' would be 'root.json'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The file details of 'metadata_filename' is calculated and
+      stored in 'self.fileinfo'.
+
+    <Returns>
+      None.
+    """
+
+    # In case we delayed loading the metadata and didn't do it in
+    # __init__ (such as with delegated metadata), then get the file
+    # info now.
+
+    # Save the path to the current metadata file for 'metadata_filename'.
+    current_filepath = os.path.join(self.metadata_directory['current'],
+                                    metadata_filename)
+    # If the path is invalid, simply return and leave fileinfo unset.
+    if not os.path.exists(current_filepath):
+      self.fileinfo[metadata_filename] = None
+      return
+
+    # Extract the file information from the actual file and save it
+    # to the fileinfo store.
+    file_length, hashes = securesystemslib.util.get_file_details(current_filepath)
+    metadata_fileinfo = tuf.formats.make_fileinfo(file_length, hashes)
+    self.fileinfo[metadata_filename] = metadata_fileinfo
+
+
+
+
+
+
+
+  def _move_current_to_previous(self, metadata_role):
+    """
+    <Purpose>
+      Non-public method that moves the current metadata file for 'metadata_role'
+      to the previous directory.
+
+    <Arguments>
+      metadata_role:
+        The name of the metadata. This is a role name and should not end
+        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+     The metadata file for 'metadata_role' is removed from 'current'
+     and moved to the 'previous' directory.
+
+    <Returns>
+      None.
+    """
+
+    # Get the 'current' and 'previous' full file paths for 'metadata_role'
+    metadata_filepath = metadata_role + '.json'
+    previous_filepath = os.path.join(self.metadata_directory['previous'],
+                                     metadata_filepath)
+    current_filepath = os.path.join(self.metadata_directory['current'],
+                                    metadata_filepath)
+
+    # Remove the previous path if it exists.
+    if os.path.exists(previous_filepath):
+      os.remove(previous_filepath)
+
+    # Move the current path to the previous path.
+    if os.path.exists(current_filepath):
+      securesystemslib.util.ensure_parent_dir(previous_filepath)
+      os.rename(current_filepath, previous_filepath)
+
+
+
+
+
+  def _delete_metadata(self, metadata_role):
+    """
+    <Purpose>
+      Non-public method that removes all (current) knowledge of 'metadata_role'.
+      The metadata belonging to 'metadata_role' is removed from the current
+      'self.metadata' store and from the role database. The 'root.json' role
+      file is never removed.
+
+    <Arguments>
+      metadata_role:
+        The name of the metadata. This is a role name and should not end
+        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The role database is modified and the metadata for 'metadata_role'
+      removed from the 'self.metadata' store.
+
+    <Returns>
+      None.
+    """
+
+    # The root metadata role is never deleted without a replacement.
+    if metadata_role == 'root':
+      return
+
+    # Get rid of the current metadata file.
+    self._move_current_to_previous(metadata_role)
+
+    # Remove knowledge of the role.
+    if metadata_role in self.metadata['current']:
+      del self.metadata['current'][metadata_role]
+    tuf.roledb.remove_role(metadata_role, self.repository_name)
+
+    # The roles delegated by 'metadata_role' are re-imported only when the
+    # metadata of the roles that delegate to them are loaded again.
+    self.fresh_roles.clear()
+    self.target_cache.clear()
+
+
+
+
+
+  def _get_expiration_timestamp(self, expires):
+    """
+    <Purpose>
+      Non-public method that returns the Unix timestamp of the ISO 8601 date
+      'expires' (e.g., '1985-10-21T01:22:00Z').  The dates of the trusted
+      metadata are checked on every target lookup, so each one is only parsed
+      once.
+
+    <Arguments>
+      expires:
+        The expiration date of metadata, conformant to
+        'securesystemslib.formats.ISO8601_DATETIME_SCHEMA'.
+
+    <Exceptions>
+      iso8601.ParseError, if 'expires' is not a valid date.
+
+    <Side Effects>
+      The timestamp is saved.
+
+    <Returns>
+      The Unix timestamp of 'expires'.
+    """
+
+    try:
+      return self.expiration_timestamps[expires]
+
+    except KeyError:
+      pass
+
+    expires_timestamp = \
+      tuf.formats.datetime_to_unix_timestamp(iso8601.parse_date(expires))
+
+    # Each version of metadata has its own date.  Those of versions that have
+    # been replaced are dropped once there are too many.
+    if len(self.expiration_timestamps) >= 1024:
+      self.expiration_timestamps.clear()
+
+    self.expiration_timestamps[expires] = expires_timestamp
+
+    return expires_timestamp
+
+
+
+
+
+  def _ensure_not_expired(self, metadata_object, metadata_rolename):
+    """
+    <Purpose>
+      Non-public method that raises an exception if the current specified
+      metadata has expired.
+
+    <Arguments>
+      metadata_object:
+        The metadata that should be expired, a 'tuf.formats.ANYROLE_SCHEMA'
+        object.
+
+      metadata_rolename:
+        The name of the metadata. This is a role name and should not end
+        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+
+    <Exceptions>
+      tuf.exceptions.ExpiredMetadataError:
+        If 'metadata_rolename' has expired.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      None.
+    """
+
+    # Extract the expiration time.
+    expires = metadata_object['expires']
+
+    # If the current time has surpassed the expiration date, raise an
+    # exception.  'expires' is in
+    # 'securesystemslib.formats.ISO8601_DATETIME_SCHEMA' format (e.g.,
+    # '1985-10-21T01:22:00Z'.)  Convert it to a unix timestamp and compare it
+    # against the current time.time() (also in Unix/POSIX time format, although
+    # with microseconds attached.)
+    current_time = int(time.time())
+    expires_timestamp = self._get_expiration_timestamp(expires)
+
+    # Generate a user-friendly error message if 'expires' is less than the
+    # current time (i.e., a local time.)
+    if expires_timestamp < current_time:
+      expires_datetime = iso8601.parse_date(expires)
+      message = 'Metadata '+repr(metadata_rolename)+' expired on ' + \
+        expires_datetime.ctime() + ' (UTC).'
+      logger.error(message)
+
+      raise tuf.exceptions.ExpiredMetadataError(message)
+
+
+
+
+
+  def all_targets(self):
+    """
+    <Purpose>
+      Get a list of the target information for all the trusted targets on the
+      repository.  This list also includes all the targets of delegated roles.
+      Targets of the list returned are ordered according the trusted order of
+      the delegated roles, where parent roles come before children.  The list
+      conforms to 'tuf.formats.TARGETINFOS_SCHEMA' and has the form:
+
+      [{'filepath': 'a/b/c.txt',
+        'fileinfo': {'length': 13323,
+                     'hashes': {'sha256': dbfac345..}}
+       ...]
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      tuf.exceptions.RepositoryError:
+        If the metadata for the 'targets' role is missing from
+        the 'snapshot' metadata.
+
+      tuf.exceptions.UnknownRoleError:
+        If one of the roles could not be found in the role database.
+
+    <Side Effects>
+      The metadata for target roles is updated and stored.
+
+    <Returns>
+     A list of targets, conformant to
+     'tuf.formats.TARGETINFOS_SCHEMA'.
+    """
+
+    # Load the most up-to-date targets of the 'targets' role and all
+    # delegated roles.
+    self._refresh_targets_metadata(refresh_all_delegated_roles=True)
+
+    # Fetch the targets for the 'targets' role.
+    all_targets = self._targets_of_role('targets', skip_refresh=True)
+
+    # Fetch the targets of the delegated roles.  get_rolenames returns
+    # all roles available on the repository.
+    delegated_targets = []
+    for role in tuf.roledb.get_rolenames(self.repository_name):
+      if role in ['root', 'snapshot', 'targets', 'timestamp']:
+        continue
+
+      else:
+        delegated_targets.extend(self._targets_of_role(role, skip_refresh=True))
+
+    all_targets.extend(delegated_targets)
+    self._evict_delegated_roles()
+
+    return all_targets
+
+
+
+
+
+  def _refresh_targets_metadata(self, rolename='targets',
+    refresh_all_delegated_roles=False):
+    """
+    <Purpose>
+      Non-public method that refreshes the targets metadata of 'rolename'.  If
+      'refresh_all_delegated_roles' is True, include all the delegations that
+      follow 'rolename'.  The metadata for the 'targets' role is updated in
+      refresh() by the _update_metadata_if_changed('targets') call, not here.
+      Delegated roles are not loaded when the repository is first initialized.
+      They are loaded from disk, updated if they have changed, and stored to
+      the 'self.metadata' store by this method.  This method is called by the
+      target methods, like all_targets() and targets_of_role().
+
+    <Arguments>
+      rolename:
+        This is a delegated role name and should not end in '.json'.  Example:
+        'unclaimed'.
+
+      refresh_all_delegated_roles:
+         Boolean indicating if all the delegated roles available in the
+         repository (via snapshot.json) should be refreshed.
+
+    <Exceptions>
+      tuf.exceptions.RepositoryError:
+        If the metadata file for the 'targets' role is missing from the
+        'snapshot' metadata.
+
+    <Side Effects>
+      The metadata for the delegated roles are loaded and updated if they
+      have changed.  Delegated metadata is removed from the role database if
+      it has expired.
+
+    <Returns>
+      None.
+    """
+
+    roles_to_update = []
+
+    if rolename + '.json' in self.metadata['current']['snapshot']['meta']:
+      roles_to_update.append(rolename)
+
+    if refresh_all_delegated_roles:
+
+      for role in six.iterkeys(self.metadata['current']['snapshot']['meta']):
+        # snapshot.json keeps track of root.json, targets.json, and delegated
+        # roles (e.g., django.json, unclaimed.json).  Remove the 'targets' role
+        # because it gets updated when the targets.json file is updated in
+        # _update_metadata_if_changed('targets') and root.
+        if role.endswith('.json'):
+          role = role[:-len('.json')]
+          if role not in ['root', 'targets', rolename]:
+            roles_to_update.append(role)
+
+        else:
+          continue
+
+    # If there is nothing to refresh, we are done.
+    if not roles_to_update:
+      return
+
+    logger.debug('Roles to update: ' + repr(roles_to_update) + '.')
+
+    # Update 'roles_to_update' one level of the delegation tree at a time,
+    # starting with 'rolename'.  The delegations of a role can only be trusted
+    # once its metadata is updated, so the roles of the next level are those
+    # delegated by the roles just updated.  Roles that are not reached this
+    # way are updated one at a time, as listed by snapshot.
+    remaining_roles = list(roles_to_update)
+    roles = remaining_roles[:1]
+
+    while roles:
+      for role in roles:
+        remaining_roles.remove(role)
+
+      self._refresh_delegated_roles(roles)
+
+      delegated_roles = []
+      for role in roles:
+        role_metadata = self.metadata['current'].get(role, {})
+
+        for roleinfo in role_metadata.get('delegations', {}).get('roles', []):
+          delegated_role = roleinfo['name']
+
+          if delegated_role in remaining_roles and \
+              delegated_role not in delegated_roles:
+            delegated_roles.append(delegated_role)
+
+      roles = delegated_roles or remaining_roles[:1]
+
+
+
+
+
+  def _refresh_delegated_roles(self, rolenames):
+    """
+    <Purpose>
+      Non-public method that loads the metadata of the targets roles of
+      'rolenames' from disk, and updates those that have changed according to
+      snapshot.  The roles already loaded and checked against the version
+      currently listed by snapshot (see 'self.fresh_roles') are only checked
+      for expiration.  The changed metadata is downloaded and verified
+      concurrently, by up to 'tuf.settings.MAX_CONCURRENT_DOWNLOADS' worker
+      threads, and then installed in the order of 'rolenames'.  The roles that
+      delegate to 'rolenames' must already be updated.
+
+    <Arguments>
+      rolenames:
+        A list of targets role names, e.g., the roles delegated by the same
+        role, in order of priority.
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        If the changed metadata of a role could not be downloaded.
+
+    <Side Effects>
+      The metadata of the roles is loaded and updated, and their delegations
+      are imported into the role database.
+
+    <Returns>
+      None.
+    """
+
+    changed_roles = []
+    stale_roles = []
+
+    for rolename in rolenames:
+      metadata_filename = rolename + '.json'
+      versioninfo = self.metadata['current']['snapshot']['meta'] \
+                                 [metadata_filename]
+
+      self._use_delegated_role(rolename)
+
+      # The metadata of a fresh role is neither loaded from disk nor imported
+      # again.
+      if self._is_fresh_role(rolename):
+        self._ensure_not_expired(self.metadata['current'][rolename], rolename)
+        continue
+
+      stale_roles.append(rolename)
+      self._load_metadata_from_file('previous', rolename)
+      self._load_metadata_from_file('current', rolename)
+
+      if self._versioninfo_has_been_updated(metadata_filename, versioninfo):
+        changed_roles.append(rolename)
+
+    # rolename: (file_object, metadata_signable) or exception
+    downloaded_metadata = {}
+
+    if len(changed_roles) > 1 and tuf.settings.MAX_CONCURRENT_DOWNLOADS > 1:
+      downloaded_metadata = self._download_metadata_files(changed_roles)
+
+    try:
+      for rolename in stale_roles:
+        if rolename == 'targets':
+          self._update_targets_metadata()
+
+        else:
+          self._update_metadata_if_changed(rolename,
+              downloaded_metadata=downloaded_metadata.pop(rolename, None))
+
+        self.fresh_roles[rolename] = \
+          self.metadata['current']['snapshot']['meta'][rolename + '.json'] \
+                       ['version']
+
+    finally:
+      # The metadata of the roles after one that failed is not installed.
+      for result in six.itervalues(downloaded_metadata):
+        if not isinstance(result, Exception):
+          result[0].close_temp_file()
+
+
+
+
+
+  def _is_fresh_role(self, rolename):
+    """
+    <Purpose>
+      Non-public method that returns whether the metadata of the targets role
+      'rolename' has been loaded and checked since snapshot last listed a new
+      version of it (see 'self.fresh_roles').  The metadata of a fresh role is
+      still trusted, unless it has expired.  A role is not fresh if the
+      version of it that is installed (see 'self.versioninfo') is older than
+      the version listed by snapshot.
+
+    <Arguments>
+      rolename:
+        The name of a targets role listed by snapshot.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      True if the metadata of 'rolename' is fresh, False otherwise.
+    """
+
+    metadata_filename = rolename + '.json'
+    versioninfo = self.metadata['current']['snapshot']['meta'] \
+                               [metadata_filename]
+
+    return rolename in self.metadata['current'] and \
+      self.fresh_roles.get(rolename) == versioninfo['version'] and \
+      not self._versioninfo_has_been_updated(metadata_filename, versioninfo)
+
+
+
+
+
+  def _update_targets_metadata(self):
+    """
+    <Purpose>
+      Non-public method that updates the metadata of the top-level targets
+      role for the target methods, like _update_metadata_if_changed(), if
+      snapshot lists a new version of it.  The metadata is installed while
+      holding 'self.refresh_lock', so that it is not installed at the same
+      time by refresh() or by the background thread of start_auto_refresh().
+      The lock is not waited for if the metadata is unchanged.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      See _update_metadata_if_changed().
+
+    <Side Effects>
+      The metadata of the targets role is updated, if it has changed.
+
+    <Returns>
+      None.
+    """
+
+    versioninfo = \
+      self.metadata['current']['snapshot']['meta'].get('targets.json')
+
+    if versioninfo is not None and \
+        not self._versioninfo_has_been_updated('targets.json', versioninfo):
+      return
+
+    with self.refresh_lock:
+      self._update_metadata_if_changed('targets')
+
+
+
+
+
+  def _use_delegated_role(self, rolename):
+    """
+    <Purpose>
+      Non-public method that records that the metadata of 'rolename' is used,
+      if it is a delegated role and the number of delegated roles whose
+      metadata is in memory is bounded (see _evict_delegated_roles()).
+
+    <Arguments>
+      rolename:
+        The name of a targets role.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      'rolename' becomes the most recently used delegated role.
+
+    <Returns>
+      None.
+    """
+
+    if tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY is None or \
+        rolename in _TOP_LEVEL_ROLE_NAMES:
+      return
+
+    self.delegated_roles_in_memory.pop(rolename, None)
+    self.delegated_roles_in_memory[rolename] = None
+
+
+
+
+
+  def _evict_delegated_roles(self):
+    """
+    <Purpose>
+      Non-public method that removes from memory the metadata of the least
+      recently used delegated roles, beyond the
+      'tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY' most recently used.  The
+      verified metadata of an evicted role stays on disk, and is loaded again
+      (from the cached copy of the file, see _load_cached_metadata()) the next
+      time the role is used, without being downloaded unless snapshot lists a
+      new version of it.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      The metadata, and compiled delegations, of delegated roles are removed
+      from memory.
+
+    <Returns>
+      None.
+    """
+
+    maximum = tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY
+
+    if maximum is None:
+      return
+
+    while len(self.delegated_roles_in_memory) > maximum:
+      rolename, unused = self.delegated_roles_in_memory.popitem(last=False)
+      logger.debug('Evicting the metadata of ' + repr(rolename) + '.')
+
+      self.metadata['current'].pop(rolename, None)
+      self.metadata['previous'].pop(rolename, None)
+      self.fresh_roles.pop(rolename, None)
+      self.delegation_matchers.pop(rolename, None)
+
+
+
+
+
+  def _get_metadata_of_role(self, metadata_set, rolename):
+    """
+    <Purpose>
+      Non-public method that returns the current or previous metadata of
+      'rolename', from memory, or, if the metadata of delegated roles is kept
+      on disk (see 'tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY'), from disk.
+      Metadata read from disk is not saved to the metadata store.
+
+    <Arguments>
+      metadata_set:
+        The string 'current' or 'previous'.
+
+      rolename:
+        The name of the role.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If the metadata read from disk is improperly formatted.
+
+    <Side Effects>
+      The metadata file may be read.
+
+    <Returns>
+      The metadata object, or None if there is none.
+    """
+
+    metadata_object = self.metadata[metadata_set].get(rolename)
+
+    if metadata_object is None and \
+        tuf.settings.MAX_DELEGATED_ROLES_IN_MEMORY is not None and \
+        rolename not in _TOP_LEVEL_ROLE_NAMES:
+      metadata_object = self._read_metadata_file(metadata_set, rolename)
+
+      # The metadata is not kept, so its delegations are not imported.
+      self.delegated_keys.pop(rolename, None)
+
+    return metadata_object
+
+
+
+
+
+  def _download_metadata_files(self, rolenames):
+    """
+    <Purpose>
+      Non-public method that downloads and verifies the metadata of the
+      targets roles of 'rolenames', at the versions listed by snapshot,
+      concurrently.  Nothing is installed.
+
+    <Arguments>
+      rolenames:
+        A list of targets role names.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      Worker threads download the metadata files.
+
+    <Returns>
+      A dictionary of the role names of 'rolenames' to the result of
+      _get_metadata_file() for the role, or the exception it raised.
+    """
+
+    def download_metadata_file(rolename):
+      version = self.metadata['current']['snapshot']['meta'] \
+                             [rolename + '.json']['version']
+
+      return self._get_metadata_file(rolename,
+          self._get_remote_metadata_filename(rolename, version),
+          tuf.settings.DEFAULT_TARGETS_REQUIRED_LENGTH, version)
+
+    # rolename: (file_object, metadata_signable) or exception
+    downloaded_metadata = _map_concurrently(download_metadata_file, rolenames,
+        tuf.settings.MAX_CONCURRENT_DOWNLOADS)
+
+    return downloaded_metadata
+
+
+
+
+
+  def _targets_of_role(self, rolename, targets=None, skip_refresh=False):
+    """
+    <Purpose>
+      Non-public method that returns the target information of all the targets
+      of 'rolename'.  The returned information is a list conformant to
+      'tuf.formats.TARGETINFOS_SCHEMA', and has the form:
+
+      [{'filepath': 'a/b/c.txt',
+        'fileinfo': {'length': 13323,
+                     'hashes': {'sha256': dbfac345..}}
+       ...]
+
+    <Arguments>
+      rolename:
+        This is a role name and should not end in '.json'.  Examples: 'targets',
+        'unclaimed'.
+
+      targets:
+        A list of targets containing target information, conformant to
+        'tuf.formats.TARGETINFOS_SCHEMA'.
+
+      skip_refresh:
+        A boolean indicating if the target metadata for 'rolename'
+        should be refreshed.
+
+    <Exceptions>
+      tuf.exceptions.UnknownRoleError:
+        If 'rolename' is not found in the role database.
+
+    <Side Effects>
+      The metadata for 'rolename' is refreshed if 'skip_refresh' is False.
+
+    <Returns>
+      A list of dict objects containing the target information of all the
+      targets of 'rolename'.  Conformant to
+      'tuf.formats.TARGETINFOS_SCHEMA'.
+    """
+
+    if targets is None:
+      targets = []
+
+    targets_of_role = list(targets)
+    logger.debug('Getting targets of role: ' + repr(rolename) + '.')
+
+    if not tuf.roledb.role_exists(rolename, self.repository_name):
+      raise tuf.exceptions.UnknownRoleError(rolename)
+
+    # We do not need to worry about the target paths being trusted because
+    # this is enforced before any new metadata is accepted.
+    if not skip_refresh:
+      self._refresh_targets_metadata(rolename)
+
+    # Do we have metadata for 'rolename'?
+    if rolename not in self.metadata['current']:
+      logger.debug('No metadata for ' + repr(rolename) + '.'
+        '  Unable to determine targets.')
+      return []
+
+    # Get the targets specified by the role itself.
+    for filepath, fileinfo in six.iteritems(self.metadata['current'][rolename].get('targets', [])):
+      new_target = {}
+      new_target['filepath'] = filepath
+      new_target['fileinfo'] = fileinfo
+
+      targets_of_role.append(new_target)
+
+    return targets_of_role
+
+
+
+
+
+  def targets_of_role(self, rolename='targets'):
+    """
+    <Purpose>
+      Return a list of trusted targets directly specified by 'rolename'.
+      The returned information is a list conformant to
+      'tuf.formats.TARGETINFOS_SCHEMA', and has the form:
+
+      [{'filepath': 'a/b/c.txt',
+        'fileinfo': {'length': 13323,
+                     'hashes': {'sha256': dbfac345..}}
+       ...]
+
+      The metadata of 'rolename' is updated if out of date, including the
+      metadata of its parent roles (i.e., the minimum roles needed to set the
+      chain of trust).
+
+    <Arguments>
+      rolename:
+        The name of the role whose list of targets are wanted.
+        The name of the role should start with 'targets'.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'rolename' is improperly formatted.
+
+      tuf.exceptions.RepositoryError:
+        If the metadata of 'rolename' cannot be updated.
+
+      tuf.exceptions.UnknownRoleError:
+        If 'rolename' is not found in the role database.
+
+    <Side Effects>
+      The metadata of updated delegated roles are downloaded and stored.
+
+    <Returns>
+      A list of targets, conformant to
+      'tuf.formats.TARGETINFOS_SCHEMA'.
+    """
+
+    # Does 'rolename' have the correct format?
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    securesystemslib.formats.RELPATH_SCHEMA.check_match(rolename)
+
+    if not tuf.roledb.role_exists(rolename, self.repository_name):
+      raise tuf.exceptions.UnknownRoleError(rolename)
+
+    self._refresh_targets_metadata(rolename)
+    targets = self._targets_of_role(rolename, skip_refresh=True)
+    self._evict_delegated_roles()
+
+    return targets
+
+
+
+
+
+  def get_one_valid_targetinfo(self, target_filepath):
+    """
+    <Purpose>
+      Return the target information of 'target_filepath', and update its
+      corresponding metadata, if necessary.
+
+    <Arguments>
+      target_filepath:
+        The path to the target file on the repository. This will be relative to
+        the 'targets' (or equivalent) directory on a given mirror.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'target_filepath' is improperly formatted.
+
+      tuf.exceptions.UnknownTargetError:
+        If 'target_filepath' was not found.
+
+      Any other unforeseen runtime exception.
+
+    <Side Effects>
+      The metadata for updated delegated roles are downloaded and stored.
+
+    <Returns>
+      The target information for 'target_filepath', conformant to
+      'tuf.formats.TARGETINFO_SCHEMA'.
+    """
+
+    # Does 'target_filepath' have the correct format?
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    securesystemslib.formats.RELPATH_SCHEMA.check_match(target_filepath)
+
+    target_filepath = self._normalize_target_filepath(target_filepath)
+
+    # Get target by looking at roles in order of priority tags.
+    target = self._preorder_depth_first_walk(target_filepath)
+
+    # Raise an exception if the target information could not be retrieved.
+    if target is None:
+      logger.error(target_filepath + ' not found.')
+      raise tuf.exceptions.UnknownTargetError(target_filepath + ' not found.')
+
+    # Otherwise, return the found target.
+    else:
+      return target
+
+
+
+
+
+  def get_valid_targetinfos(self, target_filepaths):
+    """
+    <Purpose>
+      Return the target information of each of 'target_filepaths', and update
+      the corresponding metadata, if necessary.  The delegation graph is walked
+      once for all the target paths: the paths are routed down the graph
+      together, so that the metadata of a delegated role is updated at most
+      once, however many of the paths it is trusted with.  The target found
+      for each path is the one get_one_valid_targetinfo() would return.
+
+    <Arguments>
+      target_filepaths:
+        A list of paths to target files on the repository.  These are relative
+        to the 'targets' (or equivalent) directory on a given mirror.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'target_filepaths' is improperly formatted.
+
+      tuf.exceptions.NoWorkingMirrorError:
+        If the metadata of the 'targets' role has changed and cannot be
+        updated.
+
+    <Side Effects>
+      The metadata for updated delegated roles are downloaded and stored.
+
+    <Returns>
+      A dictionary of the paths of 'target_filepaths' to their target
+      information, conformant to 'tuf.formats.TARGETINFO_SCHEMA', or to the
+      exception that get_one_valid_targetinfo() would raise for the path
+      (e.g., 'tuf.exceptions.UnknownTargetError' if the target was not
+      found).
+    """
+
+    # Does 'target_filepaths' have the correct format?
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    securesystemslib.formats.RELPATHS_SCHEMA.check_match(target_filepaths)
+
+    normalized_target_filepaths = [self._normalize_target_filepath(
+        target_filepath) for target_filepath in target_filepaths]
+
+    # Get the targets by looking at roles in order of priority tags.
+    targets = self._preorder_depth_first_walk_many(normalized_target_filepaths)
+
+    targetinfos = {}
+
+    for target_filepath, normalized_target_filepath in \
+        zip(target_filepaths, normalized_target_filepaths):
+      target = targets[normalized_target_filepath]
+
+      if target is None:
+        logger.error(normalized_target_filepath + ' not found.')
+        target = tuf.exceptions.UnknownTargetError(normalized_target_filepath +
+            ' not found.')
+
+      targetinfos[target_filepath] = target
+
+    return targetinfos
+
+
+
+
+
+  def target_cache_info(self):
+    """
+    <Purpose>
+      Return the statistics of the cache of resolved targets, so that its size
+      ('tuf.settings.TARGET_CACHE_SIZE') can be tuned.  A lookup of a target
+      path by get_one_valid_targetinfo() or get_valid_targetinfos() is a hit
+      if its target information was cached, and a miss if the delegations had
+      to be walked.
+
+    <Arguments>
+      None.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      A dictionary of the form:
+
+      {'hits': 1520, 'misses': 80, 'maxsize': 4096, 'currsize': 75}
+    """
+
+    return {'hits': self.target_cache.hits,
+        'misses': self.target_cache.misses,
+        'maxsize': self.target_cache.maxsize,
+        'currsize': len(self.target_cache.entries)}
+
+
+
+
+
+  def _normalize_target_filepath(self, target_filepath):
+    """
+    <Purpose>
+      Non-public method that returns 'target_filepath' as it is listed in
+      targets metadata: without URL encoding escapes, and with a leading '/'.
+
+    <Arguments>
+      target_filepath:
+        The path to the target file on the repository.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The normalized 'target_filepath'.
+    """
+
+    # 'target_filepath' might contain URL encoding escapes.
+    # http://docs.python.org/2/library/urllib.html#urllib.unquote
+    target_filepath = six.moves.urllib.parse.unquote(target_filepath)
+
+    if not target_filepath.startswith('/'):
+      target_filepath = '/' + target_filepath
+
+    return target_filepath
+
+
+
+
+
+  def _preorder_depth_first_walk(self, target_filepath):
+    """
+    <Purpose>
+      Non-public method that interrogates the tree of target delegations in
+      order of appearance (which implicitly order trustworthiness), and returns
+      the matching target found in the most trusted role.
+
+    <Arguments>
+      target_filepath:
+        The path to the target file on the repository. This will be relative to
+        the 'targets' (or equivalent) directory on a given mirror.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'target_filepath' is improperly formatted.
+
+      tuf.exceptions.RepositoryError:
+        If 'target_filepath' is not found.
+
+    <Side Effects>
+      The metadata for updated delegated roles are downloaded and stored.
+
+    <Returns>
+      The target information for 'target_filepath', conformant to
+      'tuf.formats.TARGETINFO_SCHEMA'.
+    """
+
+    target = self._preorder_depth_first_walk_many([target_filepath]) \
+                                                  [target_filepath]
+
+    if isinstance(target, Exception):
+      raise target
+
+    return target
+
+
+
+
+
+  def _preorder_depth_first_walk_many(self, target_filepaths):
+    """
+    <Purpose>
+      Non-public method that walks the tree of target delegations for each of
+      'target_filepaths', as _preorder_depth_first_walk() does for one target
+      path.  Each path has its own preorder depth-first walk, but the walks
+      are advanced together: the paths whose walks have reached the same role
+      are looked up in that role at the same time, so that its metadata is
+      updated, and its delegations compiled, once.
+
+    <Arguments>
+      target_filepaths:
+        The list of paths to the target files on the repository.
+
+    <Exceptions>
+      tuf.exceptions.NoWorkingMirrorError:
+        If the metadata of the 'targets' role has changed and cannot be
+        updated.
+
+    <Side Effects>
+      The metadata for updated delegated roles are downloaded and stored.
+
+    <Returns>
+      A dictionary of the paths of 'target_filepaths' to their target
+      information (conformant to 'tuf.formats.TARGETINFO_SCHEMA'), to None if
+      the target was not found, or to the exception raised while the metadata
+      of a role on the walk of the path was updated.
+    """
+
+    current_metadata = self.metadata['current']
+
+    # Ensure the client has the most up-to-date version of 'targets.json'.
+    # Raise 'tuf.exceptions.NoWorkingMirrorError' if the changed metadata cannot be
+    # successfully downloaded and 'tuf.exceptions.RepositoryError' if the referenced
+    # metadata is missing.  Target methods such as this one are called after
+    # the top-level metadata have been refreshed (i.e., updater.refresh()).
+    self._update_targets_metadata()
+
+    # The cached targets were resolved with the current snapshot and targets
+    # metadata, unless a new version of either has since been installed.
+    versions = (current_metadata['snapshot']['version'],
+        current_metadata['targets']['version'])
+    self.target_cache.check_versions(versions)
+    current_time = int(time.time())
+
+    # target_filepath: target information, None or exception
+    targets = {}
+
+    # role_name: expiration of its metadata ('expires', Unix timestamp)
+    expiration_timestamps = {}
+
+    # target_filepath: the state of its preorder depth-first traversal of the
+    # graph of target delegations (the stack of roles to visit, the roles
+    # already visited, and the number of roles that may still be visited).
+    walks = {}
+    pending_target_filepaths = []
+
+    for target_filepath in target_filepaths:
+      if target_filepath in targets or target_filepath in walks:
+        continue
+
+      target = self.target_cache.get(target_filepath, current_time,
+          current_metadata)
+
+      if target is not None:
+        targets[target_filepath] = target
+
+      else:
+        walks[target_filepath] = {'role_names': ['targets'],
+            'visited_role_names': set(),
+            'number_of_delegations': tuf.settings.MAX_NUMBER_OF_DELEGATIONS}
+        pending_target_filepaths.append(target_filepath)
+
+    # role_name: None, or the exception raised while it was updated
+    refreshed_role_names = {}
+
+    # target_filepath: hash of 'target_filepath'
+    target_filepath_hashes = {}
+
+    while pending_target_filepaths:
+      # role_name: the target paths whose walks visit it next
+      target_filepaths_of_role = {}
+      role_names = []
+
+      for target_filepath in pending_target_filepaths:
+        walk = walks[target_filepath]
+        role_name = None
+
+        while walk['number_of_delegations'] > 0 and walk['role_names']:
+          # Pop the role name from the top of the stack.
+          role_name = walk['role_names'].pop(-1)
+
+          # Skip any visited current role to prevent cycles.
+          if role_name not in walk['visited_role_names']:
+            break
+
+          logger.debug('Skipping visited current role ' + repr(role_name))
+          role_name = None
+
+        if role_name is None:
+          if walk['number_of_delegations'] == 0 and walk['role_names']:
+            logger.debug(repr(len(walk['role_names'])) + ' roles left to'
+                ' visit, but allowed to visit at most ' +
+                repr(tuf.settings.MAX_NUMBER_OF_DELEGATIONS) + ' delegations.')
+
+          targets[target_filepath] = None
+          continue
+
+        # After preorder check, add current role to set of visited roles.
+        walk['visited_role_names'].add(role_name)
+
+        # And also decrement number of visited roles.
+        walk['number_of_delegations'] -= 1
+
+        if role_name not in target_filepaths_of_role:
+          target_filepaths_of_role[role_name] = []
+          role_names.append(role_name)
 
+        target_filepaths_of_role[role_name].append(target_filepath)
 
+      pending_target_filepaths = []
 
+      for role_name in role_names:
+        try:
+          # The metadata for 'role_name' must be downloaded/updated before its
+          # targets, delegations, and child roles can be inspected.
+          # _refresh_targets_metadata() does not refresh 'targets.json', it
+          # expects _update_metadata_if_changed() to have already refreshed
+          # it, which this function has checked above.
+          if role_name not in refreshed_role_names:
+            try:
+              self._refresh_targets_metadata(role_name,
+                  refresh_all_delegated_roles=False)
+
+            except Exception as exception:
+              refreshed_role_names[role_name] = exception
+              raise
+
+            else:
+              refreshed_role_names[role_name] = None
 
+          elif refreshed_role_names[role_name] is not None:
+            raise refreshed_role_names[role_name]
 
-  def _update_metadata_if_changed(self, metadata_role,
-    referenced_metadata='snapshot'):
+          # A role refreshed after the background thread of
+          # start_auto_refresh() has published new metadata is stored with
+          # it.
+          role_metadata = current_metadata.get(role_name) or \
+            self.metadata['current'][role_name]
+          child_roles = role_metadata.get('delegations', {}).get('roles', [])
+          delegation_matcher = self._get_delegation_matcher(role_name,
+              child_roles)
+
+        except Exception as exception:
+          for target_filepath in target_filepaths_of_role[role_name]:
+            targets[target_filepath] = exception
+
+          continue
+
+        for target_filepath in target_filepaths_of_role[role_name]:
+          target = self._get_target_from_targets_role(role_name,
+              role_metadata['targets'], target_filepath)
+
+          if target is not None:
+            logger.debug('Found target in current role ' + repr(role_name))
+            targets[target_filepath] = target
+
+            # The target is cached until the metadata of any of the roles
+            # visited to find it expires.
+            visited_role_names = walks[target_filepath]['visited_role_names']
+
+            for visited_role_name in visited_role_names:
+              if visited_role_name not in expiration_timestamps:
+                visited_role_metadata = \
+                  current_metadata.get(visited_role_name) or \
+                  self.metadata['current'][visited_role_name]
+                expiration_timestamps[visited_role_name] = \
+                  (visited_role_metadata['expires'],
+                  self._get_expiration_timestamp(
+                  visited_role_metadata['expires']))
+
+            self.target_cache.add(target_filepath, target, role_name,
+                min([expiration_timestamps[visited_role_name][1]
+                for visited_role_name in visited_role_names]),
+                dict([(visited_role_name,
+                expiration_timestamps[visited_role_name][0])
+                for visited_role_name in visited_role_names]), versions)
+            continue
+
+          # The hash of the target path is computed once, if a child role is
+          # delegated hashed bins.
+          if target_filepath not in target_filepath_hashes and \
+              delegation_matcher.uses_path_hash_prefixes:
+            target_filepath_hashes[target_filepath] = \
+              self._get_target_hash(target_filepath)
+
+          walk = walks[target_filepath]
+          child_roles_to_visit = []
+
+          # Only the child roles trusted with the target are returned, in
+          # order.
+          for child_role in delegation_matcher.match(target_filepath,
+              target_filepath_hashes.get(target_filepath)):
+            child_role_name = child_role['name']
+            logger.debug('Adding child role ' + repr(child_role_name))
+            child_roles_to_visit.append(child_role_name)
+
+            if child_role['terminating']:
+              logger.debug('Not backtracking to other roles.')
+              walk['role_names'] = []
+              break
+
+          # Push 'child_roles_to_visit' in reverse order of appearance onto
+          # the stack of roles to visit.  Roles are popped from the end of the
+          # list.
+          child_roles_to_visit.reverse()
+          walk['role_names'].extend(child_roles_to_visit)
+          pending_target_filepaths.append(target_filepath)
+
+    # The metadata of the roles visited is kept in memory until the walks
+    # are done.
+    self._evict_delegated_roles()
+
+    return targets
+
+
+
+
+
+  def _get_target_from_targets_role(self, role_name, targets, target_filepath):
     """
     <Purpose>
-      Non-public method that updates the metadata for 'metadata_role' if it has
-      changed.  With the exception of the 'timestamp' role, all the top-level
-      roles are updated by this method.  The 'timestamp' role is always
-      downloaded from a mirror without first checking if it has been updated; it
-      is updated in refresh() by calling _update_metadata('timestamp').  This
-      method is also called for delegated role metadata, which are referenced by
-      'snapshot'.
+      Non-public method that determines whether the targets role with the given
+      'role_name' has the target with the name 'target_filepath'.
 
-      If the metadata needs to be updated but an update cannot be obtained,
-      this method will delete the file (with the exception of the root
-      metadata, which never gets removed without a replacement).
+    <Arguments>
+      role_name:
+        The name of the targets role that we are inspecting.
 
-      Due to the way in which metadata files are updated, it is expected that
-      'referenced_metadata' is not out of date and trusted.  The refresh()
-      method updates the top-level roles in 'timestamp -> snapshot ->
-      root -> targets' order.  For delegated metadata, the parent role is
-      updated before the delegated role.  Taking into account that
-      'referenced_metadata' is updated and verified before 'metadata_role',
-      this method determines if 'metadata_role' has changed by checking
-      the 'meta' field of the newly updated 'referenced_metadata'.
+      targets:
+        The targets of the Targets role with the name 'role_name'.
+
+      target_filepath:
+        The path to the target file on the repository. This will be relative to
+        the 'targets' (or equivalent) directory on a given mirror.
+
+    <Exceptions>
+      None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The target information for 'target_filepath', conformant to
+      'tuf.formats.TARGETINFO_SCHEMA'.
+    """
+
+    target = None
+
+    # Does the current role name have our target?  'targets' is keyed by
+    # filepath, so it is looked up directly rather than scanned, whatever the
+    # number of targets of the role.
+    logger.debug('Asking role ' + repr(role_name) + ' about target ' +\
+      repr(target_filepath))
+
+    fileinfo = targets.get(target_filepath)
+
+    if fileinfo is not None:
+      logger.debug('Found target ' + target_filepath + ' in role ' + role_name)
+      target = {'filepath': target_filepath, 'fileinfo': fileinfo}
+
+    else:
+      logger.debug('No target ' + target_filepath + ' in role ' + role_name)
+
+    return target
+
+
+
+
+
+
+  def _visit_child_role(self, child_role, target_filepath):
+    """
+    <Purpose>
+      Non-public method that determines whether the given 'target_filepath'
+      is an allowed path of 'child_role'.
+
+      Ensure that we explore only delegated roles trusted with the target.  The
+      metadata for 'child_role' should have been refreshed prior to this point,
+      however, the paths/targets that 'child_role' signs for have not been
+      verified (as intended).  The paths/targets that 'child_role' is allowed
+      to specify in its metadata depends on the delegating role, and thus is
+      left to the caller to verify.  We verify here that 'target_filepath'
+      is an allowed path according to the delegated 'child_role'.
+
+      TODO: Should the TUF spec restrict the repository to one particular
+      algorithm?  Should we allow the repository to specify in the role
+      dictionary the algorithm used for these generated hashed paths?
 
     <Arguments>
-      metadata_role:
-        The name of the metadata. This is a role name and should not end
-        in '.json'.  Examples: 'root', 'targets', 'unclaimed'.
+      child_role:
+        The delegation targets role object of 'child_role', containing its
+        paths, path_hash_prefixes, keys, and so on.
 
-      referenced_metadata:
-        This is the metadata that provides the role information for
-        'metadata_role'.  For the top-level roles, the 'snapshot' role
-        is the referenced metadata for the 'root', and 'targets' roles.
-        The 'timestamp' metadata is always downloaded regardless.  In
-        other words, it is updated by calling _update_metadata('timestamp')
-        and not by this method.  The referenced metadata for 'snapshot'
-        is 'timestamp'.  See refresh().
+      target_filepath:
+        The path to the target file on the repository. This will be relative to
+        the 'targets' (or equivalent) directory on a given mirror.
 
     <Exceptions>
-      tuf.exceptions.NoWorkingMirrorError:
-        If 'metadata_role' could not be downloaded after determining that it had
-        changed.
+      None.
 
-      tuf.exceptions.RepositoryError:
-        If the referenced metadata is missing.
+    <Side Effects>
+      None.
+
+    <Returns>
+      If 'child_role' has been delegated the target with the name
+      'target_filepath', then we return the role name of 'child_role'.
+
+      Otherwise, we return None.
+    """
+
+    target_filepath_hash = None
+
+    if child_role.get('path_hash_prefixes') is not None:
+      target_filepath_hash = self._get_target_hash(target_filepath)
+
+    if _DelegationMatcher([child_role]).match(target_filepath,
+        target_filepath_hash):
+      logger.debug('Child role ' + repr(child_role['name']) + ' is allowed to'
+          ' sign for ' + repr(target_filepath))
+      return child_role['name']
+
+    return None
+
+
+
+  def _get_delegation_matcher(self, rolename, child_roles):
+    """
+    <Purpose>
+      Non-public method that returns the '_DelegationMatcher' of the
+      delegations of 'rolename'.  The delegations are compiled once for each
+      version of the metadata of 'rolename' that is trusted, rather than for
+      every target that is looked up.
+
+    <Arguments>
+      rolename:
+        The name of the targets role.
+
+      child_roles:
+        The delegated roles ('delegations' -> 'roles') of the currently
+        trusted metadata of 'rolename'.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If a delegated role has neither "paths" nor "path_hash_prefixes".
 
     <Side Effects>
-      If it is determined that 'metadata_role' has been updated, the metadata
-      store (i.e., self.metadata) is updated with the new metadata and the
-      affected stores modified (i.e., the previous metadata store is updated).
-      If the metadata is 'targets' or a delegated targets role, the role
-      database is updated with the new information, including its delegated
-      roles.
+      The compiled delegations are stored in 'self.delegation_matchers'.
 
     <Returns>
+      A '_DelegationMatcher' object.
+    """
+
+    delegation_matcher = self.delegation_matchers.get(rolename)
+
+    # The metadata of 'rolename' is replaced, rather than modified, when it is
+    # updated or loaded again, so that the matcher of outdated delegations is
+    # replaced too.
+    if delegation_matcher is None or \
+        delegation_matcher.child_roles is not child_roles:
+      delegation_matcher = _DelegationMatcher(child_roles)
+      self.delegation_matchers[rolename] = delegation_matcher
+
+    return delegation_matcher
+
+
+
+
+
+  def _get_target_hash(self, target_filepath, hash_function='sha256'):
+    """
+    <Purpose>
+      Non-public method that computes the hash of 'target_filepath'. This is
+      useful in conjunction with the "path_hash_prefixes" attribute in a
+      delegated targets role, which tells us which paths it is implicitly
+      responsible for.
+
+    <Arguments>
+      target_filepath:
+        The path to the target file on the repository. This will be relative to
+        the 'targets' (or equivalent) directory on a given mirror.
+
+      hash_function:
+        The algorithm used by the repository to generate the hashes of the
+        target filepaths.  The repository may optionally organize targets into
+        hashed bins to ease target delegations and role metadata management.
+        The use of consistent hashing allows for a uniform distribution of
+        targets into bins.
+
+    <Exceptions>
       None.
+
+    <Side Effects>
+      None.
+
+    <Returns>
+      The hash of 'target_filepath'.
     """
 
-    metadata_filename = metadata_role + '.json'
-    expected_versioninfo = None
-    expected_fileinfo = None
+    # Calculate the hash of the filepath to determine which bin to find the
+    # target.  The client currently assumes the repository (i.e., repository
+    # tool) uses 'hash_function' to generate hashes and UTF-8.
+    digest_object = securesystemslib.hash.digest(hash_function)
+    encoded_target_filepath = target_filepath.encode('utf-8')
+    digest_object.update(encoded_target_filepath)
+    target_filepath_hash = digest_object.hexdigest()
 
-    # Ensure the referenced metadata has been loaded.  The 'root' role may be
-    # updated without having 'snapshot' available.
-    if referenced_metadata not in self.metadata['current']:
-      raise tuf.exceptions.RepositoryError('Cannot update'
-        ' ' + repr(metadata_role) + ' because ' + referenced_metadata + ' is'
-        ' missing.')
+    return target_filepath_hash
 
-    # The referenced metadata has been loaded.  Extract the new versioninfo for
-    # 'metadata_role' from it.
-    else:
-      logger.debug(repr(metadata_role) + ' referenced in ' +
-        repr(referenced_metadata)+ '.  ' + repr(metadata_role) +
-        ' may be updated.')
 
-    # Simply return if the metadata for 'metadata_role' has not been updated,
-    # according to the uncompressed metadata provided by the referenced
-    # metadata.  The metadata is considered updated if its version number is
-    # strictly greater than its currently trusted version number.
-    expected_versioninfo = self.metadata['current'][referenced_metadata] \
-                                        ['meta'] \
-                                        [metadata_filename]
 
-    if not self._versioninfo_has_been_updated(metadata_filename,
-                                              expected_versioninfo):
-      logger.info(repr(metadata_filename) + ' up-to-date.')
 
-      # Since we have not downloaded a new version of this metadata, we should
-      # check to see if our local version is stale and notify the user if so.
-      # This raises tuf.exceptions.ExpiredMetadataError if the metadata we have
-      # is expired. Resolves issue #322.
-      self._ensure_not_expired(self.metadata['current'][metadata_role],
-                               metadata_role)
 
-      # TODO: If 'metadata_role' is root or snapshot, we should verify that
-      # root's hash matches what's in snapshot, and that snapshot hash matches
-      # what's listed in timestamp.json.
+  def remove_obsolete_targets(self, destination_directory):
+    """
+    <Purpose>
+      Remove any files that are in 'previous' but not 'current'.  This makes it
+      so if you remove a file from a repository, it actually goes away.  The
+      targets for the 'targets' role and all delegated roles are checked.
+
+    <Arguments>
+      destination_directory:
+        The directory containing the target files tracked by TUF.
+
+    <Exceptions>
+      securesystemslib.exceptions.FormatError:
+        If 'destination_directory' is improperly formatted.
+
+      tuf.exceptions.RepositoryError:
+        If an error occurred removing any files.
+
+    <Side Effects>
+      Target files are removed from disk.
+
+    <Returns>
+      None.
+    """
+
+    # Does 'destination_directory' have the correct format?
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
 
-      return
+    removed_filepaths = []
 
-    logger.debug('Metadata ' + repr(metadata_filename) + ' has changed.')
+    # Iterate the rolenames and verify whether the 'previous' directory
+    # contains a target no longer found in 'current'.
+    for role in tuf.roledb.get_rolenames(self.repository_name):
+      if role.startswith('targets'):
+        previous_metadata = self._get_metadata_of_role('previous', role)
+        current_metadata = self._get_metadata_of_role('current', role)
 
-    # The file lengths of metadata are unknown, only their version numbers are
-    # known.  Set an upper limit for the length of the downloaded file for each
-    # expected role.  Note: The Timestamp role is not updated via this
-    # function.
-    if metadata_role == 'snapshot':
-      upperbound_filelength = tuf.settings.DEFAULT_SNAPSHOT_REQUIRED_LENGTH
+        if previous_metadata is not None and current_metadata is not None:
+          for target in previous_metadata['targets']:
+            if target not in current_metadata['targets']:
+              # 'target' is only in 'previous', so remove it.
+              logger.warning('Removing obsolete file: ' + repr(target) + '.')
 
-    elif metadata_role == 'root':
-      upperbound_filelength = tuf.settings.DEFAULT_ROOT_REQUIRED_LENGTH
+              # Remove the file if it hasn't been removed already.
+              destination = \
+                os.path.join(destination_directory, target.lstrip(os.sep))
+              try:
+                os.remove(destination)
+                removed_filepaths.append(destination)
 
-    # The metadata is considered Targets (or delegated Targets metadata).
-    else:
-      upperbound_filelength = tuf.settings.DEFAULT_TARGETS_REQUIRED_LENGTH
+              except OSError as e:
+                # If 'filename' already removed, just log it.
+                if e.errno == errno.ENOENT:
+                  logger.info('File ' + repr(destination) + ' was already'
+                    ' removed.')
+                  removed_filepaths.append(destination)
 
-    try:
-      self._update_metadata(metadata_role, upperbound_filelength,
-          expected_versioninfo['version'])
+                else:
+                  logger.error(str(e))
 
-    except:
-      # The current metadata we have is not current but we couldn't get new
-      # metadata. We shouldn't use the old metadata anymore.  This will get rid
-      # of in-memory knowledge of the role and delegated roles, but will leave
-      # delegated metadata files as current files on disk.
-      #
-      # TODO: Should we get rid of the delegated metadata files?  We shouldn't
-      # need to, but we need to check the trust implications of the current
-      # implementation.
-      self._delete_metadata(metadata_role)
-      logger.error('Metadata for ' + repr(metadata_role) + ' cannot be updated.')
-      raise
+            else:
+              logger.debug('Skipping: ' + repr(target) + '.  It is still'
+                ' a current target.')
+        else:
+          logger.debug('Skipping: ' + repr(role) + '.  Not in the previous'
+            ' metadata')
 
-    else:
-      # We need to import the delegated roles of 'metadata_role', since its
-      # list of delegations might have changed from what was previously
-      # loaded..
-      # TODO: Should we remove the keys of the delegated roles?
-      self._import_delegations(metadata_role)
+    self._forget_local_hashes(removed_filepaths)
 
 
 
 
 
-  def _versioninfo_has_been_updated(self, metadata_filename, new_versioninfo):
+  def updated_targets(self, targets, destination_directory):
     """
     <Purpose>
-      Non-public method that determines whether the current versioninfo of
-      'metadata_filename' is less than 'new_versioninfo' (i.e., the version
-      number has been incremented).  The 'new_versioninfo' argument should be
-      extracted from the latest copy of the metadata that references
-      'metadata_filename'.  Example: 'root.json' would be referenced by
-      'snapshot.json'.
+      Return the targets in 'targets' that have changed.  Targets are considered
+      changed if they do not exist at 'destination_directory' or the target
+      located there has mismatched file properties.
 
-      'new_versioninfo' should only be 'None' if this is for updating
-      'root.json' without having 'snapshot.json' available.
+      The returned information is a list conformant to
+      'tuf.formats.TARGETINFOS_SCHEMA' and has the form:
 
-    <Arguments>
-      metadadata_filename:
-        The metadata filename for the role.  For the 'root' role,
-        'metadata_filename' would be 'root.json'.
+      [{'filepath': 'a/b/c.txt',
+        'fileinfo': {'length': 13323,
+                     'hashes': {'sha256': dbfac345..}}
+       ...]
 
-      new_versioninfo:
-        A dict object representing the new file information for
-        'metadata_filename'.  'new_versioninfo' may be 'None' when
-        updating 'root' without having 'snapshot' available.  This
-        dict conforms to 'securesystemslib.formats.VERSIONINFO_SCHEMA' and has
-        the form:
+    <Arguments>
+      targets:
+        A list of target files.  Targets that come earlier in the list are
+        chosen over duplicates that may occur later.
 
-        {'version': 288}
+      destination_directory:
+        The directory containing the target files.
 
     <Exceptions>
-      None.
+      securesystemslib.exceptions.FormatError:
+        If the arguments are improperly formatted.
 
     <Side Effects>
-      If there is no versioninfo currently loaded for 'metadata_filename', try
-      to load it.
+      The files in 'targets' are read and their hashes computed.
 
     <Returns>
-      Boolean.  True if the versioninfo has changed, False otherwise.
+      A list of targets, conformant to
+      'tuf.formats.TARGETINFOS_SCHEMA'.
     """
 
-    # If there is no versioninfo currently stored for 'metadata_filename',
-    # try to load the file, calculate the versioninfo, and store it.
-    if metadata_filename not in self.versioninfo:
-      self._update_versioninfo(metadata_filename)
+    # Do the arguments have the correct format?
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    tuf.formats.TARGETINFOS_SCHEMA.check_match(targets)
+    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
 
-    # Return true if there is no versioninfo for 'metadata_filename'.
-    # 'metadata_filename' is not in the 'self.versioninfo' store
-    # and it doesn't exist in the 'current' metadata location.
-    if self.versioninfo[metadata_filename] is None:
-      return True
+    # Keep track of the target objects and filepaths of updated targets.
+    # Return 'updated_targets' and use 'updated_targetpaths' to avoid
+    # duplicates.
+    updated_targets = []
+    updated_targetpaths = set()
 
-    current_versioninfo = self.versioninfo[metadata_filename]
+    # target_filepath: the algorithms of the hashes listed for it
+    algorithms = {}
+    target_filepaths = []
 
-    if new_versioninfo['version'] > current_versioninfo['version']:
-      return True
+    for target in targets:
+      # Prepend 'destination_directory' to the target's relative filepath (as
+      # stored in metadata.)  Verify the hash of 'target_filepath' against
+      # each hash listed for its fileinfo.  Note: join() discards
+      # 'destination_directory' if 'filepath' contains a leading path separator
+      # (i.e., is treated as an absolute path).
+      filepath = target['filepath']
+      if filepath[0] == '/':
+        filepath = filepath[1:]
+      target_filepath = os.path.join(destination_directory, filepath)
 
-    else:
-      return False
+      target_filepaths.append(target_filepath)
+      algorithms.setdefault(target_filepath, set()).update(
+          target['fileinfo']['hashes'])
+
+    # Each local file is hashed, with all the algorithms needed, at most once.
+    local_hashes = self._get_local_hashes(algorithms)
+
+    for target, target_filepath in zip(targets, target_filepaths):
+      if target_filepath in updated_targetpaths:
+        continue
 
+      # The target is updated if it does not exist locally, or if one of its
+      # hashes differs.
+      target_hashes = local_hashes[target_filepath]
+
+      for algorithm, digest in six.iteritems(target['fileinfo']['hashes']):
+        if target_hashes is None or target_hashes[algorithm] != digest:
+          updated_targets.append(target)
+          updated_targetpaths.add(target_filepath)
+          break
 
+    return updated_targets
 
 
 
-  def _update_versioninfo(self, metadata_filename):
+
+
+  def _get_local_hashes(self, algorithms):
     """
     <Purpose>
-      Non-public method that updates the 'self.versioninfo' entry for the
-      metadata belonging to 'metadata_filename'.  If the current metadata for
-      'metadata_filename' cannot be loaded, set its 'versioninfo' to 'None' to
-      signal that it is not in 'self.versioninfo' AND it also doesn't exist
-      locally.
+      Non-public method that returns the hashes of local files.  If
+      'tuf.settings.CACHE_LOCAL_TARGET_HASHES' is True, a file whose length,
+      modification time and inode are those it had when it was last hashed is
+      not hashed again, and the hashes of the files that no longer exist are
+      dropped from the cache.  The other files are read
+      once, and hashed with all the needed algorithms, by up to
+      'tuf.settings.MAX_CONCURRENT_HASHES' worker threads.
 
     <Arguments>
-      metadata_filename:
-        The metadata filename for the role.  For the 'root' role,
-        'metadata_filename' would be 'root.json'.
+      algorithms:
+        A dictionary of the paths of the files to the sets of hash algorithms
+        (e.g., 'sha256') needed for them.
 
     <Exceptions>
-      None.
+      securesystemslib.exceptions.UnsupportedAlgorithmError:
+        If a hash algorithm is not supported.
 
     <Side Effects>
-      The version number of 'metadata_filename' is calculated and stored in its
-      corresponding entry in 'self.versioninfo'.
+      The files that have changed are read and hashed, and the cached hashes
+      are saved if they have changed.
 
     <Returns>
-      None.
+      A dictionary of the file paths to dictionaries of algorithms to hex
+      digests, or to None for the files that cannot be read (e.g., that do not
+      exist).
     """
 
-    # In case we delayed loading the metadata and didn't do it in
-    # __init__ (such as with delegated metadata), then get the version
-    # info now.
+    if tuf.settings.CACHE_LOCAL_TARGET_HASHES and self.local_hashes is None:
+      self.local_hashes = self._load_local_hashes()
 
-    # Save the path to the current metadata file for 'metadata_filename'.
-    current_filepath = os.path.join(self.metadata_directory['current'],
-                                    metadata_filename)
-    # If the path is invalid, simply return and leave versioninfo unset.
-    if not os.path.exists(current_filepath):
-      self.versioninfo[metadata_filename] = None
-      return
+    local_hashes = {}
+    filepaths_to_hash = []
+    file_statuses = {}
+    cache_changed = False
 
-    # Extract the version information from the trusted snapshot role and save
-    # it to the 'self.versioninfo' store.
-    if metadata_filename == 'timestamp.json':
-      trusted_versioninfo = \
-        self.metadata['current']['timestamp']['version']
+    for filepath, file_algorithms in six.iteritems(algorithms):
+      file_status = _get_file_status(filepath)
 
-    # When updating snapshot.json, the client either (1) has a copy of
-    # snapshot.json, or (2) is in the process of obtaining it by first
-    # downloading timestamp.json.  Note: Clients are allowed to have only
-    # root.json initially, and perform a refresh of top-level metadata to
-    # obtain the remaining roles.
-    elif metadata_filename == 'snapshot.json':
+      if file_status is None:
+        local_hashes[filepath] = None
 
-      # Verify the version number of the currently trusted snapshot.json in
-      # snapshot.json itself.  Checking the version number specified in
-      # timestamp.json may be greater than the version specified in the
-      # client's copy of snapshot.json.
-      try:
-        timestamp_version_number = self.metadata['current']['snapshot']['version']
-        trusted_versioninfo = tuf.formats.make_versioninfo(timestamp_version_number)
+        # The hashes of a file that no longer exists are dropped, so that the
+        # cache does not grow with the targets that have been removed.
+        if tuf.settings.CACHE_LOCAL_TARGET_HASHES and \
+            self.local_hashes.pop(os.path.abspath(filepath), None) is not None:
+          cache_changed = True
 
-      except KeyError:
-        trusted_versioninfo = \
-          self.metadata['current']['timestamp']['meta']['snapshot.json']
+        continue
 
-    else:
+      file_statuses[filepath] = file_status
 
-      try:
-        # The metadata file names in 'self.metadata' exclude the role
-        # extension.  Strip the '.json' extension when checking if
-        # 'metadata_filename' currently exists.
-        targets_version_number = \
-          self.metadata['current'][metadata_filename[:-len('.json')]]['version']
-        trusted_versioninfo = \
-          tuf.formats.make_versioninfo(targets_version_number)
+      if tuf.settings.CACHE_LOCAL_TARGET_HASHES:
+        cached = self.local_hashes.get(os.path.abspath(filepath))
 
-      except KeyError:
-        trusted_versioninfo = \
-          self.metadata['current']['snapshot']['meta'][metadata_filename]
+        if cached is not None and cached['status'] == file_status and \
+            file_algorithms.issubset(cached['hashes']):
+          local_hashes[filepath] = cached['hashes']
+          continue
 
-    self.versioninfo[metadata_filename] = trusted_versioninfo
+      filepaths_to_hash.append(filepath)
 
+    results = _map_concurrently(
+        lambda filepath: _hash_file(filepath, algorithms[filepath]),
+        filepaths_to_hash, tuf.settings.MAX_CONCURRENT_HASHES)
 
+    # A file is not cached if it is modified while it is hashed, or so soon
+    # after that a later modification may leave its modification time
+    # unchanged.
+    cache_time = (time.time() - 2) * 10**9
 
+    for filepath in filepaths_to_hash:
+      result = results[filepath]
 
+      if isinstance(result, (IOError, OSError)):
+        local_hashes[filepath] = None
+        continue
 
-  def _fileinfo_has_changed(self, metadata_filename, new_fileinfo):
+      elif isinstance(result, Exception):
+        raise result
+
+      local_hashes[filepath] = result
+
+      if tuf.settings.CACHE_LOCAL_TARGET_HASHES and \
+          file_statuses[filepath] == _get_file_status(filepath) and \
+          file_statuses[filepath][1] < cache_time:
+        self.local_hashes[os.path.abspath(filepath)] = \
+          {'status': file_statuses[filepath], 'hashes': result}
+        cache_changed = True
+
+    if tuf.settings.CACHE_LOCAL_TARGET_HASHES and cache_changed:
+      self._save_local_hashes()
+
+    return local_hashes
+
+
+
+
+
+  def download_target(self, target, destination_directory, resumable=False):
     """
     <Purpose>
-      Non-public method that determines whether the current fileinfo of
-      'metadata_filename' differs from 'new_fileinfo'.  The 'new_fileinfo'
-      argument should be extracted from the latest copy of the metadata that
-      references 'metadata_filename'.  Example: 'root.json' would be referenced
-      by 'snapshot.json'.
+      Download 'target' and verify it is trusted.
 
-      'new_fileinfo' should only be 'None' if this is for updating 'root.json'
-      without having 'snapshot.json' available.
+      This will only store the file at 'destination_directory' if the
+      downloaded file matches the description of the file in the trusted
+      metadata.
+
+      A resumable download keeps the data received so far in a spool file
+      next to the destination, named after it with the
+      'tuf.settings.PARTIAL_DOWNLOAD_SUFFIX' suffix.  If a mirror fails, the
+      download continues from the same byte on the next mirror, or in a later
+      call, with HTTP range requests.
 
     <Arguments>
-      metadadata_filename:
-        The metadata filename for the role.  For the 'root' role,
-        'metadata_filename' would be 'root.json'.
+      target:
+        The target to be downloaded.  Conformant to
+        'tuf.formats.TARGETINFO_SCHEMA'.
 
-      new_fileinfo:
-        A dict object representing the new file information for
-        'metadata_filename'.  'new_fileinfo' may be 'None' when
-        updating 'root' without having 'snapshot' available.  This
-        dict conforms to 'tuf.formats.FILEINFO_SCHEMA' and has
-        the form:
+      destination_directory:
+        The directory to save the downloaded target file.
 
-        {'length': 23423
-         'hashes': {'sha256': adfbc32343..}}
+      resumable:
+        A boolean indicating whether an interrupted download should be
+        resumed, rather than started over.
 
     <Exceptions>
-      None.
+      securesystemslib.exceptions.FormatError:
+        If 'target' is not properly formatted.
+
+      tuf.exceptions.NoWorkingMirrorError:
+        If a target could not be downloaded from any of the mirrors.
+
+        Although expected to be rare, there might be OSError exceptions (except
+        errno.EEXIST) raised when creating the destination directory (if it
+        doesn't exist).
 
     <Side Effects>
-      If there is no fileinfo currently loaded for 'metada_filename',
-      try to load it.
+      A target file is saved to the local system.
 
     <Returns>
-      Boolean.  True if the fileinfo has changed, false otherwise.
+      None.
     """
 
-    # If there is no fileinfo currently stored for 'metadata_filename',
-    # try to load the file, calculate the fileinfo, and store it.
-    if metadata_filename not in self.fileinfo:
-      self._update_fileinfo(metadata_filename)
+    # Do the arguments have the correct format?
+    # This check ensures the arguments have the appropriate
+    # number of objects and object types, and that all dict
+    # keys are properly named.
+    # Raise 'securesystemslib.exceptions.FormatError' if the check fail.
+    tuf.formats.TARGETINFO_SCHEMA.check_match(target)
+    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
+    securesystemslib.formats.BOOLEAN_SCHEMA.check_match(resumable)
 
-    # Return true if there is no fileinfo for 'metadata_filename'.
-    # 'metadata_filename' is not in the 'self.fileinfo' store
-    # and it doesn't exist in the 'current' metadata location.
-    if self.fileinfo[metadata_filename] is None:
-      return True
+    # Extract the target file information.
+    target_filepath = target['filepath']
+    trusted_length = target['fileinfo']['length']
+    trusted_hashes = target['fileinfo']['hashes']
 
-    current_fileinfo = self.fileinfo[metadata_filename]
+    destination = self._make_target_destination(target_filepath,
+        destination_directory)
+    target_dirpath = os.path.dirname(destination)
 
-    if current_fileinfo['length'] != new_fileinfo['length']:
-      return True
+    if resumable:
+      # The spool file is in the same directory as 'destination', so that the
+      # verified target is moved into place with a rename.
+      spool_filepath = destination + tuf.settings.PARTIAL_DOWNLOAD_SUFFIX
+      self._get_target_file_resumably(target_filepath, trusted_length,
+                                      trusted_hashes, spool_filepath)
+      tuf.download.replace_file(spool_filepath, destination)
+      return
 
-    # Now compare hashes. Note that the reason we can't just do a simple
-    # equality check on the fileinfo dicts is that we want to support the
-    # case where the hash algorithms listed in the metadata have changed
-    # without having that result in considering all files as needing to be
-    # updated, or not all hash algorithms listed can be calculated on the
-    # specific client.
-    for algorithm, hash_value in six.iteritems(new_fileinfo['hashes']):
-      # We're only looking for a single match. This isn't a security
-      # check, we just want to prevent unnecessary downloads.
-      if algorithm in current_fileinfo['hashes']:
-        if hash_value == current_fileinfo['hashes'][algorithm]:
-          return False
+    # '_get_target_file()' checks every mirror and returns the first target
+    # that passes verification.  The target is downloaded next to its
+    # destination, so that it is renamed into place rather than copied from
+    # another file system.
+    target_file_object = self._get_target_file(target_filepath, trusted_length,
+        trusted_hashes, temp_directory=target_dirpath)
 
-    return True
+    # We acquired a target file object from a mirror.  Move the file into place
+    # (i.e., locally to 'destination_directory').
+    target_file_object.move(destination)
 
 
 
 
 
-  def _update_fileinfo(self, metadata_filename):
+  def download_targets(self, targets, destination_directory, max_workers=None,
+      resumable=False):
     """
     <Purpose>
-      Non-public method that updates the 'self.fileinfo' entry for the metadata
-      belonging to 'metadata_filename'.  If the 'current' metadata for
-      'metadata_filename' cannot be loaded, set its fileinfo' to 'None' to
-      signal that it is not in the 'self.fileinfo' AND it also doesn't exist
-      locally.
+      Download the targets of 'targets' concurrently, and verify they are
+      trusted, as download_target() does for each of them.  Up to
+      'max_workers' targets are downloaded at the same time, and every target
+      is attempted, even if another one fails.
+
+      Targets with the same length and hashes have the same content, which is
+      downloaded once.  It is copied to the destinations of the other targets,
+      and the copies are verified against their trusted length and hashes
+      before they are moved into place.  'targets' should not list different
+      targets with the same file path.
 
     <Arguments>
-      metadata_filename:
-        The metadata filename for the role.  For the 'root' role,
-        'metadata_filename' would be 'root.json'.
+      targets:
+        A list of targets to be downloaded.  Conformant to
+        'tuf.formats.TARGETINFOS_SCHEMA'.
+
+      destination_directory:
+        The directory to save the downloaded target files.
+
+      max_workers:
+        The maximum number of targets downloaded concurrently, or None for
+        'tuf.settings.MAX_CONCURRENT_DOWNLOADS'.
+
+      resumable:
+        A boolean indicating whether interrupted downloads should be resumed,
+        rather than started over.
 
     <Exceptions>
-      None.
+      securesystemslib.exceptions.FormatError:
+        If the arguments are improperly formatted.
 
     <Side Effects>
-      The file details of 'metadata_filename' is calculated and
-      stored in 'self.fileinfo'.
+      Target files are saved to the local system.
 
     <Returns>
-      None.
+      A dictionary of the file paths of 'targets' to None if the target was
+      downloaded, or to the exception download_target() raised for it (e.g.,
+      'tuf.exceptions.NoWorkingMirrorError' if the target could not be
+      downloaded from any of the mirrors).
     """
 
-    # In case we delayed loading the metadata and didn't do it in
-    # __init__ (such as with delegated metadata), then get the file
-    # info now.
-
-    # Save the path to the current metadata file for 'metadata_filename'.
-    current_filepath = os.path.join(self.metadata_directory['current'],
-                                    metadata_filename)
-    # If the path is invalid, simply return and leave fileinfo unset.
-    if not os.path.exists(current_filepath):
-      self.fileinfo[metadata_filename] = None
-      return
+    # Do the arguments have the correct format?
+    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+    tuf.formats.TARGETINFOS_SCHEMA.check_match(targets)
+    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
+    securesystemslib.formats.BOOLEAN_SCHEMA.check_match(resumable)
 
-    # Extract the file information from the actual file and save it
-    # to the fileinfo store.
-    file_length, hashes = securesystemslib.util.get_file_details(current_filepath)
-    metadata_fileinfo = tuf.formats.make_fileinfo(file_length, hashes)
-    self.fileinfo[metadata_filename] = metadata_fileinfo
+    if max_workers is None:
+      max_workers = tuf.settings.MAX_CONCURRENT_DOWNLOADS
 
+    tuf.formats.MAX_WORKERS_SCHEMA.check_match(max_workers)
 
+    # (length, hashes): the targets with that content, by file path
+    targets_by_content = collections.OrderedDict()
 
+    for target in targets:
+      fileinfo = target['fileinfo']
+      content = (fileinfo['length'], tuple(sorted(fileinfo['hashes'].items())))
+      targets_by_content.setdefault(content, collections.OrderedDict()) \
+          [target['filepath']] = target
 
+    contents = list(targets_by_content)
 
+    def download_content(content):
+      # target_filepath: None or exception
+      results = {}
+      source = None
 
+      for target_filepath, target in six.iteritems(targets_by_content[content]):
+        if source is not None:
+          try:
+            self._copy_target_file(source, target, destination_directory)
+            results[target_filepath] = None
+            continue
 
-  def _move_current_to_previous(self, metadata_role):
-    """
-    <Purpose>
-      Non-public method that moves the current metadata file for 'metadata_role'
-      to the previous directory.
+          # The copy is downloaded instead.
+          except Exception as e:
+            logger.warning('Could not copy ' + repr(source) + ' to the'
+                ' destination of ' + repr(target_filepath) + ': ' + repr(e))
 
-    <Arguments>
-      metadata_role:
-        The name of the metadata. This is a role name and should not end
-        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+        try:
+          self.download_target(target, destination_directory, resumable)
 
-    <Exceptions>
-      None.
+        except Exception as e:
+          results[target_filepath] = e
+          continue
 
-    <Side Effects>
-     The metadata file for 'metadata_role' is removed from 'current'
-     and moved to the 'previous' directory.
+        results[target_filepath] = None
+        source = self._get_target_destination(target_filepath,
+            destination_directory)
 
-    <Returns>
-      None.
-    """
+      return results
 
-    # Get the 'current' and 'previous' full file paths for 'metadata_role'
-    metadata_filepath = metadata_role + '.json'
-    previous_filepath = os.path.join(self.metadata_directory['previous'],
-                                     metadata_filepath)
-    current_filepath = os.path.join(self.metadata_directory['current'],
-                                    metadata_filepath)
+    results = {}
 
-    # Remove the previous path if it exists.
-    if os.path.exists(previous_filepath):
-      os.remove(previous_filepath)
+    for content_results in six.itervalues(_map_concurrently(download_content,
+        contents, max_workers)):
+      results.update(content_results)
 
-    # Move the current path to the previous path.
-    if os.path.exists(current_filepath):
-      securesystemslib.util.ensure_parent_dir(previous_filepath)
-      os.rename(current_filepath, previous_filepath)
+    return results
 
 
 
 
 
-  def _delete_metadata(self, metadata_role):
+  def _get_target_destination(self, target_filepath, destination_directory):
     """
     <Purpose>
-      Non-public method that removes all (current) knowledge of 'metadata_role'.
-      The metadata belonging to 'metadata_role' is removed from the current
-      'self.metadata' store and from the role database. The 'root.json' role
-      file is never removed.
+      Non-public method that returns the absolute path, in
+      'destination_directory', that the target 'target_filepath' is saved to.
 
     <Arguments>
-      metadata_role:
-        The name of the metadata. This is a role name and should not end
-        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+      target_filepath:
+        The path of the target, relative to the targets directory of the
+        repository.
+
+      destination_directory:
+        The directory to save the target file.
 
     <Exceptions>
       None.
 
     <Side Effects>
-      The role database is modified and the metadata for 'metadata_role'
-      removed from the 'self.metadata' store.
+      None.
 
     <Returns>
-      None.
+      The absolute path of the local copy of the target.
     """
 
-    # The root metadata role is never deleted without a replacement.
-    if metadata_role == 'root':
-      return
-
-    # Get rid of the current metadata file.
-    self._move_current_to_previous(metadata_role)
+    # Note: join() discards 'destination_directory' if 'target_path' contains
+    # a leading path separator (i.e., is treated as an absolute path).
+    destination = os.path.join(destination_directory,
+                               target_filepath.lstrip(os.sep))
 
-    # Remove knowledge of the role.
-    if metadata_role in self.metadata['current']:
-      del self.metadata['current'][metadata_role]
-    tuf.roledb.remove_role(metadata_role, self.repository_name)
+    return os.path.abspath(destination)
 
 
 
 
 
-  def _ensure_not_expired(self, metadata_object, metadata_rolename):
+  def _make_target_destination(self, target_filepath, destination_directory):
     """
     <Purpose>
-      Non-public method that raises an exception if the current specified
-      metadata has expired.
+      Non-public method that returns the absolute path that the target
+      'target_filepath' is saved to (see _get_target_destination()), and
+      creates the directory that contains it.
 
     <Arguments>
-      metadata_object:
-        The metadata that should be expired, a 'tuf.formats.ANYROLE_SCHEMA'
-        object.
+      target_filepath:
+        The path of the target, relative to the targets directory of the
+        repository.
 
-      metadata_rolename:
-        The name of the metadata. This is a role name and should not end
-        in '.json'.  Examples: 'root', 'targets', 'targets/linux/x86'.
+      destination_directory:
+        The directory to save the target file.
 
     <Exceptions>
-      tuf.exceptions.ExpiredMetadataError:
-        If 'metadata_rolename' has expired.
+      OSError (except errno.EEXIST), if the directory cannot be created.
 
     <Side Effects>
-      None.
+      The directory of the target is created, if it does not exist.
 
     <Returns>
-      None.
+      The absolute path of the local copy of the target.
     """
 
-    # Extract the expiration time.
-    expires = metadata_object['expires']
+    destination = self._get_target_destination(target_filepath,
+        destination_directory)
+    target_dirpath = os.path.dirname(destination)
 
-    # If the current time has surpassed the expiration date, raise an
-    # exception.  'expires' is in
-    # 'securesystemslib.formats.ISO8601_DATETIME_SCHEMA' format (e.g.,
-    # '1985-10-21T01:22:00Z'.)  Convert it to a unix timestamp and compare it
-    # against the current time.time() (also in Unix/POSIX time format, although
-    # with microseconds attached.)
-    current_time = int(time.time())
+    # When attempting to create the leaf directory of 'target_dirpath', ignore
+    # any exceptions raised if the root directory already exists.  All other
+    # exceptions potentially thrown by os.makedirs() are re-raised.
+    # Note: os.makedirs can raise OSError if the leaf directory already exists
+    # or cannot be created.
+    try:
+      os.makedirs(target_dirpath)
 
-    # Generate a user-friendly error message if 'expires' is less than the
-    # current time (i.e., a local time.)
-    expires_datetime = iso8601.parse_date(expires)
-    expires_timestamp = tuf.formats.datetime_to_unix_timestamp(expires_datetime)
+    except OSError as e:
+      if e.errno == errno.EEXIST:
+        pass
 
-    if expires_timestamp < current_time:
-      message = 'Metadata '+repr(metadata_rolename)+' expired on ' + \
-        expires_datetime.ctime() + ' (UTC).'
-      logger.error(message)
+      else:
+        raise
 
-      raise tuf.exceptions.ExpiredMetadataError(message)
+    return destination
 
 
 
 
 
-  def all_targets(self):
+  def _copy_target_file(self, source, target, destination_directory):
     """
     <Purpose>
-      Get a list of the target information for all the trusted targets on the
-      repository.  This list also includes all the targets of delegated roles.
-      Targets of the list returned are ordered according the trusted order of
-      the delegated roles, where parent roles come before children.  The list
-      conforms to 'tuf.formats.TARGETINFOS_SCHEMA' and has the form:
-
-      [{'filepath': 'a/b/c.txt',
-        'fileinfo': {'length': 13323,
-                     'hashes': {'sha256': dbfac345..}}
-       ...]
+      Non-public method that copies 'source', a local file with the same
+      content as 'target', to the destination of 'target'.  The copy is
+      verified against the trusted length and hashes of 'target' before it is
+      moved into place, as a downloaded target is.
 
     <Arguments>
-      None.
+      source:
+        The path of the local file.
+
+      target:
+        The target that 'source' is copied to.  Conformant to
+        'tuf.formats.TARGETINFO_SCHEMA'.
+
+      destination_directory:
+        The directory to save the target file.
 
     <Exceptions>
-      tuf.exceptions.RepositoryError:
-        If the metadata for the 'targets' role is missing from
-        the 'snapshot' metadata.
+      tuf.exceptions.DownloadLengthMismatchError, if the length of the copy is
+      not the trusted length.
 
-      tuf.exceptions.UnknownRoleError:
-        If one of the roles could not be found in the role database.
+      securesystemslib.exceptions.BadHashError, if the hashes of the copy are
+      not the trusted hashes.
+
+      IOError or OSError, if the file cannot be copied.
 
     <Side Effects>
-      The metadata for target roles is updated and stored.
+      A target file is saved to the local system.
 
     <Returns>
-     A list of targets, conformant to
-     'tuf.formats.TARGETINFOS_SCHEMA'.
+      None.
     """
 
-    # Load the most up-to-date targets of the 'targets' role and all
-    # delegated roles.
-    self._refresh_targets_metadata(refresh_all_delegated_roles=True)
-
-    # Fetch the targets for the 'targets' role.
-    all_targets = self._targets_of_role('targets', skip_refresh=True)
+    trusted_length = target['fileinfo']['length']
+    trusted_hashes = target['fileinfo']['hashes']
 
-    # Fetch the targets of the delegated roles.  get_rolenames returns
-    # all roles available on the repository.
-    delegated_targets = []
-    for role in tuf.roledb.get_rolenames(self.repository_name):
-      if role in ['root', 'snapshot', 'targets', 'timestamp']:
-        continue
+    destination = self._make_target_destination(target['filepath'],
+        destination_directory)
 
-      else:
-        delegated_targets.extend(self._targets_of_role(role, skip_refresh=True))
+    digest_objects = {}
+    for algorithm in trusted_hashes:
+      digest_objects[algorithm] = securesystemslib.hash.digest(algorithm)
 
-    all_targets.extend(delegated_targets)
+    file_object = tuf.download.DestinationTempFile(os.path.dirname(destination))
 
-    return all_targets
+    try:
+      with open(source, 'rb') as source_file_object:
+        # No more than one byte over the trusted length is copied, which is
+        # enough for the length check to fail.
+        remaining_length = trusted_length + 1
 
+        while remaining_length > 0:
+          data = source_file_object.read(min(tuf.settings.CHUNK_SIZE,
+              remaining_length))
 
+          if not data:
+            break
 
+          remaining_length = remaining_length - len(data)
+          file_object.write(data, auto_flush=False)
 
+          for digest_object in six.itervalues(digest_objects):
+            digest_object.update(data)
 
-  def _refresh_targets_metadata(self, rolename='targets',
-    refresh_all_delegated_roles=False):
-    """
-    <Purpose>
-      Non-public method that refreshes the targets metadata of 'rolename'.  If
-      'refresh_all_delegated_roles' is True, include all the delegations that
-      follow 'rolename'.  The metadata for the 'targets' role is updated in
-      refresh() by the _update_metadata_if_changed('targets') call, not here.
-      Delegated roles are not loaded when the repository is first initialized.
-      They are loaded from disk, updated if they have changed, and stored to
-      the 'self.metadata' store by this method.  This method is called by the
-      target methods, like all_targets() and targets_of_role().
+      self._hard_check_file_length(file_object, trusted_length)
+      self._check_hashes(file_object, trusted_hashes, digest_objects)
 
-    <Arguments>
-      rolename:
-        This is a delegated role name and should not end in '.json'.  Example:
-        'unclaimed'.
+    except:
+      file_object.close_temp_file()
+      raise
 
-      refresh_all_delegated_roles:
-         Boolean indicating if all the delegated roles available in the
-         repository (via snapshot.json) should be refreshed.
+    file_object.move(destination)
 
-    <Exceptions>
-      tuf.exceptions.RepositoryError:
-        If the metadata file for the 'targets' role is missing from the
-        'snapshot' metadata.
 
-    <Side Effects>
-      The metadata for the delegated roles are loaded and updated if they
-      have changed.  Delegated metadata is removed from the role database if
-      it has expired.
 
-    <Returns>
-      None.
-    """
 
-    roles_to_update = []
 
-    if rolename + '.json' in self.metadata['current']['snapshot']['meta']:
-      roles_to_update.append(rolename)
+class _DelegationMatcher(object):
+  """
+  <Purpose>
+    The delegations of a targets role, compiled so that the child roles
+    trusted with a target path are found without testing every path pattern of
+    every child role.  The patterns of the "paths" of the child roles (Unix
+    shell-style wildcards, as in fnmatch) are indexed by their literal prefix
+    (the part before the first wildcard), and explicit paths by the path
+    itself.  The "path_hash_prefixes" of the child roles are indexed by
+    prefix, for each length of prefix.
+
+  <Arguments>
+    child_roles:
+      The list of delegated roles of the role ('delegations' -> 'roles').
+
+  <Exceptions>
+    securesystemslib.exceptions.FormatError:
+      If a delegated role has neither "paths" nor "path_hash_prefixes".
+  """
 
-    if refresh_all_delegated_roles:
+  def __init__(self, child_roles):
+    self.child_roles = child_roles
 
-      for role in six.iterkeys(self.metadata['current']['snapshot']['meta']):
-        # snapshot.json keeps track of root.json, targets.json, and delegated
-        # roles (e.g., django.json, unclaimed.json).  Remove the 'targets' role
-        # because it gets updated when the targets.json file is updated in
-        # _update_metadata_if_changed('targets') and root.
-        if role.endswith('.json'):
-          role = role[:-len('.json')]
-          if role not in ['root', 'targets', rolename]:
-            roles_to_update.append(role)
+    # path: set of indexes of 'child_roles'
+    self.paths = {}
 
-        else:
-          continue
+    # literal prefix: list of (index of 'child_roles', compiled pattern)
+    self.patterns = {}
 
-    # If there is nothing to refresh, we are done.
-    if not roles_to_update:
-      return
+    # length of prefix: {path hash prefix: set of indexes of 'child_roles'}
+    self.path_hash_prefixes = {}
 
-    logger.debug('Roles to update: ' + repr(roles_to_update) + '.')
+    for index, child_role in enumerate(child_roles):
+      child_role_paths = child_role.get('paths')
+      child_role_path_hash_prefixes = child_role.get('path_hash_prefixes')
 
-    # Iterate 'roles_to_update', and load and update its metadata file if it
-    # has changed.
-    for rolename in roles_to_update:
-      self._load_metadata_from_file('previous', rolename)
-      self._load_metadata_from_file('current', rolename)
+      # The "path_hash_prefixes" of a child role take precedence over its
+      # "paths", if it has both.
+      if child_role_path_hash_prefixes is not None:
+        for prefix in child_role_path_hash_prefixes:
+          self.path_hash_prefixes.setdefault(len(prefix), {}).setdefault(
+              prefix, set()).add(index)
+
+      elif child_role_paths is not None:
+        for child_role_path in child_role_paths:
+          # fnmatch.fnmatch() normalizes the case of both the path and the
+          # pattern on case-insensitive platforms.
+          child_role_path = os.path.normcase(child_role_path)
+          literal_prefix = re.split(r'[*?[]', child_role_path, maxsplit=1)[0]
 
-      self._update_metadata_if_changed(rolename)
+          if literal_prefix == child_role_path:
+            self.paths.setdefault(child_role_path, set()).add(index)
 
+          else:
+            self.patterns.setdefault(literal_prefix, []).append((index,
+                re.compile(fnmatch.translate(child_role_path))))
+
+      else:
+        # 'role_name' should have been validated when it was downloaded.
+        # The 'paths' or 'path_hash_prefixes' fields should not be missing,
+        # so we raise a format error here in case they are both missing.
+        raise securesystemslib.exceptions.FormatError(
+            repr(child_role['name']) + ' has neither a "paths" nor'
+            ' "path_hash_prefixes".  At least one of these attributes must'
+            ' be present.')
 
+    self.uses_path_hash_prefixes = bool(self.path_hash_prefixes)
+    self.pattern_prefix_lengths = sorted(set(len(literal_prefix)
+        for literal_prefix in self.patterns))
 
 
 
-  def _targets_of_role(self, rolename, targets=None, skip_refresh=False):
+  def match(self, target_filepath, target_filepath_hash=None):
+    """
+    Return the child roles (in order of priority) that are trusted with
+    'target_filepath'.  'target_filepath_hash' is the hash of
+    'target_filepath' (see Updater._get_target_hash()), and must be given if
+    'uses_path_hash_prefixes' is True.
     """
-    <Purpose>
-      Non-public method that returns the target information of all the targets
-      of 'rolename'.  The returned information is a list conformant to
-      'tuf.formats.TARGETINFOS_SCHEMA', and has the form:
 
-      [{'filepath': 'a/b/c.txt',
-        'fileinfo': {'length': 13323,
-                     'hashes': {'sha256': dbfac345..}}
-       ...]
+    indexes = set()
 
-    <Arguments>
-      rolename:
-        This is a role name and should not end in '.json'.  Examples: 'targets',
-        'unclaimed'.
+    for length, prefixes in six.iteritems(self.path_hash_prefixes):
+      indexes.update(prefixes.get(target_filepath_hash[:length], ()))
 
-      targets:
-        A list of targets containing target information, conformant to
-        'tuf.formats.TARGETINFOS_SCHEMA'.
+    if self.paths or self.patterns:
+      target_filepath = os.path.normcase(target_filepath)
+      indexes.update(self.paths.get(target_filepath, ()))
 
-      skip_refresh:
-        A boolean indicating if the target metadata for 'rolename'
-        should be refreshed.
+      # Only the patterns whose literal prefix is a prefix of the path can
+      # match it.
+      for length in self.pattern_prefix_lengths:
+        if length > len(target_filepath):
+          break
 
-    <Exceptions>
-      tuf.exceptions.UnknownRoleError:
-        If 'rolename' is not found in the role database.
+        for index, pattern in \
+            self.patterns.get(target_filepath[:length], ()):
+          if index not in indexes and pattern.match(target_filepath):
+            indexes.add(index)
 
-    <Side Effects>
-      The metadata for 'rolename' is refreshed if 'skip_refresh' is False.
+    return [self.child_roles[index] for index in sorted(indexes)]
 
-    <Returns>
-      A list of dict objects containing the target information of all the
-      targets of 'rolename'.  Conformant to
-      'tuf.formats.TARGETINFOS_SCHEMA'.
-    """
 
-    if targets is None:
-      targets = []
 
-    targets_of_role = list(targets)
-    logger.debug('Getting targets of role: ' + repr(rolename) + '.')
 
-    if not tuf.roledb.role_exists(rolename, self.repository_name):
-      raise tuf.exceptions.UnknownRoleError(rolename)
 
-    # We do not need to worry about the target paths being trusted because
-    # this is enforced before any new metadata is accepted.
-    if not skip_refresh:
-      self._refresh_targets_metadata(rolename)
+class _CompactTargets(_Mapping):
+  """
+  <Purpose>
+    A read-only mapping of target paths to fileinfo, which holds the targets
+    listed by the metadata of a targets role ('targets' -> 'targets') in a
+    fraction of the memory of a dictionary per target, per fileinfo and per
+    set of hashes.  The paths are interned, the lengths kept in an array, and
+    the digests of each hash algorithm concatenated, as raw bytes, in a single
+    bytes object.  The fileinfo of a target is rebuilt when the target is
+    looked up, and is equal to the fileinfo listed by the metadata.  A target
+    is looked up with a binary search of the sorted paths (see 'bisect'), and
+    the targets are iterated in the order of the metadata.
+
+  <Arguments>
+    targets:
+      The dictionary of target paths to fileinfo of the metadata, conformant
+      to 'tuf.formats.FILEDICT_SCHEMA'.
+
+  <Exceptions>
+    ValueError, if the targets cannot be held compactly: if they do not all
+    list the same hash algorithms, if the digests of an algorithm are not
+    lower case hex strings of the same length, or if a fileinfo has fields
+    other than 'length', 'hashes' and 'custom'.
+  """
 
-    # Do we have metadata for 'rolename'?
-    if rolename not in self.metadata['current']:
-      logger.debug('No metadata for ' + repr(rolename) + '.'
-        '  Unable to determine targets.')
-      return []
+  __slots__ = ['filepaths', 'order', 'lengths', 'algorithms', 'digest_sizes',
+      'digests', 'customs']
 
-    # Get the targets specified by the role itself.
-    for filepath, fileinfo in six.iteritems(self.metadata['current'][rolename].get('targets', [])):
-      new_target = {}
-      new_target['filepath'] = filepath
-      new_target['fileinfo'] = fileinfo
+  def __init__(self, targets):
+    filepaths = []
+    lengths = []
+    algorithms = []
+    hex_digests = {}
+    customs = {}
 
-      targets_of_role.append(new_target)
+    for filepath in targets:
+      algorithms = sorted(targets[filepath]['hashes'])
+      break
 
-    return targets_of_role
+    for algorithm in algorithms:
+      hex_digests[algorithm] = []
 
+    try:
+      for filepath, fileinfo in six.iteritems(targets):
+        hashes = fileinfo['hashes']
 
+        if len(hashes) != len(algorithms) or \
+            len(fileinfo) != 2 + ('custom' in fileinfo):
+          raise KeyError(filepath)
 
+        filepaths.append(filepath)
+        lengths.append(fileinfo['length'])
 
+        for algorithm in algorithms:
+          hex_digests[algorithm].append(hashes[algorithm])
 
-  def targets_of_role(self, rolename='targets'):
-    """
-    <Purpose>
-      Return a list of trusted targets directly specified by 'rolename'.
-      The returned information is a list conformant to
-      'tuf.formats.TARGETINFOS_SCHEMA', and has the form:
+        if 'custom' in fileinfo:
+          customs[len(filepaths) - 1] = fileinfo['custom']
 
-      [{'filepath': 'a/b/c.txt',
-        'fileinfo': {'length': 13323,
-                     'hashes': {'sha256': dbfac345..}}
-       ...]
+    except KeyError as e:
+      raise ValueError('Irregular fileinfo of ' + repr(e.args[0]))
 
-      The metadata of 'rolename' is updated if out of date, including the
-      metadata of its parent roles (i.e., the minimum roles needed to set the
-      chain of trust).
+    # The targets are held in the order of their paths, so that a path is
+    # found with bisect.  'self.order' is the position of each target, in the
+    # order of the metadata.
+    sorted_indexes = sorted(range(len(filepaths)), key=filepaths.__getitem__)
+    self.order = array.array('L', [0]) * len(filepaths)
 
-    <Arguments>
-      rolename:
-        The name of the role whose list of targets are wanted.
-        The name of the role should start with 'targets'.
+    for position, index in enumerate(sorted_indexes):
+      self.order[index] = position
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If 'rolename' is improperly formatted.
+    self.filepaths = tuple([_intern(filepaths[index])
+        for index in sorted_indexes])
+    lengths = [lengths[index] for index in sorted_indexes]
 
-      tuf.exceptions.RepositoryError:
-        If the metadata of 'rolename' cannot be updated.
+    for algorithm in algorithms:
+      hex_digests[algorithm] = [hex_digests[algorithm][index]
+          for index in sorted_indexes]
 
-      tuf.exceptions.UnknownRoleError:
-        If 'rolename' is not found in the role database.
+    self.customs = dict((self.order[index], custom)
+        for index, custom in six.iteritems(customs))
 
-    <Side Effects>
-      The metadata of updated delegated roles are downloaded and stored.
+    try:
+      self.lengths = array.array('q', lengths)
 
-    <Returns>
-      A list of targets, conformant to
-      'tuf.formats.TARGETINFOS_SCHEMA'.
-    """
+    # Python 2 has no array of long long integers.
+    except (ValueError, OverflowError): # pragma: no cover
+      self.lengths = tuple(lengths)
 
-    # Does 'rolename' have the correct format?
-    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
-    securesystemslib.formats.RELPATH_SCHEMA.check_match(rolename)
+    self.algorithms = tuple(algorithms)
+    self.digest_sizes = []
+    self.digests = []
 
-    if not tuf.roledb.role_exists(rolename, self.repository_name):
-      raise tuf.exceptions.UnknownRoleError(rolename)
+    for algorithm in self.algorithms:
+      hex_digest_length = len(hex_digests[algorithm][0])
 
-    self._refresh_targets_metadata(rolename)
+      if hex_digest_length % 2 or \
+          set(map(len, hex_digests[algorithm])) != set([hex_digest_length]):
+        raise ValueError('Irregular ' + repr(algorithm) + ' digests')
+
+      hex_digests[algorithm] = ''.join(hex_digests[algorithm])
 
-    return self._targets_of_role(rolename, skip_refresh=True)
+      try:
+        digests = binascii.unhexlify(hex_digests[algorithm].encode('ascii'))
 
+      except (TypeError, UnicodeError, binascii.Error):
+        raise ValueError('Invalid ' + repr(algorithm) + ' digests')
 
+      # The digests are rebuilt in lower case.
+      if binascii.hexlify(digests).decode('ascii') != hex_digests[algorithm]:
+        raise ValueError('Upper case ' + repr(algorithm) + ' digests')
 
+      self.digest_sizes.append(hex_digest_length // 2)
+      self.digests.append(digests)
 
 
-  def get_one_valid_targetinfo(self, target_filepath):
+  def to_tuple(self):
+    """
+    Return the content of the mapping as a tuple of objects that 'marshal'
+    can serialize, from which from_tuple() rebuilds the mapping.
     """
-    <Purpose>
-      Return the target information of 'target_filepath', and update its
-      corresponding metadata, if necessary.
 
-    <Arguments>
-      target_filepath:
-        The path to the target file on the repository. This will be relative to
-        the 'targets' (or equivalent) directory on a given mirror.
+    return (self.filepaths, _array_to_bytes(self.order),
+        _array_to_bytes(self.lengths), self.algorithms,
+        tuple(self.digest_sizes), tuple(self.digests), self.customs)
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If 'target_filepath' is improperly formatted.
 
-      tuf.exceptions.UnknownTargetError:
-        If 'target_filepath' was not found.
+  @classmethod
+  def from_tuple(cls, content):
+    """
+    Rebuild the mapping from the tuple returned by to_tuple().  ValueError or
+    TypeError is raised if 'content' is not consistent (e.g., if it was not
+    returned by to_tuple()).
+    """
 
-      Any other unforeseen runtime exception.
+    compact_targets = cls.__new__(cls)
+    (compact_targets.filepaths, order, lengths, compact_targets.algorithms,
+        digest_sizes, digests, compact_targets.customs) = content
 
-    <Side Effects>
-      The metadata for updated delegated roles are downloaded and stored.
+    compact_targets.order = _array_from_bytes('L', order)
+    compact_targets.lengths = _array_from_bytes('q', lengths)
+    compact_targets.digest_sizes = list(digest_sizes)
+    compact_targets.digests = list(digests)
 
-    <Returns>
-      The target information for 'target_filepath', conformant to
-      'tuf.formats.TARGETINFO_SCHEMA'.
+    compact_targets._check()
+
+    return compact_targets
+
+
+  def _check(self):
+    """
+    Raise ValueError or TypeError if the content of the mapping is not
+    consistent: the paths must be sorted strings, 'order' a permutation of
+    their positions, and there must be one length, one digest per algorithm
+    and at most one custom field per path.
     """
 
-    # Does 'target_filepath' have the correct format?
-    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
-    securesystemslib.formats.RELPATH_SCHEMA.check_match(target_filepath)
+    number_of_targets = len(self.filepaths)
 
-    # 'target_filepath' might contain URL encoding escapes.
-    # http://docs.python.org/2/library/urllib.html#urllib.unquote
-    target_filepath = six.moves.urllib.parse.unquote(target_filepath)
+    if not isinstance(self.filepaths, tuple) or \
+        not all(isinstance(filepath, six.string_types)
+        for filepath in self.filepaths) or \
+        list(self.filepaths) != sorted(self.filepaths):
+      raise ValueError('Invalid target paths')
 
-    if not target_filepath.startswith('/'):
-      target_filepath = '/' + target_filepath
+    if sorted(self.order) != list(range(number_of_targets)):
+      raise ValueError('Invalid order of the targets')
 
-    # Get target by looking at roles in order of priority tags.
-    target = self._preorder_depth_first_walk(target_filepath)
+    if len(self.lengths) != number_of_targets or \
+        any(length < 0 for length in self.lengths):
+      raise ValueError('Invalid target lengths')
 
-    # Raise an exception if the target information could not be retrieved.
-    if target is None:
-      logger.error(target_filepath + ' not found.')
-      raise tuf.exceptions.UnknownTargetError(target_filepath + ' not found.')
+    if not isinstance(self.algorithms, tuple) or \
+        not all(isinstance(algorithm, six.string_types)
+        for algorithm in self.algorithms) or \
+        len(self.digest_sizes) != len(self.algorithms) or \
+        len(self.digests) != len(self.algorithms):
+      raise ValueError('Invalid hash algorithms')
 
-    # Otherwise, return the found target.
-    else:
-      return target
+    for digest_size, digests in zip(self.digest_sizes, self.digests):
+      if not isinstance(digests, bytes) or \
+          len(digests) != digest_size * number_of_targets:
+        raise ValueError('Invalid target digests')
 
+    if not isinstance(self.customs, dict) or \
+        not all(position in range(number_of_targets)
+        for position in self.customs):
+      raise ValueError('Invalid custom fields')
 
 
+  def __getitem__(self, filepath):
+    index = self._find(filepath)
 
+    if index is None:
+      raise KeyError(filepath)
 
-  def _preorder_depth_first_walk(self, target_filepath):
-    """
-    <Purpose>
-      Non-public method that interrogates the tree of target delegations in
-      order of appearance (which implicitly order trustworthiness), and returns
-      the matching target found in the most trusted role.
+    return self._get_fileinfo(index)
 
-    <Arguments>
-      target_filepath:
-        The path to the target file on the repository. This will be relative to
-        the 'targets' (or equivalent) directory on a given mirror.
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If 'target_filepath' is improperly formatted.
+  def __contains__(self, filepath):
+    return self._find(filepath) is not None
 
-      tuf.exceptions.RepositoryError:
-        If 'target_filepath' is not found.
 
-    <Side Effects>
-      The metadata for updated delegated roles are downloaded and stored.
+  def __iter__(self):
+    for position in self.order:
+      yield self.filepaths[position]
 
-    <Returns>
-      The target information for 'target_filepath', conformant to
-      'tuf.formats.TARGETINFO_SCHEMA'.
-    """
 
-    target = None
-    current_metadata = self.metadata['current']
-    role_names = ['targets']
-    visited_role_names = set()
-    number_of_delegations = tuf.settings.MAX_NUMBER_OF_DELEGATIONS
+  def __len__(self):
+    return len(self.filepaths)
 
-    # Ensure the client has the most up-to-date version of 'targets.json'.
-    # Raise 'tuf.exceptions.NoWorkingMirrorError' if the changed metadata cannot be
-    # successfully downloaded and 'tuf.exceptions.RepositoryError' if the referenced
-    # metadata is missing.  Target methods such as this one are called after
-    # the top-level metadata have been refreshed (i.e., updater.refresh()).
-    self._update_metadata_if_changed('targets')
 
-    # Preorder depth-first traversal of the graph of target delegations.
-    while target is None and number_of_delegations > 0 and len(role_names) > 0:
+  def items(self):
+    for position in self.order:
+      yield self.filepaths[position], self._get_fileinfo(position)
 
-      # Pop the role name from the top of the stack.
-      role_name = role_names.pop(-1)
+  iteritems = items
 
-      # Skip any visited current role to prevent cycles.
-      if role_name in visited_role_names:
-        logger.debug('Skipping visited current role ' + repr(role_name))
-        continue
 
-      # The metadata for 'role_name' must be downloaded/updated before its
-      # targets, delegations, and child roles can be inspected.
-      # self.metadata['current'][role_name] is currently missing.
-      # _refresh_targets_metadata() does not refresh 'targets.json', it
-      # expects _update_metadata_if_changed() to have already refreshed it,
-      # which this function has checked above.
-      self._refresh_targets_metadata(role_name, refresh_all_delegated_roles=False)
-
-      role_metadata = current_metadata[role_name]
-      targets = role_metadata['targets']
-      delegations = role_metadata.get('delegations', {})
-      child_roles = delegations.get('roles', [])
-      target = self._get_target_from_targets_role(role_name, targets,
-                                                  target_filepath)
-      # After preorder check, add current role to set of visited roles.
-      visited_role_names.add(role_name)
-
-      # And also decrement number of visited roles.
-      number_of_delegations -= 1
+  def _find(self, filepath):
+    """
+    Return the position of 'filepath' in 'self.filepaths', or None.
+    """
 
-      if target is None:
+    if not isinstance(filepath, six.string_types):
+      return None
 
-        child_roles_to_visit = []
-        # NOTE: This may be a slow operation if there are many delegated roles.
-        for child_role in child_roles:
-          child_role_name = self._visit_child_role(child_role, target_filepath)
-          if child_role['terminating'] and child_role_name is not None:
-            logger.debug('Adding child role ' + repr(child_role_name))
-            logger.debug('Not backtracking to other roles.')
-            role_names = []
-            child_roles_to_visit.append(child_role_name)
-            break
+    position = bisect.bisect_left(self.filepaths, filepath)
 
-          elif child_role_name is None:
-            logger.debug('Skipping child role ' + repr(child_role_name))
+    if position < len(self.filepaths) and \
+        self.filepaths[position] == filepath:
+      return position
 
-          else:
-            logger.debug('Adding child role ' + repr(child_role_name))
-            child_roles_to_visit.append(child_role_name)
+    return None
 
-        # Push 'child_roles_to_visit' in reverse order of appearance onto
-        # 'role_names'.  Roles are popped from the end of the 'role_names'
-        # list.
-        child_roles_to_visit.reverse()
-        role_names.extend(child_roles_to_visit)
 
-      else:
-        logger.debug('Found target in current role ' + repr(role_name))
+  def _get_fileinfo(self, position):
+    hashes = {}
 
-    if target is None and number_of_delegations == 0 and len(role_names) > 0:
-      logger.debug(repr(len(role_names)) + ' roles left to visit, ' +
-                   'but allowed to visit at most ' +
-                   repr(tuf.settings.MAX_NUMBER_OF_DELEGATIONS) + ' delegations.')
+    for algorithm, digest_size, digests in \
+        zip(self.algorithms, self.digest_sizes, self.digests):
+      hashes[algorithm] = binascii.hexlify(digests[position * digest_size:
+          (position + 1) * digest_size]).decode('ascii')
 
-    return target
+    fileinfo = {'length': int(self.lengths[position]), 'hashes': hashes}
 
+    if position in self.customs:
+      fileinfo['custom'] = self.customs[position]
 
+    return fileinfo
 
 
 
-  def _get_target_from_targets_role(self, role_name, targets, target_filepath):
-    """
-    <Purpose>
-      Non-public method that determines whether the targets role with the given
-      'role_name' has the target with the name 'target_filepath'.
 
-    <Arguments>
-      role_name:
-        The name of the targets role that we are inspecting.
 
-      targets:
-        The targets of the Targets role with the name 'role_name'.
+class _TargetCache(object):
+  """
+  <Purpose>
+    A least recently used cache of resolved targets.  Each entry maps a target
+    path to its target information, the role that provides it, the time at
+    which the first of the metadata that it was resolved with expires, and
+    the expiration dates of the roles visited to resolve it.  The entries are
+    valid for a given version of the snapshot and targets metadata (see
+    check_versions()), and while the expiration dates of the trusted metadata
+    of those roles are unchanged.
+
+  <Arguments>
+    maxsize:
+      The maximum number of entries.  0 disables the cache.
+  """
 
-      target_filepath:
-        The path to the target file on the repository. This will be relative to
-        the 'targets' (or equivalent) directory on a given mirror.
+  def __init__(self, maxsize):
+    self.maxsize = maxsize
+    self.versions = None
+    self.hits = 0
+    self.misses = 0
 
-    <Exceptions>
-      None.
+    # target_filepath: (fileinfo, rolename, expiration timestamp,
+    # {visited rolename: 'expires' of its metadata})
+    self.entries = collections.OrderedDict()
 
-    <Side Effects>
-      None.
 
-    <Returns>
-      The target information for 'target_filepath', conformant to
-      'tuf.formats.TARGETINFO_SCHEMA'.
+
+  def check_versions(self, versions):
+    """
+    Empty the cache if 'versions', the versions of the trusted snapshot and
+    targets metadata, are not those its entries were resolved with.
     """
 
-    target = None
+    if versions != self.versions:
+      self.clear()
+      self.versions = versions
 
-    # Does the current role name have our target?
-    logger.debug('Asking role ' + repr(role_name) + ' about target ' +\
-      repr(target_filepath))
 
-    for filepath, fileinfo in six.iteritems(targets):
-      if filepath == target_filepath:
-        logger.debug('Found target ' + target_filepath + ' in role ' + role_name)
-        target = {'filepath': filepath, 'fileinfo': fileinfo}
-        break
 
-      else:
-        logger.debug('No target ' + target_filepath + ' in role ' + role_name)
+  def get(self, target_filepath, current_time, current_metadata):
+    """
+    Return the cached target information of 'target_filepath', or None if it
+    is not cached, has expired by 'current_time' (a Unix timestamp), or if the
+    expiration date of the metadata of a role that it was resolved through,
+    in the 'current_metadata' store, has changed since.  The metadata of such
+    a role must then be checked again by the delegation walk.
+    """
+
+    entry = self.entries.pop(target_filepath, None)
+
+    if entry is None or entry[2] < current_time:
+      self.misses += 1
+      return None
 
-    return target
+    # The metadata of a delegated role that is not in memory is loaded from
+    # disk, and checked, the next time the role is used.
+    for rolename, expires in six.iteritems(entry[3]):
+      role_metadata = current_metadata.get(rolename)
 
+      if role_metadata is not None and role_metadata['expires'] != expires:
+        self.misses += 1
+        return None
 
+    # The entry becomes the most recently used.
+    self.entries[target_filepath] = entry
+    self.hits += 1
 
+    return {'filepath': target_filepath, 'fileinfo': entry[0]}
 
 
 
-  def _visit_child_role(self, child_role, target_filepath):
+  def add(self, target_filepath, target, rolename, expiration_timestamp,
+      role_expires, versions):
+    """
+    Cache 'target', the target information of 'target_filepath' provided by
+    'rolename', until 'expiration_timestamp'.  'role_expires' maps the roles
+    visited to resolve it to the 'expires' of their metadata.  The target is
+    not cached if
+    'versions', the versions of the snapshot and targets metadata that it was
+    resolved with, are no longer those of the entries (e.g., if new metadata
+    was published by the background thread of Updater.start_auto_refresh()
+    during the lookup).
     """
-    <Purpose>
-      Non-public method that determines whether the given 'target_filepath'
-      is an allowed path of 'child_role'.
 
-      Ensure that we explore only delegated roles trusted with the target.  The
-      metadata for 'child_role' should have been refreshed prior to this point,
-      however, the paths/targets that 'child_role' signs for have not been
-      verified (as intended).  The paths/targets that 'child_role' is allowed
-      to specify in its metadata depends on the delegating role, and thus is
-      left to the caller to verify.  We verify here that 'target_filepath'
-      is an allowed path according to the delegated 'child_role'.
+    if self.maxsize <= 0 or versions != self.versions:
+      return
 
-      TODO: Should the TUF spec restrict the repository to one particular
-      algorithm?  Should we allow the repository to specify in the role
-      dictionary the algorithm used for these generated hashed paths?
+    self.entries.pop(target_filepath, None)
+    self.entries[target_filepath] = \
+      (target['fileinfo'], rolename, expiration_timestamp, role_expires)
 
-    <Arguments>
-      child_role:
-        The delegation targets role object of 'child_role', containing its
-        paths, path_hash_prefixes, keys, and so on.
+    while len(self.entries) > self.maxsize:
+      self.entries.popitem(last=False)
 
-      target_filepath:
-        The path to the target file on the repository. This will be relative to
-        the 'targets' (or equivalent) directory on a given mirror.
 
-    <Exceptions>
-      None.
 
-    <Side Effects>
-      None.
+  def clear(self):
+    self.entries.clear()
 
-    <Returns>
-      If 'child_role' has been delegated the target with the name
-      'target_filepath', then we return the role name of 'child_role'.
 
-      Otherwise, we return None.
-    """
 
-    child_role_name = child_role['name']
-    child_role_paths = child_role.get('paths')
-    child_role_path_hash_prefixes = child_role.get('path_hash_prefixes')
 
-    if child_role_path_hash_prefixes is not None:
-      target_filepath_hash = self._get_target_hash(target_filepath)
-      for child_role_path_hash_prefix in child_role_path_hash_prefixes:
-        if target_filepath_hash.startswith(child_role_path_hash_prefix):
-          return child_role_name
 
-        else:
-          continue
+def _map_concurrently(function, arguments, number_of_threads):
+  """
+  Call 'function' with each of 'arguments' (hashable objects), in up to
+  'number_of_threads' worker threads, and return a dictionary of the
+  arguments to the value returned by 'function', or to the exception it
+  raised.
+  """
 
-    elif child_role_paths is not None:
-      # Is 'child_role_name' allowed to sign for 'target_filepath'?
-      for child_role_path in child_role_paths:
-        # A child role path may be an explicit path or pattern (Unix
-        # shell-style wildcards).  The child role 'child_role_name' is returned
-        # if 'target_filepath' is equal to or matches 'child_role_path'.
-        # Explicit filepaths are also considered matches.
-        if fnmatch.fnmatch(target_filepath, child_role_path):
-         logger.debug('Child role ' + repr(child_role_name) + ' is allowed to'
-            ' sign for ' + repr(target_filepath))
+  pending_arguments = six.moves.queue.Queue()
+  for argument in arguments:
+    pending_arguments.put(argument)
 
-         return child_role_name
+  results = {}
+  lock = threading.Lock()
 
-        else:
-          logger.debug('The given target path' + repr(target_filepath) + ' is'
-              ' not an allowed trusted path of ' + repr(child_role_path))
+  def call_function():
+    while True:
+      try:
+        argument = pending_arguments.get_nowait()
 
-          continue
+      except six.moves.queue.Empty:
+        return
 
-    else:
-      # 'role_name' should have been validated when it was downloaded.
-      # The 'paths' or 'path_hash_prefixes' fields should not be missing,
-      # so we raise a format error here in case they are both missing.
-      raise securesystemslib.exceptions.FormatError(repr(child_role_name) + ' '
-          'has neither a "paths" nor "path_hash_prefixes".  At least'
-          ' one of these attributes must be present.')
+      try:
+        result = function(argument)
 
-    return None
+      except Exception as exception:
+        result = exception
 
+      with lock:
+        results[argument] = result
 
+  number_of_threads = min(len(arguments), number_of_threads)
 
-  def _get_target_hash(self, target_filepath, hash_function='sha256'):
-    """
-    <Purpose>
-      Non-public method that computes the hash of 'target_filepath'. This is
-      useful in conjunction with the "path_hash_prefixes" attribute in a
-      delegated targets role, which tells us which paths it is implicitly
-      responsible for.
+  # There is no need for a worker thread to call 'function' once.
+  if number_of_threads <= 1:
+    call_function()
+    return results
 
-    <Arguments>
-      target_filepath:
-        The path to the target file on the repository. This will be relative to
-        the 'targets' (or equivalent) directory on a given mirror.
+  threads = []
+  for i in range(number_of_threads):
+    thread = threading.Thread(target=call_function)
+    thread.daemon = True
+    thread.start()
+    threads.append(thread)
 
-      hash_function:
-        The algorithm used by the repository to generate the hashes of the
-        target filepaths.  The repository may optionally organize targets into
-        hashed bins to ease target delegations and role metadata management.
-        The use of consistent hashing allows for a uniform distribution of
-        targets into bins.
+  for thread in threads:
+    thread.join()
 
-    <Exceptions>
-      None.
+  return results
 
-    <Side Effects>
-      None.
 
-    <Returns>
-      The hash of 'target_filepath'.
-    """
 
-    # Calculate the hash of the filepath to determine which bin to find the
-    # target.  The client currently assumes the repository (i.e., repository
-    # tool) uses 'hash_function' to generate hashes and UTF-8.
-    digest_object = securesystemslib.hash.digest(hash_function)
-    encoded_target_filepath = target_filepath.encode('utf-8')
-    digest_object.update(encoded_target_filepath)
-    target_filepath_hash = digest_object.hexdigest()
 
-    return target_filepath_hash
 
+def _get_file_status(filepath):
+  """
+  Return the [length, modification time (in nanoseconds), inode] of the file
+  'filepath', or None if it is not a regular file that exists.
+  """
 
+  try:
+    file_status = os.stat(filepath)
 
+  except (IOError, OSError):
+    return None
 
+  if not stat.S_ISREG(file_status.st_mode):
+    return None
 
-  def remove_obsolete_targets(self, destination_directory):
-    """
-    <Purpose>
-      Remove any files that are in 'previous' but not 'current'.  This makes it
-      so if you remove a file from a repository, it actually goes away.  The
-      targets for the 'targets' role and all delegated roles are checked.
+  # os.stat_result.st_mtime_ns is new in Python 3.3.
+  modification_time = getattr(file_status, 'st_mtime_ns', None)
+  if modification_time is None:
+    modification_time = int(file_status.st_mtime * 10**9)
 
-    <Arguments>
-      destination_directory:
-        The directory containing the target files tracked by TUF.
+  return [file_status.st_size, modification_time, file_status.st_ino]
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If 'destination_directory' is improperly formatted.
 
-      tuf.exceptions.RepositoryError:
-        If an error occurred removing any files.
 
-    <Side Effects>
-      Target files are removed from disk.
 
-    <Returns>
-      None.
-    """
 
-    # Does 'destination_directory' have the correct format?
-    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
-    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
+def _hash_file(filepath, algorithms):
+  """
+  Read the file 'filepath' once, and return a dictionary of each of
+  'algorithms' to the hex digest of the file.
+  """
 
-    # Iterate the rolenames and verify whether the 'previous' directory
-    # contains a target no longer found in 'current'.
-    for role in tuf.roledb.get_rolenames(self.repository_name):
-      if role.startswith('targets'):
-        if role in self.metadata['previous'] and self.metadata['previous'][role] != None:
-          for target in self.metadata['previous'][role]['targets']:
-            if target not in self.metadata['current'][role]['targets']:
-              # 'target' is only in 'previous', so remove it.
-              logger.warning('Removing obsolete file: ' + repr(target) + '.')
+  digest_objects = {}
+  for algorithm in algorithms:
+    digest_objects[algorithm] = securesystemslib.hash.digest(algorithm)
 
-              # Remove the file if it hasn't been removed already.
-              destination = \
-                os.path.join(destination_directory, target.lstrip(os.sep))
-              try:
-                os.remove(destination)
+  with open(filepath, 'rb') as file_object:
+    while True:
+      # Large reads, since hashing releases the GIL for the length of each
+      # update.
+      data = file_object.read(1024 * 1024)
 
-              except OSError as e:
-                # If 'filename' already removed, just log it.
-                if e.errno == errno.ENOENT:
-                  logger.info('File ' + repr(destination) + ' was already'
-                    ' removed.')
+      if not data:
+        break
 
-                else:
-                  logger.error(str(e))
+      for digest_object in six.itervalues(digest_objects):
+        digest_object.update(data)
 
-            else:
-              logger.debug('Skipping: ' + repr(target) + '.  It is still'
-                ' a current target.')
-        else:
-          logger.debug('Skipping: ' + repr(role) + '.  Not in the previous'
-            ' metadata')
+  hashes = {}
+  for algorithm, digest_object in six.iteritems(digest_objects):
+    hashes[algorithm] = digest_object.hexdigest()
 
+  return hashes
 
 
 
 
-  def updated_targets(self, targets, destination_directory):
-    """
-    <Purpose>
-      Return the targets in 'targets' that have changed.  Targets are considered
-      changed if they do not exist at 'destination_directory' or the target
-      located there has mismatched file properties.
 
-      The returned information is a list conformant to
-      'tuf.formats.TARGETINFOS_SCHEMA' and has the form:
+# Strings are interned with sys.intern() in Python 3.  The target paths of
+# Python 2 metadata are unicode strings, which intern() does not accept.
+_intern = getattr(sys, 'intern', lambda string: string)
 
-      [{'filepath': 'a/b/c.txt',
-        'fileinfo': {'length': 13323,
-                     'hashes': {'sha256': dbfac345..}}
-       ...]
 
-    <Arguments>
-      targets:
-        A list of target files.  Targets that come earlier in the list are
-        chosen over duplicates that may occur later.
 
-      destination_directory:
-        The directory containing the target files.
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If the arguments are improperly formatted.
 
-    <Side Effects>
-      The files in 'targets' are read and their hashes computed.
+def _array_to_bytes(values):
+  """
+  Return the bytes of 'values', an array.array, or 'values' itself if it is a
+  tuple (see '_CompactTargets').
+  """
 
-    <Returns>
-      A list of targets, conformant to
-      'tuf.formats.TARGETINFOS_SCHEMA'.
-    """
+  if not isinstance(values, array.array):
+    return values
 
-    # Do the arguments have the correct format?
-    # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
-    tuf.formats.TARGETINFOS_SCHEMA.check_match(targets)
-    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
+  # array.tostring() is named tobytes() since Python 3.2.
+  if six.PY2: # pragma: no cover
+    return values.tostring()
 
-    # Keep track of the target objects and filepaths of updated targets.
-    # Return 'updated_targets' and use 'updated_targetpaths' to avoid
-    # duplicates.
-    updated_targets = []
-    updated_targetpaths = []
+  return values.tobytes()
 
-    for target in targets:
-      # Prepend 'destination_directory' to the target's relative filepath (as
-      # stored in metadata.)  Verify the hash of 'target_filepath' against
-      # each hash listed for its fileinfo.  Note: join() discards
-      # 'destination_directory' if 'filepath' contains a leading path separator
-      # (i.e., is treated as an absolute path).
-      filepath = target['filepath']
-      if filepath[0] == '/':
-        filepath = filepath[1:]
-      target_filepath = os.path.join(destination_directory, filepath)
 
-      if target_filepath in updated_targetpaths:
-        continue
 
-      # Try one of the algorithm/digest combos for a mismatch.  We break
-      # as soon as we find a mismatch.
-      for algorithm, digest in six.iteritems(target['fileinfo']['hashes']):
-        digest_object = None
-        try:
-          digest_object = securesystemslib.hash.digest_filename(target_filepath,
-            algorithm=algorithm)
 
-        # This exception would occur if the target does not exist locally.
-        except IOError:
-          updated_targets.append(target)
-          updated_targetpaths.append(target_filepath)
-          break
 
-        # The file does exist locally, check if its hash differs.
-        if digest_object.hexdigest() != digest:
-          updated_targets.append(target)
-          updated_targetpaths.append(target_filepath)
-          break
+def _array_from_bytes(typecode, data):
+  """
+  Return the array.array of type 'typecode' of the bytes 'data' returned by
+  _array_to_bytes(), or 'data' itself if it is a tuple.
+  """
 
-    return updated_targets
+  if isinstance(data, tuple):
+    return data
 
+  values = array.array(typecode)
 
+  if six.PY2: # pragma: no cover
+    values.fromstring(data)
 
+  else:
+    values.frombytes(data)
 
+  return values
 
-  def download_target(self, target, destination_directory):
-    """
-    <Purpose>
-      Download 'target' and verify it is trusted.
 
-      This will only store the file at 'destination_directory' if the
-      downloaded file matches the description of the file in the trusted
-      metadata.
 
-    <Arguments>
-      target:
-        The target to be downloaded.  Conformant to
-        'tuf.formats.TARGETINFO_SCHEMA'.
 
-      destination_directory:
-        The directory to save the downloaded target file.
 
-    <Exceptions>
-      securesystemslib.exceptions.FormatError:
-        If 'target' is not properly formatted.
+def _format_delegated_keys(keys_info):
+  """
+  Return the keys of the 'keys' object of delegations in the form they are
+  added to the key database, one per keyid of each key.  Keys of unsupported
+  types are skipped.  Raise 'securesystemslib.exceptions.Error' (e.g.,
+  'securesystemslib.exceptions.FormatError') if a key is invalid.
+  """
 
-      tuf.exceptions.NoWorkingMirrorError:
-        If a target could not be downloaded from any of the mirrors.
+  delegated_keys = []
 
-        Although expected to be rare, there might be OSError exceptions (except
-        errno.EEXIST) raised when creating the destination directory (if it
-        doesn't exist).
+  for keyid, keyinfo in six.iteritems(keys_info):
+    if keyinfo['keytype'] not in ['rsa', 'ed25519']:
+      logger.warning('Invalid key type for ' + repr(keyid) + '.')
+      continue
 
-    <Side Effects>
-      A target file is saved to the local system.
+    # We specify the keyid to ensure that it's the correct keyid for the key.
+    try:
+      key, keyids = securesystemslib.keys.format_metadata_to_key(keyinfo)
 
-    <Returns>
-      None.
-    """
+    except securesystemslib.exceptions.Error:
+      logger.exception('Invalid key for keyid: ' + repr(keyid) + '.')
+      raise
 
-    # Do the arguments have the correct format?
-    # This check ensures the arguments have the appropriate
-    # number of objects and object types, and that all dict
-    # keys are properly named.
-    # Raise 'securesystemslib.exceptions.FormatError' if the check fail.
-    tuf.formats.TARGETINFO_SCHEMA.check_match(target)
-    securesystemslib.formats.PATH_SCHEMA.check_match(destination_directory)
+    for keyid in keyids:
+      key = dict(key, keyid=keyid)
+      delegated_keys.append(key)
 
-    # Extract the target file information.
-    target_filepath = target['filepath']
-    trusted_length = target['fileinfo']['length']
-    trusted_hashes = target['fileinfo']['hashes']
+  return delegated_keys
 
-    # '_get_target_file()' checks every mirror and returns the first target
-    # that passes verification.
-    target_file_object = self._get_target_file(target_filepath, trusted_length,
-                                               trusted_hashes)
 
-    # We acquired a target file object from a mirror.  Move the file into place
-    # (i.e., locally to 'destination_directory').  Note: join() discards
-    # 'destination_directory' if 'target_path' contains a leading path
-    # separator (i.e., is treated as an absolute path).
-    destination = os.path.join(destination_directory,
-                               target_filepath.lstrip(os.sep))
-    destination = os.path.abspath(destination)
-    target_dirpath = os.path.dirname(destination)
 
-    # When attempting to create the leaf directory of 'target_dirpath', ignore
-    # any exceptions raised if the root directory already exists.  All other
-    # exceptions potentially thrown by os.makedirs() are re-raised.
-    # Note: os.makedirs can raise OSError if the leaf directory already exists
-    # or cannot be created.
-    try:
-      os.makedirs(target_dirpath)
 
-    except OSError as e:
-      if e.errno == errno.EEXIST:
-        pass
 
-      else:
-        raise
+def _compact_metadata(metadata_object):
+  """
+  Return 'metadata_object', or, if it is the metadata of a targets role, a
+  copy of it whose targets are held by a '_CompactTargets' (see
+  'tuf.settings.COMPACT_TARGETS_METADATA').  The metadata is returned as is
+  if its targets cannot be held compactly.
+  """
 
-    target_file_object.move(destination)
+  if not tuf.settings.COMPACT_TARGETS_METADATA or \
+      metadata_object.get('_type') != 'targets' or \
+      isinstance(metadata_object.get('targets'), _CompactTargets):
+    return metadata_object
+
+  try:
+    targets = _CompactTargets(metadata_object['targets'])
+
+  except ValueError as e:
+    logger.debug('Could not compact the targets of the metadata: ' + str(e))
+    return metadata_object
+
+  metadata_object = dict(metadata_object)
+  metadata_object['targets'] = targets
+
+  return metadata_object
@@ -32,14 +32,19 @@ from __future__ import unicode_literals
 import os
 import socket
 import logging
+import tempfile
 import time
 import timeit
 import ssl
-import time
+import collections
+import threading
+import zlib
 
 import tuf
+import tuf.exceptions
 
 import securesystemslib
+import securesystemslib.hash
 import securesystemslib.util
 import six
 
@@ -56,7 +61,9 @@ logger = logging.getLogger('tuf.download')
 
 
 
-def safe_download(url, required_length):
+def safe_download(url, required_length, digest_objects=None,
+    cancel_event=None, temp_directory=None, validators=None,
+    accept_compression=False, fetcher=None):
   """
   <Purpose>
     Given the 'url' and 'required_length' of the desired file, open a connection
@@ -79,6 +86,39 @@ def safe_download(url, required_length):
       An integer value representing the length of the file.  This is an exact
       limit.
 
+    digest_objects:
+      An optional dictionary of hash algorithms to digest objects, as returned
+      by 'securesystemslib.hash.digest()'.  Every chunk of the file is added to
+      each digest object as it is downloaded, so that the caller can verify
+      the hashes of the file without reading it back from disk.
+
+    cancel_event:
+      An optional 'threading.Event' that another thread sets to cancel the
+      download.  It is checked before every chunk is read.
+
+    temp_directory:
+      An optional directory in which the temporary file is created, instead
+      of the default temporary directory.  The directory of the final
+      destination of the file should be given, so that the file can be
+      renamed into place rather than copied (see 'DestinationTempFile').
+
+    validators:
+      An optional dictionary of the HTTP cache validator ('ETag') of a copy
+      of the file that the caller already has.  If
+      it is not empty, a conditional request is sent, so that the server does
+      not send the file again if it is unchanged.  The dictionary is updated
+      with the validators of the downloaded file.
+
+    accept_compression:
+      A boolean switch to let the server send the file compressed with gzip or
+      deflate.  It is decompressed as it is downloaded, and 'required_length'
+      applies to the decompressed file (see '_DecompressingResponse').
+
+    fetcher:
+      An optional 'tuf.fetcher.FetcherInterface' that opens 'url', instead of
+      the default HTTP transport.  The URI scheme of 'url' is then not checked
+      against 'tuf.settings.SUPPORTED_URI_SCHEMES'.
+
   <Side Effects>
     A 'securesystemslib.util.TempFile' object is created on disk to store the
     contents of 'url'.
@@ -87,6 +127,11 @@ def safe_download(url, required_length):
     tuf.ssl_commons.exceptions.DownloadLengthMismatchError, if there was a
     mismatch of observed vs expected lengths while downloading the file.
 
+    tuf.exceptions.DownloadError, if the download was cancelled.
+
+    tuf.exceptions.NotModifiedError, if 'validators' was given and the server
+    reported that the file is unchanged.
+
     securesystemslib.exceptions.FormatError, if any of the arguments are
     improperly formatted.
 
@@ -110,19 +155,25 @@ def safe_download(url, required_length):
   # with offline keys).
   parsed_url = six.moves.urllib.parse.urlparse(url)
 
-  if parsed_url.scheme not in tuf.settings.SUPPORTED_URI_SCHEMES:
+  if fetcher is None and \
+      parsed_url.scheme not in tuf.settings.SUPPORTED_URI_SCHEMES:
     message = \
       repr(url) + ' specifies an unsupported URI scheme.  Supported ' + \
       ' URI Schemes: ' + repr(tuf.settings.SUPPORTED_URI_SCHEMES)
     raise securesystemslib.exceptions.FormatError(message)
 
-  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True)
+  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True,
+      digest_objects=digest_objects, cancel_event=cancel_event,
+      temp_directory=temp_directory, validators=validators,
+      accept_compression=accept_compression, fetcher=fetcher)
 
 
 
 
 
-def unsafe_download(url, required_length):
+def unsafe_download(url, required_length, digest_objects=None,
+    cancel_event=None, temp_directory=None, validators=None,
+    accept_compression=False, fetcher=None):
   """
   <Purpose>
     Given the 'url' and 'required_length' of the desired file, open a connection
@@ -145,6 +196,39 @@ def unsafe_download(url, required_length):
       An integer value representing the length of the file.  This is an upper
       limit.
 
+    digest_objects:
+      An optional dictionary of hash algorithms to digest objects, as returned
+      by 'securesystemslib.hash.digest()'.  Every chunk of the file is added to
+      each digest object as it is downloaded, so that the caller can verify
+      the hashes of the file without reading it back from disk.
+
+    cancel_event:
+      An optional 'threading.Event' that another thread sets to cancel the
+      download.  It is checked before every chunk is read.
+
+    temp_directory:
+      An optional directory in which the temporary file is created, instead
+      of the default temporary directory.  The directory of the final
+      destination of the file should be given, so that the file can be
+      renamed into place rather than copied (see 'DestinationTempFile').
+
+    validators:
+      An optional dictionary of the HTTP cache validator ('ETag') of a copy
+      of the file that the caller already has.  If
+      it is not empty, a conditional request is sent, so that the server does
+      not send the file again if it is unchanged.  The dictionary is updated
+      with the validators of the downloaded file.
+
+    accept_compression:
+      A boolean switch to let the server send the file compressed with gzip or
+      deflate.  It is decompressed as it is downloaded, and 'required_length'
+      applies to the decompressed file (see '_DecompressingResponse').
+
+    fetcher:
+      An optional 'tuf.fetcher.FetcherInterface' that opens 'url', instead of
+      the default HTTP transport.  The URI scheme of 'url' is then not checked
+      against 'tuf.settings.SUPPORTED_URI_SCHEMES'.
+
   <Side Effects>
     A 'securesystemslib.util.TempFile' object is created on disk to store the
     contents of 'url'.
@@ -153,6 +237,11 @@ def unsafe_download(url, required_length):
     tuf.ssl_commons.exceptions.DownloadLengthMismatchError, if there was a
     mismatch of observed vs expected lengths while downloading the file.
 
+    tuf.exceptions.DownloadError, if the download was cancelled.
+
+    tuf.exceptions.NotModifiedError, if 'validators' was given and the server
+    reported that the file is unchanged.
+
     securesystemslib.exceptions.FormatError, if any of the arguments are
     improperly formatted.
 
@@ -176,19 +265,412 @@ def unsafe_download(url, required_length):
   # with offline keys).
   parsed_url = six.moves.urllib.parse.urlparse(url)
 
-  if parsed_url.scheme not in tuf.settings.SUPPORTED_URI_SCHEMES:
+  if fetcher is None and \
+      parsed_url.scheme not in tuf.settings.SUPPORTED_URI_SCHEMES:
+    message = \
+      repr(url) + ' specifies an unsupported URI scheme.  Supported ' + \
+      ' URI Schemes: ' + repr(tuf.settings.SUPPORTED_URI_SCHEMES)
+    raise securesystemslib.exceptions.FormatError(message)
+
+  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=False,
+      digest_objects=digest_objects, cancel_event=cancel_event,
+      temp_directory=temp_directory, validators=validators,
+      accept_compression=accept_compression, fetcher=fetcher)
+
+
+
+
+
+def resumable_download(url, required_length, spool_filepath,
+    digest_objects=None, fetcher=None):
+  """
+  <Purpose>
+    Given the 'url' and 'required_length' of the desired file, download it to
+    'spool_filepath', continuing from the data already in 'spool_filepath'
+    with an HTTP 'Range' request, if there is any.  The data in
+    'spool_filepath' may have been downloaded from another mirror.  As with
+    tuf.download.safe_download(), the length of the downloaded file must match
+    'required_length' exactly.
+
+    If the download is interrupted, the data received so far is kept in
+    'spool_filepath', so that a later call can resume it.  A server that
+    ignores the 'Range' request and sends the whole file instead restarts the
+    download from the beginning.  The caller must verify the hashes of the
+    file before it is trusted.
+
+  <Arguments>
+    url:
+      A URL string that represents the location of the file.  The URI scheme
+      component must be one of 'tuf.settings.SUPPORTED_URI_SCHEMES'.
+
+    required_length:
+      An integer value representing the length of the file.  This is an exact
+      limit.
+
+    spool_filepath:
+      The path of the file that holds the data downloaded so far.  It is
+      created if it does not exist.
+
+    digest_objects:
+      An optional dictionary of hash algorithms to digest objects, as returned
+      by 'securesystemslib.hash.digest()', that have already been updated with
+      the data in 'spool_filepath'.  Every chunk that is downloaded is added to
+      each digest object.  If the spool file has to be discarded, the digest
+      objects in the dictionary are replaced with new ones.
+
+    fetcher:
+      An optional 'tuf.fetcher.FetcherInterface' that opens 'url', instead of
+      the default HTTP transport.  The URI scheme of 'url' is then not checked
+      against 'tuf.settings.SUPPORTED_URI_SCHEMES'.
+
+  <Side Effects>
+    Data is appended to 'spool_filepath', which may be truncated first.
+
+  <Exceptions>
+    securesystemslib.exceptions.DownloadLengthMismatchError, if there was a
+    mismatch of observed vs expected lengths while downloading the file.
+
+    tuf.exceptions.DownloadError, if the server returned a different part of
+    the file than requested.
+
+    securesystemslib.exceptions.FormatError, if any of the arguments are
+    improperly formatted.
+
+    Any other unforeseen runtime exception.
+
+  <Returns>
+    The length of the downloaded file in 'spool_filepath'.
+  """
+
+  # Do all of the arguments have the appropriate format?
+  # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+  securesystemslib.formats.URL_SCHEMA.check_match(url)
+  securesystemslib.formats.LENGTH_SCHEMA.check_match(required_length)
+  securesystemslib.formats.PATH_SCHEMA.check_match(spool_filepath)
+
+  # Ensure 'url' specifies one of the URI schemes in
+  # 'tuf.settings.SUPPORTED_URI_SCHEMES'.  See safe_download().
+  parsed_url = six.moves.urllib.parse.urlparse(url)
+
+  if fetcher is None and \
+      parsed_url.scheme not in tuf.settings.SUPPORTED_URI_SCHEMES:
+    message = \
+      repr(url) + ' specifies an unsupported URI scheme.  Supported ' + \
+      ' URI Schemes: ' + repr(tuf.settings.SUPPORTED_URI_SCHEMES)
+    raise securesystemslib.exceptions.FormatError(message)
+
+  if digest_objects is None:
+    digest_objects = {}
+
+  # 'url.replace()' is for compatibility with Windows-based systems.  See
+  # _download_file().
+  url = url.replace('\\', '/')
+
+  offset = 0
+  if os.path.exists(spool_filepath):
+    offset = os.path.getsize(spool_filepath)
+
+  if offset > required_length:
+    logger.warning(repr(spool_filepath) + ' is longer than the required'
+      ' length of ' + repr(required_length) + ' bytes.  Discarding it.')
+    offset = _truncate_spool_file(spool_filepath, digest_objects)
+
+  if offset == required_length:
+    logger.info('Already downloaded: ' + repr(url))
+    return offset
+
+  headers = {}
+  if offset:
+    logger.info('Resuming download of ' + repr(url) + ' from byte ' +
+      repr(offset) + '.')
+    headers['Range'] = 'bytes=' + str(offset) + '-'
+
+  else:
+    logger.info('Downloading: ' + repr(url))
+
+  connection = _open_connection(url, headers, fetcher)
+
+  try:
+    if offset:
+      if connection.getcode() == 206:
+        _check_content_range(connection, offset, required_length)
+
+      else:
+        logger.info(repr(url) + ' does not support range requests.'
+          '  Restarting the download.')
+        offset = _truncate_spool_file(spool_filepath, digest_objects)
+
+    reported_length = _get_content_length(connection)
+    _check_content_length(reported_length, required_length - offset)
+
+    # Append the rest of the file to the spool file.  Whatever is received is
+    # kept if the download fails.
+    with open(spool_filepath, 'ab') as spool_file:
+      total_downloaded, average_download_speed = \
+        _download_fixed_amount_of_data(connection, _SpoolFile(spool_file),
+        required_length - offset, digest_objects)
+
+  except:
+    connection.close()
+    logger.exception('Could not download URL: ' + repr(url))
+    raise
+
+  # Does the length of the file match the required length?
+  _check_downloaded_length(offset + total_downloaded, required_length,
+                           STRICT_REQUIRED_LENGTH=True,
+                           average_download_speed=average_download_speed)
+
+  return offset + total_downloaded
+
+
+
+
+
+def download_segment(url, offset, segment_length, file_object, file_lock,
+    cancel_event=None, fetcher=None):
+  """
+  <Purpose>
+    Download the 'segment_length' bytes of the file at 'url' that start at
+    byte 'offset', with an HTTP 'Range' request, and write them at the same
+    position of 'file_object'.  Several segments of a file may be downloaded
+    into the same 'file_object' at the same time, from different threads, as
+    long as they share 'file_lock'.  The length of the segment must match
+    'segment_length' exactly.  The caller must verify the hashes of the whole
+    file once all of its segments are downloaded.
+
+  <Arguments>
+    url:
+      A URL string that represents the location of the file.  The URI scheme
+      component must be one of 'tuf.settings.SUPPORTED_URI_SCHEMES'.
+
+    offset:
+      The position of the first byte of the segment.
+
+    segment_length:
+      The length of the segment.
+
+    file_object:
+      The 'securesystemslib.util.TempFile' file-like object that the segment
+      is written to.
+
+    file_lock:
+      The 'threading.Lock' that protects 'file_object'.
+
+    cancel_event:
+      An optional 'threading.Event' that another thread sets to cancel the
+      download.  It is checked before every chunk is read.
+
+    fetcher:
+      An optional 'tuf.fetcher.FetcherInterface' that opens 'url', instead of
+      the default HTTP transport.  The URI scheme of 'url' is then not checked
+      against 'tuf.settings.SUPPORTED_URI_SCHEMES'.
+
+  <Side Effects>
+    The segment is written to 'file_object'.
+
+  <Exceptions>
+    securesystemslib.exceptions.DownloadLengthMismatchError, if there was a
+    mismatch of observed vs expected lengths while downloading the segment.
+
+    tuf.exceptions.DownloadError, if the server does not support range
+    requests, returned a different part of the file than requested, or the
+    download was cancelled.
+
+    securesystemslib.exceptions.FormatError, if any of the arguments are
+    improperly formatted.
+
+    Any other unforeseen runtime exception.
+
+  <Returns>
+    None.
+  """
+
+  # Do all of the arguments have the appropriate format?
+  # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+  securesystemslib.formats.URL_SCHEMA.check_match(url)
+  securesystemslib.formats.LENGTH_SCHEMA.check_match(offset)
+  securesystemslib.formats.LENGTH_SCHEMA.check_match(segment_length)
+
+  # Ensure 'url' specifies one of the URI schemes in
+  # 'tuf.settings.SUPPORTED_URI_SCHEMES'.  See safe_download().
+  parsed_url = six.moves.urllib.parse.urlparse(url)
+
+  if fetcher is None and \
+      parsed_url.scheme not in tuf.settings.SUPPORTED_URI_SCHEMES:
     message = \
       repr(url) + ' specifies an unsupported URI scheme.  Supported ' + \
       ' URI Schemes: ' + repr(tuf.settings.SUPPORTED_URI_SCHEMES)
     raise securesystemslib.exceptions.FormatError(message)
 
-  return _download_file(url, required_length, STRICT_REQUIRED_LENGTH=False)
+  # 'url.replace()' is for compatibility with Windows-based systems.  See
+  # _download_file().
+  url = url.replace('\\', '/')
+  logger.info('Downloading bytes ' + repr(offset) + '-' +
+    repr(offset + segment_length - 1) + ' of ' + repr(url))
+
+  headers = {'Range': 'bytes=' + str(offset) + '-' +
+                      str(offset + segment_length - 1)}
+  connection = _open_connection(url, headers, fetcher)
+
+  try:
+    if connection.getcode() != 206:
+      raise tuf.exceptions.DownloadError(repr(url) + ' does not support'
+        ' range requests.')
+
+    _check_content_range(connection, offset)
+
+    reported_length = _get_content_length(connection)
+    _check_content_length(reported_length, segment_length)
+
+    total_downloaded, average_download_speed = \
+      _download_fixed_amount_of_data(connection,
+      _SegmentFile(file_object, offset, file_lock), segment_length,
+      cancel_event=cancel_event)
+
+  except:
+    connection.close()
+    logger.exception('Could not download URL: ' + repr(url))
+    raise
+
+  # Does the length of the segment match the required length?
+  _check_downloaded_length(total_downloaded, segment_length,
+                           STRICT_REQUIRED_LENGTH=True,
+                           average_download_speed=average_download_speed)
+
+
+
+
+
+def _truncate_spool_file(spool_filepath, digest_objects):
+  """
+  Discard the data in 'spool_filepath', and replace the digest objects in
+  'digest_objects' with new ones.  Return the new length of the spool file.
+  """
+
+  with open(spool_filepath, 'wb'):
+    pass
+
+  for algorithm in list(digest_objects):
+    digest_objects[algorithm] = securesystemslib.hash.digest(algorithm)
+
+  return 0
 
 
 
 
 
-def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True):
+def _check_content_range(connection, offset, required_length=None):
+  """
+  <Purpose>
+    A helper function that checks whether the partial content returned by the
+    server starts at 'offset', the first byte that was requested.
+
+  <Arguments>
+    connection:
+      The object that the _open_connection function returns for communicating
+      with the server about the contents of a URL.
+
+    offset:
+      The position of the first byte requested.
+
+    required_length:
+      The total number of bytes expected of the file, if known.
+
+  <Side Effects>
+    No known side effects.
+
+  <Exceptions>
+    tuf.exceptions.DownloadError, if the 'Content-Range' header is missing,
+    malformed, or does not start at 'offset'.
+
+  <Returns>
+    None.
+  """
+
+  # Example: 'Content-Range: bytes 1024-4095/4096'.
+  content_range = connection.info().get('Content-Range')
+
+  try:
+    unit, byte_range = content_range.split(' ', 1)
+    first_last, complete_length = byte_range.split('/', 1)
+    first_byte = int(first_last.split('-', 1)[0], 10)
+
+  except (AttributeError, ValueError):
+    raise tuf.exceptions.DownloadError('Invalid Content-Range: ' +
+      repr(content_range))
+
+  if unit != 'bytes' or first_byte != offset:
+    raise tuf.exceptions.DownloadError('Requested the file from byte ' +
+      repr(offset) + ', but got Content-Range: ' + repr(content_range))
+
+  if required_length is not None and complete_length != '*' and \
+      complete_length != str(required_length):
+    logger.debug('The server reported a complete length of ' +
+      repr(complete_length) + ' bytes, but ' + repr(required_length) +
+      ' bytes are required.')
+
+
+
+
+
+class _SpoolFile(object):
+  """
+  Adapts a regular file object, opened for appending, to the write() and
+  flush() methods of 'securesystemslib.util.TempFile' that
+  _download_fixed_amount_of_data() uses.
+  """
+
+  def __init__(self, file_object):
+    self.file_object = file_object
+
+
+  def write(self, data, auto_flush=True):
+    self.file_object.write(data)
+
+    if auto_flush:
+      self.file_object.flush()
+
+
+  def flush(self):
+    self.file_object.flush()
+
+
+
+
+
+class _SegmentFile(object):
+  """
+  Writes the data passed to write() to consecutive positions of a shared
+  'securesystemslib.util.TempFile', starting at 'offset', for
+  _download_fixed_amount_of_data().  Every write is done under 'file_lock',
+  which is shared by the segments of the file.
+  """
+
+  def __init__(self, file_object, offset, file_lock):
+    self.file_object = file_object
+    self.position = offset
+    self.file_lock = file_lock
+
+
+  def write(self, data, auto_flush=True):
+    with self.file_lock:
+      self.file_object.seek(self.position)
+      self.file_object.write(data, auto_flush=auto_flush)
+
+    self.position = self.position + len(data)
+
+
+  def flush(self):
+    with self.file_lock:
+      self.file_object.flush()
+
+
+
+
+
+def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True,
+    digest_objects=None, cancel_event=None, temp_directory=None,
+    validators=None, accept_compression=False, fetcher=None):
   """
   <Purpose>
     Given the url and length of the desired file, this function opens a
@@ -214,199 +696,653 @@ def _download_file(url, required_length, STRICT_REQUIRED_LENGTH=True):
       False when we know that we want to turn this off for downloading the
       timestamp metadata, which has no signed required_length.
 
-  <Side Effects>
-    A 'securesystemslib.util.TempFile' object is created on disk to store the
-    contents of 'url'.
+    digest_objects:
+      An optional dictionary of hash algorithms to digest objects, as returned
+      by 'securesystemslib.hash.digest()'.  Every chunk of the file is added to
+      each digest object as it is downloaded, so that the caller can verify
+      the hashes of the file without reading it back from disk.
+
+    cancel_event:
+      An optional 'threading.Event' that another thread sets to cancel the
+      download.  It is checked before every chunk is read.
+
+    temp_directory:
+      An optional directory in which the temporary file is created, instead
+      of the default temporary directory.  The directory of the final
+      destination of the file should be given, so that the file can be
+      renamed into place rather than copied (see 'DestinationTempFile').
+
+    validators:
+      An optional dictionary of the HTTP cache validator ('ETag') of a copy
+      of the file that the caller already has.  If
+      it is not empty, a conditional request is sent, so that the server does
+      not send the file again if it is unchanged.  The dictionary is updated
+      with the validators of the downloaded file.
+
+    accept_compression:
+      A boolean switch to let the server send the file compressed with gzip or
+      deflate.  It is decompressed as it is downloaded, and 'required_length'
+      applies to the decompressed file (see '_DecompressingResponse').
+
+    fetcher:
+      An optional 'tuf.fetcher.FetcherInterface' that opens 'url', instead of
+      the default HTTP transport.  The URI scheme of 'url' is then not checked
+      against 'tuf.settings.SUPPORTED_URI_SCHEMES'.
+
+  <Side Effects>
+    A 'securesystemslib.util.TempFile' object is created on disk to store the
+    contents of 'url'.
+
+  <Exceptions>
+    tuf.ssl_commons.exceptions.DownloadLengthMismatchError, if there was a
+    mismatch of observed vs expected lengths while downloading the file.
+
+    tuf.exceptions.DownloadError, if the download was cancelled.
+
+    tuf.exceptions.NotModifiedError, if 'validators' was given and the server
+    reported that the file is unchanged.
+
+    securesystemslib.exceptions.FormatError, if any of the arguments are
+    improperly formatted.
+
+    Any other unforeseen runtime exception.
+
+  <Returns>
+    A 'securesystemslib.util.TempFile' file-like object that points to the
+    contents of 'url'.
+  """
+
+  # Do all of the arguments have the appropriate format?
+  # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
+  securesystemslib.formats.URL_SCHEMA.check_match(url)
+  securesystemslib.formats.LENGTH_SCHEMA.check_match(required_length)
+
+  # 'url.replace()' is for compatibility with Windows-based systems because
+  # they might put back-slashes in place of forward-slashes.  This converts it
+  # to the common format.
+  url = url.replace('\\', '/')
+  logger.info('Downloading: ' + repr(url))
+
+  # Open the connection to the remote file, with a conditional request if the
+  # validators of a previous copy are known.
+  headers = _get_conditional_headers(validators) or {}
+
+  if accept_compression:
+    headers['Accept-encoding'] = 'gzip, deflate'
+
+  try:
+    connection = _open_connection(url, headers, fetcher)
+
+  except six.moves.urllib.error.HTTPError as e:
+    if e.code == 304:
+      logger.info(repr(url) + ' has not been modified.')
+      raise tuf.exceptions.NotModifiedError(url)
+
+    logger.exception('Could not download URL: ' + repr(url))
+    raise
+
+  except:
+    logger.exception('Could not download URL: ' + repr(url))
+    raise
+
+  if validators is not None:
+    _update_validators(validators, connection)
+
+  if accept_compression:
+    connection = _decompress_response(connection, required_length)
+
+  # This is the temporary file that we will return to contain the contents of
+  # the downloaded file.
+  if temp_directory is None:
+    temp_file = securesystemslib.util.TempFile()
+
+  else:
+    temp_file = DestinationTempFile(temp_directory)
+
+  try:
+    # We ask the server about how big it thinks this file should be.
+    reported_length = _get_content_length(connection)
+
+    # Then, we check whether the required length matches the reported length.
+    _check_content_length(reported_length, required_length,
+                          STRICT_REQUIRED_LENGTH)
+
+    # Download the contents of the URL, up to the required length, to a
+    # temporary file, and get the total number of downloaded bytes.
+    total_downloaded, average_download_speed = \
+      _download_fixed_amount_of_data(connection, temp_file, required_length,
+      digest_objects, cancel_event)
+
+    # Does the total number of downloaded bytes match the required length?
+    _check_downloaded_length(total_downloaded, required_length,
+                             STRICT_REQUIRED_LENGTH=STRICT_REQUIRED_LENGTH,
+                             average_download_speed=average_download_speed)
+
+  except:
+    # Close 'temp_file'.  Any written data is lost.
+    temp_file.close_temp_file()
+    logger.exception('Could not download URL: ' + repr(url))
+    raise
+
+  else:
+    return temp_file
+
+
+
+
+
+def _download_fixed_amount_of_data(connection, temp_file, required_length,
+    digest_objects=None, cancel_event=None):
+  """
+  <Purpose>
+    This is a helper function, where the download really happens. While-block
+    reads data from connection a fixed chunk of data at a time, or less, until
+    'required_length' is reached.
+
+  <Arguments>
+    connection:
+      The object that the _open_connection returns for communicating with the
+      server about the contents of a URL.
+
+    temp_file:
+      A temporary file where the contents at the URL specified by the
+      'connection' object will be stored.
+
+    required_length:
+      The number of bytes that we must download for the file.  This is almost
+      always specified by the TUF metadata for the data file in question
+      (except in the case of timestamp metadata, in which case we would fix a
+      reasonable upper bound).
+
+    digest_objects:
+      An optional dictionary of hash algorithms to digest objects that are
+      updated with every chunk of data written to 'temp_file'.
+
+    cancel_event:
+      An optional 'threading.Event' that is set to cancel the download.
+
+  <Side Effects>
+    Data from the server will be written to 'temp_file', and added to the
+    digest objects in 'digest_objects'.
+
+  <Exceptions>
+    tuf.exceptions.DownloadError, if 'cancel_event' is set.
+
+    Runtime or network exceptions will be raised without question.
+
+  <Returns>
+    A (total_downloaded, average_download_speed) tuple, where
+    'total_downloaded' is the total number of bytes downloaded for the desired
+    file and the 'average_download_speed' calculated for the download
+    attempt.
+  """
+
+  # Keep track of total bytes downloaded.
+  number_of_bytes_received = 0
+  average_download_speed = 0
+
+  # The throughput of the connection is measured over a sliding time window,
+  # rather than throttling every read, so that fast connections are limited
+  # only by the speed of the socket.
+  throughput_monitor = _ThroughputMonitor()
+
+  if digest_objects is None:
+    digest_objects = {}
+
+  # A local file (see 'tuf.fetcher.FileFetcher') whose data need not be hashed
+  # is copied by the kernel, without passing through user space.
+  if not digest_objects and hasattr(connection, 'copy_to') and \
+      (cancel_event is None or not cancel_event.is_set()):
+    try:
+      number_of_bytes_received = connection.copy_to(temp_file, required_length)
+
+    finally:
+      connection.close()
+
+    return number_of_bytes_received, \
+      throughput_monitor.final_speed(number_of_bytes_received)
+
+  try:
+    while True:
+      # Another thread may have lost interest in the file (e.g., a copy was
+      # already downloaded from a different mirror).
+      if cancel_event is not None and cancel_event.is_set():
+        raise tuf.exceptions.DownloadError('The download was cancelled.')
+
+      # We download a fixed chunk of data in every round. This is so that we
+      # can defend against slow retrieval attacks. Furthermore, we do not wish
+      # to download an extremely large file in one shot.
+      data = b''
+      read_amount = min(tuf.settings.CHUNK_SIZE,
+                        required_length - number_of_bytes_received)
+
+      try:
+        data = connection.read(read_amount)
+
+      # Python 3.2 returns 'IOError' if the remote file object has timed out.
+      except (socket.error, IOError):
+        # Nothing could be read from the connection.  Back off for a short
+        # amount of time so that the CPU is not hogged while the window
+        # check below decides whether the server is too slow.
+        time.sleep(0.05)
+
+      else:
+        # The connection has been closed by the server.  Stop reading, and
+        # let the caller decide whether the downloaded length is acceptable.
+        if not data:
+          logger.debug('Downloaded ' + repr(number_of_bytes_received) + '/' +
+            repr(required_length) + ' bytes.')
+          average_download_speed = \
+            throughput_monitor.final_speed(number_of_bytes_received)
+          break
+
+      number_of_bytes_received = number_of_bytes_received + len(data)
+
+      # Data successfully read from the connection.  Store it.
+      temp_file.write(data, auto_flush=False)
+
+      # Hash the data while it is still in memory, rather than reading the
+      # whole file back from disk once it has been downloaded.
+      for digest_object in six.itervalues(digest_objects):
+        digest_object.update(data)
+
+      if number_of_bytes_received == required_length:
+        break
+
+      window_download_speed = \
+        throughput_monitor.update(number_of_bytes_received)
+
+      # Still within the slow start grace period.
+      if window_download_speed is None:
+        continue
+
+      average_download_speed = window_download_speed
+
+      if average_download_speed < tuf.settings.MIN_AVERAGE_DOWNLOAD_SPEED:
+        logger.debug('The download speed over the last ' +
+          repr(tuf.settings.DOWNLOAD_SPEED_WINDOW) + ' seconds dropped below'
+          ' the minimum average download speed set in tuf.settings.py.')
+        break
+
+  except:
+    raise
+
+  else:
+    # This else block returns and skips closing the connection in the finally
+    # block, so close the connection here.
+    connection.close()
+    temp_file.flush()
+    return number_of_bytes_received, average_download_speed
+
+  finally:
+    # Whatever happens, make sure that we always close the connection.
+    connection.close()
+
+
+
+
+
+def _decompress_response(connection, required_length):
+  """
+  <Purpose>
+    Return 'connection', or a '_DecompressingResponse' that wraps it if the
+    response is compressed.
+
+  <Arguments>
+    connection:
+      The object that _open_connection() returns.
+
+    required_length:
+      The length, or upper limit on the length, of the decompressed file.
+
+  <Side Effects>
+    'connection' is closed if its content encoding is not supported.
+
+  <Exceptions>
+    tuf.exceptions.DownloadError, if the content encoding of the response is
+    not supported.
+
+  <Returns>
+    A file-like object that returns the decompressed response.
+  """
+
+  content_encoding = \
+    (connection.info().get('Content-Encoding') or 'identity').strip().lower()
+
+  if content_encoding == 'identity':
+    return connection
+
+  elif content_encoding in ['gzip', 'x-gzip', 'deflate']:
+    logger.debug('Decompressing a ' + content_encoding + ' response.')
+    return _DecompressingResponse(connection, content_encoding,
+        required_length)
+
+  else:
+    connection.close()
+    raise tuf.exceptions.DownloadError('Unsupported content encoding: ' +
+      repr(content_encoding))
+
+
+
+
+
+class _DecompressingResponse(object):
+  """
+  <Purpose>
+    A file-like wrapper of a connection whose response is compressed with
+    gzip or deflate.  The response is decompressed as it is read, and read()
+    never returns more than the requested amount of decompressed data, so the
+    decompressed file is bounded by 'required_length' exactly like an
+    uncompressed one (e.g., against endless data and zip bombs).
+
+    Deflate never expands incompressible data by more than a few bytes per
+    block, so no more than a small margin over 'required_length' compressed
+    bytes are read either.  This bounds the data received for a stream that
+    never decompresses to anything.
+  """
+
+  def __init__(self, connection, content_encoding, required_length):
+    self.connection = connection
+
+    if content_encoding == 'deflate':
+      self.decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+
+    else:
+      self.decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+    self.compressed_length = 0
+    self.max_compressed_length = required_length + required_length // 100 + 1024
+
+
+  def read(self, amount=None):
+    if amount is None:
+      amount = tuf.settings.CHUNK_SIZE
+
+    # A 'max_length' of zero means no limit to zlib.
+    if amount <= 0:
+      return b''
+
+    while True:
+      # Compressed data whose decompressed data did not fit in the previous
+      # read is decompressed first.
+      if self.decompressor.unconsumed_tail:
+        compressed_data = self.decompressor.unconsumed_tail
+
+      # The end of the compressed stream.  Python 2 lacks 'eof'.
+      elif getattr(self.decompressor, 'eof', False):
+        return b''
+
+      else:
+        compressed_data = self.connection.read(tuf.settings.CHUNK_SIZE)
+
+        if not compressed_data:
+          return b''
+
+        self.compressed_length = self.compressed_length + len(compressed_data)
+
+        if self.compressed_length > self.max_compressed_length:
+          raise tuf.exceptions.DownloadError('Received more than ' +
+            repr(self.max_compressed_length) + ' bytes of compressed data.')
+
+      try:
+        data = self.decompressor.decompress(compressed_data, amount)
+
+      except zlib.error as e:
+        raise tuf.exceptions.DownloadError('Could not decompress the'
+          ' response: ' + str(e))
+
+      if data:
+        return data
+
+
+  def info(self):
+    return self.connection.info()
+
+
+  def close(self):
+    self.connection.close()
+
+
+
+
+
+class _ThroughputMonitor(object):
+  """
+  <Purpose>
+    Helper class that measures the download speed of a connection over a
+    sliding time window of 'tuf.settings.DOWNLOAD_SPEED_WINDOW' seconds.
+    A server that starts delivering data at an acceptable speed and then
+    stalls is detected as soon as the window no longer contains enough data,
+    instead of only after the overall average has decayed.
+
+    Servers with a slow start are tolerated by ignoring their delivery speed
+    for 'tuf.settings.SLOW_START_GRACE_PERIOD' seconds.
+  """
+
+  def __init__(self):
+    self.start_time = timeit.default_timer()
+
+    # (time, total number of bytes received) samples, oldest first.  The
+    # oldest sample is the most recent one taken at, or before, the start of
+    # the window.
+    self.samples = collections.deque([(self.start_time, 0)])
+
+
+  def update(self, number_of_bytes_received):
+    """
+    Record that 'number_of_bytes_received' bytes have been received so far,
+    and return the download speed (bytes/second) over the current window.
+    None is returned while the slow start grace period has not yet elapsed.
+    """
+
+    now = timeit.default_timer()
+    self.samples.append((now, number_of_bytes_received))
+
+    window_start = now - tuf.settings.DOWNLOAD_SPEED_WINDOW
+    while len(self.samples) > 1 and self.samples[1][0] <= window_start:
+      self.samples.popleft()
+
+    if now - self.start_time < tuf.settings.SLOW_START_GRACE_PERIOD:
+      return None
+
+    oldest_time, oldest_number_of_bytes = self.samples[0]
+    seconds_in_window = now - oldest_time
+
+    if seconds_in_window <= 0:
+      return None
+
+    return \
+      (number_of_bytes_received - oldest_number_of_bytes) / seconds_in_window
+
+
+  def final_speed(self, number_of_bytes_received):
+    """
+    Return the average download speed (bytes/second) of a download that the
+    server has ended.  A download that ends within the slow start grace period
+    is averaged over the whole grace period, so that a server cannot evade the
+    minimum download speed by closing the connection early.
+    """
+
+    seconds_spent_receiving = max(timeit.default_timer() - self.start_time,
+                                  tuf.settings.SLOW_START_GRACE_PERIOD)
+
+    if seconds_spent_receiving <= 0:
+      return 0
+
+    return number_of_bytes_received / seconds_spent_receiving
+
+
+
+
+
+class DestinationTempFile(object):
+  """
+  <Purpose>
+    A temporary file, with the interface of 'securesystemslib.util.TempFile',
+    that is created in a given directory (normally that of its final
+    destination) instead of the default temporary directory.  move() renames
+    the file into place with replace_file(), rather than copying it, so that
+    the downloaded data is only written once, and the destination is never
+    seen partially written.
+
+    The file is removed by close_temp_file() unless it has been moved.
+  """
+
+  def __init__(self, directory, prefix='tuf_temp_'):
+    self.temporary_file = tempfile.NamedTemporaryFile(prefix=prefix,
+        dir=directory, delete=False)
+
+
+  def get_compressed_length(self):
+    return os.fstat(self.temporary_file.fileno()).st_size
+
+
+  def flush(self):
+    self.temporary_file.flush()
+
+
+  def read(self, size=None):
+    if size is None:
+      self.temporary_file.seek(0)
+      data = self.temporary_file.read()
+      self.temporary_file.seek(0)
 
-  <Exceptions>
-    tuf.ssl_commons.exceptions.DownloadLengthMismatchError, if there was a
-    mismatch of observed vs expected lengths while downloading the file.
+      return data
 
-    securesystemslib.exceptions.FormatError, if any of the arguments are
-    improperly formatted.
+    return self.temporary_file.read(size)
 
-    Any other unforeseen runtime exception.
 
-  <Returns>
-    A 'securesystemslib.util.TempFile' file-like object that points to the
-    contents of 'url'.
-  """
+  def write(self, data, auto_flush=True):
+    self.temporary_file.write(data)
 
-  # Do all of the arguments have the appropriate format?
-  # Raise 'securesystemslib.exceptions.FormatError' if there is a mismatch.
-  securesystemslib.formats.URL_SCHEMA.check_match(url)
-  securesystemslib.formats.LENGTH_SCHEMA.check_match(required_length)
+    if auto_flush:
+      self.flush()
 
-  # 'url.replace()' is for compatibility with Windows-based systems because
-  # they might put back-slashes in place of forward-slashes.  This converts it
-  # to the common format.
-  url = url.replace('\\', '/')
-  logger.info('Downloading: ' + repr(url))
 
-  # This is the temporary file that we will return to contain the contents of
-  # the downloaded file.
-  temp_file = securesystemslib.util.TempFile()
+  def seek(self, *args):
+    self.temporary_file.seek(*args)
 
-  try:
-    # Open the connection to the remote file.
-    connection = _open_connection(url)
 
-    # We ask the server about how big it thinks this file should be.
-    reported_length = _get_content_length(connection)
+  def move(self, destination_path):
+    """
+    Move the file to 'destination_path', which should be on the same file
+    system, and close it.
+    """
 
-    # Then, we check whether the required length matches the reported length.
-    _check_content_length(reported_length, required_length,
-                          STRICT_REQUIRED_LENGTH)
+    self.flush()
+    self.temporary_file.close()
+    replace_file(self.temporary_file.name, destination_path)
 
-    # Download the contents of the URL, up to the required length, to a
-    # temporary file, and get the total number of downloaded bytes.
-    total_downloaded, average_download_speed = \
-      _download_fixed_amount_of_data(connection, temp_file, required_length)
 
-    # Does the total number of downloaded bytes match the required length?
-    _check_downloaded_length(total_downloaded, required_length,
-                             STRICT_REQUIRED_LENGTH=STRICT_REQUIRED_LENGTH,
-                             average_download_speed=average_download_speed)
+  def close_temp_file(self):
+    self.temporary_file.close()
 
-  except:
-    # Close 'temp_file'.  Any written data is lost.
-    temp_file.close_temp_file()
-    logger.exception('Could not download URL: ' + repr(url))
-    raise
+    try:
+      os.remove(self.temporary_file.name)
 
-  else:
-    return temp_file
+    except OSError:
+      pass
 
 
 
 
 
-def _download_fixed_amount_of_data(connection, temp_file, required_length):
+def replace_file(source_path, destination_path):
   """
   <Purpose>
-    This is a helper function, where the download really happens. While-block
-    reads data from connection a fixed chunk of data at a time, or less, until
-    'required_length' is reached.
+    Atomically replace 'destination_path' with the file at 'source_path',
+    which must be on the same file system.  The file is first flushed to disk
+    if 'tuf.settings.FSYNC_DOWNLOADED_TARGETS' is True.
 
   <Arguments>
-    connection:
-      The object that the _open_connection returns for communicating with the
-      server about the contents of a URL.
+    source_path:
+      The path of the file to move.
 
-    temp_file:
-      A temporary file where the contents at the URL specified by the
-      'connection' object will be stored.
+    destination_path:
+      The path that 'source_path' is moved to.  An existing file is replaced.
 
-    required_length:
-      The number of bytes that we must download for the file.  This is almost
-      always specified by the TUF metadata for the data file in question
-      (except in the case of timestamp metadata, in which case we would fix a
-      reasonable upper bound).
+  <Exceptions>
+    OSError, if the file cannot be moved.
 
   <Side Effects>
-    Data from the server will be written to 'temp_file'.
-
-  <Exceptions>
-    Runtime or network exceptions will be raised without question.
+    'source_path' is renamed to 'destination_path'.
 
   <Returns>
-    A (total_downloaded, average_download_speed) tuple, where
-    'total_downloaded' is the total number of bytes downloaded for the desired
-    file and the 'average_download_speed' calculated for the download
-    attempt.
+    None.
   """
 
-  # Tolerate servers with a slow start by ignoring their delivery speed for
-  # 'tuf.settings.SLOW_START_GRACE_PERIOD' seconds.  Set 'seconds_spent_receiving'
-  # to negative SLOW_START_GRACE_PERIOD seconds, and begin checking the average
-  # download speed once it is positive.
-  grace_period = -tuf.settings.SLOW_START_GRACE_PERIOD
+  if tuf.settings.FSYNC_DOWNLOADED_TARGETS:
+    with open(source_path, 'rb+') as file_object:
+      os.fsync(file_object.fileno())
 
-  # Keep track of total bytes downloaded.
-  number_of_bytes_received = 0
-  average_download_speed = 0
+  # os.replace() is only available in Python 3.3+.  os.rename() is atomic, and
+  # replaces 'destination_path', on POSIX systems.
+  if hasattr(os, 'replace'):
+    os.replace(source_path, destination_path)
 
-  start_time = timeit.default_timer()
+  else: # pragma: no cover
+    if os.name == 'nt' and os.path.exists(destination_path):
+      os.remove(destination_path)
 
-  try:
-    while True:
-      # We download a fixed chunk of data in every round. This is so that we
-      # can defend against slow retrieval attacks. Furthermore, we do not wish
-      # to download an extremely large file in one shot.  Before beginning the
-      # round, sleep for a short amount of time so that the CPU is not hogged
-      # in the while loop.
-      time.sleep(0.05)
-      data = b''
-      read_amount = min(tuf.settings.CHUNK_SIZE,
-                        required_length - number_of_bytes_received)
+    os.rename(source_path, destination_path)
 
-      try:
-        data = connection.read(read_amount)
 
-      # Python 3.2 returns 'IOError' if the remote file object has timed out.
-      except (socket.error, IOError):
-        pass
 
-      number_of_bytes_received = number_of_bytes_received + len(data)
 
-      # Data successfully read from the connection.  Store it.
-      temp_file.write(data)
 
-      if number_of_bytes_received == required_length:
-        break
+def _get_conditional_headers(validators):
+  """
+  Return the request headers that make a request conditional on the file
+  having changed since it was downloaded with the given 'validators' (see
+  '_update_validators()'), or None if no validators are known.
+  """
 
-      stop_time = timeit.default_timer()
-      seconds_spent_receiving = stop_time - start_time
+  if not validators:
+    return None
 
-      if (seconds_spent_receiving + grace_period) < 0:
-        continue
+  # 'Last-Modified' is not used, since it only has a resolution of one second,
+  # and a file that is replaced within the same second would be reported
+  # unchanged.
+  if validators.get('ETag'):
+    return {'If-None-Match': validators['ETag']}
 
-      # Measure the average download speed.
-      average_download_speed = number_of_bytes_received / seconds_spent_receiving
+  return None
 
-      if average_download_speed < tuf.settings.MIN_AVERAGE_DOWNLOAD_SPEED:
-        logger.debug('The average download speed dropped below the minimum'
-          ' average download speed set in tuf.settings.py.')
-        break
 
-      else:
-        logger.debug('The average download speed has not dipped below the'
-          ' mimimum average download speed set in tuf.settings.py.')
 
-      # We might have no more data to read. Check number of bytes downloaded.
-      if not data:
-        logger.debug('Downloaded ' + repr(number_of_bytes_received) + '/' +
-          repr(required_length) + ' bytes.')
 
-        # Finally, we signal that the download is complete.
-        break
 
-  except:
-    raise
+def _update_validators(validators, connection):
+  """
+  Replace the contents of the 'validators' dictionary with the 'ETag'
+  response header of 'connection', if any.
+  """
 
-  else:
-    # This else block returns and skips closing the connection in the finally
-    # block, so close the connection here.
-    connection.close()
-    return number_of_bytes_received, average_download_speed
+  validators.clear()
 
-  finally:
-    # Whatever happens, make sure that we always close the connection.
-    connection.close()
+  value = connection.info().get('ETag')
 
+  if value:
+    validators['ETag'] = value
 
 
 
 
-def _get_request(url):
+
+def _get_request(url, headers=None):
   """
   Wraps the URL to retrieve to protects against "creative"
   interpretation of the RFC: http://bugs.python.org/issue8732
+  Any additional request 'headers' (e.g., 'Range') are also set.
 
   https://github.com/pypa/pip/blob/d0fa66ecc03ab20b7411b35f7c7b423f31f77761/pip/download.py#L147
   """
 
-  return six.moves.urllib.request.Request(url, headers={'Accept-encoding': 'identity'})
+  request_headers = {'Accept-encoding': 'identity'}
+  if headers:
+    request_headers.update(headers)
+
+  return six.moves.urllib.request.Request(url, headers=request_headers)
 
 
 
@@ -442,31 +1378,60 @@ def _get_opener(scheme=None):
 
 
 
-def _open_connection(url):
+def _open_connection(url, headers=None, fetcher=None):
+  """
+  Open 'url' with 'fetcher' (a 'tuf.fetcher.FetcherInterface'), or with
+  open_connection() if no fetcher is given, and return the file-like response.
+  """
+
+  if fetcher is not None:
+    return fetcher.fetch(url, headers)
+
+  return open_connection(url, headers)
+
+
+
+
+
+def open_connection(url, headers=None):
   """
   <Purpose>
-    Helper function that opens a connection to the url. urllib2 supports http,
-    ftp, and file. In python (2.6+) where the ssl module is available, urllib2
-    also supports https.
+    Open a connection to the url.  HTTP and HTTPS requests are sent over a
+    persistent connection taken from the process-wide connection pool (see
+    '_ConnectionPool').  Requests for other URI schemes, or that must go
+    through a proxy, are handled by urllib2, which supports http, ftp, and
+    file.  This is the transport of 'tuf.fetcher.HTTPFetcher', the default
+    fetcher.
 
-    TODO: Determine whether this follows http redirects and decide if we like
-    that. For example, would we not want to allow redirection from ssl to
-     non-ssl urls?
+    Redirects are followed, except from https to a non-https url.
 
   <Arguments>
     url:
       URL string (e.g., 'http://...' or 'ftp://...' or 'file://...')
 
+    headers:
+      An optional dictionary of additional HTTP request headers, such as
+      'Range'.
+
   <Exceptions>
-    None.
+    six.moves.urllib.error.URLError, if a connection to the server could not
+    be established.
+
+    six.moves.urllib.error.HTTPError, if the server did not successfully
+    return the file.
 
   <Side Effects>
-    Opens a connection to a remote server.
+    Opens a connection to a remote server, or reuses an idle one.
 
   <Returns>
     File-like object.
   """
 
+  parsed_url = six.moves.urllib.parse.urlparse(url)
+
+  if parsed_url.scheme in ['http', 'https'] and not _proxy_required(parsed_url):
+    return _connection_pool.urlopen(url, headers)
+
   # urllib2.Request produces a Request object that allows for a finer control
   # of the requesting process. Request object allows to add headers or data to
   # the HTTP request. For instance, request method add_header(key, val) can be
@@ -474,10 +1439,8 @@ def _open_connection(url):
   # 'Mozilla/4.0 (compatible; MSIE 7.0; Windows NT 5.1)' this can be useful if
   # servers do not recognize connections that originates from
   # Python-urllib/x.y.
-
-  parsed_url = six.moves.urllib.parse.urlparse(url)
   opener = _get_opener(scheme=parsed_url.scheme)
-  request = _get_request(url)
+  request = _get_request(url, headers)
 
   return opener.open(request, timeout = tuf.settings.SOCKET_TIMEOUT)
 
@@ -485,6 +1448,23 @@ def _open_connection(url):
 
 
 
+def _proxy_required(parsed_url):
+  """
+  Return True if the environment configures a proxy for 'parsed_url', in which
+  case the request is left to urllib2, which knows how to use it.
+  """
+
+  proxies = six.moves.urllib.request.getproxies()
+
+  if parsed_url.scheme not in proxies:
+    return False
+
+  return not six.moves.urllib.request.proxy_bypass(parsed_url.hostname)
+
+
+
+
+
 def _get_content_length(connection):
   """
   <Purpose>
@@ -674,11 +1654,15 @@ def _check_downloaded_length(total_downloaded, required_length,
 
 class VerifiedHTTPSConnection(six.moves.http_client.HTTPSConnection):
   """
-  A connection that wraps connections with ssl certificate verification.
+  A connection that wraps connections with ssl certificate verification.  The
+  'SSLContext' is shared by all connections (see '_get_ssl_context()'), and the
+  TLS session in 'tls_session', if set, is resumed.
 
   https://github.com/pypa/pip/blob/d0fa66ecc03ab20b7411b35f7c7b423f31f77761/pip/download.py#L72
   """
 
+  tls_session = None
+
   def connect(self):
 
     self.connection_kwargs = {}
@@ -695,17 +1679,13 @@ class VerifiedHTTPSConnection(six.moves.http_client.HTTPSConnection):
       self.sock = sock
       self._tunnel()
 
-    # set location of certificate authorities
-    assert os.path.isfile(tuf.settings.ssl_certificates)
-    cert_path = tuf.settings.ssl_certificates
+    # TLS session resumption is only available in Python 3.6+.
+    wrap_kwargs = {}
+    if self.tls_session is not None:
+      wrap_kwargs.update(session = self.tls_session)
 
-    # TODO: Disallow SSLv2.
-    # http://docs.python.org/dev/library/ssl.html#protocol-versions
-    # TODO: Select the right ciphers.
-    # http://docs.python.org/dev/library/ssl.html#cipher-selection
-    self.sock = ssl.wrap_socket(sock, self.key_file, self.cert_file,
-                                cert_reqs=ssl.CERT_REQUIRED,
-                                ca_certs=cert_path)
+    self.sock = _get_ssl_context().wrap_socket(sock,
+        server_hostname=self.host, **wrap_kwargs)
 
     match_hostname(self.sock.getpeercert(), self.host)
 
@@ -726,3 +1706,325 @@ class VerifiedHTTPSHandler(six.moves.urllib.request.HTTPSHandler):
 
   def https_open(self, req):
     return self.do_open(self.specialized_conn_class, req)
+
+
+
+
+
+# The 'SSLContext' shared by all HTTPS connections, and the certificate
+# authorities file ('tuf.settings.ssl_certificates') it was created for.
+_ssl_context = None
+_ssl_context_certificates = None
+_ssl_context_lock = threading.Lock()
+
+
+def _get_ssl_context():
+  """
+  <Purpose>
+    Return the 'SSLContext' shared by all HTTPS connections.  It is created
+    on first use, and again whenever 'tuf.settings.ssl_certificates' changes,
+    so that the certificate authorities file is only loaded once.
+
+  <Arguments>
+    None.
+
+  <Exceptions>
+    AssertionError, if 'tuf.settings.ssl_certificates' is not a file.
+
+    ssl.SSLError, if the certificate authorities cannot be loaded.
+
+  <Side Effects>
+    The certificate authorities file is read the first time it is used.
+
+  <Returns>
+    An 'ssl.SSLContext' object.
+  """
+
+  global _ssl_context
+  global _ssl_context_certificates
+
+  with _ssl_context_lock:
+    cert_path = tuf.settings.ssl_certificates
+
+    if _ssl_context is None or _ssl_context_certificates != cert_path:
+      # set location of certificate authorities
+      assert os.path.isfile(cert_path)
+
+      # The default context requires certificate verification and disallows
+      # SSLv2 and SSLv3.  The hostname is verified with match_hostname(), as
+      # before, so that the vendored version is used for Python 2.7.
+      # http://docs.python.org/dev/library/ssl.html#protocol-versions
+      context = ssl.create_default_context(cafile=cert_path)
+      context.check_hostname = False
+
+      _ssl_context = context
+      _ssl_context_certificates = cert_path
+
+    return _ssl_context
+
+
+
+
+
+class _PooledResponse(object):
+  """
+  <Purpose>
+    The file-like object returned by '_ConnectionPool.urlopen()'.  It behaves
+    like the response returned by urllib2, and returns its connection to the
+    pool when it is closed, provided that the response was read in full and
+    the server allows the connection to be kept alive.  Otherwise, the
+    connection is closed.
+  """
+
+  def __init__(self, pool, key, connection, response):
+    self.pool = pool
+    self.key = key
+    self.connection = connection
+    self.response = response
+    self.status = response.status
+
+
+  def read(self, amount=None):
+    return self.response.read(amount)
+
+
+  def info(self):
+    return self.response.msg
+
+
+  def getcode(self):
+    return self.status
+
+
+  def getheader(self, name, default=None):
+    return self.response.getheader(name, default)
+
+
+  def close(self):
+    # close() may be called more than once.
+    if self.connection is None:
+      return
+
+    connection = self.connection
+    self.connection = None
+
+    # A response without a body, such as '304 Not Modified', is read in full
+    # by reading nothing, so that its connection can be reused.
+    if self.response.length == 0:
+      self.response.read()
+
+    if self.response.isclosed() and not self.response.will_close:
+      self.pool.release(self.key, connection)
+
+    else:
+      self.response.close()
+      connection.close()
+
+
+
+
+
+class _ConnectionPool(object):
+  """
+  <Purpose>
+    A pool of persistent HTTP/1.1 connections, kept per (scheme, host, port)
+    and shared by every download made by this process.  Up to
+    'tuf.settings.CONNECTION_POOL_SIZE' idle connections are kept for each
+    host, and idle connections older than 'tuf.settings.CONNECTION_IDLE_TIMEOUT'
+    seconds are discarded.  The TLS session of the last HTTPS connection to a
+    host is resumed by new connections to that host.
+
+    The pool is safe to use from multiple threads.
+  """
+
+  # The maximum number of redirects followed for a single request, as urllib2.
+  MAX_REDIRECTIONS = 10
+
+  def __init__(self):
+    self._lock = threading.Lock()
+
+    # (scheme, host, port): [(connection, time it was returned to the pool)]
+    self._idle_connections = {}
+
+    # (host, port): the TLS session of the last HTTPS connection to the host.
+    self._tls_sessions = {}
+
+
+  def urlopen(self, url, headers=None):
+    """
+    Send a GET request for 'url', with any additional request 'headers',
+    following redirects, and return a '_PooledResponse'.  Raise
+    'six.moves.urllib.error.HTTPError' if the server did not return the file
+    (or the requested part of it), or 'six.moves.urllib.error.URLError' if the
+    server could not be reached.
+    """
+
+    for redirection in range(self.MAX_REDIRECTIONS + 1):
+      parsed_url = six.moves.urllib.parse.urlparse(url)
+      response = self._request(parsed_url, headers)
+
+      if response.status in [200, 206]:
+        return response
+
+      location = response.getheader('Location')
+      response_headers = response.info()
+      response.close()
+
+      if response.status not in [301, 302, 303, 307, 308] or location is None:
+        raise six.moves.urllib.error.HTTPError(url, response.status,
+            response.response.reason, response_headers, None)
+
+      redirected_url = six.moves.urllib.parse.urljoin(url, location)
+      redirected_scheme = six.moves.urllib.parse.urlparse(redirected_url).scheme
+
+      if redirected_scheme not in ['http', 'https'] or \
+          (parsed_url.scheme == 'https' and redirected_scheme != 'https'):
+        raise six.moves.urllib.error.HTTPError(url, response.status,
+            'Refusing to follow redirect to ' + repr(redirected_url),
+            response_headers, None)
+
+      logger.debug('Redirected from ' + repr(url) + ' to ' +
+        repr(redirected_url) + '.')
+      url = redirected_url
+
+    raise six.moves.urllib.error.HTTPError(url, response.status,
+        'Too many redirects', response_headers, None)
+
+
+  def _request(self, parsed_url, extra_headers=None):
+    """
+    Send a GET request for 'parsed_url' over a pooled connection.  A request
+    that fails on a reused connection, which the server may have closed in the
+    meantime, is retried once on a new connection.
+    """
+
+    default_port = 443 if parsed_url.scheme == 'https' else 80
+    key = (parsed_url.scheme, parsed_url.hostname,
+           parsed_url.port or default_port)
+
+    path = parsed_url.path or '/'
+    if parsed_url.query:
+      path = path + '?' + parsed_url.query
+
+    # Protect against "creative" interpretation of the RFC.  See
+    # _get_request().
+    headers = {'Accept-encoding': 'identity'}
+    if extra_headers:
+      headers.update(extra_headers)
+
+    connection, reused = self._get_connection(key)
+
+    while True:
+      # Resume the last TLS session with the host if 'connection' has to
+      # (re)connect.
+      if isinstance(connection, VerifiedHTTPSConnection):
+        with self._lock:
+          connection.tls_session = self._tls_sessions.get(key[1:])
+
+      try:
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+
+      except (socket.error, six.moves.http_client.HTTPException) as e:
+        connection.close()
+
+        if reused:
+          logger.debug('Reused connection to ' + repr(key) + ' failed: ' +
+            repr(e) + '.  Retrying with a new connection.')
+          connection, reused = self._new_connection(key), False
+          continue
+
+        raise six.moves.urllib.error.URLError(e)
+
+      else:
+        self._save_tls_session(key, connection)
+        return _PooledResponse(self, key, connection, response)
+
+
+  def _get_connection(self, key):
+    """
+    Return a (connection, reused) tuple, where 'connection' is an idle
+    connection for 'key', or a new one if there is none.
+    """
+
+    now = timeit.default_timer()
+    expired_connections = []
+    connection = None
+
+    with self._lock:
+      idle_connections = self._idle_connections.get(key, [])
+
+      while idle_connections:
+        idle_connection, released_time = idle_connections.pop()
+
+        if now - released_time < tuf.settings.CONNECTION_IDLE_TIMEOUT:
+          connection = idle_connection
+          break
+
+        expired_connections.append(idle_connection)
+
+    for expired_connection in expired_connections:
+      expired_connection.close()
+
+    if connection is not None:
+      return connection, True
+
+    return self._new_connection(key), False
+
+
+  def _new_connection(self, key):
+    scheme, host, port = key
+
+    if scheme == 'https':
+      connection = VerifiedHTTPSConnection(host, port,
+          timeout=tuf.settings.SOCKET_TIMEOUT)
+
+    else:
+      connection = six.moves.http_client.HTTPConnection(host, port,
+          timeout=tuf.settings.SOCKET_TIMEOUT)
+
+    return connection
+
+
+  def _save_tls_session(self, key, connection):
+    tls_session = getattr(connection.sock, 'session', None)
+
+    if tls_session is not None:
+      with self._lock:
+        self._tls_sessions[key[1:]] = tls_session
+
+
+  def release(self, key, connection):
+    """
+    Return the idle 'connection' for 'key' to the pool, or close it if the
+    pool for 'key' is full.
+    """
+
+    with self._lock:
+      idle_connections = self._idle_connections.setdefault(key, [])
+
+      if len(idle_connections) < tuf.settings.CONNECTION_POOL_SIZE:
+        idle_connections.append((connection, timeit.default_timer()))
+        return
+
+    connection.close()
+
+
+  def clear(self):
+    """
+    Close all idle connections and forget all TLS sessions.
+    """
+
+    with self._lock:
+      idle_connections = self._idle_connections
+      self._idle_connections = {}
+      self._tls_sessions = {}
+
+    for connections in six.itervalues(idle_connections):
+      for connection, released_time in connections:
+        connection.close()
+
+
+
+# The connection pool shared by safe_download() and unsafe_download().
+_connection_pool = _ConnectionPool()
@@ -177,6 +177,16 @@ class SlowRetrievalError(DownloadError):
            repr(self.__average_download_speed) + ' bytes per second.'
 
 
+class NotModifiedError(DownloadError):
+  """Indicate that a conditionally requested file has not been modified."""
+
+  def __init__(self, url):
+    self.url = url
+
+  def __str__(self):
+    return repr(self.url) + ' has not been modified.'
+
+
 class KeyAlreadyExistsError(Error):
   """Indicate that a key already exists and cannot be added."""
   pass
@@ -0,0 +1,338 @@
+"""
+<Program Name>
+  fetcher.py
+
+<Started>
+  October 16, 2026.
+
+<Copyright>
+  See LICENSE for licensing information.
+
+<Purpose>
+  Provide the transports that 'tuf.download' fetches files with.  A fetcher
+  opens a URL and returns a file-like response, like the one returned by
+  urllib2.urlopen(), that 'tuf.download' reads, length-checks and hashes as
+  usual.  An updater uses a fetcher given to it at construction, for example:
+
+    updater = tuf.client.updater.Updater('repository', repository_mirrors,
+        fetcher=tuf.fetcher.FileFetcher())
+
+  HTTPFetcher sends requests over the connection pool of 'tuf.download' (and
+  urllib2), and is used if no fetcher is given.  FileFetcher reads local
+  files, such as those of a mirror mounted over NFS, without the HTTP stack,
+  and copies them with os.copy_file_range() or os.sendfile() where possible.
+  MemoryFetcher serves files held in memory, for tests and benchmarks.
+"""
+
+# Help with Python 3 compatibility, where the print statement is a function, an
+# implicit relative import is invalid, and the '/' operator performs true
+# division.  Example:  print 'hello world' raises a 'SyntaxError' exception.
+from __future__ import print_function
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import abc
+import email.message
+import errno
+import io
+import logging
+import os
+
+import tuf
+import tuf.download
+import tuf.settings
+
+import six
+
+# See 'log.py' to learn how logging is handled in TUF.
+logger = logging.getLogger('tuf.fetcher')
+
+
+@six.add_metaclass(abc.ABCMeta)
+class FetcherInterface(object):
+  """
+  <Purpose>
+    The interface of the transports used by 'tuf.download'.  A subclass
+    must implement fetch().
+
+    fetch() returns a file-like response with these methods:
+
+      read(amount=None): up to 'amount' bytes of the file, or b'' once all of
+        it has been read.
+      info(): the response headers (e.g., 'Content-Length', 'Content-Range',
+        'ETag'), as a case-insensitive mapping with a get() method.
+      getcode(): the status code of the response (200, or 206 for a 'Range'
+        request that was honored).
+      close(): release the resources of the response.
+
+    fetch() raises 'six.moves.urllib.error.HTTPError' if the file cannot be
+    returned (e.g., 404), and 'six.moves.urllib.error.URLError' if the mirror
+    cannot be reached.  A response to a conditional request (e.g., with an
+    'If-None-Match' header) may be an HTTPError with a status code of 304.
+  """
+
+  @abc.abstractmethod
+  def fetch(self, url, headers=None):
+    """
+    <Purpose>
+      Open 'url' and return a file-like response.
+
+    <Arguments>
+      url:
+        The URL of the file.
+
+      headers:
+        An optional dictionary of HTTP request headers, such as 'Range'.  A
+        fetcher may ignore those that it does not support, except 'Range'.
+
+    <Exceptions>
+      six.moves.urllib.error.HTTPError, if the file could not be returned.
+
+      six.moves.urllib.error.URLError, if the mirror could not be reached.
+
+    <Side Effects>
+      Opens a connection or a file.
+
+    <Returns>
+      A file-like response.
+    """
+
+    raise NotImplementedError
+
+
+
+
+
+class HTTPFetcher(FetcherInterface):
+  """
+  <Purpose>
+    The default fetcher, which sends requests for http and https URLs over
+    the persistent connections of the pool in 'tuf.download', and requests
+    for other URLs (or through a proxy) with urllib2.
+  """
+
+  def fetch(self, url, headers=None):
+    return tuf.download.open_connection(url, headers)
+
+
+
+
+
+class FileFetcher(FetcherInterface):
+  """
+  <Purpose>
+    A fetcher of 'file://' URLs, which reads local files directly rather than
+    through urllib2.  Its responses are copied to the downloaded file by the
+    kernel (os.copy_file_range() or os.sendfile()), without passing through
+    user space, if their data need not be hashed as it is downloaded.
+  """
+
+  def fetch(self, url, headers=None):
+    parsed_url = six.moves.urllib.parse.urlparse(url)
+
+    if parsed_url.scheme not in ['file', '']:
+      raise six.moves.urllib.error.URLError('Not a file URL: ' + repr(url))
+
+    filepath = six.moves.urllib.request.url2pathname(parsed_url.path)
+
+    try:
+      file_object = io.open(filepath, 'rb', buffering=0)
+
+    except (IOError, OSError) as e:
+      if e.errno in [errno.ENOENT, errno.ENOTDIR, errno.EISDIR]:
+        _raise_http_error(url, 404, 'Not Found')
+
+      raise six.moves.urllib.error.URLError(e)
+
+    length = os.fstat(file_object.fileno()).st_size
+
+    try:
+      return _LocalResponse(url, file_object, length, headers)
+
+    except:
+      file_object.close()
+      raise
+
+
+
+
+
+class MemoryFetcher(FetcherInterface):
+  """
+  <Purpose>
+    A fetcher of files held in memory, for tests and benchmarks.  'files' is a
+    dictionary of URLs to the contents (bytes) of the files, which may be
+    changed at any time.
+  """
+
+  def __init__(self, files=None):
+    if files is None:
+      files = {}
+
+    self.files = files
+
+
+  def fetch(self, url, headers=None):
+    try:
+      data = self.files[url]
+
+    except KeyError:
+      _raise_http_error(url, 404, 'Not Found')
+
+    return _LocalResponse(url, io.BytesIO(data), len(data), headers)
+
+
+
+
+
+class _LocalResponse(object):
+  """
+  <Purpose>
+    The file-like response of FileFetcher and MemoryFetcher.  A 'Range'
+    request header of the form 'bytes=first-' or 'bytes=first-last' is
+    honored with a 206 response.
+  """
+
+  def __init__(self, url, file_object, length, request_headers=None):
+    self.file_object = file_object
+    self.status = 200
+    self.headers = email.message.Message()
+
+    first = 0
+    last = length - 1
+    byte_range = None
+
+    for header, value in six.iteritems(request_headers or {}):
+      if header.lower() == 'range':
+        byte_range = value
+
+    if byte_range is not None:
+      try:
+        first, last = byte_range.split('=', 1)[1].split('-', 1)
+        first = int(first)
+        last = min(int(last), length - 1) if last else length - 1
+
+      except ValueError:
+        _raise_http_error(url, 400, 'Bad Request')
+
+      if first >= length or first > last:
+        _raise_http_error(url, 416, 'Requested Range Not Satisfiable')
+
+      self.status = 206
+      self.headers['Content-Range'] = \
+        'bytes ' + str(first) + '-' + str(last) + '/' + str(length)
+      self.file_object.seek(first)
+
+    self.remaining = max(last - first + 1, 0)
+    self.headers['Content-Length'] = str(self.remaining)
+
+
+  def read(self, amount=None):
+    if amount is None or amount > self.remaining:
+      amount = self.remaining
+
+    data = self.file_object.read(amount)
+    self.remaining = self.remaining - len(data)
+
+    return data
+
+
+  def info(self):
+    return self.headers
+
+
+  def getcode(self):
+    return self.status
+
+
+  def close(self):
+    self.file_object.close()
+
+
+  def copy_to(self, file_object, amount):
+    """
+    Copy up to 'amount' bytes of the response to the end of 'file_object', a
+    'securesystemslib.util.TempFile' or 'tuf.download.DestinationTempFile',
+    and return the number of bytes copied.  The data is copied by the kernel
+    if possible, and read and written otherwise.
+    """
+
+    amount = min(amount, self.remaining)
+    total_copied = 0
+
+    file_object.flush()
+    destination = getattr(file_object, 'temporary_file', None)
+
+    if destination is not None and isinstance(self.file_object, io.FileIO):
+      total_copied = _copy_file_range(self.file_object.fileno(),
+          destination.fileno(), amount)
+
+    self.remaining = self.remaining - total_copied
+
+    # Whatever the kernel could not copy is read and written instead.
+    while total_copied < amount:
+      data = self.read(min(tuf.settings.CHUNK_SIZE, amount - total_copied))
+
+      if not data:
+        break
+
+      file_object.write(data, auto_flush=False)
+      total_copied = total_copied + len(data)
+
+    file_object.flush()
+
+    return total_copied
+
+
+
+
+
+def _copy_file_range(source_fd, destination_fd, amount):
+  """
+  Copy up to 'amount' bytes from the current position of 'source_fd' to the
+  current position of 'destination_fd', without passing through user space,
+  and return the number of bytes copied.  os.copy_file_range() (Linux, Python
+  3.8+) is tried first, then os.sendfile() (Python 3.3+).  Zero is returned if
+  neither can copy between the two files, so that the caller can fall back to
+  reading and writing.
+  """
+
+  copy_functions = []
+
+  if hasattr(os, 'copy_file_range'):
+    copy_functions.append(('copy_file_range', lambda count:
+        os.copy_file_range(source_fd, destination_fd, count)))
+
+  if hasattr(os, 'sendfile'):
+    copy_functions.append(('sendfile', lambda count:
+        os.sendfile(destination_fd, source_fd, None, count)))
+
+  total_copied = 0
+
+  for name, copy_function in copy_functions:
+    try:
+      while total_copied < amount:
+        copied = copy_function(amount - total_copied)
+
+        if not copied:
+          break
+
+        total_copied = total_copied + copied
+
+      return total_copied
+
+    # E.g., copy_file_range() between different file systems on older Linux
+    # kernels, or sendfile() to a regular file on other platforms.
+    except OSError as e:
+      logger.debug('Could not copy with ' + name + '(): ' + str(e))
+
+  return total_copied
+
+
+
+
+
+def _raise_http_error(url, status, reason):
+  raise six.moves.urllib.error.HTTPError(url, status, reason,
+      email.message.Message(), None)
@@ -271,6 +271,13 @@ DELEGATIONS_SCHEMA = SCHEMA.Object(
 # as requiring them to be a power of 2.
 NUMBINS_SCHEMA = SCHEMA.Integer(lo=1)
 
+# The maximum number of files that a client downloads concurrently, or the
+# number of worker threads that it uses to do so.
+MAX_WORKERS_SCHEMA = SCHEMA.Integer(lo=1)
+
+# The number of seconds between two refreshes of the metadata of a client.
+REFRESH_INTERVAL_SCHEMA = SCHEMA.Integer(lo=1)
+
 # The fileinfo format of targets specified in the repository and
 # developer tools.  The second element of this list holds custom data about the
 # target, such as file permissions, author(s), last modified, etc.
@@ -214,6 +214,56 @@ def remove_keydb(repository_name):
 
 
 
+
+def replace_keydb(repository_name, staged_repository_name):
+  """
+  <Purpose>
+    Replace the key database of the repository named 'repository_name' with
+    the key database staged under 'staged_repository_name', which is removed.
+    The key database of 'repository_name' is replaced at once, so that it is
+    never seen partially rebuilt.
+
+  <Arguments>
+    repository_name:
+      The name of the repository whose key database is replaced.
+
+    staged_repository_name:
+      The name under which the new key database was created.
+
+  <Exceptions>
+    securesystemslib.exceptions.FormatError, if the arguments are improperly
+    formatted.
+
+    securesystemslib.exceptions.InvalidNameError, if either repository name
+    does not exist, or if 'staged_repository_name' is 'default'.
+
+  <Side Effects>
+    The key database of 'repository_name' is replaced.
+
+  <Returns>
+    None.
+  """
+
+  # Are the arguments properly formatted?  Raise
+  # 'securesystemslib.exceptions.FormatError' if not.
+  securesystemslib.formats.NAME_SCHEMA.check_match(repository_name)
+  securesystemslib.formats.NAME_SCHEMA.check_match(staged_repository_name)
+
+  for name in [repository_name, staged_repository_name]:
+    if name not in _keydb_dict:
+      raise securesystemslib.exceptions.InvalidNameError('Repository name'
+        ' does not exist: ' + repr(name))
+
+  if staged_repository_name == 'default':
+    raise securesystemslib.exceptions.InvalidNameError('Cannot remove the'
+      ' default repository: ' + repr(staged_repository_name))
+
+  _keydb_dict[repository_name] = _keydb_dict.pop(staged_repository_name)
+
+
+
+
+
 def add_key(key_dict, keyid=None, repository_name='default'):
   """
   <Purpose>
@@ -15,6 +15,11 @@
 <Purpose>
   Extract a list of mirror urls corresponding to the file type and the location
   of the file with respect to the base url.
+
+  The health of every mirror (its latency, throughput and error rate) is
+  tracked from the downloads that the client makes, and the list of mirror urls
+  is ordered by it.  A mirror that fails repeatedly is skipped for a while
+  (its "circuit breaker" is open).
 """
 
 # Help with Python 3 compatibility, where the print statement is a function, an
@@ -26,9 +31,12 @@ from __future__ import division
 from __future__ import unicode_literals
 
 import os
+import threading
+import timeit
 
 import tuf
 import tuf.formats
+import tuf.settings
 
 import securesystemslib
 import six
@@ -37,6 +45,16 @@ import six
 # 'get_list_of_mirrors' function supports these file types.
 _SUPPORTED_FILE_TYPES = ['meta', 'target']
 
+# The weight of the latest download in the moving averages of the latency,
+# throughput and error rate of a mirror.
+_SMOOTHING_FACTOR = 0.3
+
+# The health of the mirrors that have been downloaded from, keyed by the
+# scheme and network location of the mirror (e.g., 'http://localhost:8001').
+# See _get_mirror_key().
+_mirror_health = {}
+_mirror_health_lock = threading.Lock()
+
 
 def get_list_of_mirrors(file_type, file_path, mirrors_dict):
   """
@@ -74,7 +92,9 @@ def get_list_of_mirrors(file_type, file_path, mirrors_dict):
     securesystemslib.exceptions.FormatError, on bad argument.
 
   <Return>
-    List of mirror urls corresponding to the file_type and file_path.  If no
+    List of mirror urls corresponding to the file_type and file_path, best
+    mirror first (see get_mirror_stats()).  Mirrors whose circuit breaker is
+    open are left out, unless that would leave no mirror at all.  If no
     match is found, empty list is returned.
   """
 
@@ -96,6 +116,13 @@ def get_list_of_mirrors(file_type, file_path, mirrors_dict):
   # object.
   in_confined_directory = securesystemslib.util.file_in_confined_directories
 
+  # urllib.quote(string) replaces special characters in string using the %xx
+  # escape.  This is done to avoid parsing issues of the URL on the server
+  # side. Do *NOT* pass URLs with Unicode characters without first encoding
+  # the URL as UTF-8. We need a long-term solution with #61.
+  # http://bugs.python.org/issue1712522
+  quoted_file_path = six.moves.urllib.parse.quote(file_path).lstrip(os.sep)
+
   list_of_mirrors = []
   for mirror_name, mirror_info in six.iteritems(mirrors_dict):
     if file_type == 'meta':
@@ -111,13 +138,311 @@ def get_list_of_mirrors(file_type, file_path, mirrors_dict):
         continue
       base = mirror_info['url_prefix'] + '/' + mirror_info['targets_path']
 
-    # urllib.quote(string) replaces special characters in string using the %xx
-    # escape.  This is done to avoid parsing issues of the URL on the server
-    # side. Do *NOT* pass URLs with Unicode characters without first encoding
-    # the URL as UTF-8. We need a long-term solution with #61.
-    # http://bugs.python.org/issue1712522
-    file_path = six.moves.urllib.parse.quote(file_path)
-    url = base + '/' + file_path.lstrip(os.sep)
+    url = base + '/' + quoted_file_path
     list_of_mirrors.append(url)
 
-  return list_of_mirrors
+  return _rank_mirrors(list_of_mirrors)
+
+
+
+
+
+def _rank_mirrors(list_of_mirrors):
+  """
+  Return the mirror urls of 'list_of_mirrors' ordered by the score of their
+  mirror, lowest first, without those whose circuit breaker is open.  A
+  mirror that has never been downloaded from is given the median score of the
+  others, so that it is tried before the slow mirrors but after the fast ones.
+  Mirrors that have the same score keep their order.  If every circuit
+  breaker is open, all the urls are returned.
+  """
+
+  now = timeit.default_timer()
+  mirror_states = []
+
+  with _mirror_health_lock:
+    for url in list_of_mirrors:
+      health = _mirror_health.get(_get_mirror_key(url))
+
+      if health is None:
+        mirror_states.append((False, None))
+
+      else:
+        mirror_states.append((health.is_open(now), health.score()))
+
+  known_scores = sorted([score for is_open, score in mirror_states
+                         if score is not None and score != float('inf')])
+  median_score = 0.0
+
+  if known_scores:
+    median_score = known_scores[len(known_scores) // 2]
+
+  ranked_mirrors = []
+
+  for index, url in enumerate(list_of_mirrors):
+    is_open, score = mirror_states[index]
+
+    if score is None:
+      score = median_score
+
+    ranked_mirrors.append((is_open, score, index, url))
+
+  ranked_mirrors.sort()
+  available_mirrors = [url for is_open, score, index, url in ranked_mirrors
+                       if not is_open]
+
+  if not available_mirrors:
+    return [url for is_open, score, index, url in ranked_mirrors]
+
+  return available_mirrors
+
+
+
+
+
+def record_success(url, seconds, number_of_bytes):
+  """
+  <Purpose>
+    Record that the file at 'url' was downloaded, and verified, in 'seconds'
+    seconds.  This updates the latency, throughput and error rate of its
+    mirror, and closes the mirror's circuit breaker.
+
+  <Arguments>
+    url:
+      The mirror url of the file, as returned by get_list_of_mirrors().
+
+    seconds:
+      The time the download took.
+
+    number_of_bytes:
+      The length of the downloaded file.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    The health of the mirror is updated.
+
+  <Return>
+    None.
+  """
+
+  with _mirror_health_lock:
+    health = _mirror_health.setdefault(_get_mirror_key(url), _MirrorHealth())
+    health.add_success(seconds, number_of_bytes)
+
+
+
+
+
+def record_failure(url):
+  """
+  <Purpose>
+    Record that the file at 'url' could not be downloaded, or failed
+    verification.  After 'tuf.settings.MIRROR_FAILURE_THRESHOLD' consecutive
+    failures, the circuit breaker of the mirror is opened, and the mirror is
+    skipped for 'tuf.settings.MIRROR_CIRCUIT_BREAKER_TIMEOUT' seconds.
+
+  <Arguments>
+    url:
+      The mirror url of the file, as returned by get_list_of_mirrors().
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    The health of the mirror is updated.
+
+  <Return>
+    None.
+  """
+
+  with _mirror_health_lock:
+    health = _mirror_health.setdefault(_get_mirror_key(url), _MirrorHealth())
+    health.add_failure(timeit.default_timer())
+
+
+
+
+
+def get_mirror_stats():
+  """
+  <Purpose>
+    Return the health of every mirror that has been downloaded from, which
+    determines the order of the mirror urls returned by get_list_of_mirrors().
+
+    Mirrors are ranked by their 'score', the expected number of seconds per
+    byte downloaded from them: the inverse of their average 'throughput'
+    (bytes per second), divided by the probability that a download succeeds
+    (1 - 'error_rate').  The throughput, unlike the latency of a download,
+    does not depend much on the size of the files that were downloaded.  The
+    'score' of a mirror that has never been downloaded from is None; it is
+    ranked with the median score of the other mirrors of a file.  A mirror
+    whose circuit breaker is open ('state' is
+    'open') is not ranked until 'retry_in' seconds have passed; it is then
+    'half-open' and tried again, after the other mirrors.
+
+  <Arguments>
+    None.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    None.
+
+  <Return>
+    A dictionary of the scheme and network location of each mirror (e.g.,
+    'http://localhost:8001') to a dictionary with the 'score', 'latency',
+    'throughput' (bytes/second), 'error_rate', 'successes', 'failures',
+    'consecutive_failures', 'state' ('closed', 'open' or 'half-open') and
+    'retry_in' (seconds) of the mirror.
+  """
+
+  now = timeit.default_timer()
+  mirror_stats = {}
+
+  with _mirror_health_lock:
+    for mirror_key, health in six.iteritems(_mirror_health):
+      mirror_stats[mirror_key] = health.get_stats(now)
+
+  return mirror_stats
+
+
+
+
+
+def clear_mirror_stats():
+  """
+  <Purpose>
+    Forget the health of all mirrors, and close their circuit breakers.
+
+  <Arguments>
+    None.
+
+  <Exceptions>
+    None.
+
+  <Side Effects>
+    The health of all mirrors is reset.
+
+  <Return>
+    None.
+  """
+
+  with _mirror_health_lock:
+    _mirror_health.clear()
+
+
+
+
+
+def _get_mirror_key(url):
+  """
+  Return the scheme and network location of 'url', which identify the mirror
+  that serves it.
+  """
+
+  parsed_url = six.moves.urllib.parse.urlparse(url)
+
+  return parsed_url.scheme + '://' + parsed_url.netloc
+
+
+
+
+
+class _MirrorHealth(object):
+  """
+  <Purpose>
+    The moving averages of the latency, throughput and error rate of a mirror,
+    and the state of its circuit breaker.  Instances are protected by
+    '_mirror_health_lock'.
+  """
+
+  def __init__(self):
+    self.latency = None
+    self.throughput = None
+    self.error_rate = 0.0
+    self.successes = 0
+    self.failures = 0
+    self.consecutive_failures = 0
+
+    # The time at which an open circuit breaker becomes half-open, or None if
+    # the circuit breaker is closed.
+    self.retry_time = None
+
+
+  def add_success(self, seconds, number_of_bytes):
+    seconds = max(seconds, 0.001)
+    self.latency = _moving_average(self.latency, seconds)
+    self.throughput = _moving_average(self.throughput,
+                                      max(number_of_bytes, 1) / seconds)
+    self.error_rate = _moving_average(self.error_rate, 0.0)
+    self.successes = self.successes + 1
+    self.consecutive_failures = 0
+    self.retry_time = None
+
+
+  def add_failure(self, now):
+    self.error_rate = _moving_average(self.error_rate, 1.0)
+    self.failures = self.failures + 1
+    self.consecutive_failures = self.consecutive_failures + 1
+
+    # A half-open circuit breaker is opened again by a single failure.
+    if self.consecutive_failures >= tuf.settings.MIRROR_FAILURE_THRESHOLD:
+      self.retry_time = now + tuf.settings.MIRROR_CIRCUIT_BREAKER_TIMEOUT
+
+
+  def is_open(self, now):
+    return self.retry_time is not None and now < self.retry_time
+
+
+  def score(self):
+    # A half-open mirror is tried after every healthy one.
+    if self.retry_time is not None:
+      return float('inf')
+
+    # A mirror that has never been downloaded from has no score (see
+    # _rank_mirrors()), but one that has only ever failed is ranked after
+    # every mirror that has worked.
+    if self.throughput is None:
+      return None if self.failures == 0 else float('inf')
+
+    if self.error_rate >= 1.0:
+      return float('inf')
+
+    return 1.0 / self.throughput / (1.0 - self.error_rate)
+
+
+  def get_stats(self, now):
+    if self.retry_time is None:
+      state = 'closed'
+      retry_in = 0
+
+    elif now < self.retry_time:
+      state = 'open'
+      retry_in = self.retry_time - now
+
+    else:
+      state = 'half-open'
+      retry_in = 0
+
+    return {'score': self.score(), 'latency': self.latency,
+            'throughput': self.throughput, 'error_rate': self.error_rate,
+            'successes': self.successes, 'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'state': state, 'retry_in': retry_in}
+
+
+
+
+
+def _moving_average(average, value):
+  """
+  Return the exponential moving average 'average' updated with 'value'.
+  """
+
+  if average is None:
+    return value
+
+  return _SMOOTHING_FACTOR * value + (1 - _SMOOTHING_FACTOR) * average
@@ -236,6 +236,59 @@ def remove_roledb(repository_name):
 
 
 
+
+
+def replace_roledb(repository_name, staged_repository_name):
+  """
+  <Purpose>
+    Replace the roledb of the repository named 'repository_name' with the
+    roledb staged under 'staged_repository_name', which is removed.  The
+    roledb of 'repository_name' is replaced at once, so that it is never seen
+    partially rebuilt.
+
+  <Arguments>
+    repository_name:
+      The name of the repository whose roledb is replaced.
+
+    staged_repository_name:
+      The name under which the new roledb was created.
+
+  <Exceptions>
+    securesystemslib.exceptions.FormatError, if the arguments are improperly
+    formatted.
+
+    securesystemslib.exceptions.InvalidNameError, if either repository name
+    does not exist, or if 'staged_repository_name' is 'default'.
+
+  <Side Effects>
+    The roledb of 'repository_name' is replaced.
+
+  <Returns>
+    None.
+  """
+
+  # Are the arguments properly formatted?  If not, raise
+  # 'securesystemslib.exceptions.FormatError'.
+  securesystemslib.formats.NAME_SCHEMA.check_match(repository_name)
+  securesystemslib.formats.NAME_SCHEMA.check_match(staged_repository_name)
+
+  global _roledb_dict
+  global _dirty_roles
+
+  for name in [repository_name, staged_repository_name]:
+    if name not in _roledb_dict or name not in _dirty_roles:
+      raise securesystemslib.exceptions.InvalidNameError('Repository name'
+        ' does not exist: ' + repr(name))
+
+  if staged_repository_name == 'default':
+    raise securesystemslib.exceptions.InvalidNameError('Cannot remove the'
+      ' default repository: ' + repr(staged_repository_name))
+
+  _roledb_dict[repository_name] = _roledb_dict.pop(staged_repository_name)
+  _dirty_roles[repository_name] = _dirty_roles.pop(staged_repository_name)
+
+
+
 def add_role(rolename, roleinfo, repository_name='default'):
   """
   <Purpose>
@@ -78,6 +78,21 @@ DEFAULT_TARGETS_REQUIRED_LENGTH = 5000000 #bytes
 # Set a timeout value in seconds (float) for non-blocking socket operations.
 SOCKET_TIMEOUT = 2 #seconds
 
+# The maximum number of idle, persistent HTTP/HTTPS connections that are kept
+# open to each mirror host and reused by later downloads.  Set to 0 to close
+# every connection after its download.
+CONNECTION_POOL_SIZE = 4
+
+# The time (in seconds) an idle persistent connection is kept open before it
+# is discarded.
+CONNECTION_IDLE_TIMEOUT = 30 #seconds
+
+# The maximum number of metadata and target files that are downloaded
+# concurrently by a client that supports parallel downloads, such as
+# 'tuf.client.async_updater.AsyncUpdater', and of delegated targets metadata
+# files that are downloaded concurrently by Updater.all_targets().
+MAX_CONCURRENT_DOWNLOADS = 4
+
 # The maximum chunk of data, in bytes, we would download in every round.
 CHUNK_SIZE = 8192 #bytes
 
@@ -88,6 +103,105 @@ MIN_AVERAGE_DOWNLOAD_SPEED = 100 #bytes/second
 # The time (in seconds) we ignore a server with a slow initial retrieval speed.
 SLOW_START_GRACE_PERIOD = 3 #seconds
 
+# The length of the sliding time window (in seconds) over which the download
+# speed is measured and compared against 'MIN_AVERAGE_DOWNLOAD_SPEED'.
+DOWNLOAD_SPEED_WINDOW = 3 #seconds
+
+# The time (in seconds) to wait for a valid metadata file from a mirror before
+# the same file is also requested from the next mirror ("hedged" requests).
+# The first copy that verifies is used, and the other downloads are cancelled.
+# None disables hedging, so that mirrors are tried one after another.
+HEDGED_REQUEST_DELAY = None #seconds
+
+# The number of consecutive failed downloads from a mirror after which its
+# circuit breaker is opened, and the mirror is skipped for
+# 'MIRROR_CIRCUIT_BREAKER_TIMEOUT' seconds.  See tuf.mirrors.
+MIRROR_FAILURE_THRESHOLD = 3
+MIRROR_CIRCUIT_BREAKER_TIMEOUT = 60 #seconds
+
+# Targets of at least this many bytes are downloaded in segments (HTTP range
+# requests), one from each mirror that serves the target, concurrently.  None
+# disables segmented downloads.
+SEGMENTED_DOWNLOAD_MIN_LENGTH = None #bytes
+
+# Whether a downloaded target is flushed to disk (fsync) before it is renamed
+# to its destination.  This is opt-in durability: enabling it guards against
+# an empty or partial target after a crash, but adds one fsync per downloaded
+# target, which can dominate the time of installing many small targets.
+FSYNC_DOWNLOADED_TARGETS = False
+
+# Whether root and timestamp metadata are requested conditionally (with the
+# 'ETag' validator of the trusted copy), so that a mirror can answer '304 Not
+# Modified' instead of sending them again.  Only mirrors that send an 'ETag'
+# are requested conditionally.
+CONDITIONAL_METADATA_REQUESTS = True
+
+# Whether metadata may be transferred compressed with gzip or deflate, if the
+# server supports it.  It is decompressed as it is downloaded, and the
+# decompressed length is bounded by the usual upper limits (e.g.,
+# DEFAULT_SNAPSHOT_REQUIRED_LENGTH).
+COMPRESSED_METADATA_TRANSFER = False
+
+# The maximum number of target paths whose target information is cached by an
+# updater, so that targets looked up again are not resolved by walking the
+# delegations again.  The least recently used are evicted first.  The cache is
+# emptied whenever a new snapshot or targets version is installed.  Set to 0
+# to disable the cache.
+TARGET_CACHE_SIZE = 4096
+
+# Whether the updater keeps the targets listed by the metadata of targets roles
+# in a compact, read-only form (see '_CompactTargets' in
+# 'tuf/client/updater.py'), rather than as a dictionary per target, per
+# fileinfo and per set of hashes.  The fileinfo of a target is rebuilt when it
+# is looked up, so a lookup that misses the target cache is slower (about 30
+# times), and the 'targets' of the metadata in 'Updater.metadata' are a
+# read-only mapping instead of a dict.  It suits clients of repositories with
+# very many targets that are short of memory.
+COMPACT_TARGETS_METADATA = False
+
+# The maximum number of delegated roles whose metadata the updater keeps in
+# memory, or None for no limit.  Beyond it, the metadata of the least recently
+# used delegated roles is evicted after each lookup, and loaded again from the
+# verified files on disk when the roles are next used.  If set, the previous
+# metadata of delegated roles is kept on disk only.
+MAX_DELEGATED_ROLES_IN_MEMORY = None
+
+# The shortest and longest number of seconds between two refreshes of the
+# top-level metadata by the background thread of an updater (see
+# 'tuf.client.updater.Updater.start_auto_refresh()'), unless it is given an
+# interval.  The metadata is refreshed once half of the time left before the
+# trusted timestamp metadata expires has passed, within these bounds.  A
+# refresh that fails is retried after the shortest interval.
+MIN_AUTO_REFRESH_INTERVAL = 30
+MAX_AUTO_REFRESH_INTERVAL = 3600
+
+# Whether the updater caches the metadata it has loaded and checked, and the
+# keys of the roles it delegates, in a binary form (see the 'marshal' module)
+# that is faster to load than JSON.  A cached copy of a metadata file is used
+# only while the hash of the file is unchanged.  The cache is saved in the
+# metadata directory of the repository, and is trusted like the metadata
+# files next to it, whose signatures are not verified again when they are
+# loaded either.
+CACHE_VERIFIED_METADATA = True
+
+# Whether Updater.updated_targets() caches the hashes of the local copies of
+# targets, by path, length, modification time and inode.  A file whose
+# length, modification time and inode are unchanged is not hashed again.  The
+# cache is saved, unsigned, in the metadata directory of the repository.
+# Enabling it weakens the guarantee of updated_targets(): a local file that
+# was changed without changing its length, modification time or inode (e.g.,
+# by a process that restores the modification time), or a tampered cache
+# file, is not detected, and the target is not downloaded again.
+CACHE_LOCAL_TARGET_HASHES = False
+
+# The maximum number of local files that Updater.updated_targets() hashes
+# concurrently.
+MAX_CONCURRENT_HASHES = 4
+
+# The suffix of the spool file, next to the destination of a target, that holds
+# the data received so far by a resumable target download.
+PARTIAL_DOWNLOAD_SUFFIX = '.partial'
+
 # Software updaters that integrate the framework are required to specify
 # the URL prefix for the mirrors that clients can contact to download updates.
 # The following URI schemes are those that download.py support.  By default,